@@ -0,0 +1,295 @@
+import sqlite3
+import threading
+
+
+def insert_company(
+    ticker: str,
+    name: str,
+    sector: str = None,
+    description: str = None,
+    incorporationYear: int = None,
+    databasePath: str = "data/main.sql",
+):
+    """
+    Inserts a new company into the 'Companies' table.
+
+    Parameters:
+        - ticker (str): The ticker symbol of the company.
+        - name (str): The full name of the company.
+        - sector (str): The sector the company belongs to.
+        - description (str): A short description of the company.
+        - incorporationYear (int): The year the company was incorporated.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If the company is already stored.
+    """
+    from config import DATABASE_BUSY_TIMEOUT
+
+    conn = sqlite3.connect(databasePath, timeout=DATABASE_BUSY_TIMEOUT)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(1) FROM Companies WHERE ticker = ?", (ticker,))
+        if cursor.fetchone()[0] != 0:
+            raise ValueError(f"The company ticker, {ticker}, is already stored")
+
+        cursor.execute(
+            "INSERT INTO Companies (ticker, name, sector, description, incorporation_year) VALUES (?, ?, ?, ?, ?)",
+            (ticker, name, sector, description, incorporationYear),
+        )
+        conn.commit()
+        cursor.close()
+
+    finally:
+        conn.close()
+
+
+def ticker_history_rows(
+    ticker: str, bars: list, databasePath: str = "data/main.sql"
+) -> list:
+    """
+    Converts the daily bars of a single ticker into the 'StockPrices' rows that are not stored yet.
+
+    Parameters:
+        - ticker (str): The ticker symbol the bars belong to.
+        - bars (list): Bars in the format returned by call_ticker_range.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - list: (ticker, date, open, close, high, low, volume, weighted_volume) tuples.
+
+    Note:
+        - Only bars for dates present in the 'DateStatuses' table are kept, and dates already stored for the
+          ticker are skipped, so the function can safely be re-run after an interrupted fetch.
+    """
+    from DatabaseHandling.priceStore import select_prices
+
+    conn = sqlite3.connect(databasePath)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT date FROM DateStatuses")
+        knownDates = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+    finally:
+        conn.close()
+    storedDates = {
+        row[0]
+        for row in select_prices(("date",), tickers=[ticker], databasePath=databasePath)
+    }
+
+    return [
+        (
+            ticker,
+            bar["date"],
+            bar["o"],  # open
+            bar["c"],  # close
+            bar["h"],  # high
+            bar["l"],  # low
+            bar["v"],  # volume traded
+            bar.get("vw"),  # weighted volume (missing for some thinly traded days)
+        )
+        for bar in bars
+        if bar["date"] in knownDates and bar["date"] not in storedDates
+    ]
+
+
+def _insert_rows(rows: list, databasePath: str) -> int:
+    """Writes 'StockPrices' rows in one transaction, returning how many were written."""
+    from config import DATABASE_BUSY_TIMEOUT
+
+    conn = sqlite3.connect(databasePath, timeout=DATABASE_BUSY_TIMEOUT)
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT OR REPLACE INTO StockPrices (ticker, date, open, close, high, low, volume, weighted_volume) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+        cursor.close()
+        return len(rows)
+
+    finally:
+        conn.close()
+
+
+def insert_ticker_history(
+    ticker: str, bars: list, databasePath: str = "data/main.sql"
+) -> int:
+    """
+    Bulk inserts the daily bars of a single ticker into the 'StockPrices' table in one transaction.
+
+    Parameters:
+        - ticker (str): The ticker symbol the bars belong to.
+        - bars (list): Bars in the format returned by call_ticker_range.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - int: The number of rows inserted.
+
+    Note:
+        - Only bars for dates present in the 'DateStatuses' table are inserted, and dates already stored for the
+          ticker are skipped (see ticker_history_rows).
+        - The derived data is not updated; add_company does that through the ingest pipeline.
+    """
+    return _insert_rows(ticker_history_rows(ticker, bars, databasePath), databasePath)
+
+
+def add_company(
+    ticker: str,
+    name: str,
+    sector: str = None,
+    description: str = None,
+    incorporationYear: int = None,
+    progressCallback=None,
+    databasePath: str = "data/main.sql",
+) -> int:
+    """
+    Adds a company to the tracked universe and fetches its full price history.
+
+    The company is inserted into 'Companies', its history from the first date in 'DateStatuses' up to the last
+    fully updated date is fetched with the per-ticker range endpoint (normally a single call, rather than one
+    grouped call per historic date), and the bars are bulk inserted through an IngestPipeline, whose post-ingest
+    hooks work out the derived data (daily returns, indicators, leaderboards) and update the in-memory caches so
+    that the new company is usable without a restart.
+
+    Parameters:
+        - ticker (str): The ticker symbol of the company.
+        - name (str): The full name of the company.
+        - sector (str): The sector the company belongs to.
+        - description (str): A short description of the company.
+        - incorporationYear (int): The year the company was incorporated.
+        - progressCallback (callable): Optional. Called as progressCallback(message, fraction) after each step,
+          where fraction is between 0 and 1.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - int: The number of price rows inserted.
+
+    Raises:
+        ValueError: If the company is already stored, the API has no data for it, or no date is fully updated yet.
+        ConnectionError: If the API call fails. Network errors from 'requests' are raised as they are.
+        sqlite3.Error: If a post-ingest hook fails. The prices are stored by then.
+
+    Dependencies:
+        - call_ticker_range from DatabaseHandling.autoBackfill
+        - company_dictionary from DatabaseHandling.companies
+        - IngestPipeline and IngestBatch from DatabaseHandling.ingestPipeline
+
+    Example:
+        ```
+        >>> add_company("ABNB", "Airbnb Inc", "Hospitality")
+        640
+        ```
+    """
+    from config import DATABASE_BUSY_TIMEOUT
+    from DatabaseHandling.autoBackfill import call_ticker_range
+    from DatabaseHandling.companies import company_dictionary
+    from DatabaseHandling.ingestPipeline import IngestBatch, IngestPipeline
+    from DatabaseHandling.storageLayout import ensure_schema
+
+    def report(message, fraction):
+        if progressCallback:
+            progressCallback(message, fraction)
+
+    ticker = ticker.upper()
+    ensure_schema(databasePath)
+
+    conn = sqlite3.connect(databasePath)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MIN(date) FROM DateStatuses")
+        startDate = cursor.fetchone()[0]
+        cursor.execute("SELECT MAX(date) FROM DateStatuses WHERE complete_data = true")
+        endDate = cursor.fetchone()[0]
+        cursor.close()
+    finally:
+        conn.close()
+
+    if endDate is None:
+        raise ValueError(
+            "There are no fully updated dates to fetch the history up to. Run the backfill first."
+        )
+
+    report(f"Adding {ticker} to Companies", 0.0)
+    insert_company(ticker, name, sector, description, incorporationYear, databasePath)
+
+    pipeline = IngestPipeline(
+        [("insert", lambda batch: _insert_rows(batch.rows, batch.databasePath))]
+    )
+    try:
+        report(f"Fetching {ticker} history from {startDate} to {endDate}", 0.2)
+        bars = call_ticker_range(ticker, startDate, endDate)
+
+        report(f"Storing {len(bars)} days of {ticker} data", 0.7)
+        batch = IngestBatch(
+            ticker_history_rows(ticker, bars, databasePath),
+            scope="tickers",
+            databasePath=databasePath,
+        )
+        pipeline.run(batch)
+    except Exception:
+        # e.g. a network error or a failed insert; leave the universe as it was, so the user can try again
+        pipeline.close()
+        conn = sqlite3.connect(databasePath, timeout=DATABASE_BUSY_TIMEOUT)
+        try:
+            conn.execute("DELETE FROM Companies WHERE ticker = ?", (ticker,))
+            conn.commit()
+        finally:
+            conn.close()
+        raise
+    inserted = len(batch)
+    company_dictionary[ticker] = name  # daily backfill will now keep this ticker
+
+    report(f"Working out {ticker} daily returns and technical indicators", 0.8)
+    errors = pipeline.close()
+    if errors:
+        raise errors[0][2]
+
+    report(f"{ticker} added with {inserted} days of data", 1.0)
+    return inserted
+
+
+def add_company_in_background(
+    ticker: str,
+    name: str,
+    sector: str = None,
+    description: str = None,
+    incorporationYear: int = None,
+    progressCallback=None,
+    doneCallback=None,
+) -> threading.Thread:
+    """
+    Runs add_company on a background thread, so that the GUI stays responsive while the history is fetched.
+
+    Parameters:
+        - ticker, name, sector, description, incorporationYear: As for add_company.
+        - progressCallback (callable): Optional. Passed through to add_company.
+        - doneCallback (callable): Optional. Called as doneCallback(insertedCount, error) when the thread finishes,
+          where error is None on success, or the exception that was raised.
+
+    Returns:
+        - threading.Thread: The started thread.
+
+    Note:
+        - Both callbacks are called from the background thread. Tkinter widgets must not be touched from them
+          directly; pass the values to the GUI thread (e.g. through a queue.Queue polled with after()).
+    """
+
+    def worker():
+        try:
+            inserted = add_company(
+                ticker, name, sector, description, incorporationYear, progressCallback
+            )
+        except Exception as error:
+            if doneCallback:
+                doneCallback(0, error)
+            return
+        if doneCallback:
+            doneCallback(inserted, None)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    return thread
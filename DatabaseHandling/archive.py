@@ -0,0 +1,353 @@
+import os
+import sqlite3
+
+# Old years of 'StockPrices' can be moved out of the live database into one SQLite file per year, kept in
+# ARCHIVE_DIRECTORY next to the live database. The 'ArchivedYears' table in the live database records which years
+# have been moved and where to. Archives are read-only, VACUUMed and optionally gzip compressed; a compressed
+# archive is decompressed into a cache in the temporary directory the first time it is read.
+# Reads go through DatabaseHandling.priceStore.select_prices, which ATTACHes an archive only when the requested
+# date range reaches its year, so reads of recent data only ever touch the live database.
+
+ARCHIVE_DIRECTORY = "archive"
+ARCHIVE_COLUMNS = (
+    "ticker",
+    "date",
+    "open",
+    "close",
+    "high",
+    "low",
+    "volume",
+    "weighted_volume",
+)
+
+
+def _resolve(databasePath: str, path: str) -> str:
+    """Archive paths are stored relative to the folder of the live database, so the data folder can be moved."""
+    return os.path.join(os.path.dirname(os.path.abspath(databasePath)), path)
+
+
+def _catalog_exists(conn: sqlite3.Connection) -> bool:
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT COUNT(1) FROM main.sqlite_master WHERE type = 'table' AND name = 'ArchivedYears'"
+    )
+    exists = cursor.fetchone()[0] != 0
+    cursor.close()
+    return exists
+
+
+def _readable_copy(archivePath: str) -> str:
+    """
+    Returns the path of an uncompressed copy of an archive, decompressing it into the cache if it is compressed.
+
+    Parameters:
+        - archivePath (str): The path of the archive file, ending in .gz if it is compressed.
+
+    Returns:
+        - str: A path that can be ATTACHed.
+
+    Note:
+        - The cached copy is reused until the compressed file is newer than it.
+    """
+    import gzip
+    import shutil
+    import tempfile
+
+    if not archivePath.endswith(".gz"):
+        return archivePath
+
+    cacheDirectory = os.path.join(tempfile.gettempdir(), "stockArchives")
+    os.makedirs(cacheDirectory, exist_ok=True)
+    cachedPath = os.path.join(cacheDirectory, os.path.basename(archivePath)[:-3])
+    if not os.path.exists(cachedPath) or os.path.getmtime(
+        cachedPath
+    ) < os.path.getmtime(archivePath):
+        partialPath = cachedPath + ".partial"  # so a reader never sees half a file
+        with gzip.open(archivePath, "rb") as compressed, open(
+            partialPath, "wb"
+        ) as uncompressed:
+            shutil.copyfileobj(compressed, uncompressed)
+        os.replace(partialPath, cachedPath)
+    return cachedPath
+
+
+def attach_archives(
+    conn: sqlite3.Connection,
+    startDate: str = None,
+    endDate: str = None,
+    databasePath: str = "data/main.sql",
+) -> list:
+    """
+    ATTACHes, read-only, every archive holding rows between two dates.
+
+    Parameters:
+        - conn (sqlite3.Connection): An open connection to the live database, opened with uri=True.
+        - startDate (str): Optional. The first date of the range (yyyy-mm-dd). None means from the first stored date.
+        - endDate (str): Optional. The last date of the range (yyyy-mm-dd). None means up to the last stored date.
+        - databasePath (str): The path of the live database, which archive paths are relative to.
+
+    Returns:
+        - list: The schema names the archives were ATTACHed as (e.g. 'archive2021'), oldest first. Empty if no
+          archive holds rows in the range, in which case nothing is ATTACHed.
+    """
+    from pathlib import Path
+
+    if not _catalog_exists(conn):
+        return []
+
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT year, path FROM ArchivedYears
+        WHERE (? IS NULL OR last_date >= ?) AND (? IS NULL OR first_date <= ?)
+        ORDER BY year
+    """,
+        (startDate, startDate, endDate, endDate),
+    )
+    archives = cursor.fetchall()
+
+    schemas = []
+    for year, path in archives:
+        schema = f"archive{year}"
+        readablePath = _readable_copy(_resolve(databasePath, path))
+        cursor.execute(
+            "ATTACH DATABASE ? AS " + schema,
+            (Path(readablePath).as_uri() + "?mode=ro&immutable=1",),
+        )
+        schemas.append(schema)
+    cursor.close()
+    return schemas
+
+
+def live_start_date(databasePath: str = "data/main.sql") -> str:
+    """
+    Returns the first date that has not been archived, or None if no year has been archived.
+
+    Rows from this date onwards are only ever stored in the live database, so reading them never needs an archive.
+    """
+    conn = sqlite3.connect(databasePath)
+    try:
+        if not _catalog_exists(conn):
+            return None
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX(year) FROM ArchivedYears")
+        lastYear = cursor.fetchone()[0]
+        cursor.close()
+        return None if lastYear is None else f"{lastYear + 1}-01-01"
+
+    finally:
+        conn.close()
+
+
+def archive_year(
+    year: int, compress: bool = False, databasePath: str = "data/main.sql"
+) -> int:
+    """
+    Moves every row of one year out of the live 'StockPrices' table into that year's archive file.
+
+    Parameters:
+        - year (int): The year to archive.
+        - compress (bool): If True, the archive is gzip compressed once it is written.
+        - databasePath (str): The path of the live database, in any of the storage layouts.
+
+    Returns:
+        - int: The number of rows moved.
+
+    Raises:
+        sqlite3.Error: If there is an error while reading or writing either database. The rows are copied and
+        deleted in one transaction across both files, so they are never lost or duplicated.
+
+    Note:
+        - If the year has already been archived (e.g. a company added since had history in it), the new rows are
+          merged into the existing archive.
+        - The archive is a clustered (ticker, date) table with a date index, so it is read the same way as the
+          clustered layout of the live database.
+    """
+    import gzip
+    import shutil
+    from DatabaseHandling.storageLayout import (
+        COMPACT_COLUMNS,
+        detect_layout,
+        layout_expressions,
+    )
+
+    firstDay, lastDay = f"{year}-01-01", f"{year}-12-31"
+    os.makedirs(_resolve(databasePath, ARCHIVE_DIRECTORY), exist_ok=True)
+
+    conn = sqlite3.connect(databasePath, isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ArchivedYears (
+                year INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                first_date DATE,
+                last_date DATE,
+                row_count INTEGER,
+                compressed BOOLEAN
+            )
+        """
+        )
+        cursor.execute("SELECT path FROM ArchivedYears WHERE year = ?", (year,))
+        existing = cursor.fetchone()
+
+        path = os.path.join(ARCHIVE_DIRECTORY, f"prices-{year}.sql")
+        archivePath = _resolve(databasePath, path)
+        if existing is not None and existing[0].endswith(".gz"):
+            with gzip.open(_resolve(databasePath, existing[0]), "rb") as compressed:
+                with open(archivePath, "wb") as uncompressed:
+                    shutil.copyfileobj(compressed, uncompressed)
+        if os.path.exists(archivePath):
+            os.chmod(archivePath, 0o644)  # archives are left read-only
+
+        layout = detect_layout(conn)
+        source, _, rawExpression, encode = layout_expressions(layout)
+        if layout == "compact":  # the archive stores the values as they are
+            decode = lambda column: COMPACT_COLUMNS[column][0]
+        else:
+            decode = lambda column: column
+        liveTable = "PriceBars" if layout == "compact" else "StockPrices"
+
+        cursor.execute("ATTACH DATABASE ? AS archive", (archivePath,))
+        cursor.execute("BEGIN")
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS archive.StockPrices (
+                ticker TEXT NOT NULL,
+                date DATE NOT NULL,
+                open REAL,
+                close REAL,
+                high REAL,
+                low REAL,
+                volume INTEGER,
+                weighted_volume REAL,
+                PRIMARY KEY (ticker, date)
+            ) WITHOUT ROWID
+        """
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS archive.idx_StockPrices_date ON StockPrices (date)"
+        )
+        cursor.execute(
+            f"""
+            INSERT OR REPLACE INTO archive.StockPrices ({", ".join(ARCHIVE_COLUMNS)})
+            SELECT {", ".join(decode(column) for column in ARCHIVE_COLUMNS)}
+            FROM {source}
+            WHERE {rawExpression("date")} BETWEEN ? AND ?
+            ORDER BY {rawExpression("ticker")}, {rawExpression("date")}
+        """,
+            (encode(firstDay), encode(lastDay)),
+        )
+        movedRows = cursor.rowcount
+        if (
+            movedRows == 0 and existing is None
+        ):  # nothing to archive, so leave no empty file behind
+            cursor.execute("ROLLBACK")
+            cursor.execute("DETACH DATABASE archive")
+            cursor.close()
+            os.remove(archivePath)
+            return 0
+
+        cursor.execute(
+            f"DELETE FROM {liveTable} WHERE {rawExpression('date')} BETWEEN ? AND ?",
+            (encode(firstDay), encode(lastDay)),
+        )
+        cursor.execute("SELECT MIN(date), MAX(date), COUNT(1) FROM archive.StockPrices")
+        firstDate, lastDate, rowCount = cursor.fetchone()
+        cursor.execute(
+            "INSERT OR REPLACE INTO ArchivedYears (year, path, first_date, last_date, row_count, compressed) VALUES (?, ?, ?, ?, ?, ?)",
+            (year, path, firstDate, lastDate, rowCount, False),
+        )
+        cursor.execute("COMMIT")
+        cursor.execute("DETACH DATABASE archive")
+
+        archiveConn = sqlite3.connect(archivePath)
+        archiveConn.execute("VACUUM")
+        archiveConn.close()
+        os.chmod(archivePath, 0o444)
+
+        compressedPath = archivePath + ".gz"
+        if os.path.exists(compressedPath):
+            # replaced below, or out of date now that the uncompressed archive holds the rows.
+            # Read-only files cannot be overwritten or removed on Windows, hence the chmod
+            os.chmod(compressedPath, 0o644)
+            os.remove(compressedPath)
+        if compress:
+            with open(archivePath, "rb") as uncompressed:
+                with gzip.open(compressedPath, "wb") as compressed:
+                    shutil.copyfileobj(uncompressed, compressed)
+            os.chmod(compressedPath, 0o444)
+            cursor.execute(
+                "UPDATE ArchivedYears SET path = ?, compressed = ? WHERE year = ?",
+                (path + ".gz", True, year),
+            )
+            os.chmod(archivePath, 0o644)
+            os.remove(archivePath)
+
+        cursor.close()
+        return movedRows
+
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+    finally:
+        conn.close()
+
+
+def archive_old_years(
+    keepYears: int = 3, compress: bool = False, databasePath: str = "data/main.sql"
+) -> dict:
+    """
+    Archives every year before the last keepYears years, then VACUUMs the live database.
+
+    Parameters:
+        - keepYears (int): The number of most recent years to keep in the live database, counting the current one.
+        - compress (bool): If True, the archives are gzip compressed.
+        - databasePath (str): The path of the live database.
+
+    Returns:
+        - dict: year -> the number of rows moved, for every year that had rows to move.
+
+    Raises:
+        sqlite3.Error: If there is an error while reading or writing a database.
+
+    Note:
+        - This replaces deleting old data (see docs/ToDo.md): nothing is lost, and graphs, searches and sorts over
+          old dates still work, they just read the archive files as well.
+        - Make sure nothing else has the database open, as it is VACUUMed.
+
+    Example:
+        ```
+        >>> archive_old_years(3, compress=True)
+        {2021: 10504, 2022: 25142}
+        ```
+    """
+    from datetime import date
+    from DatabaseHandling.priceStore import price_store, select_prices
+
+    first = select_prices(
+        ("date",),
+        orderBy="date",
+        limit=1,
+        includeArchives=False,
+        databasePath=databasePath,
+    )
+    if not first:
+        return {}
+
+    moved = {}
+    for year in range(int(first[0][0][:4]), date.today().year - keepYears + 1):
+        rows = archive_year(year, compress, databasePath)
+        if rows:
+            moved[year] = rows
+
+    if moved:
+        conn = sqlite3.connect(databasePath)
+        conn.execute("VACUUM")
+        conn.close()
+        if os.path.abspath(price_store.databasePath) == os.path.abspath(databasePath):
+            price_store.invalidate()  # cached histories were loaded before the rows moved
+    return moved
@@ -22,7 +22,8 @@ def call_all_companies(date: str) -> list:
 
     Note:
         - Make sure to set up the 'api-token' environment variable with your API key.
-        - The function will filter for relevant companies based on the 'company_dictionary'.
+        - The function will filter for relevant companies based on the 'company_dictionary', unless
+          config.FULL_UNIVERSE is set, in which case every ticker is kept.
 
     Example:
         >>> data = call_all_companies('2023-07-31')
@@ -33,6 +34,7 @@ def call_all_companies(date: str) -> list:
     import requests
     from dotenv import load_dotenv
     from DatabaseHandling.companies import company_dictionary
+    from config import FULL_UNIVERSE
 
     load_dotenv()
     api_key = os.environ.get("api-token")
@@ -55,7 +57,7 @@ def call_all_companies(date: str) -> list:
     ):  # raw data is a json where the value of the results key is a list of dictionaries, each holding data for distinct companies, hence this cleansing
         subDictionary = rawData["results"][counter]
         if (
-            subDictionary["T"] in company_dictionary
+            FULL_UNIVERSE or subDictionary["T"] in company_dictionary
         ):  # rawData contains many more companies then we need hence...
             companySortedData.append(subDictionary)
         counter += 1
@@ -63,6 +65,76 @@ def call_all_companies(date: str) -> list:
     return companySortedData
 
 
+def call_ticker_range(ticker: str, startDate: str, endDate: str) -> list:
+    """
+    Retrieves the daily bars of a single ticker between two dates from the Polygon range aggregates API.
+
+    Parameters:
+        ticker (str): The ticker symbol of the company.
+        startDate (str): The first date of the range in the format 'yyyy-mm-dd'.
+        endDate (str): The last date of the range in the format 'yyyy-mm-dd'.
+
+    Returns:
+        list: A list of dictionaries, one per trading day in ascending date order, in the same raw format as
+        call_all_companies, with the date of the bar added under the 'date' key.
+
+    Raises:
+        ConnectionError: if the API call fails or returns an error.
+        ValueError: Raised when the API has no data for the ticker in the given range.
+
+    Dependencies:
+        - The function relies on the 'requests' module to make API calls.
+        - The function requires the 'dotenv' module to load environment variables.
+
+    Note:
+        - Make sure to set up the 'api-token' environment variable with your API key.
+        - A single call returns up to 50000 bars, so the full history of a ticker is normally one call. If the API
+          pages the results, each further page is requested after the same 12 second wait used by backfill.
+
+    Example:
+        >>> data = call_ticker_range('AAPL', '2023-07-31', '2023-08-01')
+        >>> print(data)
+        [{'v': 38824127, 'vw': 195.9178, 'o': 196.06, 'c': 196.45, 'h': 196.49, 'l': 195.26, 't': 1690776000000, 'n': 400374, 'date': '2023-07-31'}, ...]
+    """
+    import os
+    import time
+    import requests
+    from datetime import datetime, timezone
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    api_key = os.environ.get("api-token")
+
+    url = f"https://api.polygon.io/v2/aggs/ticker/{ticker}/range/1/day/{startDate}/{endDate}?adjusted=true&sort=asc&limit=50000&apiKey={api_key}"
+
+    bars = []
+    while url:
+        rawData = requests.get(url)
+        if rawData.status_code != 200:
+            raise ConnectionError(
+                f"Request failed with status code {rawData.status_code}"
+            )
+
+        rawData = rawData.json()
+        for bar in rawData.get("results", []):
+            bar["date"] = str(
+                datetime.fromtimestamp(bar["t"] / 1000, tz=timezone.utc).date()
+            )  # 't' is the start of the trading day in unix msec
+            bars.append(bar)
+
+        url = rawData.get("next_url")
+        if url:
+            url = f"{url}&apiKey={api_key}"
+            time.sleep(12)  # same rate limit as the grouped endpoint
+
+    if bars == []:
+        raise ValueError(
+            f"No data is available for {ticker} from {startDate} to {endDate}"
+        )
+
+    return bars
+
+
 def add_missing_dates():
     from datetime import datetime, timedelta
 
@@ -154,31 +226,81 @@ def find_last_full_date() -> str:
         return result[0]
 
 
-def insert_data_into_stockprices(data: list):
+def grouped_rows(data: list) -> list:
+    """
+    Converts one date of data from 'call_all_companies' into 'StockPrices' rows.
+
+    Parameters:
+    - data (list): The date followed by a dictionary per company, as returned by 'call_all_companies'.
+
+    Returns:
+    list: (ticker, date, open, close, high, low, volume, weighted_volume) tuples, one per company.
+    """
+    date = data[0]
+    return [
+        (
+            company["T"],
+            date,
+            company["o"],  # open
+            company["c"],  # close
+            company["h"],  # high
+            company.get("l"),  # low
+            company["v"],  # volume traded
+            company.get(
+                "vw"
+            ),  # weighted volume (missing for some thinly traded tickers)
+        )
+        for company in data[1:]
+    ]
+
+
+def insert_data_into_stockprices(data: list, databasePath: str = "data/main.sql"):
+    """
+    Inserts one date of stock price data into the 'StockPrices' table in a single transaction.
+
+    Parameters:
+    - data (list): The date followed by a dictionary per company, as returned by 'call_all_companies'.
+    - databasePath (str): The path of the SQLite database.
+
+    Returns:
+    None
+
+    Raises:
+    sqlite3.Error: If there is an error while connecting to or querying the SQLite database.
+
+    Note:
+    The rows are written with a single executemany and one commit, rather than a commit per company, which
+    keeps a full universe date (~10k companies) to a fraction of a second. When config.FULL_UNIVERSE is set,
+    tickers missing from the 'Companies' table are added to it with their ticker as their name, so that they
+    can be picked in the GUI and have their names looked up. In the clustered storage layout, re-running a date
+    replaces its rows rather than failing on the (ticker, date) key.
+    An error (e.g. the database staying locked by another writer for longer than config.DATABASE_BUSY_TIMEOUT)
+    is printed and raised again, so that the ingest pipeline stops before recording the date's status.
+
+    Example Use:
+    insert_data_into_stockprices(call_all_companies("2023-07-31"))
+    """
+    from config import DATABASE_BUSY_TIMEOUT, FULL_UNIVERSE
+
+    conn = cursor = None
     try:
-        conn = sqlite3.connect("data/main.sql")
+        conn = sqlite3.connect(databasePath, timeout=DATABASE_BUSY_TIMEOUT)
         cursor = conn.cursor()
-        date = data[0]
-        for company in data:
-            if company == date:
-                continue
-            insertArgs = (
-                company["T"],
-                date,
-                company["o"],  # open
-                company["c"],  # close
-                company["h"],  # high
-                company["v"],  # volume traded
-                company["vw"],  # weighted volume
-            )
-            cursor.execute(
-                "INSERT INTO StockPrices (ticker, date, open, close, high, volume, weighted_volume) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                insertArgs,
+        insertArgs = grouped_rows(data)
+        cursor.executemany(
+            "INSERT OR REPLACE INTO StockPrices (ticker, date, open, close, high, low, volume, weighted_volume) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            insertArgs,
+        )
+        if FULL_UNIVERSE:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO Companies (ticker, name) VALUES (?, ?)",
+                [(company["T"], company["T"]) for company in data[1:]],
             )
-            conn.commit()
+        conn.commit()
 
     except sqlite3.Error as error:
         print("Error: {}".format(error))
+        raise  # so that the date's status is not updated as if nothing had been stored for it
 
     finally:
         # Close the cursor and connection
@@ -188,7 +310,7 @@ def insert_data_into_stockprices(data: list):
             conn.close()
 
 
-def update_date_statuses(date: str):
+def update_date_statuses(date: str, databasePath: str = "data/main.sql"):
     """
     Inserts stock price data into the 'StockPrices' table in the SQLite database.
 
@@ -212,14 +334,17 @@ def update_date_statuses(date: str):
     insert_data_into_stockprices(data)
     """
 
+    from config import DATABASE_BUSY_TIMEOUT
+    from DatabaseHandling.priceStore import count_prices
+
+    conn = cursor = None
     try:
-        conn = sqlite3.connect("data/main.sql")
+        conn = sqlite3.connect(databasePath, timeout=DATABASE_BUSY_TIMEOUT)
         cursor = conn.cursor()
 
-        cursor.execute(
-            "SELECT COUNT(*) FROM StockPrices WHERE date = ?", (date,)
-        )  # select number of entries for a particular date
-        count = cursor.fetchone()[0]
+        count = count_prices(
+            startDate=date, endDate=date, databasePath=databasePath
+        )  # number of entries for a particular date, counted on the date index whatever the storage layout
         if (
             count >= 90
         ):  # note that the list of companies stored is not always available in the data, however we only drop to 97 companies returned from 101
@@ -244,6 +369,23 @@ def update_date_statuses(date: str):
             conn.close()
 
 
+def _insert_stage(batch):
+    """Ingest pipeline stage writing a date of 'call_all_companies' data, if the market was open."""
+    if batch.data is not None:
+        insert_data_into_stockprices(batch.data, batch.databasePath)
+
+
+def _date_status_stage(batch):
+    """
+    Ingest pipeline stage recording whether each date of the batch has complete data or the market was closed.
+
+    Not run for a batch whose insert stage raised (IngestPipeline.run stops at the failing stage), so a date whose
+    rows were not stored is left incomplete and fetched again, rather than being marked as a day the market was closed.
+    """
+    for date in batch.dates:
+        update_date_statuses(date, batch.databasePath)
+
+
 def backfill(lastFullDate: str):
     """
     Backfills missing data for dates starting from the last fully updated date to yesterday.
@@ -261,24 +403,43 @@ def backfill(lastFullDate: str):
     - time
     - datetime
     - timedelta
+    - ensure_schema
+    - archive_old_years
     - add_missing_dates
+    - load_companies_from_database
     - call_all_companies
-    - insert_data_into_stockprices
-    - update_date_statuses
+    - IngestPipeline and IngestBatch from DatabaseHandling.ingestPipeline
 
     Note:
     This function relies on external functions 'add_missing_dates', 'call_all_companies',
     'insert_data_into_stockprices', and 'update_date_statuses'. It also uses a sleep duration of
     12 seconds to comply with the rate limits of the free API plan.
+    Each date is ingested through an IngestPipeline (insert, then date_status), whose post-ingest hooks
+    (daily returns, indicators, leaderboards, caches) work out the derived data of the date on a worker
+    pool while the next date is fetched. The time taken by each stage and hook is printed at the end.
 
     Example Use:
     backfill("2023-01-01")
     """
     import time
     from datetime import timedelta, datetime
+    from config import ARCHIVE_AFTER_YEARS, COMPRESS_ARCHIVES
+    from DatabaseHandling.archive import archive_old_years
+    from DatabaseHandling.companies import load_companies_from_database
+    from DatabaseHandling.ingestPipeline import IngestBatch, IngestPipeline
+    from DatabaseHandling.storageLayout import ensure_schema
 
+    ensure_schema()
     add_missing_dates()
-
+    load_companies_from_database()  # picks up companies added by the user since the last run
+    if ARCHIVE_AFTER_YEARS is not None:
+        archive_old_years(
+            ARCHIVE_AFTER_YEARS, COMPRESS_ARCHIVES
+        )  # only does anything once a new year is old enough
+
+    pipeline = IngestPipeline(
+        [("insert", _insert_stage), ("date_status", _date_status_stage)]
+    )
     yesterday = datetime.now() - timedelta(days=1)
 
     if lastFullDate != str(yesterday.date()):
@@ -295,6 +456,9 @@ def backfill(lastFullDate: str):
         datesToFill.append(str(yesterday))
     else:
         print("Already up to date")
+        # the derived data only has work to do the first time, or after INDICATOR_WINDOWS changes
+        pipeline.run_hooks(IngestBatch())
+        _finish_pipeline(pipeline)
         return
 
     for date in datesToFill:
@@ -309,19 +473,188 @@ def backfill(lastFullDate: str):
                 "item count:", len(data) - 1
             )  # prints number of companies returned (the -1 is because the first value of data is the date)
 
-            insert_data_into_stockprices(
-                data
-            )  # inserts the data into the stockprices table
-
-            update_date_statuses(date)  # updates the dateStatuses table accordingly
-
-            print(date, "\n")  # prints date to indicate that it is accounted for
+            rows = grouped_rows(data)
 
         except (
             ValueError
         ):  # this is raised from call_all_companies, and happens when the length of the query returned from the api is 0 = the market was closed
-            update_date_statuses(date)  # the dateStatuses table is updated accordingly
-            print(date, "\n")  # prints date to indicate that it is accounted for
+            data = None
+            rows = []
+
+        try:
+            # inserts the data, updates the dateStatuses table accordingly, then starts the post-ingest hooks
+            pipeline.run(IngestBatch(rows, dates=[date], data=data))
+        except sqlite3.Error:
+            # the date is left incomplete, so the next backfill starts from it again
+            print(date, "was not stored, and will be fetched again on the next run\n")
+            break
+        print(date, "\n")  # prints date to indicate that it is accounted for
+
+    _finish_pipeline(pipeline)
+
+
+def _finish_pipeline(pipeline):
+    """Waits for backfill's post-ingest hooks, then prints any errors and the time taken by each stage and hook."""
+    for name, batch, error in pipeline.close():
+        print("Error: {} failed on {}: {}".format(name, batch, error))
+    print(pipeline.report())
+
+
+def backfill_missing_lows(
+    tickers=None, progressCallback=None, databasePath: str = "data/main.sql"
+) -> int:
+    """
+    Fills in the 'low' of rows stored before the column existed, from each ticker's daily bars.
+
+    Parameters:
+        - tickers (iterable): Optional. Only fill in these tickers. Defaults to every ticker with a missing low.
+        - progressCallback (callable): Optional. Called as progressCallback(message, fraction) after each ticker,
+          where fraction is between 0 and 1.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - int: The number of rows whose low was filled in.
+
+    Raises:
+        sqlite3.Error: If there is an error while reading or writing the database.
+
+    Dependencies:
+        - call_ticker_range for each ticker's bars, one call per ticker.
+        - rebuild_indicators from DatabaseHandling.indicators and update_leaderboards from
+          DatabaseHandling.leaderboards, for the indicators and leaderboards that use the low (atr_n, day_range).
+
+    Note:
+        - The same 12 second wait as backfill is kept between calls, so filling in every company of the default
+          universe takes around 20 minutes.
+        - A ticker the API has no data for, or whose call fails, is printed and skipped, so the function can be
+          run again to retry it.
+        - Only the live database is filled in; archived years stay as they are (see DatabaseHandling/archive.py).
+
+    Example:
+        ```
+        >>> backfill_missing_lows(["AAPL"])
+        632
+        ```
+    """
+    import time
+    import requests
+    from config import DATABASE_BUSY_TIMEOUT
+    from DatabaseHandling.indicators import rebuild_indicators
+    from DatabaseHandling.leaderboards import update_leaderboards
+    from DatabaseHandling.priceStore import price_store
+    from DatabaseHandling.storageLayout import (
+        PRICE_SCALE,
+        detect_layout,
+        encode_date,
+        ensure_schema,
+    )
+    from graphing.cache import graph_cache
+
+    def report(message, fraction):
+        if progressCallback:
+            progressCallback(message, fraction)
+
+    ensure_schema(databasePath)
+    conn = sqlite3.connect(databasePath)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT ticker, date FROM StockPrices WHERE low IS NULL ORDER BY ticker, date"
+        )
+        missing = {}  # ticker -> set of dates with no low
+        for ticker, date in cursor.fetchall():
+            missing.setdefault(ticker, set()).add(date)
+        cursor.close()
+    finally:
+        conn.close()
+    if tickers is not None:
+        missing = {
+            ticker: dates for ticker, dates in missing.items() if ticker in set(tickers)
+        }
+
+    filled = {}  # ticker -> rows filled in
+    for number, (ticker, dates) in enumerate(sorted(missing.items())):
+        if number:
+            time.sleep(12)  # the free api plan allows 5 calls per min
+        try:
+            bars = call_ticker_range(ticker, min(dates), max(dates))
+        except (ValueError, ConnectionError, requests.RequestException) as error:
+            print("Error: {} lows not filled in: {}".format(ticker, error))
+            continue
+        lows = [
+            (bar["l"], ticker, bar["date"])
+            for bar in bars
+            if bar["date"] in dates and bar.get("l") is not None
+        ]
+
+        conn = sqlite3.connect(databasePath, timeout=DATABASE_BUSY_TIMEOUT)
+        try:
+            cursor = conn.cursor()
+            if detect_layout(conn) == "compact":
+                cursor.executemany(
+                    "UPDATE PriceBars SET low = ? WHERE tickerid = (SELECT tickerid FROM Tickers WHERE ticker = ?) AND day = ?",
+                    [
+                        (round(low * PRICE_SCALE), ticker, encode_date(date))
+                        for low, ticker, date in lows
+                    ],
+                )
+            else:
+                cursor.executemany(
+                    "UPDATE StockPrices SET low = ? WHERE ticker = ? AND date = ? AND low IS NULL",
+                    lows,
+                )
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+        filled[ticker] = len(lows)
+        report(f"Filled in {len(lows)} lows of {ticker}", (number + 1) / len(missing))
+
+    if filled:
+        report("Working out the indicators and leaderboards that use the low", 1.0)
+        if databasePath == price_store.databasePath:
+            for ticker in filled:
+                price_store.invalidate(ticker)
+            graph_cache.invalidate(filled)
+        rebuild_indicators(filled, databasePath)
+        update_leaderboards(tickers=filled, databasePath=databasePath)
+    return sum(filled.values())
+
+
+def backfill_missing_lows_in_background(
+    tickers=None, progressCallback=None, doneCallback=None
+):
+    """
+    Runs backfill_missing_lows on a background thread, so that the GUI stays responsive during the calls.
+
+    Parameters:
+        - tickers (iterable): Optional. Passed through to backfill_missing_lows.
+        - progressCallback (callable): Optional. Passed through to backfill_missing_lows.
+        - doneCallback (callable): Optional. Called as doneCallback(filledCount, error) when the thread finishes,
+          where error is None on success, or the exception that was raised.
+
+    Returns:
+        - threading.Thread: The started thread.
+
+    Note:
+        - Both callbacks are called from the background thread, as in add_company_in_background.
+    """
+    import threading
+
+    def worker():
+        try:
+            filled = backfill_missing_lows(tickers, progressCallback)
+        except Exception as error:
+            if doneCallback:
+                doneCallback(0, error)
+            return
+        if doneCallback:
+            doneCallback(filled, None)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    return thread
 
 
 # backfill(find_last_full_date())
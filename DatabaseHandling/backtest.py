@@ -0,0 +1,284 @@
+import numpy as np
+
+# Backtests a threshold rule (see DatabaseHandling/thresholds.py) or a screening expression (see
+# DatabaseHandling/screener.py) over the stored history: how often it fired, and what the close did over the next
+# few trading days each time.
+#
+# Unlike a replay (DatabaseHandling/replay.py), which checks one date at a time like live data, the whole history is
+# read once into a matrix of dates x tickers per column, and the rule is worked out on every cell at once with
+# pandas and numpy:
+#   - the value a rule watches is a shift or rolling mean of the matrix (e.g. a 5 day move is close / close 5 rows
+#     earlier), and a rule fires where the value crossed its threshold since the row before
+#   - a screen is worked out over the whole range by the screener, and fires where a ticker starts matching
+#   - the forward return over h days is close h rows later / close, and is averaged over the cells the rule fired
+#     on, and over every cell as a baseline to compare with
+#
+# The rows of the matrix are the dates any ticker has a price on, so a date a ticker is missing counts as one of its
+# trading days, and a rule cannot fire across it (the live alert engine compares a ticker's bars either side of a
+# gap).
+
+
+def load_matrix(
+    columns: tuple = ("close", "volume"),
+    tickers=None,
+    startDate: str = None,
+    endDate: str = None,
+    databasePath: str = "data/main.sql",
+) -> dict:
+    """
+    Reads stored prices into one dates x tickers DataFrame per column.
+
+    Parameters:
+        - columns (tuple): The price columns to read (see PriceStore.COLUMNS).
+        - tickers (iterable): Optional. Only read these tickers. Defaults to every ticker.
+        - startDate (str): Optional. The first date (yyyy-mm-dd). Defaults to the first stored date.
+        - endDate (str): Optional. The last date. Defaults to the last stored date.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - dict: column -> pandas.DataFrame with a row per date (in order) and a column per ticker, with NaN where a
+          ticker has no value.
+
+    Dependencies:
+        - The 'pandas' library for handling data in DataFrame format.
+    """
+    import pandas as pd
+    from DatabaseHandling.priceStore import select_prices
+
+    rows = select_prices(
+        ("date", "ticker") + tuple(columns),
+        tickers=tickers,
+        startDate=startDate,
+        endDate=endDate,
+        databasePath=databasePath,
+    )
+    frame = pd.DataFrame(rows, columns=["date", "ticker", *columns])
+    matrices = {}
+    for column in columns:
+        matrices[column] = (
+            frame.pivot(index="date", columns="ticker", values=column)
+            .sort_index()
+            .astype(float)  # None becomes NaN
+        )
+    return matrices
+
+
+def rule_values(kind: str, days: int, closes, volumes):
+    """
+    Works out the value a threshold rule kind watches on every cell, as thresholds._value does for one ticker.
+
+    Parameters:
+        - kind (str): One of thresholds.RULE_KINDS.
+        - days (int): The days the rule looks back over (ignored for "price").
+        - closes (pandas.DataFrame): The dates x tickers closes.
+        - volumes (pandas.DataFrame): The dates x tickers volumes.
+
+    Returns:
+        - pandas.DataFrame: The values, with NaN where they are not known.
+    """
+    if kind == "price":
+        return closes
+    if kind == "move":
+        before = closes.shift(days)
+        return (closes / before.where(before != 0) - 1) * 100
+    # a stored bar with no volume counts as 0, as in the alert engine
+    volumes = volumes.fillna(0).where(closes.notna())
+    average = volumes.shift(1).rolling(days).mean()
+    return volumes / average.where(average > 0)
+
+
+def crossings(values, threshold: float, direction: str):
+    """
+    Finds the cells where a value crossed a threshold since the row before, as the alert engine fires.
+
+    Returns:
+        - pandas.DataFrame: True where the value moved from below to at or above the threshold ("above"), or from
+          above to at or below it ("below").
+    """
+    previous = values.shift(1)
+    if direction == "above":
+        return (previous < threshold) & (values >= threshold)
+    return (previous > threshold) & (values <= threshold)
+
+
+def forward_returns(closes, horizon: int):
+    """The percentage change of the close over the next horizon rows of a dates x tickers matrix."""
+    return (closes.shift(-horizon) / closes.where(closes != 0) - 1) * 100
+
+
+def summarise(hits, closes, horizons: tuple) -> dict:
+    """
+    Sums up the cells a rule fired on, and the forward returns from them.
+
+    Parameters:
+        - hits (pandas.DataFrame): True on the cells the rule fired on, with the same shape as closes.
+        - closes (pandas.DataFrame): The dates x tickers closes.
+        - horizons (tuple): The forward horizons, in trading days.
+
+    Returns:
+        - dict: With the keys:
+            - "hits" (int): The number of times the rule fired.
+            - "dates" (int): The number of dates looked at.
+            - "hitsByTicker" (dict): ticker -> times fired, most first, leaving out tickers it never fired for.
+            - "firstHit", "lastHit" (str): The dates of the first and last hits, or None.
+            - "horizons" (dict): horizon -> a dict of:
+                - "count" (int): The hits whose forward return is known (i.e. not too close to the last date).
+                - "mean", "median" (float): The forward return after a hit, in %.
+                - "positive" (float): The % of those hits followed by a rise.
+                - "baseline" (float): The mean forward return of every cell, to compare the mean with.
+    """
+    mask = hits.to_numpy(dtype=bool)
+    byTicker = mask.sum(axis=0)
+    order = np.argsort(-byTicker, kind="stable")
+    hitDates = np.flatnonzero(mask.any(axis=1))
+
+    summary = {
+        "hits": int(mask.sum()),
+        "dates": len(hits.index),
+        "hitsByTicker": {
+            hits.columns[i]: int(byTicker[i]) for i in order if byTicker[i] > 0
+        },
+        "firstHit": hits.index[hitDates[0]] if len(hitDates) else None,
+        "lastHit": hits.index[hitDates[-1]] if len(hitDates) else None,
+        "horizons": {},
+    }
+    for horizon in horizons:
+        returns = forward_returns(closes, horizon).to_numpy()
+        after = returns[mask]
+        after = after[~np.isnan(after)]
+        known = returns[~np.isnan(returns)]
+        summary["horizons"][horizon] = {
+            "count": len(after),
+            "mean": float(after.mean()) if len(after) else None,
+            "median": float(np.median(after)) if len(after) else None,
+            "positive": float((after > 0).mean() * 100) if len(after) else None,
+            "baseline": float(known.mean()) if len(known) else None,
+        }
+    return summary
+
+
+def backtest_rule(
+    kind: str,
+    threshold: float,
+    direction: str = "above",
+    days: int = None,
+    tickers=None,
+    startDate: str = None,
+    endDate: str = None,
+    horizons: tuple = None,
+    databasePath: str = "data/main.sql",
+) -> dict:
+    """
+    Backtests a threshold rule over the stored history of one or more tickers.
+
+    Parameters:
+        - kind (str): One of thresholds.RULE_KINDS: "price", "move" or "volume_spike".
+        - threshold (float): The price, % move or multiple of the average volume.
+        - direction (str): "above" or "below".
+        - days (int): The days a move or volume spike is measured over. Not used for "price".
+        - tickers (iterable): Optional. The tickers to test the rule on. Defaults to every ticker.
+        - startDate (str): Optional. The first date (yyyy-mm-dd). Defaults to the first stored date.
+        - endDate (str): Optional. The last date. Defaults to the last stored date.
+        - horizons (tuple): Optional. The forward horizons in trading days. Defaults to BACKTEST_HORIZONS in
+          config.py.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - dict: See summarise.
+
+    Raises:
+        ValueError: If the kind or direction is unknown, or a move or volume spike has no days.
+
+    Example:
+        ```
+        >>> result = backtest_rule("move", -5, "below", days=5)  # every ticker falling 5% over a week
+        >>> result["hits"], result["horizons"][20]["mean"], result["horizons"][20]["baseline"]
+        (2966, 0.77, 0.66)
+        ```
+    """
+    from DatabaseHandling.thresholds import DIRECTIONS, RULE_KINDS
+
+    if kind not in RULE_KINDS:
+        raise ValueError(
+            f"Unknown rule kind: {kind}. Use one of {', '.join(RULE_KINDS)}"
+        )
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Unknown direction: {direction}. Use 'above' or 'below'")
+    if kind == "price":
+        days = 0
+    elif days is None or int(days) < 1:
+        raise ValueError(f"A {kind} rule needs a number of days of at least 1")
+    horizons = _horizons(horizons)
+
+    matrices = load_matrix(
+        ("close", "volume"), tickers, startDate, endDate, databasePath
+    )
+    closes, volumes = matrices["close"], matrices["volume"]
+    values = rule_values(kind, int(days), closes, volumes)
+    return summarise(crossings(values, threshold, direction), closes, horizons)
+
+
+def backtest_screen(
+    expression: str,
+    startDate: str = None,
+    endDate: str = None,
+    horizons: tuple = None,
+    entries: bool = True,
+    databasePath: str = "data/main.sql",
+) -> dict:
+    """
+    Backtests a screening expression over the stored history of every ticker.
+
+    Parameters:
+        - expression (str): The screening expression (see DatabaseHandling/screener.py).
+        - startDate (str): Optional. The first date (yyyy-mm-dd). Defaults to the first stored date.
+        - endDate (str): Optional. The last date. Defaults to the last stored date.
+        - horizons (tuple): Optional. The forward horizons in trading days. Defaults to BACKTEST_HORIZONS in
+          config.py.
+        - entries (bool): If True, a ticker only fires on the first date of each run of dates it matches on, as in
+          a replay. If False, it fires on every date it matches on.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - dict: See summarise.
+
+    Raises:
+        ValueError: If the expression cannot be parsed.
+
+    Example:
+        ```
+        >>> result = backtest_screen("crosses_above(close, sma_50)")
+        >>> result["horizons"][5]["count"], round(result["horizons"][5]["positive"], 2)
+        (2041, 50.37)
+        ```
+    """
+    import pandas as pd
+    from DatabaseHandling.screener import screen
+
+    horizons = _horizons(horizons)
+    closes = load_matrix(("close",), None, startDate, endDate, databasePath)["close"]
+    if closes.empty:
+        return summarise(closes.notna(), closes, horizons)
+
+    matches = screen(expression, closes.index[0], closes.index[-1], databasePath)
+    rows = {date: i for i, date in enumerate(closes.index)}
+    columns = {ticker: i for i, ticker in enumerate(closes.columns)}
+    mask = np.zeros(closes.shape, dtype=bool)
+    for ticker, dates in matches.items():
+        if ticker in columns:
+            mask[[rows[date] for date in dates if date in rows], columns[ticker]] = True
+    if entries:
+        mask[1:] &= ~mask[:-1]
+    hits = pd.DataFrame(mask, index=closes.index, columns=closes.columns)
+    return summarise(hits, closes, horizons)
+
+
+def _horizons(horizons) -> tuple:
+    if horizons is None:
+        from config import BACKTEST_HORIZONS
+
+        horizons = BACKTEST_HORIZONS
+    horizons = tuple(int(horizon) for horizon in horizons)
+    if any(horizon < 1 for horizon in horizons):
+        raise ValueError("Forward horizons must be at least 1 trading day")
+    return horizons
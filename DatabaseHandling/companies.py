@@ -101,4 +101,73 @@ company_dictionary = {
     'JD': 'JD.com Inc ADR',
     'LCID': 'Lucid Group Inc'
 }
-# from the nasdaq
\ No newline at end of file
+# from the nasdaq
+
+def load_companies_from_database(databasePath: str = "data/main.sql"):
+    """
+    Adds every company stored in the Companies table to company_dictionary, so that companies added by a
+    user after this file was written are also kept by call_all_companies.
+
+    Parameters:
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        None
+    """
+    import sqlite3
+
+    try:
+        conn = sqlite3.connect(databasePath)
+        cursor = conn.cursor()
+        cursor.execute("SELECT ticker, name FROM Companies")
+        for ticker, name in cursor.fetchall():
+            company_dictionary.setdefault(ticker, name)
+
+    except sqlite3.Error as error:
+        print("Error: {}".format(error))
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+def sector_members(databasePath: str = "data/main.sql") -> dict:
+    """
+    Reads which companies are in each sector from the Companies table, so companies added later are included.
+
+    Parameters:
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - dict: sector -> list of tickers, both in alphabetical order. Companies with no sector are left out.
+
+    Example:
+        ```
+        >>> sector_members()["Energy"]
+        ['BKR', 'ENPH', 'FANG']
+        ```
+    """
+    import sqlite3
+
+    members = {}
+    conn = cursor = None
+    try:
+        conn = sqlite3.connect(databasePath)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT sector, ticker FROM Companies WHERE sector IS NOT NULL ORDER BY sector, ticker"
+        )
+        for sector, ticker in cursor.fetchall():
+            members.setdefault(sector, []).append(ticker)
+
+    except sqlite3.Error as error:
+        print("Error: {}".format(error))
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+    return members
@@ -0,0 +1,385 @@
+import sqlite3
+
+# Daily returns, kept in the 'DailyReturns' table with one row per (date, ticker), so that percentage changes can
+# be searched, sorted and screened on without looking up the previous trading day of every row first.
+#
+# They are worked out in SQL with the LAG window function over the price rows (read through
+# DatabaseHandling.priceStore.price_query, so any storage layout and archived years are handled), and brought up to
+# date after each ingest by update_daily_returns. Until it is, compute_returns works them out the same way on a read.
+#
+# Definitions (the previous close is that of the ticker's previous trading day):
+#   previous_close     the previous close
+#   change             close - previous close
+#   percentage_change  the change as a percentage of the previous close
+#   log_return         ln(close / previous close)
+#   gap                how far the open is above the previous close, as a percentage of the previous close
+# All are NULL on a ticker's first stored day.
+
+RETURN_COLUMNS = ("previous_close", "change", "percentage_change", "log_return", "gap")
+LOOKBACK_DAYS = 31  # calendar days read before the new dates, to find each ticker's previous trading day
+BATCH_SIZE = 500  # tickers worked out at once when working out whole histories
+
+
+def ensure_returns_table(conn: sqlite3.Connection):
+    """Creates the 'DailyReturns' table if it does not exist."""
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS DailyReturns (
+            date DATE NOT NULL,
+            ticker TEXT NOT NULL,
+            previous_close REAL,
+            change REAL,
+            percentage_change REAL,
+            log_return REAL,
+            gap REAL,
+            PRIMARY KEY (date, ticker)
+        ) WITHOUT ROWID
+    """
+    )  # keyed on date first, like 'TechnicalIndicators', as searches and sorts read every ticker over a few dates
+    cursor.close()
+
+
+def _returns_query(
+    conn: sqlite3.Connection,
+    tickers=None,
+    fromDate: str = None,
+    databasePath: str = "data/main.sql",
+) -> tuple:
+    """
+    Builds a query that works out the returns of every row from fromDate onwards (default all of them), selecting
+    date, ticker and RETURN_COLUMNS in that order.
+
+    Returns:
+        - tuple: (query, arguments).
+    """
+    import math
+    from datetime import date, timedelta
+    from DatabaseHandling.priceStore import price_query
+
+    readFrom = None
+    if fromDate is not None:
+        # far enough back to find the previous trading day of nearly every ticker
+        readFrom = str(date.fromisoformat(fromDate) - timedelta(days=LOOKBACK_DAYS))
+    query, arguments, layout = price_query(
+        conn,
+        ("ticker", "date", "open", "close"),
+        tickers=tickers,
+        startDate=readFrom,
+        databasePath=databasePath,
+    )
+    rowDate = "date(c1 * 86400, 'unixepoch')" if layout == "compact" else "c1"
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT ln(1)")
+    except sqlite3.OperationalError:  # SQLite was built without its maths functions
+        conn.create_function("ln", 1, math.log, deterministic=True)
+    cursor.close()
+    return (
+        f"""
+        SELECT date, ticker, previous_close,
+            close - previous_close AS change,
+            (close - previous_close) * 100.0 / previous_close AS percentage_change,
+            CASE WHEN close > 0 AND previous_close > 0 THEN ln(close / previous_close) END AS log_return,
+            (open - previous_close) * 100.0 / previous_close AS gap
+        FROM (
+            SELECT {rowDate} AS date, c0 AS ticker, c2 AS open, c3 AS close,
+                LAG(c3) OVER (PARTITION BY c0 ORDER BY c1) AS previous_close
+            FROM ({query})
+        )
+        WHERE ? IS NULL OR date >= ?
+    """,
+        arguments + [fromDate, fromDate],
+    )
+
+
+def _write_returns(
+    conn: sqlite3.Connection,
+    tickers=None,
+    fromDate: str = None,
+    databasePath: str = "data/main.sql",
+) -> int:
+    """
+    Works out the returns of every row from fromDate onwards (default all of them) in one statement, and commits
+    them to 'DailyReturns', replacing any already there.
+
+    Returns:
+        - int: The number of rows written.
+    """
+    query, arguments = _returns_query(conn, tickers, fromDate, databasePath)
+    cursor = conn.cursor()
+    cursor.execute(
+        f"INSERT OR REPLACE INTO DailyReturns (date, ticker, {', '.join(RETURN_COLUMNS)}) {query}",
+        arguments,
+    )
+    written = cursor.rowcount
+    conn.commit()
+
+    cursor.execute("PRAGMA database_list")
+    for schema in [row[1] for row in cursor.fetchall()]:
+        if schema.startswith("archive"):  # ATTACHed by price_query
+            cursor.execute(f"DETACH DATABASE {schema}")
+    cursor.close()
+    return written
+
+
+def update_daily_returns(tickers=None, databasePath: str = "data/main.sql") -> int:
+    """
+    Brings 'DailyReturns' up to date with the stored prices.
+
+    Parameters:
+        - tickers (iterable): Optional. Work out these tickers' whole histories again, e.g. after adding a company.
+          By default, only the dates after the last date in 'DailyReturns' are worked out, for every ticker.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - int: The number of (date, ticker) rows written.
+
+    Raises:
+        sqlite3.Error: If there is an error while reading or writing the database.
+
+    Note:
+        - The first time this runs the whole table is built, BATCH_SIZE tickers at a time.
+        - A new row whose previous trading day is more than LOOKBACK_DAYS before it (e.g. after a long trading
+          halt) has its ticker worked out again in full, so the result is always the same as a full build.
+
+    Example:
+        ```
+        >>> update_daily_returns()  # after backfill has ingested a new date
+        101
+        ```
+    """
+    from datetime import date, timedelta
+    from config import DATABASE_BUSY_TIMEOUT
+
+    # uri for the read-only archives
+    conn = sqlite3.connect(databasePath, uri=True, timeout=DATABASE_BUSY_TIMEOUT)
+    try:
+        ensure_returns_table(conn)
+        cursor = conn.cursor()
+        written = 0
+
+        lastDate = None
+        if tickers is None:
+            cursor.execute("SELECT MAX(date) FROM DailyReturns")
+            lastDate = cursor.fetchone()[0]
+            if lastDate is None:  # build the whole table
+                cursor.execute("SELECT ticker FROM Companies")
+                tickers = [row[0] for row in cursor.fetchall()]
+
+        if tickers is not None:
+            tickers = list(tickers)
+            for start in range(0, len(tickers), BATCH_SIZE):
+                written += _write_returns(
+                    conn, tickers[start : start + BATCH_SIZE], None, databasePath
+                )
+            cursor.close()
+            return written
+
+        fromDate = str(date.fromisoformat(lastDate) + timedelta(days=1))
+        written += _write_returns(conn, None, fromDate, databasePath)
+
+        cursor.execute(
+            "SELECT DISTINCT ticker FROM DailyReturns WHERE date >= ? AND previous_close IS NULL",
+            (fromDate,),
+        )
+        missing = [row[0] for row in cursor.fetchall()]
+        if missing:  # a first trading day, or one too long after the one before
+            written += _write_returns(conn, missing, None, databasePath)
+        cursor.close()
+        return written
+
+    finally:
+        conn.close()
+
+
+def _select_query(
+    source: str,
+    columns,
+    tickers=None,
+    startDate: str = None,
+    endDate: str = None,
+    orderBy: str = None,
+    descending: bool = False,
+    limit: int = None,
+    where: str = None,
+    whereArguments: tuple = (),
+) -> tuple:
+    """Builds the query select_returns runs on source, a table or a subquery. Returns (query, arguments)."""
+    columns = list(columns)
+    for column in columns + ([orderBy] if orderBy else []):
+        if column not in ("ticker", "date") + RETURN_COLUMNS:
+            raise ValueError(f"Unknown daily return column: {column}")
+
+    conditions = []
+    arguments = []
+    if tickers is not None:
+        tickers = list(tickers)
+        conditions.append(f"ticker IN ({', '.join('?' * len(tickers))})")
+        arguments.extend(tickers)
+    if startDate is not None:
+        conditions.append("date >= ?")
+        arguments.append(startDate)
+    if endDate is not None:
+        conditions.append("date <= ?")
+        arguments.append(endDate)
+    if orderBy is not None and orderBy != "date":
+        conditions.append(f"{orderBy} IS NOT NULL")
+    if where is not None:
+        conditions.append(f"({where})")
+        arguments.extend(whereArguments)
+
+    query = f"SELECT {', '.join(columns)} FROM {source}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if orderBy is not None:
+        query += f" ORDER BY {orderBy}{' DESC' if descending else ''}"
+    if limit is not None:
+        query += " LIMIT ?"
+        arguments.append(limit)
+
+    return query, arguments
+
+
+def select_returns(
+    columns,
+    tickers=None,
+    startDate: str = None,
+    endDate: str = None,
+    orderBy: str = None,
+    descending: bool = False,
+    limit: int = None,
+    where: str = None,
+    whereArguments: tuple = (),
+    databasePath: str = "data/main.sql",
+) -> list:
+    """
+    Reads stored daily returns, like select_prices reads prices.
+
+    Parameters:
+        - columns (iterable): Columns to select, from 'ticker', 'date' and RETURN_COLUMNS.
+        - tickers (iterable): Optional. Only rows for these tickers.
+        - startDate (str): Optional. Only rows on or after this date (yyyy-mm-dd).
+        - endDate (str): Optional. Only rows on or before this date (yyyy-mm-dd).
+        - orderBy (str): Optional. A column to sort by. Rows with a NULL in it are left out.
+        - descending (bool): Sort in descending order.
+        - limit (int): Optional. The most rows to return.
+        - where (str): Optional. An extra SQL condition on the columns (e.g. "percentage_change > ?").
+        - whereArguments (tuple): The values for the ? parameters in where.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - list: Row tuples with the columns in the order given. Empty if 'DailyReturns' has not been built.
+
+    Example:
+        ```
+        >>> select_returns(("date", "percentage_change"), tickers=["AAPL"], startDate="2023-01-04", endDate="2023-01-04")
+        [('2023-01-04', 1.0314)]
+        ```
+    """
+    query, arguments = _select_query(
+        "DailyReturns",
+        columns,
+        tickers,
+        startDate,
+        endDate,
+        orderBy,
+        descending,
+        limit,
+        where,
+        whereArguments,
+    )
+
+    conn = sqlite3.connect(databasePath)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(1) FROM sqlite_master WHERE type = 'table' AND name = 'DailyReturns'"
+        )
+        if cursor.fetchone()[0] == 0:
+            cursor.close()
+            return []
+        cursor.execute(query, arguments)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+    finally:
+        conn.close()
+
+
+def compute_returns(
+    columns,
+    tickers=None,
+    startDate: str = None,
+    endDate: str = None,
+    orderBy: str = None,
+    descending: bool = False,
+    limit: int = None,
+    where: str = None,
+    whereArguments: tuple = (),
+    databasePath: str = "data/main.sql",
+) -> list:
+    """
+    Works out daily returns from the stored prices, as update_daily_returns would, without storing them. The
+    parameters and result are those of select_returns; use it when 'DailyReturns' is not up to date (see
+    returns_up_to_date).
+
+    Note:
+        - A row whose ticker's previous trading day is more than LOOKBACK_DAYS before startDate has no return.
+    """
+    conn = sqlite3.connect(databasePath, uri=True)  # uri for the read-only archives
+    try:
+        returnsQuery, returnsArguments = _returns_query(
+            conn, tickers, startDate, databasePath
+        )
+        query, arguments = _select_query(
+            f"({returnsQuery})",
+            columns,
+            tickers,
+            startDate,
+            endDate,
+            orderBy,
+            descending,
+            limit,
+            where,
+            whereArguments,
+        )
+        cursor = conn.cursor()
+        cursor.execute(query, returnsArguments + arguments)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+    finally:
+        conn.close()
+
+
+def returns_up_to_date(endDate: str, databasePath: str = "data/main.sql") -> bool:
+    """
+    Returns True if 'DailyReturns' has been updated since the last stored trading day on or before endDate, so
+    that it can be read instead of working the returns out from the prices.
+    """
+    from DatabaseHandling.priceStore import select_prices
+
+    prices = select_prices(
+        ("date",),
+        endDate=endDate,
+        orderBy="date",
+        descending=True,
+        limit=1,
+        includeArchives=False,
+        databasePath=databasePath,
+    )
+    if not prices:
+        return True
+    returns = select_returns(
+        ("date",),
+        endDate=endDate,
+        orderBy="date",
+        descending=True,
+        limit=1,
+        databasePath=databasePath,
+    )
+    return bool(returns) and returns[0][0] >= prices[0][0]
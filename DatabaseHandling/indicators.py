@@ -0,0 +1,499 @@
+import json
+import math
+import sqlite3
+from collections import deque
+
+# Technical indicators, kept in the 'TechnicalIndicators' table with one row per (date, ticker) and one column per
+# indicator named <indicator>_<window>, e.g. sma_50. Which ones are kept is set by INDICATOR_WINDOWS in config.py.
+#
+# They are updated incrementally: 'IndicatorState' keeps, per ticker, the last date worked out and the rolling state
+# (running sums and the values still inside each window), so each new trading day costs the same however long the
+# history is, and only the dates ingested since the last update are read.
+#
+# Definitions (n is the window in trading days of that ticker):
+#   sma_n         mean of the last n closes
+#   ema_n         exponential moving average of the close, smoothing 2 / (n + 1), started from sma_n on day n
+#   rsi_n         relative strength index over the last n changes in close (simple averages of gains and losses)
+#   stddev_n      sample standard deviation of the last n closes
+#   volatility_n  sample standard deviation of the last n daily log returns, annualised, in %
+#   avg_volume_n  mean of the last n volumes
+#   atr_n         Wilder's average true range, which needs 'low'. Rows stored without one restart it.
+
+INDICATORS = ("sma", "ema", "rsi", "stddev", "volatility", "avg_volume", "atr")
+TRADING_DAYS_PER_YEAR = 252
+BATCH_SIZE = 500  # tickers read at once when working out whole histories
+
+
+def indicator_names() -> list:
+    """Returns the column names of the configured indicators, e.g. ['sma_20', 'sma_50', ...]."""
+    from config import INDICATOR_WINDOWS
+
+    names = []
+    for indicator in INDICATORS:
+        for window in INDICATOR_WINDOWS.get(indicator, ()):
+            names.append(f"{indicator}_{window}")
+    return names
+
+
+class IndicatorState:
+    """
+    The rolling state of one ticker's indicators, updated one trading day at a time.
+
+    Each window keeps a running sum (and sum of squares where needed) that the newest value is added to and the
+    value leaving the window is taken from, so an update costs O(1) per indicator whatever the window.
+    """
+
+    def __init__(self, names: list):
+        self.names = list(names)
+        self._windows = {}  # indicator -> windows
+        for name in self.names:
+            indicator, window = name.rsplit("_", 1)
+            self._windows.setdefault(indicator, []).append(int(window))
+
+        longest = lambda *indicators: max(
+            [
+                window
+                for indicator in indicators
+                for window in self._windows.get(indicator, ())
+            ]
+            or [0]
+        )
+        self._closes = deque(maxlen=longest("sma", "ema", "stddev") + 1)
+        self._changes = deque(maxlen=longest("rsi") + 1)
+        self._logReturns = deque(maxlen=longest("volatility") + 1)
+        self._volumes = deque(maxlen=longest("avg_volume") + 1)
+        self._previousClose = None
+        # name -> [running sum, running sum of squares] (for rsi, the gains and the losses)
+        self._sums = {name: [0.0, 0.0] for name in self.names}
+        self._counts = {}  # atr name -> consecutive true ranges so far, for seeding it
+        self._values = {}  # the recursive indicators' (ema, atr) previous values
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "names": self.names,
+                "closes": list(self._closes),
+                "changes": list(self._changes),
+                "logReturns": list(self._logReturns),
+                "volumes": list(self._volumes),
+                "previousClose": self._previousClose,
+                "sums": self._sums,
+                "counts": self._counts,
+                "values": self._values,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, text: str):
+        data = json.loads(text)
+        state = cls(data["names"])
+        state._closes.extend(data["closes"])
+        state._changes.extend(data["changes"])
+        state._logReturns.extend(data["logReturns"])
+        state._volumes.extend(data["volumes"])
+        state._previousClose = data["previousClose"]
+        state._sums = data["sums"]
+        state._counts = data["counts"]
+        state._values = data["values"]
+        return state
+
+    def __slide(self, values: deque, indicator: str, newValue, parts=None):
+        """
+        Adds newValue to the running sums of every window of an indicator, and takes out the value that has just
+        left each window. parts splits a value into the two amounts summed (by default the value and its square).
+        """
+        parts = parts or (lambda value: (value, value * value))
+        newParts = parts(newValue)
+        for window in self._windows.get(indicator, ()):
+            sums = self._sums[f"{indicator}_{window}"]
+            sums[0] += newParts[0]
+            sums[1] += newParts[1]
+            if len(values) > window:
+                leavingParts = parts(values[-window - 1])
+                sums[0] -= leavingParts[0]
+                sums[1] -= leavingParts[1]
+
+    def __mean(self, values: deque, indicator: str, window: int):
+        if len(values) < window:
+            return None
+        return self._sums[f"{indicator}_{window}"][0] / window
+
+    def __sample_deviation(self, values: deque, indicator: str, window: int):
+        if len(values) < window or window < 2:
+            return None
+        total, squares = self._sums[f"{indicator}_{window}"]
+        variance = (squares - total * total / window) / (window - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    def update(
+        self, close: float, high: float = None, low: float = None, volume: int = None
+    ) -> dict:
+        """
+        Moves the state on by one trading day.
+
+        Parameters:
+            - close, high, low, volume: The day's values. Only close is required.
+
+        Returns:
+            - dict: indicator name -> the day's value, or None where there is not yet enough history.
+        """
+        previousClose = self._previousClose
+        self._previousClose = close
+
+        self._closes.append(close)
+        self.__slide(self._closes, "sma", close)
+        self.__slide(self._closes, "stddev", close)
+        if previousClose is not None:
+            change = close - previousClose
+            self._changes.append(change)
+            self.__slide(
+                self._changes,
+                "rsi",
+                change,
+                lambda value: (max(value, 0.0), max(-value, 0.0)),  # gain, loss
+            )
+            if previousClose > 0 and close > 0:
+                logReturn = math.log(close / previousClose)
+                self._logReturns.append(logReturn)
+                self.__slide(self._logReturns, "volatility", logReturn)
+        if volume is not None:
+            self._volumes.append(volume)
+            self.__slide(self._volumes, "avg_volume", volume)
+
+        results = {}
+        for window in self._windows.get("sma", ()):
+            results[f"sma_{window}"] = self.__mean(self._closes, "sma", window)
+        for window in self._windows.get("stddev", ()):
+            results[f"stddev_{window}"] = self.__sample_deviation(
+                self._closes, "stddev", window
+            )
+        for window in self._windows.get("avg_volume", ()):
+            results[f"avg_volume_{window}"] = self.__mean(
+                self._volumes, "avg_volume", window
+            )
+        for window in self._windows.get("volatility", ()):
+            deviation = self.__sample_deviation(self._logReturns, "volatility", window)
+            results[f"volatility_{window}"] = (
+                None
+                if deviation is None
+                else deviation * math.sqrt(TRADING_DAYS_PER_YEAR) * 100
+            )
+        for window in self._windows.get("rsi", ()):
+            results[f"rsi_{window}"] = self.__rsi(window)
+        for window in self._windows.get("ema", ()):
+            results[f"ema_{window}"] = self.__ema(window, close)
+        for window in self._windows.get("atr", ()):
+            results[f"atr_{window}"] = self.__atr(window, previousClose, high, low)
+        return results
+
+    def __rsi(self, window: int):
+        if len(self._changes) < window:
+            return None
+        gains, losses = self._sums[f"rsi_{window}"]
+        if losses <= 0:
+            return 50.0 if gains <= 0 else 100.0
+        return 100 - 100 / (1 + gains / losses)
+
+    def __ema(self, window: int, close: float):
+        name = f"ema_{window}"
+        previous = self._values.get(name)
+        if previous is None:
+            if len(self._closes) < window:
+                return None
+            # seeded from the simple average of the first window closes (only ever done once)
+            value = sum(list(self._closes)[-window:]) / window
+        else:
+            smoothing = 2 / (window + 1)
+            value = smoothing * close + (1 - smoothing) * previous
+        self._values[name] = value
+        return value
+
+    def __atr(self, window: int, previousClose, high, low):
+        name = f"atr_{window}"
+        if high is None or low is None:
+            # the true range is unknown, so start again from the next day that has one
+            self._values.pop(name, None)
+            self._sums[name] = [0.0, 0.0]
+            self._counts[name] = 0
+            return None
+
+        trueRange = high - low
+        if previousClose is not None:
+            trueRange = max(
+                trueRange, abs(high - previousClose), abs(low - previousClose)
+            )
+
+        previous = self._values.get(name)
+        if previous is not None:
+            value = (previous * (window - 1) + trueRange) / window
+        else:
+            sums = self._sums[name]
+            sums[0] += trueRange
+            self._counts[name] = self._counts.get(name, 0) + 1
+            if self._counts[name] < window:
+                return None
+            value = sums[0] / window
+        self._values[name] = value
+        return value
+
+
+def ensure_indicator_tables(conn: sqlite3.Connection, names: list):
+    """
+    Creates 'TechnicalIndicators' and 'IndicatorState' if they do not exist, and adds a column for any newly
+    configured indicator.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS TechnicalIndicators (
+            date DATE NOT NULL,
+            ticker TEXT NOT NULL,
+            PRIMARY KEY (date, ticker)
+        ) WITHOUT ROWID
+    """
+    )  # keyed on date first, as the screener reads every ticker over a few dates
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS IndicatorState (
+            ticker TEXT PRIMARY KEY,
+            last_date DATE NOT NULL,
+            state TEXT NOT NULL
+        )
+    """
+    )
+    cursor.execute("PRAGMA table_info(TechnicalIndicators)")
+    columns = [row[1] for row in cursor.fetchall()]
+    for name in names:
+        if name not in columns:
+            cursor.execute(f"ALTER TABLE TechnicalIndicators ADD COLUMN {name} REAL")
+    cursor.close()
+
+
+def update_indicators(tickers=None, databasePath: str = "data/main.sql") -> int:
+    """
+    Brings 'TechnicalIndicators' up to date with the stored prices, working out only the dates after each ticker's
+    last update.
+
+    Parameters:
+        - tickers (iterable): Optional. Only update these tickers. Defaults to every company.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - int: The number of (date, ticker) rows written.
+
+    Raises:
+        sqlite3.Error: If there is an error while reading or writing the database.
+
+    Note:
+        - A ticker without a saved state (e.g. a newly added company, or every ticker the first time this runs, or
+          after INDICATOR_WINDOWS is changed) has its whole history worked out, BATCH_SIZE tickers at a time.
+        - Rows inserted before a ticker's last update (e.g. a missing date filled in later) are not picked up by
+          an incremental update: use rebuild_indicators for that ticker.
+
+    Example:
+        ```
+        >>> update_indicators()  # after backfill has ingested a new date
+        101
+        ```
+    """
+    from datetime import date, timedelta
+    from config import DATABASE_BUSY_TIMEOUT
+    from DatabaseHandling.priceStore import select_prices
+
+    names = indicator_names()
+    conn = sqlite3.connect(databasePath, timeout=DATABASE_BUSY_TIMEOUT)
+    try:
+        ensure_indicator_tables(conn, names)
+        cursor = conn.cursor()
+        if tickers is None:
+            cursor.execute("SELECT ticker FROM Companies")
+            tickers = [row[0] for row in cursor.fetchall()]
+        tickers = list(tickers)
+
+        cursor.execute("SELECT ticker, last_date, state FROM IndicatorState")
+        states = {}
+        for ticker, lastDate, text in cursor.fetchall():
+            state = IndicatorState.from_json(text)
+            if (
+                state.names == names
+            ):  # otherwise the configuration changed, so start again
+                states[ticker] = (lastDate, state)
+        updates = [ticker for ticker in tickers if ticker in states]
+        rebuilds = [ticker for ticker in tickers if ticker not in states]
+
+        batches = []
+        if updates:
+            firstNewDate = str(
+                date.fromisoformat(min(states[ticker][0] for ticker in updates))
+                + timedelta(days=1)
+            )
+            batches.append((updates, firstNewDate))
+        for start in range(0, len(rebuilds), BATCH_SIZE):
+            batches.append((rebuilds[start : start + BATCH_SIZE], None))
+
+        written = 0
+        for batchTickers, startDate in batches:
+            rows = select_prices(
+                ("ticker", "date", "close", "high", "low", "volume"),
+                tickers=batchTickers,
+                startDate=startDate,
+                orderBy="date",
+                databasePath=databasePath,
+            )
+            indicatorRows = []
+            lastDates = {}
+            for ticker, rowDate, close, high, low, volume in rows:
+                if ticker in states:
+                    lastDate, state = states[ticker]
+                    if rowDate <= lastDate:
+                        continue
+                else:
+                    state = IndicatorState(names)
+                    states[ticker] = (None, state)
+                if close is None:
+                    continue
+                values = state.update(close, high, low, volume)
+                indicatorRows.append(
+                    (rowDate, ticker) + tuple(values[name] for name in names)
+                )
+                lastDates[ticker] = rowDate
+                states[ticker] = (rowDate, state)
+
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO TechnicalIndicators (date, ticker{''.join(', ' + name for name in names)}) "
+                f"VALUES (?, ?{', ?' * len(names)})",
+                indicatorRows,
+            )
+            cursor.executemany(
+                "INSERT OR REPLACE INTO IndicatorState (ticker, last_date, state) VALUES (?, ?, ?)",
+                [
+                    (ticker, lastDate, states[ticker][1].to_json())
+                    for ticker, lastDate in lastDates.items()
+                ],
+            )
+            conn.commit()
+            written += len(indicatorRows)
+
+        cursor.close()
+        return written
+
+    finally:
+        conn.close()
+
+
+def rebuild_indicators(tickers=None, databasePath: str = "data/main.sql") -> int:
+    """
+    Works out the indicators of the given tickers (default every company) from their whole history again, e.g.
+    after their 'low' values have been filled in or a missing date was added.
+
+    Returns:
+        - int: The number of (date, ticker) rows written.
+    """
+    from config import DATABASE_BUSY_TIMEOUT
+
+    conn = sqlite3.connect(databasePath, timeout=DATABASE_BUSY_TIMEOUT)
+    try:
+        ensure_indicator_tables(conn, indicator_names())
+        cursor = conn.cursor()
+        if tickers is None:
+            cursor.execute("DELETE FROM IndicatorState")
+            cursor.execute("DELETE FROM TechnicalIndicators")
+        else:
+            tickers = list(tickers)
+            for ticker in tickers:
+                cursor.execute("DELETE FROM IndicatorState WHERE ticker = ?", (ticker,))
+                cursor.execute(
+                    "DELETE FROM TechnicalIndicators WHERE ticker = ?", (ticker,)
+                )
+        conn.commit()
+        cursor.close()
+
+    finally:
+        conn.close()
+
+    return update_indicators(tickers, databasePath)
+
+
+def stored_indicators(databasePath: str = "data/main.sql") -> set:
+    """Returns the names of the indicators that have a column in 'TechnicalIndicators' and are still configured."""
+    conn = sqlite3.connect(databasePath)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA table_info(TechnicalIndicators)")
+        columns = {row[1] for row in cursor.fetchall()}
+        cursor.close()
+        return columns & set(indicator_names())
+
+    finally:
+        conn.close()
+
+
+def select_indicators(
+    names,
+    tickers=None,
+    startDate: str = None,
+    endDate: str = None,
+    databasePath: str = "data/main.sql",
+) -> list:
+    """
+    Reads stored indicators.
+
+    Parameters:
+        - names (iterable): The indicators to read, e.g. ['sma_50', 'rsi_14'].
+        - tickers (iterable): Optional. Only rows for these tickers.
+        - startDate (str): Optional. Only rows on or after this date (yyyy-mm-dd).
+        - endDate (str): Optional. Only rows on or before this date (yyyy-mm-dd).
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - list: (ticker, date, *values) tuples, with the values in the order of names (None where there was not
+          enough history).
+
+    Example:
+        ```
+        >>> select_indicators(["sma_50", "rsi_14"], tickers=["AAPL"], startDate="2023-06-01", endDate="2023-06-01")
+        [('AAPL', '2023-06-01', 172.4, 63.1)]
+        ```
+    """
+    names = list(names)
+    conditions = []
+    arguments = []
+    if tickers is not None:
+        tickers = list(tickers)
+        conditions.append(f"ticker IN ({', '.join('?' * len(tickers))})")
+        arguments.extend(tickers)
+    if startDate is not None:
+        conditions.append("date >= ?")
+        arguments.append(startDate)
+    if endDate is not None:
+        conditions.append("date <= ?")
+        arguments.append(endDate)
+
+    query = f"SELECT ticker, date{''.join(', ' + name for name in names)} FROM TechnicalIndicators"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    conn = sqlite3.connect(databasePath)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, arguments)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+    finally:
+        conn.close()
+
+
+def get_indicators(ticker: str, date: str, databasePath: str = "data/main.sql") -> dict:
+    """
+    Reads every stored indicator of one ticker on one date, with a single primary key lookup.
+
+    Returns:
+        - dict: indicator name -> value (None where there was not enough history). Empty if none are stored.
+    """
+    names = sorted(stored_indicators(databasePath))
+    rows = select_indicators(names, [ticker], date, date, databasePath)
+    if not rows:
+        return {}
+    return dict(zip(names, rows[0][2:]))
@@ -0,0 +1,379 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Ingesting a batch of prices (one date from backfill, or one company's history from add_company) is a pipeline of
+# ordered stages, e.g. writing the rows and then updating 'DateStatuses', run one after the other on the calling
+# thread. Once the stages have committed, every registered post-ingest hook is given the batch (exactly the rows
+# that were written) and run on a worker pool, so the derived data (daily returns, indicators, leaderboards,
+# sector indices, caches) is brought up to date once per batch, while backfill goes on to fetch the next date.
+#
+# Hooks are registered once for the whole program with register_hook, and are run in the order they were
+# registered. A hook can name hooks it must run after (e.g. the leaderboards read the daily returns), and a hook
+# never runs for a batch before it has finished with the previous batch, so each derived table is written by one
+# thread at a time, in date order.
+#
+# The time taken by every stage and hook is recorded, and IngestPipeline.report() sums it up.
+
+INGEST_COLUMNS = (
+    "ticker",
+    "date",
+    "open",
+    "close",
+    "high",
+    "low",
+    "volume",
+    "weighted_volume",
+)
+HOOK_WORKERS = 4
+
+_hooks = []  # (name, function, after) in the order registered
+_hooksLock = threading.Lock()
+
+
+class IngestBatch:
+    """
+    The rows written by one run of an ingest pipeline.
+
+    Parameters:
+        - rows (list): Row tuples in the order of INGEST_COLUMNS.
+        - scope (str): "dates" if the rows are new dates for the tracked companies (backfill), or "tickers" if they
+          are the whole history of new companies (add_company).
+        - dates (iterable): Optional. The dates the batch covers, which can include dates with no rows (e.g. a
+          date the market was closed). Defaults to the dates of the rows.
+        - data: Optional. The data the rows were made from (e.g. the response of call_all_companies), for stages
+          that write it.
+        - databasePath (str): The path of the SQLite database.
+
+    Note:
+        - An empty "dates" batch with no dates asks the hooks to catch up on anything not worked out yet (e.g. the
+          first time a derived table is built).
+    """
+
+    def __init__(
+        self,
+        rows: list = (),
+        scope: str = "dates",
+        dates=None,
+        data=None,
+        databasePath: str = "data/main.sql",
+    ):
+        if scope not in ("dates", "tickers"):
+            raise ValueError(f"Unknown ingest batch scope: {scope}")
+        self.rows = list(rows)
+        self.scope = scope
+        self.data = data
+        self.databasePath = databasePath
+        self.tickers = sorted({row[0] for row in self.rows})
+        if dates is None:
+            dates = {row[1] for row in self.rows}
+        self.dates = sorted(dates)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def catch_up(self) -> bool:
+        """True for an empty batch with no dates, which asks the hooks to work out anything not done yet."""
+        return self.scope == "dates" and not self.rows and not self.dates
+
+    def __repr__(self) -> str:
+        return f"IngestBatch({len(self.rows)} rows, {len(self.tickers)} tickers, dates={self.dates})"
+
+
+def register_hook(name: str, function, after: tuple = ()):
+    """
+    Registers a post-ingest hook, run with every batch once the pipeline's stages have committed it.
+
+    Parameters:
+        - name (str): A unique name for the hook, used in the timings and by other hooks' after.
+        - function (callable): Called as function(batch) with the IngestBatch. Its return value is kept as the
+          hook's result.
+        - after (tuple): The names of hooks that must have finished with a batch before this one starts on it.
+
+    Raises:
+        ValueError: If the name is already registered, or a hook in after has not been registered (hooks must
+            be registered after those they depend on).
+
+    Example:
+        ```
+        >>> register_hook("graph_cache", lambda batch: graph_cache.invalidate(batch.tickers))
+        ```
+    """
+    with _hooksLock:
+        names = [hook[0] for hook in _hooks]
+        if name in names:
+            raise ValueError(f"An ingest hook named {name} is already registered")
+        for dependency in after:
+            if dependency not in names:
+                raise ValueError(
+                    f"The ingest hook {name} is registered before {dependency}, which it runs after"
+                )
+        _hooks.append((name, function, tuple(after)))
+
+
+def unregister_hook(name: str):
+    """Removes a post-ingest hook, and any hooks registered to run after it."""
+    with _hooksLock:
+        removed = {name}
+        for hookName, _, after in list(_hooks):
+            if removed.intersection(after):
+                removed.add(hookName)
+        _hooks[:] = [hook for hook in _hooks if hook[0] not in removed]
+
+
+def registered_hooks() -> list:
+    """The names of the registered hooks, in the order they are started."""
+    with _hooksLock:
+        return [hook[0] for hook in _hooks]
+
+
+class IngestPipeline:
+    """
+    Runs ordered ingest stages on batches of prices, then the post-ingest hooks on a worker pool.
+
+    Parameters:
+        - stages (list): (name, function) pairs, run in order on the calling thread as function(batch). Each
+          stage commits its own writes.
+        - maxWorkers (int): The most hooks run at once.
+
+    Note:
+        - run() returns once the stages are done, without waiting for the hooks, so call wait() before relying
+          on the derived data (or before the program exits).
+        - An error in a stage is raised by run() and the hooks are not run for that batch. An error in a hook is
+          kept, and given by wait(); hooks that run after it are skipped for that batch.
+
+    Example:
+        ```
+        >>> pipeline = IngestPipeline([("insert", insert_stage), ("date_status", date_status_stage)])
+        >>> pipeline.run(IngestBatch(rows, dates=["2023-07-31"], data=data))
+        >>> pipeline.wait()
+        []
+        >>> print(pipeline.report())
+        ```
+    """
+
+    def __init__(self, stages: list = (), maxWorkers: int = HOOK_WORKERS):
+        self._stages = list(stages)
+        self._maxWorkers = maxWorkers
+        self._executor = None
+        self._lastRuns = {}  # hook name -> future of its run on the latest batch
+        self._pending = []  # (name, batch, future) not yet waited for
+        self._timings = {}  # stage or hook name -> list of seconds, one per batch
+        self._timingsLock = threading.Lock()
+
+    def add_stage(self, name: str, function):
+        """Adds a stage after the existing ones."""
+        self._stages.append((name, function))
+
+    @property
+    def timings(self) -> dict:
+        """Stage or hook name -> the seconds it took on each batch so far."""
+        with self._timingsLock:
+            return {name: list(seconds) for name, seconds in self._timings.items()}
+
+    def __record(self, name: str, seconds: float):
+        with self._timingsLock:
+            self._timings.setdefault(name, []).append(seconds)
+
+    def run(self, batch: IngestBatch) -> dict:
+        """
+        Runs every stage on a batch, in order, then starts the hooks on it.
+
+        Returns:
+            - dict: Hook name -> concurrent.futures.Future of its result on this batch.
+        """
+        for name, function in self._stages:
+            started = time.perf_counter()
+            function(batch)
+            self.__record(name, time.perf_counter() - started)
+        return self.run_hooks(batch)
+
+    def run_hooks(self, batch: IngestBatch) -> dict:
+        """
+        Starts the hooks on a batch whose rows are already committed, without running the stages.
+
+        Returns:
+            - dict: Hook name -> concurrent.futures.Future of its result on this batch.
+        """
+        with _hooksLock:
+            hooks = list(_hooks)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._maxWorkers, thread_name_prefix="ingest-hook"
+            )
+
+        futures = {}
+        for name, function, after in hooks:
+            # the futures waited on were all submitted before this one, and the pool starts work in the order it
+            # is submitted, so they are already running or done when this starts and the wait cannot deadlock
+            future = self._executor.submit(
+                self.__run_hook,
+                name,
+                function,
+                batch,
+                [futures[dependency] for dependency in after],
+                self._lastRuns.get(name),
+            )
+            futures[name] = future
+            self._lastRuns[name] = future
+            self._pending.append((name, batch, future))
+        return futures
+
+    def __run_hook(
+        self, name: str, function, batch: IngestBatch, dependencies, previous
+    ):
+        """
+        Runs one hook on a batch once the hooks it runs after, and its own run on the previous batch, have finished.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        for future in dependencies:
+            future.result()  # raises, skipping this hook, if a hook it runs after failed
+        if previous is not None:
+            previous.exception()  # only the order matters, not whether the last run worked
+
+        started = time.perf_counter()
+        result = function(batch)
+        self.__record(name, time.perf_counter() - started)
+        return result
+
+    def wait(self) -> list:
+        """
+        Waits for every hook started so far to finish.
+
+        Returns:
+            - list: (hook name, batch, exception) for every hook run that failed or was skipped, oldest first.
+        """
+        pending, self._pending = self._pending, []
+        errors = []
+        for name, batch, future in pending:
+            error = future.exception()
+            if error is not None:
+                errors.append((name, batch, error))
+        return errors
+
+    def close(self) -> list:
+        """Waits for the hooks, then stops the worker pool. Returns the same as wait()."""
+        errors = self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self._lastRuns.clear()
+        return errors
+
+    def report(self) -> str:
+        """
+        Sums up the recorded timings, one line per stage or hook.
+
+        Example:
+            ```
+            >>> print(pipeline.report())
+            insert         3 batches, 0.041s total, 0.014s per batch
+            ...
+            ```
+        """
+        timings = self.timings
+        if not timings:
+            return "Nothing has been ingested"
+        width = max(len(name) for name in timings)
+        lines = []
+        for name, seconds in timings.items():
+            total = sum(seconds)
+            lines.append(
+                f"{name:<{width}}  {len(seconds)} batches, {total:.3f}s total, {total / len(seconds):.3f}s per batch"
+            )
+        return "\n".join(lines)
+
+
+def _daily_returns_hook(batch: IngestBatch) -> int:
+    from DatabaseHandling.dailyReturns import update_daily_returns
+
+    if not batch.rows and not batch.catch_up:  # e.g. the market was closed
+        return 0
+    # new dates are worked out from the last date in 'DailyReturns', which needs no list of tickers
+    tickers = batch.tickers if batch.scope == "tickers" else None
+    return update_daily_returns(tickers, batch.databasePath)
+
+
+def _indicators_hook(batch: IngestBatch) -> int:
+    from DatabaseHandling.indicators import update_indicators
+
+    if not batch.rows and not batch.catch_up:
+        return 0
+    return update_indicators(batch.tickers or None, batch.databasePath)
+
+
+def _leaderboards_hook(batch: IngestBatch) -> int:
+    from DatabaseHandling.leaderboards import update_leaderboards
+
+    if not batch.rows and not batch.catch_up:
+        return 0
+    if batch.scope == "tickers":
+        return update_leaderboards(
+            tickers=batch.tickers, databasePath=batch.databasePath
+        )
+    return update_leaderboards(batch.dates or None, databasePath=batch.databasePath)
+
+
+def _sector_indices_hook(batch: IngestBatch) -> int:
+    from DatabaseHandling.companies import sector_members
+    from DatabaseHandling.sectorIndices import update_sector_indices
+
+    if not batch.rows and not batch.catch_up:
+        return 0
+    if batch.scope == "tickers":  # a new member changes its sector's past returns
+        sectors = [
+            sector
+            for sector, tickers in sector_members(batch.databasePath).items()
+            if set(tickers) & set(batch.tickers)
+        ]
+        return update_sector_indices(sectors, databasePath=batch.databasePath)
+    return update_sector_indices(
+        fromDate=min(batch.dates) if batch.dates else None,
+        databasePath=batch.databasePath,
+    )
+
+
+def _price_cache_hook(batch: IngestBatch) -> int:
+    from DatabaseHandling.priceStore import price_store
+
+    if batch.databasePath != price_store.databasePath:
+        return 0
+    if (
+        batch.scope == "tickers"
+    ):  # rows can be older than those cached, so load them again on next use
+        for ticker in batch.tickers:
+            price_store.invalidate(ticker)
+        return len(batch)
+    return price_store.refresh_cached(batch.tickers)
+
+
+def _graph_cache_hook(batch: IngestBatch) -> int:
+    from DatabaseHandling.priceStore import price_store
+    from graphing.cache import graph_cache
+
+    if batch.databasePath != price_store.databasePath:
+        return 0
+    # whole histories, so any range of theirs may have changed
+    if batch.scope == "tickers":
+        return graph_cache.invalidate(batch.tickers)
+    if not batch.rows:
+        return 0
+    return graph_cache.invalidate(batch.tickers, batch.dates)
+
+
+def _alerts_hook(batch: IngestBatch) -> int:
+    from DatabaseHandling.thresholds import check_ingested
+
+    return check_ingested(batch)
+
+
+register_hook("daily_returns", _daily_returns_hook)
+register_hook("indicators", _indicators_hook)
+register_hook("leaderboards", _leaderboards_hook, after=("daily_returns",))
+register_hook("sector_indices", _sector_indices_hook, after=("daily_returns",))
+register_hook("price_cache", _price_cache_hook)
+register_hook("graph_cache", _graph_cache_hook, after=("price_cache",))
+register_hook("alerts", _alerts_hook)
@@ -44,6 +44,7 @@ def init_all():
                 open REAL,
                 close REAL,
                 high REAL,
+                low REAL,
                 volume INTEGER,
                 weighted_volume REAL,
                 FOREIGN KEY (ticker) REFERENCES Companies (ticker),
@@ -52,6 +53,13 @@ def init_all():
         """
         )
 
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_StockPrices_ticker_date ON StockPrices (ticker, date)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_StockPrices_date ON StockPrices (date)"
+        )
+
         conn.commit()
 
     except sqlite3.Error as error:
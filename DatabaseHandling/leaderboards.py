@@ -0,0 +1,275 @@
+import sqlite3
+
+# Per-day leaderboards: the LEADERBOARD_SIZE highest ('top') and lowest ('bottom') tickers of each date by a few
+# metrics, kept in the 'DailyLeaderboards' table as each date is ingested. A top-n query over several dates (e.g.
+# the biggest gainers of a week) is then answered by a k-way merge of the per-day lists, which are already sorted,
+# instead of sorting every price row in the range.
+#
+# Metrics:
+#   percentage_change  change of the close since the previous trading day, in % (from 'DailyReturns')
+#   volume             shares traded
+#   dollar_volume      close * volume
+#   day_range          (high - low) as a percentage of the low, where the low is stored
+#
+# 'LeaderboardDates' records which dates have been worked out, so a query can tell whether the leaderboards cover
+# its whole range.
+
+LEADERBOARD_METRICS = ("percentage_change", "volume", "dollar_volume", "day_range")
+# the most results a top-n query can be answered with from the leaderboards
+LEADERBOARD_SIZE = 25
+# one (metric, date)'s lists, written so that the whole primary key is used
+BOTH_DIRECTIONS = "metric = ? AND direction IN ('top', 'bottom') AND date = ?"
+
+
+def ensure_leaderboard_tables(conn: sqlite3.Connection):
+    """Creates the 'DailyLeaderboards' and 'LeaderboardDates' tables if they do not exist."""
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS DailyLeaderboards (
+            metric TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            date DATE NOT NULL,
+            rank INTEGER NOT NULL,
+            ticker TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (metric, direction, date, rank)
+        ) WITHOUT ROWID
+    """
+    )  # keyed so that one metric's lists over a date range are read in date order
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS LeaderboardDates (
+            date DATE PRIMARY KEY
+        )
+    """
+    )
+    cursor.close()
+
+
+def _metric_values(dates, tickers, databasePath: str) -> dict:
+    """
+    Works out every leaderboard metric for the stored rows on the given dates.
+
+    Returns:
+        - dict: date -> {metric: list of (value, ticker)}, leaving out values that are not known.
+    """
+    from DatabaseHandling.dailyReturns import select_returns
+    from DatabaseHandling.priceStore import select_prices
+
+    startDate, endDate = min(dates), max(dates)
+    dates = set(dates)
+    values = {date: {metric: [] for metric in LEADERBOARD_METRICS} for date in dates}
+
+    for date, ticker, close, high, low, volume in select_prices(
+        ("date", "ticker", "close", "high", "low", "volume"),
+        tickers=tickers,
+        startDate=startDate,
+        endDate=endDate,
+        databasePath=databasePath,
+    ):
+        if date not in dates:
+            continue
+        day = values[date]
+        if volume is not None:
+            day["volume"].append((volume, ticker))
+            if close is not None:
+                day["dollar_volume"].append((close * volume, ticker))
+        if high is not None and low:
+            day["day_range"].append(((high - low) * 100 / low, ticker))
+
+    for date, ticker, percentageChange in select_returns(
+        ("date", "ticker", "percentage_change"),
+        tickers=tickers,
+        startDate=startDate,
+        endDate=endDate,
+        databasePath=databasePath,
+    ):
+        if date in dates and percentageChange is not None:
+            values[date]["percentage_change"].append((percentageChange, ticker))
+    return values
+
+
+def update_leaderboards(
+    dates=None, tickers=None, databasePath: str = "data/main.sql"
+) -> int:
+    """
+    Works out the leaderboards of newly ingested dates, or merges newly added tickers into existing ones.
+
+    Parameters:
+        - dates (iterable): Optional. The dates (yyyy-mm-dd) to work out. By default, every trading day in
+          'DateStatuses' that has not been worked out yet.
+        - tickers (iterable): Optional. Only merge these tickers' rows into the leaderboards of the dates, e.g.
+          after adding a company, rather than working the dates out from every ticker.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - int: The number of dates whose leaderboards were written.
+
+    Raises:
+        sqlite3.Error: If there is an error while reading or writing the database.
+
+    Note:
+        - Reads the 'DailyReturns' table for percentage_change, so run update_daily_returns first.
+
+    Example:
+        ```
+        >>> update_leaderboards()  # after backfill has ingested a new date
+        1
+        ```
+    """
+    import heapq
+    from config import DATABASE_BUSY_TIMEOUT
+
+    conn = sqlite3.connect(databasePath, timeout=DATABASE_BUSY_TIMEOUT)
+    try:
+        ensure_leaderboard_tables(conn)
+        cursor = conn.cursor()
+        if dates is None:
+            if tickers is None:
+                cursor.execute(
+                    """
+                    SELECT date FROM DateStatuses
+                    WHERE market_open AND date NOT IN (SELECT date FROM LeaderboardDates)
+                """
+                )
+            else:
+                cursor.execute("SELECT date FROM LeaderboardDates")
+            dates = [row[0] for row in cursor.fetchall()]
+        dates = sorted(dates)
+        if not dates:
+            cursor.close()
+            return 0
+        if tickers is not None:
+            tickers = list(tickers)
+
+        values = _metric_values(dates, tickers, databasePath)
+        rows = []
+        for date in dates:
+            for metric in LEADERBOARD_METRICS:
+                candidates = values[date][metric]
+                if tickers is not None:  # merge with the tickers already on the lists
+                    cursor.execute(
+                        f"SELECT value, ticker FROM DailyLeaderboards WHERE {BOTH_DIRECTIONS}",
+                        (metric, date),
+                    )
+                    merging = set(tickers)
+                    candidates = candidates + [
+                        (value, ticker)
+                        for value, ticker in set(cursor.fetchall())
+                        if ticker not in merging
+                    ]
+                for direction, pick in (
+                    ("top", heapq.nlargest),
+                    ("bottom", heapq.nsmallest),
+                ):
+                    for rank, (value, ticker) in enumerate(
+                        pick(LEADERBOARD_SIZE, candidates), start=1
+                    ):
+                        rows.append((metric, direction, date, rank, ticker, value))
+
+        for date in dates:
+            for metric in LEADERBOARD_METRICS:
+                cursor.execute(
+                    f"DELETE FROM DailyLeaderboards WHERE {BOTH_DIRECTIONS}",
+                    (metric, date),
+                )
+        cursor.executemany(
+            "INSERT INTO DailyLeaderboards (metric, direction, date, rank, ticker, value) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO LeaderboardDates (date) VALUES (?)",
+            [(date,) for date in dates],
+        )
+        conn.commit()
+        cursor.close()
+        return len(dates)
+
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+
+def top_from_leaderboards(
+    metric: str,
+    startDate: str,
+    endDate: str,
+    n: int = 10,
+    bottom: bool = False,
+    databasePath: str = "data/main.sql",
+) -> list:
+    """
+    Finds the n highest (or lowest) values of a metric on any date in a range, from the per-day leaderboards.
+
+    Parameters:
+        - metric (str): One of LEADERBOARD_METRICS.
+        - startDate (str): The first date of the range (yyyy-mm-dd).
+        - endDate (str): The last date of the range (yyyy-mm-dd).
+        - n (int): The number of results.
+        - bottom (bool): If True, the lowest values instead of the highest.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - list: Up to n (date, ticker, value) tuples, best first. None if the leaderboards cannot answer the
+          query, i.e. n is more than LEADERBOARD_SIZE or a trading day in the range has not been worked out.
+
+    Note:
+        - Each day's list is read in rank order, and heapq.merge takes the best of the days' next entries until n
+          are found, so at most n entries of each day are looked at.
+
+    Example:
+        ```
+        >>> top_from_leaderboards("percentage_change", "2023-06-05", "2023-06-09", 3)
+        [('2023-06-07', 'WBD', 8.43), ('2023-06-05', 'ILMN', 6.97), ('2023-06-09', 'TSLA', 4.06)]
+        ```
+    """
+    import heapq
+    from itertools import groupby, islice
+
+    if metric not in LEADERBOARD_METRICS or n > LEADERBOARD_SIZE:
+        return None
+    direction = "bottom" if bottom else "top"
+
+    conn = sqlite3.connect(databasePath)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(1) FROM sqlite_master WHERE type = 'table' AND name = 'LeaderboardDates'"
+        )
+        if cursor.fetchone()[0] == 0:  # not built yet
+            cursor.close()
+            return None
+        cursor.execute(
+            """
+            SELECT COUNT(1) FROM DateStatuses
+            WHERE market_open AND date BETWEEN ? AND ? AND date NOT IN (SELECT date FROM LeaderboardDates)
+        """,
+            (startDate, endDate),
+        )
+        if cursor.fetchone()[0] != 0:  # not worked out yet
+            cursor.close()
+            return None
+
+        cursor.execute(
+            """
+            SELECT date, ticker, value FROM DailyLeaderboards
+            WHERE metric = ? AND direction = ? AND date BETWEEN ? AND ? AND rank <= ?
+            ORDER BY date, rank
+        """,
+            (metric, direction, startDate, endDate, n),
+        )
+        days = [
+            list(rows) for _, rows in groupby(cursor.fetchall(), lambda row: row[0])
+        ]
+        cursor.close()
+
+    finally:
+        conn.close()
+
+    merged = heapq.merge(*days, key=lambda row: row[2], reverse=not bottom)
+    return list(islice(merged, n))
@@ -0,0 +1,548 @@
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+
+PRICE_VALUE_COLUMNS = ("open", "close", "high", "low", "volume", "weighted_volume")
+
+
+def select_prices(
+    columns,
+    tickers=None,
+    startDate: str = None,
+    endDate: str = None,
+    orderBy: str = None,
+    descending: bool = False,
+    limit: int = None,
+    includeArchives: bool = True,
+    where: str = None,
+    whereArguments: tuple = (),
+    databasePath: str = "data/main.sql",
+) -> list:
+    """
+    Reads price rows from whichever storage layout the database is in (see DatabaseHandling/storageLayout.py),
+    and from any archived years the date range reaches (see DatabaseHandling/archive.py).
+
+    This is the one place that knows how the rows are stored. In the compact layout the filters and the sort are
+    applied to the encoded integer columns, so that the (tickerid, day) key and the day index are used, and each
+    selected value is decoded back to the usual form (yyyy-mm-dd dates, prices in dollars) in the query.
+
+    Parameters:
+        - columns (iterable): Columns to select, from 'ticker', 'date', 'open', 'close', 'high', 'low', 'volume'
+          and 'weighted_volume'.
+        - tickers (iterable): Optional. Only rows for these tickers.
+        - startDate (str): Optional. Only rows on or after this date (yyyy-mm-dd).
+        - endDate (str): Optional. Only rows on or before this date (yyyy-mm-dd).
+        - orderBy (str): Optional. A column to sort by. Rows with a NULL in it are left out.
+        - descending (bool): Sort in descending order.
+        - limit (int): Optional. The most rows to return.
+        - includeArchives (bool): If False, only the live database is read.
+        - where (str): Optional. An extra SQL condition, with each price column written as a placeholder (e.g.
+          "{close} > 2 * {open} AND {volume} > ?"), which is filled in with the decoded column for the layout.
+        - whereArguments (tuple): The values for the ? parameters in where.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - list: Row tuples with the columns in the order given.
+
+    Note:
+        - Archives are only ATTACHed when the date range reaches an archived year, so reads of recent dates only
+          touch the live database. When they are, the live rows and the archived rows are combined with UNION ALL,
+          each part read on its own indexes, and sorted and limited as a whole.
+
+    Example:
+        ```
+        >>> select_prices(("date", "close"), tickers=["AAPL"], startDate="2023-01-03", endDate="2023-01-04")
+        [('2023-01-03', 125.07), ('2023-01-04', 126.36)]
+        ```
+    """
+    from DatabaseHandling.storageLayout import decode_date
+
+    columns = list(columns)
+    conn = sqlite3.connect(databasePath, uri=True)  # uri for the read-only archives
+    try:
+        query, arguments, layout = price_query(
+            conn,
+            columns,
+            tickers,
+            startDate,
+            endDate,
+            orderBy,
+            descending,
+            limit,
+            includeArchives,
+            where,
+            whereArguments,
+            databasePath,
+        )
+        cursor = conn.cursor()
+        cursor.execute(query, arguments)
+        rows = cursor.fetchall()
+        cursor.close()
+
+        if layout == "compact" and "date" in columns:
+            dateIndex = columns.index("date")
+            rows = [
+                row[:dateIndex] + (decode_date(row[dateIndex]),) + row[dateIndex + 1 :]
+                for row in rows
+            ]
+        return rows
+
+    finally:
+        conn.close()
+
+
+def count_prices(
+    tickers=None,
+    startDate: str = None,
+    endDate: str = None,
+    includeArchives: bool = True,
+    where: str = None,
+    whereArguments: tuple = (),
+    databasePath: str = "data/main.sql",
+) -> int:
+    """
+    Counts the price rows select_prices would read, in the database, without fetching them. The parameters are
+    those of select_prices.
+
+    Example:
+        ```
+        >>> count_prices(startDate="2023-01-03", endDate="2023-01-03")
+        100
+        ```
+    """
+    conn = sqlite3.connect(databasePath, uri=True)  # uri for the read-only archives
+    try:
+        query, arguments, _ = price_query(
+            conn,
+            ("ticker",),
+            tickers,
+            startDate,
+            endDate,
+            None,
+            False,
+            None,
+            includeArchives,
+            where,
+            whereArguments,
+            databasePath,
+        )
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(1) FROM ({query})", arguments)
+        count = cursor.fetchone()[0]
+        cursor.close()
+        return count
+
+    finally:
+        conn.close()
+
+
+def price_query(
+    conn: sqlite3.Connection,
+    columns,
+    tickers=None,
+    startDate: str = None,
+    endDate: str = None,
+    orderBy: str = None,
+    descending: bool = False,
+    limit: int = None,
+    includeArchives: bool = True,
+    where: str = None,
+    whereArguments: tuple = (),
+    databasePath: str = "data/main.sql",
+) -> tuple:
+    """
+    Builds the query select_prices runs, so that it can also be used as a subquery (e.g. by a window function in
+    DatabaseHandling/dailyReturns.py). The parameters are those of select_prices.
+
+    Parameters:
+        - conn (sqlite3.Connection): An open connection to the live database, opened with uri=True. Any archives
+          the date range reaches are ATTACHed to it.
+
+    Returns:
+        - tuple: (query, arguments, layout). The query selects the columns, in order, as c0, c1, ... In the compact
+          layout the dates are selected as day numbers (see storageLayout.decode_date).
+    """
+    from DatabaseHandling.archive import attach_archives
+    from DatabaseHandling.storageLayout import detect_layout, layout_expressions
+
+    columns = list(columns)
+    if tickers is not None:
+        tickers = list(tickers)
+
+    layout = detect_layout(conn)
+    sources = [layout_expressions(layout)]
+    if includeArchives:
+        for schema in attach_archives(conn, startDate, endDate, databasePath):
+            # archives store the values as they are; their dates are selected as day numbers when the live
+            # rows are compact so that every part decodes, and sorts, the same way
+            sources.append(
+                (
+                    f"{schema}.StockPrices",
+                    lambda column: (
+                        "CAST(julianday(date) - 2440587.5 AS INTEGER)"
+                        if column == "date" and layout == "compact"
+                        else column
+                    ),
+                    lambda column: column,
+                    str,
+                )
+            )
+
+    queries = []
+    arguments = []
+    for source, selectExpression, rawExpression, encode in sources:
+        selected = [
+            f"{selectExpression(column)} AS c{index}"
+            for index, column in enumerate(columns)
+        ]
+        conditions = []
+        if tickers is not None:
+            conditions.append(
+                f"{rawExpression('ticker')} IN ({', '.join('?' * len(tickers))})"
+            )
+            arguments.extend(tickers)
+        if startDate is not None:
+            conditions.append(f"{rawExpression('date')} >= ?")
+            arguments.append(encode(startDate))
+        if endDate is not None:
+            conditions.append(f"{rawExpression('date')} <= ?")
+            arguments.append(encode(endDate))
+        if orderBy is not None and orderBy != "date":
+            conditions.append(f"{rawExpression(orderBy)} IS NOT NULL")
+        if where is not None:
+            conditions.append(
+                "("
+                + where.format(
+                    **{
+                        column: f"({selectExpression(column)})"
+                        for column in PRICE_VALUE_COLUMNS
+                    }
+                )
+                + ")"
+            )
+            arguments.extend(whereArguments)
+
+        if len(sources) == 1:
+            sortExpression = rawExpression(orderBy) if orderBy else None
+        else:
+            # the parts are sorted together, so on values that compare the same way in every part
+            if orderBy is not None:
+                selected.append(f"{selectExpression(orderBy)} AS sortKey")
+            sortExpression = "sortKey" if orderBy else None
+
+        query = f"SELECT {', '.join(selected)} FROM {source}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if sortExpression is not None:
+            query += f" ORDER BY {sortExpression}{' DESC' if descending else ''}"
+        if limit is not None:
+            query += " LIMIT ?"  # in each part too, so that no part returns more than it could contribute
+            arguments.append(limit)
+        queries.append(query)
+
+    if len(queries) == 1:
+        return queries[0], arguments, layout
+
+    query = f"SELECT {', '.join(f'c{index}' for index in range(len(columns)))} FROM ("
+    query += " UNION ALL ".join(f"SELECT * FROM ({part})" for part in queries)
+    query += ")"
+    if orderBy is not None:
+        query += f" ORDER BY sortKey{' DESC' if descending else ''}"
+    if limit is not None:
+        query += " LIMIT ?"
+        arguments.append(limit)
+    return query, arguments, layout
+
+
+class PriceStore:
+    """
+    In-memory store of per-ticker price histories, loaded lazily from the StockPrices table.
+
+    Each ticker's history is read once, in date order, and then served from memory, so repeated
+    range reads (e.g. regenerating a graph) do not go back to the database. Histories are kept as
+    lists of row tuples in the order given by COLUMNS, alongside a list of their dates so that a
+    date range can be found with a binary search.
+
+    Note:
+        - The store is shared between the GUI and background threads (e.g. when a company is added),
+          hence access to the cached histories is guarded by a lock.
+        - Call refresh() after writing new rows for a ticker so that the cached copy is replaced, or
+          refresh_cached() after ingesting new dates, which adds them to the cached histories.
+        - At most maxTickers histories are kept; the least recently used one is dropped when another is
+          loaded. This bounds memory when the full universe (~10k tickers) is stored.
+        - Only the live (unarchived) part of a history is loaded at first. Archived years are read, and kept,
+          the first time a range reaching them is asked for (see DatabaseHandling/archive.py).
+        - Range aggregates (total volume, highest high, max drawdown...) are answered by a RangeIndex kept
+          alongside each cached history (see range_index), which is extended when refresh_cached() adds new days.
+    """
+
+    COLUMNS = ("date", "open", "close", "high", "low", "volume", "weighted_volume")
+
+    def __init__(self, databasePath: str = "data/main.sql", maxTickers: int = 500):
+        self._databasePath = databasePath
+        self._maxTickers = maxTickers
+        self._histories = OrderedDict()  # ticker -> list of row tuples, ordered by date
+        self._dates = {}  # ticker -> list of dates, parallel to self._histories
+        self._loadedFrom = (
+            {}
+        )  # ticker -> first date loaded, or None if the whole history is loaded
+        self._rangeIndexes = {}  # ticker -> RangeIndex of the cached history
+        self._lock = threading.Lock()
+        self._schemaChecked = False
+
+    @property
+    def databasePath(self):
+        return self._databasePath
+
+    def __load_tickers(self, tickers: list):
+        """
+        Read the live histories of some tickers from the database into memory, in one query.
+
+        Parameters:
+            - tickers (list): The ticker symbols to load.
+
+        Returns:
+            None
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        from DatabaseHandling.archive import live_start_date
+        from DatabaseHandling.storageLayout import ensure_schema
+
+        if not self._schemaChecked:
+            ensure_schema(self._databasePath)  # the 'low' column and indexes are needed
+            self._schemaChecked = True
+
+        loadedFrom = live_start_date(self._databasePath)
+        histories = {ticker: [] for ticker in tickers}
+        for row in select_prices(
+            ("ticker",) + self.COLUMNS,
+            tickers=tickers,
+            startDate=loadedFrom,
+            orderBy="date",
+            databasePath=self._databasePath,
+        ):
+            histories[row[0]].append(row[1:])
+
+        for ticker, rows in histories.items():
+            self._histories[ticker] = rows
+            self._histories.move_to_end(ticker)
+            self._dates[ticker] = [row[0] for row in rows]
+            self._loadedFrom[ticker] = loadedFrom
+            self._rangeIndexes.pop(ticker, None)
+
+        while len(self._histories) > self._maxTickers:
+            oldest, _ = self._histories.popitem(last=False)
+            del self._dates[oldest]
+            del self._loadedFrom[oldest]
+            self._rangeIndexes.pop(oldest, None)
+
+    def __load_older(self, ticker: str, startDate: str):
+        """
+        Read the part of a ticker's history before what is loaded, from startDate (None for all of it), which will
+        include archived years.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        from datetime import date, timedelta
+
+        loadedFrom = self._loadedFrom[ticker]
+        rows = select_prices(
+            self.COLUMNS,
+            tickers=[ticker],
+            startDate=startDate,
+            endDate=str(date.fromisoformat(loadedFrom) - timedelta(days=1)),
+            orderBy="date",
+            databasePath=self._databasePath,
+        )
+
+        self._histories[ticker] = rows + self._histories[ticker]
+        self._dates[ticker] = [row[0] for row in rows] + self._dates[ticker]
+        self._loadedFrom[ticker] = startDate
+        self._rangeIndexes.pop(ticker, None)  # it only covers the days after these
+
+    def __ensure_loaded(self, ticker: str, startDate: str):
+        """Load a ticker's history from startDate (None for all of it) if it is not cached. Call with the lock held."""
+        if ticker not in self._histories:
+            self.__load_tickers([ticker])
+        else:
+            self._histories.move_to_end(ticker)
+        loadedFrom = self._loadedFrom[ticker]
+        if loadedFrom is not None and (startDate is None or startDate < loadedFrom):
+            self.__load_older(ticker, startDate)
+
+    def get_history(
+        self, ticker: str, startDate: str = None, endDate: str = None
+    ) -> list:
+        """
+        Retrieve the stored rows for a ticker between two dates (inclusive).
+
+        Parameters:
+            - ticker (str): The ticker symbol of the company.
+            - startDate (str): The first date of the range (yyyy-mm-dd). None means from the first stored date.
+            - endDate (str): The last date of the range (yyyy-mm-dd). None means up to the last stored date.
+
+        Returns:
+            - list: Row tuples in the order given by PriceStore.COLUMNS, sorted by date.
+
+        Example:
+            ```
+            >>> price_store.get_history("AAPL", "2023-01-03", "2023-01-05")
+            [('2023-01-03', 130.28, 125.07, 130.9, 124.17, 112117471, 125.725), ...]
+            ```
+        """
+        with self._lock:
+            self.__ensure_loaded(ticker, startDate)
+            rows = self._histories[ticker]
+            dates = self._dates[ticker]
+
+        first = 0 if startDate is None else bisect_left(dates, startDate)
+        last = len(dates) if endDate is None else bisect_right(dates, endDate)
+        return rows[first:last]
+
+    def get_frame(
+        self,
+        tickers,
+        startDate: str,
+        endDate: str,
+        columns: tuple = ("date", "close", "ticker"),
+    ):
+        """
+        Retrieve the stored rows for several tickers between two dates as a pandas DataFrame.
+
+        Parameters:
+            - tickers (iterable): The ticker symbols to include.
+            - startDate (str): The first date of the range (yyyy-mm-dd).
+            - endDate (str): The last date of the range (yyyy-mm-dd).
+            - columns (tuple): The columns to include. "ticker" and any of PriceStore.COLUMNS may be used.
+
+        Returns:
+            - pandas.DataFrame: One row per (ticker, date), grouped by ticker in the order given, then sorted by date.
+
+        Dependencies:
+            - The 'pandas' library for handling data in DataFrame format.
+
+        Note:
+            - The histories of the tickers that are not cached are read together in one query, so comparing many
+              companies costs one read rather than one per company.
+        """
+        import pandas as pd
+
+        tickers = list(tickers)
+        with self._lock:
+            missing = [
+                ticker
+                for ticker in dict.fromkeys(tickers)
+                if ticker not in self._histories
+            ]
+            if len(missing) > 1:
+                # one query for every ticker not cached, rather than one each
+                self.__load_tickers(missing[: self._maxTickers])
+
+        rows = []
+        rowTickers = []
+        for ticker in tickers:
+            history = self.get_history(ticker, startDate, endDate)
+            rows.extend(history)
+            rowTickers.extend([ticker] * len(history))
+
+        frame = pd.DataFrame(rows, columns=list(self.COLUMNS))
+        frame["ticker"] = rowTickers
+        return frame[list(columns)]
+
+    def range_index(self, ticker: str, startDate: str = None):
+        """
+        Returns the RangeIndex (see DatabaseHandling/rangeIndex.py) of a ticker's history, for range aggregates
+        that do not scan the rows in the range.
+
+        Parameters:
+            - ticker (str): The ticker symbol of the company.
+            - startDate (str): The earliest date that will be queried (yyyy-mm-dd). None means the whole history.
+
+        Returns:
+            - RangeIndex: Built the first time it is asked for, then kept with the cached history. If refresh_cached()
+              has added days since, only those are added to it.
+
+        Example:
+            ```
+            >>> price_store.range_index("AAPL", "2023-01-01").total_volume("2023-01-01", "2023-03-31")
+            4368912733
+            ```
+        """
+        from DatabaseHandling.rangeIndex import RangeIndex
+
+        with self._lock:
+            self.__ensure_loaded(ticker, startDate)
+            rows = self._histories[ticker]
+            index = self._rangeIndexes.get(ticker)
+            indexed = 0 if index is None else len(index)
+            if (
+                index is None
+                or indexed > len(rows)
+                or (indexed and index.dates[-1] != rows[indexed - 1][0])
+                or (indexed and index.dates[0] != rows[0][0])
+            ):  # not built yet, or the history has changed other than by new days
+                index = RangeIndex(rows)
+            elif indexed < len(rows):
+                index.extend(rows[indexed:])
+            self._rangeIndexes[ticker] = index
+            return index
+
+    def refresh(self, ticker: str):
+        """Reload a ticker's history from the database, e.g. after new rows have been written for it."""
+        with self._lock:
+            self.__load_tickers([ticker])
+
+    def refresh_cached(self, tickers) -> int:
+        """
+        Add the days stored since they were loaded to the cached histories of the given tickers, e.g. after a date
+        has been ingested. Tickers that are not cached are left to be loaded on first use.
+
+        Returns:
+            - int: The number of rows added.
+        """
+        with self._lock:
+            cached = [ticker for ticker in tickers if ticker in self._histories]
+            extending = [ticker for ticker in cached if self._dates[ticker]]
+            for ticker in cached:
+                if not self._dates[ticker]:  # nothing to add to, so load it all
+                    self.__load_tickers([ticker])
+            if not extending:
+                return 0
+
+            rows = select_prices(
+                ("ticker",) + self.COLUMNS,
+                tickers=extending,
+                startDate=min(self._dates[ticker][-1] for ticker in extending),
+                orderBy="date",
+                databasePath=self._databasePath,
+            )
+            added = 0
+            for row in rows:
+                ticker = row[0]
+                if row[1] > self._dates[ticker][-1]:
+                    self._histories[ticker].append(row[1:])
+                    self._dates[ticker].append(row[1])
+                    added += 1
+            return added
+
+    def invalidate(self, ticker: str = None):
+        """Drop a ticker's cached history (or every cached history if no ticker is given) so it is reloaded on next use."""
+        with self._lock:
+            if ticker is None:
+                self._histories.clear()
+                self._dates.clear()
+                self._loadedFrom.clear()
+                self._rangeIndexes.clear()
+            else:
+                self._histories.pop(ticker, None)
+                self._dates.pop(ticker, None)
+                self._loadedFrom.pop(ticker, None)
+                self._rangeIndexes.pop(ticker, None)
+
+
+price_store = PriceStore()
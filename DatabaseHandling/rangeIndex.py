@@ -0,0 +1,260 @@
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+# Range queries over one ticker's price history, answered without scanning the rows in the range:
+#   - prefix sums of the volume and of the daily log returns, so a total (or a return over the range) is the
+#     difference of two entries: O(1)
+#   - segment trees of the high, low and close, holding each node's maximum and minimum, so the highest or lowest
+#     value in a range combines O(log n) nodes
+#   - a segment tree of the largest drawdown of the close within each node, which combines in order as
+#     max(left drawdown, right drawdown, fall from the left maximum to the right minimum): O(log n)
+# Segment trees rather than sparse tables, as they take O(n) memory instead of O(n log n), and a new day is added
+# by updating O(log n) nodes.
+#
+# Indexes are built from, and kept alongside, the histories cached by DatabaseHandling.priceStore.PriceStore (see
+# PriceStore.range_index), and extended rather than rebuilt when new days are ingested.
+
+TREE_COLUMNS = ("high", "low", "close")
+INITIAL_CAPACITY = 256
+
+
+class RangeIndex:
+    """
+    Range aggregates over one ticker's history.
+
+    Parameters:
+        - rows (list): Rows in the order of PriceStore.COLUMNS (date, open, close, high, low, volume,
+          weighted_volume), sorted by date.
+
+    Note:
+        - Every query takes a startDate and endDate (yyyy-mm-dd, both included, either can be None for the start
+          or end of the history), and returns None if the range has no stored value for the column.
+
+    Example:
+        ```
+        >>> index = RangeIndex(price_store.get_history("AAPL"))
+        >>> index.highest("high", "2023-01-01", "2023-06-30")
+        194.48
+        >>> index.max_drawdown("2023-01-01", "2023-12-31")
+        10.75
+        ```
+    """
+
+    def __init__(self, rows: list = ()):
+        self._dates = []
+        self._lastClose = np.nan  # for the log return of the next row added
+        self._capacity = 0
+        # entry i is the sum of the first i values, so entries 0 to len(self) are used
+        self._volumeSums = np.zeros(1)
+        self._logReturnSums = np.zeros(1)
+        # column -> segment tree, with the root at 1 and the leaf of row i at capacity + i
+        self._maximums = {}
+        self._minimums = {}
+        self._drawdowns = np.zeros(0)
+        self.extend(rows)
+
+    def __len__(self) -> int:
+        return len(self._dates)
+
+    @property
+    def dates(self) -> list:
+        return self._dates
+
+    def extend(self, rows: list):
+        """
+        Adds rows for dates after the last one indexed, e.g. the days ingested since the index was built.
+
+        Raises:
+            ValueError: If a row is not after the last indexed date.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        if self._dates and rows[0][0] <= self._dates[-1]:
+            raise ValueError(
+                f"Rows can only be added after {self._dates[-1]}, not {rows[0][0]}"
+            )
+
+        first = len(self._dates)
+        last = first + len(rows)
+        columns = list(zip(*rows))
+        values = {
+            "close": np.array(columns[2], dtype=float),
+            "high": np.array(columns[3], dtype=float),  # None becomes NaN
+            "low": np.array(columns[4], dtype=float),
+        }
+        volumes = np.nan_to_num(np.array(columns[5], dtype=float))
+        closes = np.concatenate(([self._lastClose], values["close"]))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            logReturns = np.log(closes[1:] / closes[:-1])
+        logReturns[~np.isfinite(logReturns)] = 0.0  # the first day, or a missing close
+
+        updateFrom = first
+        if last > self._capacity:
+            self.__grow(last)
+            updateFrom = 0  # the nodes were not moved with the leaves
+        capacity = self._capacity
+
+        self._dates.extend(columns[0])
+        self._lastClose = closes[-1]
+        self._volumeSums[first + 1 : last + 1] = self._volumeSums[first] + np.cumsum(
+            volumes
+        )
+        self._logReturnSums[first + 1 : last + 1] = self._logReturnSums[
+            first
+        ] + np.cumsum(logReturns)
+        for column in TREE_COLUMNS:
+            known = ~np.isnan(values[column])
+            self._maximums[column][capacity + first : capacity + last] = np.where(
+                known, values[column], -np.inf
+            )
+            self._minimums[column][capacity + first : capacity + last] = np.where(
+                known, values[column], np.inf
+            )
+        self.__update_parents(updateFrom, last)
+
+    def __grow(self, size: int):
+        """Moves the trees and sums to a capacity (a power of two) of at least size, keeping the leaves."""
+        capacity = max(INITIAL_CAPACITY, self._capacity)
+        while capacity < size:
+            capacity *= 2
+        oldCapacity, count = self._capacity, len(self._dates)
+        for name in ("_volumeSums", "_logReturnSums"):
+            sums = np.zeros(capacity + 1)
+            sums[: count + 1] = getattr(self, name)[: count + 1]
+            setattr(self, name, sums)
+        for trees, empty in ((self._maximums, -np.inf), (self._minimums, np.inf)):
+            for column in TREE_COLUMNS:
+                tree = np.full(2 * capacity, empty)
+                if column in trees:
+                    tree[capacity : capacity + count] = trees[column][
+                        oldCapacity : oldCapacity + count
+                    ]
+                trees[column] = tree
+        self._drawdowns = np.zeros(2 * capacity)
+        self._capacity = capacity
+
+    def __update_parents(self, first: int, last: int):
+        """Works out the nodes above leaves first to last - 1 again, one level of the trees at a time."""
+        low, high = first + self._capacity, last - 1 + self._capacity
+        closeMaximums, closeMinimums = self._maximums["close"], self._minimums["close"]
+        while low > 1:
+            low, high = low // 2, high // 2
+            parents = np.arange(low, high + 1)
+            left, right = 2 * parents, 2 * parents + 1
+            for column in TREE_COLUMNS:
+                maximums, minimums = self._maximums[column], self._minimums[column]
+                maximums[parents] = np.maximum(maximums[left], maximums[right])
+                minimums[parents] = np.minimum(minimums[left], minimums[right])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                across = np.where(
+                    closeMaximums[left] > 0,
+                    1 - closeMinimums[right] / closeMaximums[left],
+                    0.0,
+                )
+            self._drawdowns[parents] = np.maximum(
+                np.maximum(self._drawdowns[left], self._drawdowns[right]), across
+            )
+
+    def span(self, startDate: str = None, endDate: str = None) -> tuple:
+        """Returns (first, last): the positions of the first row in the range and of the row after its end."""
+        first = 0 if startDate is None else bisect_left(self._dates, startDate)
+        last = (
+            len(self._dates) if endDate is None else bisect_right(self._dates, endDate)
+        )
+        return first, max(first, last)
+
+    def count(self, startDate: str = None, endDate: str = None) -> int:
+        """The number of trading days stored in the range."""
+        first, last = self.span(startDate, endDate)
+        return last - first
+
+    def total_volume(self, startDate: str = None, endDate: str = None) -> int:
+        first, last = self.span(startDate, endDate)
+        if first == last:
+            return None
+        return int(self._volumeSums[last] - self._volumeSums[first])
+
+    def average_volume(self, startDate: str = None, endDate: str = None) -> float:
+        first, last = self.span(startDate, endDate)
+        if first == last:
+            return None
+        return float(self._volumeSums[last] - self._volumeSums[first]) / (last - first)
+
+    def log_return(self, startDate: str = None, endDate: str = None) -> float:
+        """The sum of the daily log returns after the first day of the range, i.e. ln(last close / first close)."""
+        first, last = self.span(startDate, endDate)
+        if last - first < 2:
+            return None
+        return float(self._logReturnSums[last] - self._logReturnSums[first + 1])
+
+    def percentage_return(self, startDate: str = None, endDate: str = None) -> float:
+        """The percentage change of the close from the first to the last day of the range."""
+        logReturn = self.log_return(startDate, endDate)
+        return None if logReturn is None else float(np.expm1(logReturn) * 100)
+
+    def highest(self, column: str, startDate: str = None, endDate: str = None) -> float:
+        """The highest high, low or close in the range."""
+        value = self.__combine(self._maximums[column], max, -np.inf, startDate, endDate)
+        return None if value == -np.inf else float(value)
+
+    def lowest(self, column: str, startDate: str = None, endDate: str = None) -> float:
+        """The lowest high, low or close in the range."""
+        value = self.__combine(self._minimums[column], min, np.inf, startDate, endDate)
+        return None if value == np.inf else float(value)
+
+    def __combine(self, tree, function, empty: float, startDate: str, endDate: str):
+        first, last = self.span(startDate, endDate)
+        result = empty
+        low, high = first + self._capacity, last + self._capacity
+        while low < high:
+            if low & 1:
+                result = function(result, tree[low])
+                low += 1
+            if high & 1:
+                high -= 1
+                result = function(result, tree[high])
+            low, high = low // 2, high // 2
+        return result
+
+    def max_drawdown(self, startDate: str = None, endDate: str = None) -> float:
+        """
+        The largest fall of the close from a peak to a later trough within the range, as a percentage of the peak.
+        """
+        first, last = self.span(startDate, endDate)
+        if first == last:
+            return None
+        closeMaximums, closeMinimums = self._maximums["close"], self._minimums["close"]
+
+        def node(position):
+            return (
+                closeMaximums[position],
+                closeMinimums[position],
+                self._drawdowns[position],
+            )
+
+        def join(left, right):
+            across = 1 - right[1] / left[0] if left[0] > 0 else 0.0
+            return (
+                max(left[0], right[0]),
+                min(left[1], right[1]),
+                max(left[2], right[2], across),
+            )
+
+        # the nodes on the left of the range are joined left to right, and those on the right right to left
+        empty = (-np.inf, np.inf, 0.0)
+        leftPart, rightPart = empty, empty
+        low, high = first + self._capacity, last + self._capacity
+        while low < high:
+            if low & 1:
+                leftPart = join(leftPart, node(low))
+                low += 1
+            if high & 1:
+                high -= 1
+                rightPart = join(node(high), rightPart)
+            low, high = low // 2, high // 2
+        maximum, _, drawdown = join(leftPart, rightPart)
+        if maximum == -np.inf:
+            return None
+        return float(drawdown * 100)
@@ -0,0 +1,286 @@
+import time
+
+# Replays stored prices through the alert rules and screens, a date at a time, as if each date were being ingested
+# now, to see how the rules would have behaved without waiting for live data.
+#
+# Each date is passed on through the same interfaces live data uses:
+#   - an IngestBatch of the date's rows is checked by an AlertEngine (as the ingest pipeline's 'alerts' hook does)
+#     and given to any hooks registered with register_hook, which take the same batches as post-ingest hooks
+#   - each bar is given, as a quote in the format of call_ticker_current, to subscribers with the events it fired,
+#     as the watchlist's QuotePoller does
+# The engine is made with persist=False, so a replay never reads or changes the saved alert state or events.
+#
+# Screens are worked out once over the whole range, from the trading day before it, with the vectorised screener, and
+# a ticker fires a screen event on each date it starts matching the expression (i.e. it did not match on its previous
+# trading day).
+#
+# The replay runs as fast as possible, or at a set number of trading days a second, and reports how many events
+# fired and how many bars a second were replayed.
+
+
+class Replay:
+    """
+    A replay of stored prices through alert rules and screens.
+
+    Parameters:
+        - startDate (str): Optional. The first date replayed (yyyy-mm-dd). Defaults to the first stored date.
+        - endDate (str): Optional. The last date replayed. Defaults to the last stored date.
+        - tickers (iterable): Optional. Only replay these tickers. Defaults to every ticker.
+        - rules (list): Optional. Rule tuples (in the order of thresholds.RULE_COLUMNS) to check. Defaults to the
+          stored rules.
+        - screens (iterable): Optional. Screening expressions (see DatabaseHandling/screener.py) to check.
+        - speed (float): Optional. Trading days replayed a second. None replays as fast as possible.
+        - databasePath (str): The path of the SQLite database.
+
+    Note:
+        - The bars before startDate that the rules look back over are checked first without reporting their
+          events, so a rule can fire on the first date replayed. Screens are worked out from the trading day before
+          startDate, so a ticker only fires a screen event on it if it started matching then.
+        - Events are tuples in the order of thresholds.EVENT_COLUMNS (rule id, ticker, date, value, message). The
+          rule id of a screen event is its expression, and its value is None.
+
+    Example:
+        ```
+        >>> replay = Replay("2023-01-01", "2023-12-31", rules=[(1, "AAPL", "price", 0, 190.0, "above", None)])
+        >>> replay.run()["events"]
+        [(1, 'AAPL', '2023-06-30', 193.97, 'AAPL went above 190.00 (193.97)'), ...]
+        ```
+    """
+
+    def __init__(
+        self,
+        startDate: str = None,
+        endDate: str = None,
+        tickers=None,
+        rules: list = None,
+        screens=(),
+        speed: float = None,
+        databasePath: str = "data/main.sql",
+    ):
+        from DatabaseHandling.thresholds import list_rules
+
+        self.startDate = startDate
+        self.endDate = endDate
+        self.tickers = None if tickers is None else list(tickers)
+        self.rules = list_rules(databasePath) if rules is None else list(rules)
+        self.screens = list(screens)
+        self.speed = speed
+        self._databasePath = databasePath
+        self._subscribers = []
+        self._hooks = []
+
+    def subscribe(self, callback):
+        """Calls callback(ticker, quote, events) with every bar replayed, like QuotePoller.subscribe."""
+        self._subscribers.append(callback)
+
+    def register_hook(self, function):
+        """Calls function(batch) with the IngestBatch of every date replayed, like a post-ingest hook."""
+        self._hooks.append(function)
+
+    def __screen_events(self, startDate: str, endDate: str) -> dict:
+        """
+        Works out every screen over the range in one go.
+
+        Returns:
+            - dict: date -> list of screen events on that date.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        from datetime import date, timedelta
+        from DatabaseHandling.priceStore import select_prices
+        from DatabaseHandling.screener import screen
+
+        if not self.screens:
+            return {}
+        # from the trading day before the range, so a ticker already matching then does not start matching on the
+        # first date replayed
+        firstDate = startDate
+        previousDay = select_prices(
+            ("date",),
+            endDate=str(date.fromisoformat(startDate) - timedelta(days=1)),
+            orderBy="date",
+            descending=True,
+            limit=1,
+            databasePath=self._databasePath,
+        )
+        if previousDay:
+            startDate = previousDay[0][0]
+
+        # ticker -> its dates in the range, to find its previous trading day
+        tradingDays = {}
+        for ticker, rowDate in select_prices(
+            ("ticker", "date"),
+            tickers=self.tickers,
+            startDate=startDate,
+            endDate=endDate,
+            orderBy="date",
+            databasePath=self._databasePath,
+        ):
+            tradingDays.setdefault(ticker, []).append(rowDate)
+
+        events = {}
+        for expression in self.screens:
+            for ticker, dates in screen(
+                expression, startDate, endDate, self._databasePath
+            ).items():
+                if self.tickers is not None and ticker not in self.tickers:
+                    continue
+                matched = set(dates)
+                previous = None
+                for rowDate in tradingDays.get(ticker, ()):
+                    if (
+                        rowDate >= firstDate
+                        and rowDate in matched
+                        and previous not in matched
+                    ):
+                        events.setdefault(rowDate, []).append(
+                            (
+                                expression,
+                                ticker,
+                                rowDate,
+                                None,
+                                f"{ticker} started matching {expression}",
+                            )
+                        )
+                    previous = rowDate
+        return events
+
+    def run(self) -> dict:
+        """
+        Replays every date in the range.
+
+        Returns:
+            - dict: With the keys:
+                - "dates" (int): The trading days replayed.
+                - "bars" (int): The bars replayed.
+                - "events" (list): Every event fired, in date order.
+                - "seconds" (float): The time the replay took.
+                - "barsPerSecond" (float): The bars replayed a second.
+        """
+        from collections import Counter
+        from datetime import date, timedelta
+        from itertools import groupby
+        from DatabaseHandling.ingestPipeline import INGEST_COLUMNS, IngestBatch
+        from DatabaseHandling.priceStore import select_prices
+        from DatabaseHandling.storageLayout import ensure_schema
+        from DatabaseHandling.thresholds import AlertEngine
+
+        # INGEST_COLUMNS has 'low', which databases made before it was stored lack
+        ensure_schema(self._databasePath)
+        started = time.perf_counter()
+        engine = AlertEngine(self._databasePath, rules=self.rules, persist=False)
+
+        readFrom = self.startDate
+        longest = max((rule[3] for rule in self.rules), default=0)
+        if self.startDate is not None:
+            # enough calendar days before the range to hold the trading days the rules look back over
+            readFrom = str(
+                date.fromisoformat(self.startDate)
+                - timedelta(days=(longest + 1) * 7 // 5 + 14)
+            )
+        rows = select_prices(
+            INGEST_COLUMNS,
+            tickers=self.tickers,
+            startDate=readFrom,
+            endDate=self.endDate,
+            orderBy="date",
+            databasePath=self._databasePath,
+        )
+        days = [
+            (rowDate, list(dayRows))
+            for rowDate, dayRows in groupby(rows, key=lambda row: row[1])
+        ]
+        warmUp = []
+        if self.startDate is not None:
+            warmUp = [
+                row
+                for rowDate, dayRows in days
+                if rowDate < self.startDate
+                for row in dayRows
+            ]
+            # a ticker with a gap in its prices needs bars from further back
+            needed = {}
+            for rule in self.rules:
+                needed[rule[1]] = max(needed.get(rule[1], 0), rule[3] + 1)
+            counts = Counter(row[0] for row in warmUp)
+            short = [
+                ticker
+                for ticker, size in needed.items()
+                if counts[ticker] < size
+                and (self.tickers is None or ticker in self.tickers)
+            ]
+            if short:
+                warmUp = [
+                    row
+                    for row in select_prices(
+                        INGEST_COLUMNS,
+                        tickers=short,
+                        endDate=readFrom,
+                        orderBy="date",
+                        databasePath=self._databasePath,
+                    )
+                    if row[1] < readFrom
+                ] + warmUp
+            engine.check_bars(warmUp)
+            days = [day for day in days if day[0] >= self.startDate]
+        screenEvents = self.__screen_events(days[0][0], days[-1][0]) if days else {}
+
+        # ticker -> its close on the previous date, for the quotes
+        lastCloses = {row[0]: row[3] for row in warmUp if row[3] is not None}
+        events = []
+        bars = 0
+        for number, (rowDate, dayRows) in enumerate(days):
+            if self.speed:
+                wait = started + number / self.speed - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+
+            dayEvents = engine.check_bars(dayRows) + screenEvents.get(rowDate, [])
+            events.extend(dayEvents)
+            bars += len(dayRows)
+
+            if self._hooks:
+                batch = IngestBatch(
+                    dayRows, dates=[rowDate], databasePath=self._databasePath
+                )
+                for hook in self._hooks:
+                    hook(batch)
+            if self._subscribers:
+                byTicker = {}
+                for event in dayEvents:
+                    byTicker.setdefault(event[1], []).append(event)
+                for row in dayRows:
+                    quote = _quote_from_bar(row, lastCloses.get(row[0]))
+                    if row[3] is not None:
+                        lastCloses[row[0]] = row[3]
+                    for callback in self._subscribers:
+                        callback(row[0], quote, byTicker.get(row[0], []))
+
+        seconds = time.perf_counter() - started
+        return {
+            "dates": len(days),
+            "bars": bars,
+            "events": events,
+            "seconds": seconds,
+            "barsPerSecond": bars / seconds if seconds else 0.0,
+        }
+
+
+def _quote_from_bar(row: tuple, prevClose: float = None) -> dict:
+    """A bar (in the order of INGEST_COLUMNS) in the quote format of call_ticker_current, with its 'date' added."""
+    ticker, rowDate, open, close, high, low, volume, _ = row
+    change = None
+    if prevClose and close is not None:
+        change = f"{(close - prevClose) * 100 / prevClose:+.2f}%"
+    return {
+        "ticker": ticker,
+        "date": rowDate,
+        "currentOpen": open,
+        "currentHigh": high,
+        "currentLow": low,
+        "currentVolume": volume,
+        "prevClose": prevClose,
+        "currentPrice": close,
+        "currentPercentageChange": change,
+    }
@@ -0,0 +1,779 @@
+import re
+import sqlite3
+
+import numpy as np
+
+# A stock screener: filters every stored ticker by an expression such as
+#     close > sma_50 AND volume > 2 * avg_volume_20 AND sector = 'Technology'
+# over a date or date range.
+#
+# The expression is parsed into a tree, and split on its top level ANDs. Parts that only use the 'Companies' columns
+# (sector, name) are run against 'Companies' to narrow the tickers, and parts that only use one day's prices are
+# pushed into the price query as SQL. Anything left (indicators, crossovers, or a mix of the two) is then worked
+# out with numpy over the candidate tickers' recent histories, every ticker at once. Indicators kept in the
+# 'TechnicalIndicators' table (see DatabaseHandling/indicators.py), and daily returns kept in the 'DailyReturns'
+# table (see DatabaseHandling/dailyReturns.py), are read from them rather than worked out.
+
+PRICE_COLUMNS = ("open", "close", "high", "low", "volume", "weighted_volume")
+COMPANY_COLUMNS = ("sector", "name")
+RETURN_COLUMNS = ("previous_close", "change", "percentage_change", "log_return", "gap")
+INDICATORS = {
+    # name -> the column it is worked out from
+    "sma": "close",  # simple moving average of the close over n trading days
+    "avg_volume": "volume",  # mean volume over n trading days
+    "return": "close",  # percentage change of the close over n trading days
+    "rsi": "close",  # relative strength index over n trading days (simple averages of the gains and losses)
+    "volatility": "close",  # annualised standard deviation of the daily log returns over n trading days, in %
+    "stddev": "close",  # sample standard deviation of the close over n trading days
+    # only read from the 'TechnicalIndicators' table, as they depend on the whole history rather than a window
+    "ema": "close",
+    "atr": "close",
+}
+FUNCTIONS = {
+    # name -> number of arguments
+    "crosses_above": 2,  # true on the day the first argument moves above the second
+    "crosses_below": 2,
+    "abs": 1,
+}
+KEYWORDS = ("and", "or", "not")
+COMPARISONS = ("=", "==", "!=", "<>", "<", "<=", ">", ">=")
+TRADING_DAYS_PER_YEAR = 252
+
+TOKEN_PATTERN = re.compile(
+    r"\s*(?:(?P<number>\d+(?:\.\d*)?|\.\d+)|(?P<string>'(?:[^']|'')*')"
+    r"|(?P<name>[A-Za-z_][A-Za-z0-9_]*)|(?P<operator>>=|<=|!=|<>|==|[-+*/()<>=,]))"
+)
+INDICATOR_PATTERN = re.compile(r"({})_(\d+)$".format("|".join(INDICATORS)))
+
+
+class Parser:
+    """
+    Parses a screening expression into a tree of tuples, e.g. "close > sma_50" becomes
+    ("compare", ">", ("column", "close"), ("indicator", "sma", 50)).
+
+    Grammar, loosest binding first:
+        expression := and_expression ("OR" and_expression)*
+        and_expression := not_expression ("AND" not_expression)*
+        not_expression := "NOT" not_expression | comparison
+        comparison := sum (("=" | "==" | "!=" | "<>" | "<" | "<=" | ">" | ">=") sum)?
+        sum := product (("+" | "-") product)*
+        product := unary (("*" | "/") unary)*
+        unary := "-" unary | number | 'string' | column | indicator | function "(" arguments ")" | "(" expression ")"
+
+    Keywords and names are case insensitive.
+    """
+
+    def __init__(self, expression: str):
+        self._expression = expression
+        self._tokens = self.__tokenise(expression)
+        self._position = 0
+
+    def __tokenise(self, expression: str) -> list:
+        tokens = []
+        position = 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = TOKEN_PATTERN.match(expression, position)
+            if match is None:
+                raise ValueError(
+                    f"Unexpected character in the expression: {expression[position:].strip()[:10]!r}"
+                )
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == "number":
+                value = float(value)
+            elif kind == "string":
+                value = value[1:-1].replace("''", "'")
+            elif kind == "name":
+                value = value.lower()
+                if value in KEYWORDS:
+                    kind = "keyword"
+            tokens.append((kind, value))
+            position = match.end()
+        return tokens
+
+    def __peek(self):
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+        return (None, None)
+
+    def __accept(self, kind: str, *values) -> bool:
+        tokenKind, tokenValue = self.__peek()
+        if tokenKind == kind and (not values or tokenValue in values):
+            self._position += 1
+            return True
+        return False
+
+    def __expect(self, kind: str, value):
+        if not self.__accept(kind, value):
+            found = self.__peek()[1]
+            raise ValueError(
+                f"Expected {value!r} in the expression"
+                + ("" if found is None else f", found {found!r}")
+            )
+
+    def parse(self) -> tuple:
+        """
+        Returns:
+            - tuple: The root of the expression tree.
+
+        Raises:
+            ValueError: If the expression is empty, malformed or uses an unknown name.
+        """
+        if not self._tokens:
+            raise ValueError("The expression is empty")
+        tree = self.__expression()
+        if self._position != len(self._tokens):
+            raise ValueError(f"Unexpected {self.__peek()[1]!r} in the expression")
+        return tree
+
+    def __expression(self) -> tuple:
+        tree = self.__and_expression()
+        while self.__accept("keyword", "or"):
+            tree = ("or", tree, self.__and_expression())
+        return tree
+
+    def __and_expression(self) -> tuple:
+        tree = self.__not_expression()
+        while self.__accept("keyword", "and"):
+            tree = ("and", tree, self.__not_expression())
+        return tree
+
+    def __not_expression(self) -> tuple:
+        if self.__accept("keyword", "not"):
+            return ("not", self.__not_expression())
+        return self.__comparison()
+
+    def __comparison(self) -> tuple:
+        tree = self.__sum()
+        kind, value = self.__peek()
+        if kind == "operator" and value in COMPARISONS:
+            self._position += 1
+            operator = {"==": "=", "<>": "!="}.get(value, value)
+            tree = ("compare", operator, tree, self.__sum())
+        return tree
+
+    def __sum(self) -> tuple:
+        tree = self.__product()
+        while True:
+            kind, value = self.__peek()
+            if not (kind == "operator" and value in ("+", "-")):
+                return tree
+            self._position += 1
+            tree = ("arithmetic", value, tree, self.__product())
+
+    def __product(self) -> tuple:
+        tree = self.__unary()
+        while True:
+            kind, value = self.__peek()
+            if not (kind == "operator" and value in ("*", "/")):
+                return tree
+            self._position += 1
+            tree = ("arithmetic", value, tree, self.__unary())
+
+    def __unary(self) -> tuple:
+        kind, value = self.__peek()
+        if kind is None:
+            raise ValueError("The expression ends unexpectedly")
+        self._position += 1
+
+        if kind == "operator" and value == "-":
+            return ("negate", self.__unary())
+        if kind == "operator" and value == "(":
+            tree = self.__expression()
+            self.__expect("operator", ")")
+            return tree
+        if kind == "number":
+            return ("number", value)
+        if kind == "string":
+            return ("string", value)
+        if kind == "name":
+            if value in PRICE_COLUMNS + COMPANY_COLUMNS + RETURN_COLUMNS:
+                return ("column", value)
+            indicator = INDICATOR_PATTERN.match(value)
+            if indicator is not None:
+                window = int(indicator.group(2))
+                if window < 1:
+                    raise ValueError(f"{value} needs a window of at least 1 day")
+                return ("indicator", indicator.group(1), window)
+            if value in FUNCTIONS:
+                self.__expect("operator", "(")
+                arguments = [self.__expression()]
+                while self.__accept("operator", ","):
+                    arguments.append(self.__expression())
+                self.__expect("operator", ")")
+                if len(arguments) != FUNCTIONS[value]:
+                    raise ValueError(
+                        f"{value} takes {FUNCTIONS[value]} argument(s), {len(arguments)} given"
+                    )
+                return ("call", value, tuple(arguments))
+            raise ValueError(f"Unknown metric: {value}")
+        raise ValueError(f"Unexpected {value!r} in the expression")
+
+
+def split_conjuncts(tree: tuple) -> list:
+    """Splits a tree on its top level ANDs, so that each part can be evaluated wherever suits it best."""
+    if tree[0] == "and":
+        return split_conjuncts(tree[1]) + split_conjuncts(tree[2])
+    return [tree]
+
+
+def sources_of(tree: tuple) -> set:
+    """
+    Returns what a tree needs to be evaluated: any of 'prices' (one day's price columns), 'companies' (the
+    Companies columns), 'returns' (the daily return columns) and 'history' (indicators and functions, which need
+    previous days).
+    """
+    kind = tree[0]
+    if kind == "column":
+        if tree[1] in COMPANY_COLUMNS:
+            return {"companies"}
+        return {"returns" if tree[1] in RETURN_COLUMNS else "prices"}
+    if kind in ("indicator", "call"):
+        return {"history"}
+    if kind in ("number", "string"):
+        return set()
+    return set().union(
+        *(sources_of(child) for child in tree[1:] if isinstance(child, tuple))
+    )
+
+
+def children_of(tree: tuple) -> list:
+    if tree[0] == "call":
+        return list(tree[2])
+    return [child for child in tree[1:] if isinstance(child, tuple)]
+
+
+def indicators_used(tree: tuple) -> set:
+    """Returns the names of the indicators a tree uses, e.g. {'sma_50', 'rsi_14'}."""
+    if tree[0] == "indicator":
+        return {f"{tree[1]}_{tree[2]}"}
+    return set().union(*(indicators_used(child) for child in children_of(tree)))
+
+
+def returns_used(tree: tuple) -> set:
+    """Returns the daily return columns a tree uses, e.g. {'percentage_change'}."""
+    if tree[0] == "column":
+        return {tree[1]} & set(RETURN_COLUMNS)
+    return set().union(*(returns_used(child) for child in children_of(tree)))
+
+
+def columns_needed(tree: tuple, stored: set = frozenset()) -> set:
+    """
+    Returns the price columns a tree reads, including those its indicators and daily returns are worked out from,
+    unless they are in stored, in which case they are read from 'TechnicalIndicators' or 'DailyReturns' instead.
+    """
+    kind = tree[0]
+    if kind == "column":
+        if tree[1] in RETURN_COLUMNS and tree[1] not in stored:
+            return {"open", "close"} if tree[1] == "gap" else {"close"}
+        return {tree[1]} if tree[1] in PRICE_COLUMNS else set()
+    if kind == "indicator":
+        return set() if f"{tree[1]}_{tree[2]}" in stored else {INDICATORS[tree[1]]}
+    return set().union(*(columns_needed(child, stored) for child in children_of(tree)))
+
+
+def history_needed(tree: tuple, stored: set = frozenset()) -> int:
+    """
+    Returns the number of trading days before a date that the tree needs to be evaluated on that date. The
+    indicators and daily returns in stored are read as they are, so need none.
+    """
+    kind = tree[0]
+    if kind == "column":
+        return 1 if tree[1] in RETURN_COLUMNS and tree[1] not in stored else 0
+    if kind == "indicator":
+        _, name, window = tree
+        if f"{name}_{window}" in stored:
+            return 0
+        return window - 1 if name in ("sma", "avg_volume", "stddev") else window
+    extra = 1 if kind == "call" and tree[1] in ("crosses_above", "crosses_below") else 0
+    return extra + max(
+        [history_needed(child, stored) for child in children_of(tree)] or [0]
+    )
+
+
+def to_sql(tree: tuple, arguments: list) -> str:
+    """
+    Converts a tree without indicators or functions to an SQL condition, appending its literals to arguments.
+
+    Price columns are written as placeholders for select_prices' where parameter (e.g. '{close}'), and the
+    Companies columns as they are.
+    """
+    kind = tree[0]
+    if kind == "column":
+        return "{" + tree[1] + "}" if tree[1] in PRICE_COLUMNS else tree[1]
+    if kind in ("number", "string"):
+        arguments.append(tree[1])
+        return "?"
+    if kind == "negate":
+        return f"(-{to_sql(tree[1], arguments)})"
+    if kind == "not":
+        return f"(NOT {to_sql(tree[1], arguments)})"
+    if kind in ("and", "or"):
+        left = to_sql(tree[1], arguments)
+        return f"({left} {kind.upper()} {to_sql(tree[2], arguments)})"
+    if kind == "arithmetic" and tree[1] == "/":
+        left = to_sql(tree[2], arguments)
+        # * 1.0 so that dividing two integers (e.g. volumes) is not rounded down, matching numpy
+        return f"({left} * 1.0 / {to_sql(tree[3], arguments)})"
+    if kind in ("arithmetic", "compare"):
+        left = to_sql(tree[2], arguments)
+        return f"({left} {tree[1]} {to_sql(tree[3], arguments)})"
+    raise ValueError(f"{kind} cannot be converted to SQL")
+
+
+class Histories:
+    """
+    The recent price histories of several tickers, as one numpy array per column, sorted by ticker then date.
+
+    Values are evaluated on every row at once. The windowed calculations (moving averages, shifts) use each row's
+    position within its ticker's history, so that a window never reaches into the previous ticker's rows.
+    """
+
+    def __init__(self, rows: list, columns: tuple, companies: dict):
+        values = list(zip(*rows)) or [()] * (len(columns) + 2)
+        tickers = np.array(values[0], dtype=str)
+        dates = np.array(values[1], dtype=str)
+        order = np.lexsort((dates, tickers))
+        self.tickers = tickers[order]
+        self.dates = dates[order]
+        self._values = {
+            column: np.array(values[index + 2], dtype=float)[order]
+            for index, column in enumerate(columns)
+        }
+        self._companies = companies  # ticker -> {column: value}
+
+        index = np.arange(len(rows))
+        starts = np.ones(len(rows), dtype=bool)
+        starts[1:] = self.tickers[1:] != self.tickers[:-1]
+        self._position = index - np.maximum.accumulate(np.where(starts, index, 0))
+
+    def column(self, name: str) -> np.ndarray:
+        if name in COMPANY_COLUMNS:
+            return np.array(
+                [self._companies.get(ticker, {}).get(name) for ticker in self.tickers],
+                dtype=object,
+            )
+        if name in RETURN_COLUMNS and name not in self._values:
+            # 'DailyReturns' is not up to date, so work it out as update_daily_returns would
+            close = self._values["close"]
+            previous = self.shift(close, 1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                if name == "previous_close":
+                    return previous
+                if name == "change":
+                    return close - previous
+                if name == "percentage_change":
+                    return np.where(
+                        previous != 0, (close - previous) * 100 / previous, np.nan
+                    )
+                if name == "log_return":
+                    return np.where(
+                        (close > 0) & (previous > 0), np.log(close / previous), np.nan
+                    )
+                return np.where(
+                    previous != 0,
+                    (self._values["open"] - previous) * 100 / previous,
+                    np.nan,
+                )
+        return self._values[name]
+
+    def shift(self, values: np.ndarray, days: int) -> np.ndarray:
+        """Each row's value from days trading days earlier for the same ticker (NaN if there is none)."""
+        shifted = np.full(len(values), np.nan)
+        if days < len(values):
+            shifted[days:] = values[: len(values) - days]
+        shifted[self._position < days] = np.nan
+        return shifted
+
+    def rolling_mean(self, values: np.ndarray, window: int) -> np.ndarray:
+        """The mean over each row and the window - 1 before it for the same ticker (NaN unless all are known)."""
+        known = ~np.isnan(values)
+        sums = np.concatenate(([0.0], np.cumsum(np.where(known, values, 0.0))))
+        counts = np.concatenate(([0], np.cumsum(known)))
+        end = np.arange(1, len(values) + 1)
+        start = np.maximum(end - window, 0)
+        total = sums[end] - sums[start]
+        count = counts[end] - counts[start]
+        return np.where(
+            (self._position >= window - 1) & (count == window), total / window, np.nan
+        )
+
+    def indicator(self, name: str, window: int) -> np.ndarray:
+        if (
+            f"{name}_{window}" in self._values
+        ):  # read from the 'TechnicalIndicators' table
+            return self._values[f"{name}_{window}"]
+        if name in ("ema", "atr"):
+            raise ValueError(
+                f"{name}_{window} is only available once it is stored: add it to INDICATOR_WINDOWS in config.py and "
+                "run DatabaseHandling.indicators.update_indicators"
+            )
+
+        close = self._values[INDICATORS[name]]
+        if name in ("sma", "avg_volume"):
+            return self.rolling_mean(close, window)
+        if name == "return":
+            previous = self.shift(close, window)
+            return np.where(previous > 0, (close / previous - 1) * 100, np.nan)
+
+        if name == "rsi":
+            change = close - self.shift(close, 1)
+            averageGain = self.rolling_mean(np.maximum(change, 0.0), window)
+            averageLoss = self.rolling_mean(np.maximum(-change, 0.0), window)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return np.where(
+                    averageLoss == 0,
+                    np.where(averageGain == 0, 50.0, 100.0),
+                    100 - 100 / (1 + averageGain / averageLoss),
+                )
+        if name == "volatility":
+            previous = self.shift(close, 1)
+            logReturns = np.log(np.where(previous > 0, close / previous, np.nan))
+            mean = self.rolling_mean(logReturns, window)
+            meanOfSquares = self.rolling_mean(logReturns**2, window)
+            if window < 2:
+                return np.full(len(close), np.nan)
+            variance = (meanOfSquares - mean**2) * window / (window - 1)
+            return (
+                np.sqrt(np.maximum(variance, 0)) * np.sqrt(TRADING_DAYS_PER_YEAR) * 100
+            )
+        if name == "stddev":
+            if window < 2:
+                return np.full(len(close), np.nan)
+            mean = self.rolling_mean(close, window)
+            variance = (
+                (self.rolling_mean(close**2, window) - mean**2)
+                * window
+                / (window - 1)
+            )
+            return np.sqrt(np.maximum(variance, 0))
+        raise ValueError(f"Unknown indicator: {name}")
+
+
+def _is_null(values) -> np.ndarray:
+    if isinstance(values, np.ndarray):
+        if values.dtype == object:
+            return np.array([value is None for value in values], dtype=bool)
+        return np.isnan(values)
+    return values is None or (isinstance(values, float) and np.isnan(values))
+
+
+def evaluate(tree: tuple, histories: Histories):
+    """
+    Evaluates a tree on every row of histories.
+
+    Conditions use SQL's three valued logic, so that evaluating one here gives the same answer as pushing it into
+    the price query: they are arrays of 1.0 (true), 0.0 (false) and NaN (unknown, e.g. a comparison with a value
+    that is not stored, or a moving average with too little history). Only rows that come out as 1.0 match.
+    """
+    kind = tree[0]
+    if kind in ("number", "string"):
+        return tree[1]
+    if kind == "column":
+        return histories.column(tree[1])
+    if kind == "indicator":
+        return histories.indicator(tree[1], tree[2])
+    if kind == "negate":
+        return -evaluate(tree[1], histories)
+    if kind == "not":
+        return 1.0 - evaluate(tree[1], histories)  # NaN stays NaN
+
+    if kind == "and":
+        left, right = evaluate(tree[1], histories), evaluate(tree[2], histories)
+        # false if either is false, otherwise unknown if either is unknown
+        return np.where((left == 0) | (right == 0), 0.0, left * right)
+    if kind == "or":
+        left, right = evaluate(tree[1], histories), evaluate(tree[2], histories)
+        return np.where((left == 1) | (right == 1), 1.0, np.maximum(left, right))
+
+    if kind == "arithmetic":
+        left, right = evaluate(tree[2], histories), evaluate(tree[3], histories)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if tree[1] == "+":
+                return left + right
+            if tree[1] == "-":
+                return left - right
+            if tree[1] == "*":
+                return left * right
+            return np.where(right == 0, np.nan, left / np.where(right == 0, 1, right))
+
+    if kind == "compare":
+        left, right = evaluate(tree[2], histories), evaluate(tree[3], histories)
+        unknown = _is_null(left) | _is_null(right)
+        if isinstance(left, np.ndarray) and left.dtype == object:
+            left = np.where(
+                unknown, "", left
+            )  # so that None is never compared with a string
+        with np.errstate(invalid="ignore"):
+            result = {
+                "=": lambda: left == right,
+                "!=": lambda: left != right,
+                "<": lambda: left < right,
+                "<=": lambda: left <= right,
+                ">": lambda: left > right,
+                ">=": lambda: left >= right,
+            }[tree[1]]()
+        return np.where(unknown, np.nan, np.asarray(result, dtype=float))
+
+    if kind == "call":
+        name, arguments = tree[1], tree[2]
+        values = [
+            np.asarray(evaluate(argument, histories), dtype=float)
+            for argument in arguments
+        ]
+        if name == "abs":
+            return np.abs(values[0])
+        first, second = np.broadcast_arrays(*values)
+        today = first - second
+        yesterday = histories.shift(first, 1) - histories.shift(second, 1)
+        if name == "crosses_below":
+            today, yesterday = -today, -yesterday
+        # crossed: above today, at or below the day before
+        return np.where(
+            np.isnan(today) | np.isnan(yesterday),
+            np.nan,
+            ((today > 0) & (yesterday <= 0)).astype(float),
+        )
+
+    raise ValueError(f"Cannot evaluate {kind}")
+
+
+def read_histories(
+    parts: list,
+    stored: set,
+    tickers,
+    startDate: str,
+    endDate: str,
+    companies: dict,
+    databasePath: str,
+):
+    """
+    Reads the prices, and the stored indicators and daily returns in stored, that parts need to be evaluated
+    from startDate to endDate.
+
+    Returns:
+        - Histories: The rows from far enough before startDate for every indicator and crossover in parts, or None
+          if the stored values are missing for any of the rows (i.e. they have not been updated since).
+    """
+    from datetime import date, timedelta
+    from DatabaseHandling.dailyReturns import select_returns
+    from DatabaseHandling.indicators import select_indicators
+    from DatabaseHandling.priceStore import select_prices
+
+    daysNeeded = max(history_needed(part, stored) for part in parts)
+    if daysNeeded:
+        # trading days to calendar days, with room for weekends and market holidays
+        startDate = str(
+            date.fromisoformat(startDate) - timedelta(days=daysNeeded * 7 // 5 + 14)
+        )
+    # only the columns the expression reads, so that as little as possible is read and converted
+    columns = tuple(
+        column
+        for column in PRICE_COLUMNS
+        if any(column in columns_needed(part, stored) for part in parts)
+    )
+    rows = select_prices(
+        ("ticker", "date") + columns,
+        tickers=tickers,
+        startDate=startDate,
+        endDate=endDate,
+        databasePath=databasePath,
+    )
+
+    for names, select in (
+        (tuple(sorted(stored - set(RETURN_COLUMNS))), select_indicators),
+        (tuple(sorted(stored & set(RETURN_COLUMNS))), select_returns),
+    ):
+        if not names:
+            continue
+        if select is select_returns:
+            storedRows = select_returns(
+                ("ticker", "date") + names,
+                tickers,
+                startDate,
+                endDate,
+                databasePath=databasePath,
+            )
+        else:
+            storedRows = select_indicators(
+                names, tickers, startDate, endDate, databasePath
+            )
+        storedValues = {(row[0], row[1]): row[2:] for row in storedRows}
+        try:
+            rows = [row + storedValues[(row[0], row[1])] for row in rows]
+        except KeyError:
+            return None
+        columns += names
+
+    return Histories(rows, columns, companies)
+
+
+def screen(
+    expression: str,
+    startDate: str,
+    endDate: str = None,
+    databasePath: str = "data/main.sql",
+) -> dict:
+    """
+    Finds the tickers that match a screening expression on a date, or on any date in a range.
+
+    Parameters:
+        - expression (str): The conditions to match, e.g. "close > sma_50 AND volume > 2 * avg_volume_20 AND
+          sector = 'Technology'". It can use:
+            - the price columns: open, close, high, low, volume, weighted_volume
+            - the Companies columns: sector, name
+            - the daily returns: previous_close, change, percentage_change, log_return, gap (see
+              DatabaseHandling/dailyReturns.py)
+            - indicators, where n is a number of trading days: sma_n, avg_volume_n, return_n, rsi_n, volatility_n,
+              stddev_n, and ema_n and atr_n if they are stored (see INDICATOR_WINDOWS in config.py)
+            - the functions crosses_above(a, b), crosses_below(a, b) and abs(a)
+            - numbers, 'strings', + - * /, comparisons (= != < <= > >=), AND, OR, NOT and brackets
+        - startDate (str): The date to screen (yyyy-mm-dd), or the first date of the range.
+        - endDate (str): Optional. The last date of the range. Defaults to startDate.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - dict: ticker -> list of the dates (yyyy-mm-dd) it matched on, in ticker order.
+
+    Raises:
+        ValueError: If the expression cannot be parsed.
+        sqlite3.Error: If there is an error while querying the database.
+
+    Note:
+        - Indicators for a date are worked out from the trading days up to and including it, so sma_50 on the
+          first date of the range reads the 49 trading days before the range as well. A ticker without enough
+          history for an indicator does not match.
+        - Conditions on the Companies columns narrow the tickers with one query on 'Companies', and conditions
+          on one day's prices are applied in the price query, so the histories are only read for the tickers
+          that could still match.
+        - Indicators stored in 'TechnicalIndicators', and daily returns stored in 'DailyReturns', are read from
+          them for just the dates screened, when they are up to date for them. Conditions only on the daily
+          returns (e.g. percentage_change > 5) are applied in a query on 'DailyReturns'.
+
+    Example:
+        ```
+        >>> screen("close > sma_50 AND rsi_14 < 70 AND sector = 'Technology'", "2023-06-01")
+        {'AAPL': ['2023-06-01'], 'MSFT': ['2023-06-01'], ...}
+        ```
+    """
+    from DatabaseHandling.dailyReturns import returns_up_to_date, select_returns
+    from DatabaseHandling.indicators import stored_indicators
+    from DatabaseHandling.priceStore import select_prices
+
+    endDate = endDate or startDate
+    tree = Parser(expression).parse()
+
+    companyParts, priceParts, otherParts = [], [], []
+    for part in split_conjuncts(tree):
+        sources = sources_of(part)
+        if sources == {"companies"}:
+            companyParts.append(part)
+        elif sources <= {"prices"}:
+            priceParts.append(part)
+        else:
+            otherParts.append(part)
+
+    conn = sqlite3.connect(databasePath)
+    try:
+        cursor = conn.cursor()
+        tickers = None
+        if companyParts:
+            arguments = []
+            conditions = " AND ".join(to_sql(part, arguments) for part in companyParts)
+            cursor.execute(
+                f"SELECT ticker FROM Companies WHERE {conditions}", arguments
+            )
+            tickers = [row[0] for row in cursor.fetchall()]
+            if not tickers:
+                return {}
+
+        companies = {}
+        if any("companies" in sources_of(part) for part in otherParts):
+            cursor.execute(
+                f"SELECT ticker, {', '.join(COMPANY_COLUMNS)} FROM Companies"
+            )
+            companies = {
+                row[0]: dict(zip(COMPANY_COLUMNS, row[1:])) for row in cursor.fetchall()
+            }
+        cursor.close()
+
+    finally:
+        conn.close()
+
+    arguments = []
+    where = " AND ".join(to_sql(part, arguments) for part in priceParts) or None
+    matches = select_prices(
+        ("ticker", "date"),
+        tickers=tickers,
+        startDate=startDate,
+        endDate=endDate,
+        where=where,
+        whereArguments=tuple(arguments),
+        databasePath=databasePath,
+    )
+    narrowed = tickers is not None or where is not None
+
+    returnParts = [part for part in otherParts if sources_of(part) == {"returns"}]
+    if returnParts and matches and returns_up_to_date(endDate, databasePath):
+        # conditions only on the daily returns are applied in a query on 'DailyReturns', like those on the prices
+        otherParts = [part for part in otherParts if sources_of(part) != {"returns"}]
+        arguments = []
+        returned = set(
+            select_returns(
+                ("ticker", "date"),
+                tickers,
+                startDate,
+                endDate,
+                where=" AND ".join(to_sql(part, arguments) for part in returnParts),
+                whereArguments=tuple(arguments),
+                databasePath=databasePath,
+            )
+        )
+        matches = [match for match in matches if match in returned]
+        narrowed = True
+
+    if otherParts and matches:
+        # only the tickers that matched everything else need their histories read
+        candidates = sorted({ticker for ticker, _ in matches})
+        if not narrowed:
+            candidates = None  # every ticker, so there is no need to list them
+        histories = None
+        wanted = set().union(*(indicators_used(part) for part in otherParts))
+        stored = stored_indicators(databasePath) & wanted if wanted else set()
+        wantedReturns = set().union(*(returns_used(part) for part in otherParts))
+        if wantedReturns and returns_up_to_date(endDate, databasePath):
+            stored |= wantedReturns
+        if stored:
+            histories = read_histories(
+                otherParts + priceParts,
+                stored,
+                candidates,
+                startDate,
+                endDate,
+                companies,
+                databasePath,
+            )
+        if histories is None:  # nothing stored, or not up to date for these dates
+            histories = read_histories(
+                otherParts + priceParts,
+                set(),
+                candidates,
+                startDate,
+                endDate,
+                companies,
+                databasePath,
+            )
+
+        matched = np.ones(len(histories.dates), dtype=bool)
+        for part in otherParts + priceParts:
+            matched &= np.asarray(evaluate(part, histories)) == 1
+        matched &= histories.dates >= startDate
+        matches = list(
+            zip(histories.tickers[matched].tolist(), histories.dates[matched].tolist())
+        )
+
+    results = {}
+    for ticker, matchDate in sorted(matches):
+        results.setdefault(ticker, []).append(matchDate)
+    return results
@@ -1,12 +1,16 @@
 import sqlite3
 
+QUOTE_URL = "https://polygon.io/quote/{ticker}"
 
-def call_ticker_current(ticker: str) -> list:
+
+def call_ticker_current(ticker: str, quoteUrl: str = QUOTE_URL) -> list:
     """
     Fetches the current stock data for a given ticker by webscraping the Polygon.io site.
 
     Parameters:
         - ticker (str): The ticker symbol of the stock.
+        - quoteUrl (str): The address of the quote page, with {ticker} in place of the ticker. Defaults to the
+          Polygon.io site; the watchlist poller can point it elsewhere (e.g. a local stand-in server).
 
     Returns:
         - list: A list containing the current stock data.
@@ -27,11 +31,8 @@ def call_ticker_current(ticker: str) -> list:
         - NameError: If the provided ticker yields a non-200 status code response from the Polygon.io API.
 
     Dependencies:
-        - bs4 (BeautifulSoup): For parsing HTML content.
-        - re (Regular Expression): For pattern matching.
-        - datetime: For capturing the current date and time.
-        - json: For parsing JSON data.
         - requests: For making HTTP requests.
+        - parse_quote_page: For reading the data out of the page (with bs4, re, datetime and json).
 
     Note:
         - The function uses web scraping to retrieve real-time stock data from Polygon.io.
@@ -42,52 +43,69 @@ def call_ticker_current(ticker: str) -> list:
         'currentLow': 2740.10, 'currentVolume': 1248000, 'prevClose': 2745.98, 'currentPrice': 2768.99,
         'currentPercentageChange': '+0.85%'}]
     """
+    import requests
+
+    response = requests.get(quoteUrl.format(ticker=ticker))
+
+    if response.status_code == 200:
+        return parse_quote_page(ticker, response.text)
+
+    else:
+        raise NameError(f"Provided ticker yielded {response.status_code} response")
+
+
+def parse_quote_page(ticker: str, responseContents: str) -> list:
+    """
+    Reads the current stock data out of a Polygon.io quote page, in the format returned by call_ticker_current.
+
+    Parameters:
+        - ticker (str): The ticker symbol of the stock.
+        - responseContents (str): The HTML of the quote page.
+
+    Returns:
+        - list: [date, data], as returned by call_ticker_current.
+
+    Raises:
+        - AttributeError: If the page does not hold a quote.
+    """
     from bs4 import BeautifulSoup
     import re
     import datetime
     import json
-    import requests
 
     finalData = [(str(datetime.datetime.now())[:10]), {}]
     finalData[1]["ticker"] = ticker
 
-    response = requests.get(f"https://polygon.io/quote/{ticker}")
-
-    if response.status_code == 200:
-        responseContents = response.text
-        soup = BeautifulSoup(responseContents, "html.parser")
-
-        currentPriceElement = soup.find(
-            "title"
-        )  # the current price is found from the title of the webpage, along with percentage change from open
-        if currentPriceElement:
-            currentPriceRaw = currentPriceElement.text.strip()
-            pattern = r"(-\d+\.\d{2}%|\+\d+\.\d{2}%) (\d+\.?\d+?)"  # first group is for the percentage, accounting for a +ve & -ve. second group for current price
-            currentPercentageChange = re.search(pattern, currentPriceRaw).group(1)
-            currentPriceValue = float(re.search(pattern, currentPriceRaw).group(2))
-
-        data = soup.find(
-            id="__NEXT_DATA__"
-        ).text  # data is held within a json inside a script tag in the html
-        data = json.loads(data)
-        currentOpen = data["props"]["pageProps"]["open"]
-        prevClose = data["props"]["pageProps"]["close"]
-        currentHigh = data["props"]["pageProps"]["high"]
-        currentLow = data["props"]["pageProps"]["low"]
-        currentVolume = data["props"]["pageProps"]["volume"]
-
-        finalData[1]["currentOpen"] = currentOpen
-        finalData[1]["currentHigh"] = currentHigh
-        finalData[1]["currentLow"] = currentLow
-        finalData[1]["currentVolume"] = currentVolume
-        finalData[1]["prevClose"] = prevClose
-        finalData[1]["currentPrice"] = currentPriceValue
-        finalData[1]["currentPercentageChange"] = currentPercentageChange
-
-        return finalData
-
-    else:
-        raise NameError(f"Provided ticker yielded {response.status_code} response")
+    soup = BeautifulSoup(responseContents, "html.parser")
+
+    currentPriceElement = soup.find(
+        "title"
+    )  # the current price is found from the title of the webpage, along with percentage change from open
+    if currentPriceElement:
+        currentPriceRaw = currentPriceElement.text.strip()
+        pattern = r"(-\d+\.\d{2}%|\+\d+\.\d{2}%) (\d+\.?\d+?)"  # first group is for the percentage, accounting for a +ve & -ve. second group for current price
+        currentPercentageChange = re.search(pattern, currentPriceRaw).group(1)
+        currentPriceValue = float(re.search(pattern, currentPriceRaw).group(2))
+
+    data = soup.find(
+        id="__NEXT_DATA__"
+    ).text  # data is held within a json inside a script tag in the html
+    data = json.loads(data)
+    currentOpen = data["props"]["pageProps"]["open"]
+    prevClose = data["props"]["pageProps"]["close"]
+    currentHigh = data["props"]["pageProps"]["high"]
+    currentLow = data["props"]["pageProps"]["low"]
+    currentVolume = data["props"]["pageProps"]["volume"]
+
+    finalData[1]["currentOpen"] = currentOpen
+    finalData[1]["currentHigh"] = currentHigh
+    finalData[1]["currentLow"] = currentLow
+    finalData[1]["currentVolume"] = currentVolume
+    finalData[1]["prevClose"] = prevClose
+    finalData[1]["currentPrice"] = currentPriceValue
+    finalData[1]["currentPercentageChange"] = currentPercentageChange
+
+    return finalData
 
 def check_company_exists(company: str):
         conn = sqlite3.connect("data/main.sql")
@@ -139,6 +157,11 @@ def search_by_date_and_company(company: str, date: str) -> dict:
                 - "high": Highest stock price on the specified date.
                 - "volume": Trading volume on the specified date.
                 - "weighted_volume": Weighted trading volume on the specified date.
+                - "previous_close": Closing stock price on the previous trading day.
+                - "change": Change in the closing price since the previous trading day.
+                - "percentage_change": The change as a percentage of the previous close.
+                These last three are read from the 'DailyReturns' table (see DatabaseHandling/dailyReturns.py),
+                and are None if it has not been built, or on the company's first stored day.
 
     Raises:
         ValueError: If data is not available for the specified company on the given date.
@@ -150,11 +173,13 @@ def search_by_date_and_company(company: str, date: str) -> dict:
 
         - SQLite3 is required for database operations. Ensure the 'data/main.sql' database exists with the necessary table 'StockPrices'.
           The table should have columns: 'ticker', 'date', 'close', 'open', 'high', 'volume', and 'weighted_volume'.
+          It is read through select_prices, so any of the storage layouts in storageLayout.py can be used.
 
     Example:
         ```
         >>> search_by_date_and_company("AAPL", "2023-01-01")
-        {"close": 150.0, "open": 145.0, "high": 155.0, "volume": 1000000, "weighted_volume": 500000.0}
+        {"close": 150.0, "open": 145.0, "high": 155.0, "volume": 1000000, "weighted_volume": 500000.0,
+         "previous_close": 148.5, "change": 1.5, "percentage_change": 1.0101}
         ```
     """
     from datetime import datetime
@@ -174,86 +199,110 @@ def search_by_date_and_company(company: str, date: str) -> dict:
             "currentVolume": data["currentVolume"],
             "open": data["currentOpen"],
         }
-    try:
-        conn = sqlite3.connect("data/main.sql")
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT close, open, high, volume, weighted_volume FROM StockPrices WHERE ticker = ? AND date = ?",
-            (company, date),
+    from DatabaseHandling.priceStore import select_prices
+
+    result = select_prices(
+        ("close", "open", "high", "volume", "weighted_volume"),
+        tickers=[company],
+        startDate=date,
+        endDate=date,
+    )
+    if result == None or result == []:
+        raise ValueError(
+            f"Data is not available for {company} on {date}. The market may have been closed, or data for that company is not available"
         )
-        result = cursor.fetchall()
-        if result == None or result == []:
-            raise ValueError(
-                f"Data is not available for {company} on {date}. The market may have been closed, or data for that company is not available"
-            )
-        return {
-            "close": result[0][0],
-            "open": result[0][1],
-            "high": result[0][2],
-            "volume": result[0][3],
-            "weighted_volume": result[0][4]
-        }
-
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
-
-def search_by_metrics():
-    # these results need to be saved locally in txt
-
-    # possible  metrics to search by:
-
-    # Closing Price: Allow users to search for companies based on their closing stock prices on specific dates.
-    # Opening Price: Similar to closing price but for the opening price.
-    # High and Low Prices: Users can search for companies based on the highest and lowest stock prices on specific dates.
-    # Volume: Provide the ability to search for companies based on their trading volume on specific dates.
-    # Market Capitalization Metrics:
-
-    # Market Cap: Users can search for companies based on their market capitalization, which is the total market value of their outstanding shares.
-    # Financial Ratios:
-
-    # Price-to-Earnings (P/E) Ratio: Allow users to search for companies with specific P/E ratios, which can indicate a company's valuation relative to its earnings.
-    # Price-to-Sales (P/S) Ratio: Similar to P/E ratio but based on revenue.
-    # Price-to-Book (P/B) Ratio: Indicate a company's valuation relative to its book value.
-    # Dividend Yield: Users can search for companies with specific dividend yields, which is the dividend income relative to the stock price.
-    # Performance Metrics:
-
-    # Return on Investment (ROI): Users may want to search for companies based on their historical ROI over specific periods.
-    # Earnings per Share (EPS): Allow users to search for companies with specific EPS values.
-    # Revenue Growth: Provide the ability to search for companies based on their revenue growth rates.
-    # Market Index Metrics:
-
-    # Comparison to Market Indices: Users can search for companies that outperformed or underperformed market indices like the S&P 500.
-    # Technical Indicators:
-
-    # Moving Averages: Allow users to search for companies that have recently crossed specific moving average lines.
-    # Relative Strength Index (RSI): Users can search for companies based on their RSI values, indicating overbought or oversold conditions.
-    # Volatility Metrics:
-
-    # Historical Volatility: Users may want to search for companies with specific historical volatility levels.
-    # Implied Volatility: Search for companies with specific implied volatility levels for options trading.
-    # Fundamental Metrics:
+    from DatabaseHandling.dailyReturns import (
+        compute_returns,
+        returns_up_to_date,
+        select_returns,
+    )
+
+    # worked out from the prices if 'DailyReturns' has not been brought up to date
+    select = select_returns if returns_up_to_date(date) else compute_returns
+    returns = select(
+        ("previous_close", "change", "percentage_change"),
+        tickers=[company],
+        startDate=date,
+        endDate=date,
+    )
+    previousClose, change, percentageChange = returns[0] if returns else (None, None, None)
+    return {
+        "close": result[0][0],
+        "open": result[0][1],
+        "high": result[0][2],
+        "volume": result[0][3],
+        "weighted_volume": result[0][4],
+        "previous_close": previousClose,
+        "change": change,
+        "percentage_change": percentageChange,
+    }
+
+
+def search_by_metrics(
+    expression: str,
+    startDate: str,
+    endDate: str = None,
+    saveToFile: bool = True,
+    databasePath: str = "data/main.sql",
+) -> dict:
+    """
+    Searches every stored company for those matching conditions on their prices and technical indicators.
 
-    # Debt-to-Equity Ratio: Users can search for companies with specific debt-to-equity ratios, indicating their financial leverage.
-    # Profit Margin: Allow users to search for companies with specific profit margin percentages.
-    # Dividend Metrics:
+    Parameters:
+        expression (str): The conditions, e.g. "close > sma_50 AND volume > 2 * avg_volume_20 AND sector = 'Technology'".
+                          See DatabaseHandling.screener.screen for everything that can be used: the price columns,
+                          sector, moving averages (sma_n, avg_volume_n), return_n, rsi_n, volatility_n and
+                          crosses_above/crosses_below.
+        startDate (str): The date to search (YYYY-MM-DD), or the first date of a range.
+        endDate (str): Optional. The last date of the range.
+        saveToFile (bool): If True, the results are also saved to a txt file in DatabaseHandling/SortSearchResults.
+        databasePath (str): The path of the SQLite database.
 
-    # Dividend History: Users can search for companies with specific dividend payment histories or dividend growth rates.
-    # Economic Indicators:
+    Returns:
+        dict: ticker -> list of the dates it matched on.
 
-    # Interest Rates: Allow users to search for companies in specific interest rate environments.
-    # Sector and Industry Metrics:
+    Raises:
+        ValueError: If a date is invalid, or the expression cannot be understood.
 
-    # Sector Performance: Users can search for companies within specific sectors or industries.
-    # Industry Metrics: Provide industry-specific metrics such as same-store sales growth for retail companies.
-    # Custom Metrics:
+    Note:
+        Fundamental metrics (market cap, P/E, dividends...) and implied volatility are not stored, so they cannot
+        be searched by yet.
 
-    # Allow users to define custom metrics or combinations of metrics to search for companies that meet their specific criteria.
-    # Adding these metrics to your search functionality will make your finance app more versatile and useful for a wide range of investors and traders who have different investment strategies and preferences.
-    pass
+    Example:
+        ```
+        >>> search_by_metrics("rsi_14 < 30 AND sector = 'Technology'", "2023-06-01")
+        {'INTC': ['2023-06-01']}
+        ```
+    """
+    from datetime import datetime
+    from DatabaseHandling.screener import screen
+
+    check_date_validity(startDate)
+    if endDate is not None:
+        check_date_validity(endDate)
+        if endDate < startDate:
+            raise ValueError("The end date must not be before the start date")
+
+    results = screen(expression, startDate, endDate, databasePath)
+
+    if saveToFile:
+        import os
+
+        folderPath = os.path.join(os.getcwd(), "DatabaseHandling/SortSearchResults")
+        os.makedirs(folderPath, exist_ok=True)
+        fileName = f"{datetime.today().date()}-metrics"
+        filePath = os.path.join(folderPath, fileName + ".txt")
+        count = 1
+        while os.path.exists(filePath):  # never overwrite an earlier search
+            filePath = os.path.join(folderPath, f"{fileName}{count}.txt")
+            count += 1
+
+        with open(filePath, "w") as file:
+            file.write(f"{expression}\nfrom {startDate} to {endDate or startDate}\n\n")
+            for ticker, dates in results.items():
+                file.write(f"{ticker}: {', '.join(dates)}\n")
+
+    return results
 
 
 # search with metrics
@@ -0,0 +1,306 @@
+import sqlite3
+
+# Sector indices, kept in the 'SectorIndices' table with one row per (sector, weighting, date), so that comparing
+# sectors (on the graph and sort screens) reads a few stored series rather than every member's prices.
+#
+# A sector's members are the companies with that sector in the 'Companies' table, so a company added later is
+# included. Each day's sector return is worked out from its members' daily returns (from 'DailyReturns'):
+#   equal   the mean of the members' returns
+#   volume  the members' returns weighted by their dollar volume (close * volume) that day, so a member's weight
+#           does not depend on its share price
+# Each index starts at BASE_VALUE on the sector's first day and is compounded by its daily return, so the return of
+# a sector over a range is the index's value at the end over its value before the start.
+#
+# The indices are brought up to date after each ingest by update_sector_indices: only the dates from the ingested one
+# on are worked out, carrying on from each index's value the day before. When a company is added its sector's indices
+# are worked out again in full, as its history changes the sector's past returns.
+
+SECTOR_WEIGHTINGS = ("equal", "volume")
+BASE_VALUE = 100.0
+
+
+def ensure_sector_table(conn: sqlite3.Connection):
+    """Creates the 'SectorIndices' table if it does not exist."""
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS SectorIndices (
+            sector TEXT NOT NULL,
+            weighting TEXT NOT NULL,
+            date DATE NOT NULL,
+            value REAL NOT NULL,
+            return REAL NOT NULL,
+            members INTEGER NOT NULL,
+            PRIMARY KEY (sector, weighting, date)
+        ) WITHOUT ROWID
+    """
+    )  # keyed so that one index over a date range is read in date order
+    cursor.close()
+
+
+def _daily_sector_returns(
+    startDate: str = None, sectors=None, databasePath: str = "data/main.sql"
+):
+    """
+    Works out every sector's daily return, under each weighting, from its members' daily returns.
+
+    Returns:
+        - pandas.DataFrame: One row per (sector, weighting, date) with a member's return, with the columns sector,
+          weighting, date, return and members (the number of members with a return that day), sorted by date.
+    """
+    import pandas as pd
+    from DatabaseHandling.companies import sector_members
+    from DatabaseHandling.dailyReturns import select_returns
+    from DatabaseHandling.priceStore import select_prices
+
+    members = sector_members(databasePath)
+    if sectors is not None:
+        members = {sector: members.get(sector, []) for sector in sectors}
+    sectorOf = {
+        ticker: sector for sector, tickers in members.items() for ticker in tickers
+    }
+    tickers = list(sectorOf) if sectors is not None else None
+    columns = ["sector", "weighting", "date", "return", "members"]
+    if not sectorOf:
+        return pd.DataFrame(columns=columns)
+
+    returns = pd.DataFrame(
+        select_returns(
+            ("date", "ticker", "percentage_change"),
+            tickers=tickers,
+            startDate=startDate,
+            where="percentage_change IS NOT NULL",
+            databasePath=databasePath,
+        ),
+        columns=["date", "ticker", "return"],
+    )
+    prices = pd.DataFrame(
+        select_prices(
+            ("date", "ticker", "close", "volume"),
+            tickers=tickers,
+            startDate=startDate,
+            databasePath=databasePath,
+        ),
+        columns=["date", "ticker", "close", "volume"],
+    )
+    frame = returns.merge(prices, on=["date", "ticker"], how="left")
+    frame["sector"] = frame["ticker"].map(sectorOf)
+    frame = frame.dropna(subset=["sector"])
+    frame["weight"] = (frame["close"] * frame["volume"]).fillna(0)
+    frame["weighted"] = frame["return"] * frame["weight"]
+
+    grouped = frame.groupby(["sector", "date"])
+    equal = grouped["return"].mean()
+    weights = grouped["weight"].sum()
+    # a day with no volumes for a sector falls back to the equal weighting
+    volume = (grouped["weighted"].sum() / weights.where(weights > 0)).fillna(equal)
+    counts = grouped.size()
+
+    parts = []
+    for weighting, values in (("equal", equal), ("volume", volume)):
+        parts.append(
+            pd.DataFrame({"return": values, "members": counts})
+            .reset_index()
+            .assign(weighting=weighting)
+        )
+    return pd.concat(parts, ignore_index=True)[columns].sort_values(
+        "date", kind="stable"
+    )
+
+
+def update_sector_indices(
+    sectors=None, fromDate: str = None, databasePath: str = "data/main.sql"
+) -> int:
+    """
+    Brings 'SectorIndices' up to date with the stored daily returns.
+
+    Parameters:
+        - sectors (iterable): Optional. Only these sectors' indices, e.g. after adding a company to one. Defaults to
+          every sector.
+        - fromDate (str): Optional. Work the indices out again from this date (yyyy-mm-dd), carrying on from their
+          values before it. By default, every sector's indices carry on from the last date stored, and the indices of
+          the given sectors are worked out again in full.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - int: The number of (sector, weighting, date) rows written.
+
+    Raises:
+        sqlite3.Error: If there is an error while reading or writing the database.
+
+    Note:
+        - Reads the 'DailyReturns' table, so run update_daily_returns first.
+        - The first time this runs every index is worked out in full.
+
+    Example:
+        ```
+        >>> update_sector_indices()  # after backfill has ingested a new date
+        36
+        ```
+    """
+    from datetime import date, timedelta
+    from config import DATABASE_BUSY_TIMEOUT
+
+    conn = sqlite3.connect(databasePath, timeout=DATABASE_BUSY_TIMEOUT)
+    try:
+        ensure_sector_table(conn)
+        cursor = conn.cursor()
+
+        startDate = fromDate
+        sectorCondition, sectorArguments = "", []
+        if sectors is not None:
+            sectorArguments = list(sectors)
+            sectorCondition = (
+                f" AND sector IN ({', '.join('?' * len(sectorArguments))})"
+            )
+        elif fromDate is None:
+            cursor.execute("SELECT MAX(date) FROM SectorIndices")
+            lastDate = cursor.fetchone()[0]
+            if lastDate is not None:
+                startDate = str(date.fromisoformat(lastDate) + timedelta(days=1))
+
+        previous = {}  # (sector, weighting) -> the index's last value before startDate
+        if startDate is not None:
+            # SQLite takes the bare columns from the row with the MAX
+            cursor.execute(
+                f"SELECT sector, weighting, value, MAX(date) FROM SectorIndices WHERE date < ?{sectorCondition} GROUP BY sector, weighting",
+                [startDate, *sectorArguments],
+            )
+            previous = {
+                (sector, weighting): value
+                for sector, weighting, value, _ in cursor.fetchall()
+            }
+        cursor.execute(
+            f"DELETE FROM SectorIndices WHERE date >= ?{sectorCondition}",
+            [startDate or "", *sectorArguments],
+        )
+
+        frame = _daily_sector_returns(
+            startDate, sectorArguments if sectors is not None else None, databasePath
+        )
+        if frame.empty:
+            conn.commit()
+            cursor.close()
+            return 0
+
+        keys = list(zip(frame["sector"], frame["weighting"]))
+        startValues = [previous.get(key, BASE_VALUE) for key in keys]
+        growth = 1 + frame["return"] / 100
+        frame["value"] = (
+            growth.groupby([frame["sector"], frame["weighting"]]).cumprod()
+            * startValues
+        )
+
+        cursor.executemany(
+            "INSERT OR REPLACE INTO SectorIndices (sector, weighting, date, value, return, members) VALUES (?, ?, ?, ?, ?, ?)",
+            frame[["sector", "weighting", "date", "value", "return", "members"]]
+            .astype(object)
+            .itertuples(index=False, name=None),
+        )
+        conn.commit()
+        cursor.close()
+        return len(frame)
+
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+
+def select_sector_indices(
+    sectors=None,
+    startDate: str = None,
+    endDate: str = None,
+    weighting: str = "equal",
+    databasePath: str = "data/main.sql",
+) -> list:
+    """
+    Reads stored sector index values.
+
+    Parameters:
+        - sectors (iterable): Optional. Only these sectors. Defaults to every sector.
+        - startDate (str): Optional. Only values on or after this date (yyyy-mm-dd).
+        - endDate (str): Optional. Only values on or before this date (yyyy-mm-dd).
+        - weighting (str): One of SECTOR_WEIGHTINGS.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - list: (date, sector, value, return) tuples, sorted by sector then date. Empty if 'SectorIndices' has not
+          been built.
+
+    Raises:
+        ValueError: If the weighting is not known.
+
+    Example:
+        ```
+        >>> select_sector_indices(["Energy"], "2023-01-03", "2023-01-04")
+        [('2023-01-03', 'Energy', 176.94, -3.66), ('2023-01-04', 'Energy', 174.44, -1.41)]
+        ```
+    """
+    if weighting not in SECTOR_WEIGHTINGS:
+        raise ValueError(
+            f"Unknown weighting: {weighting}. Use one of {', '.join(SECTOR_WEIGHTINGS)}"
+        )
+    conditions = ["weighting = ?"]
+    arguments = [weighting]
+    if sectors is not None:
+        sectors = list(sectors)
+        conditions.append(f"sector IN ({', '.join('?' * len(sectors))})")
+        arguments.extend(sectors)
+    if startDate is not None:
+        conditions.append("date >= ?")
+        arguments.append(startDate)
+    if endDate is not None:
+        conditions.append("date <= ?")
+        arguments.append(endDate)
+
+    conn = sqlite3.connect(databasePath)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(1) FROM sqlite_master WHERE type = 'table' AND name = 'SectorIndices'"
+        )
+        if cursor.fetchone()[0] == 0:
+            cursor.close()
+            return []
+        cursor.execute(
+            f"SELECT date, sector, value, return FROM SectorIndices WHERE {' AND '.join(conditions)} ORDER BY sector, date",
+            arguments,
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+    finally:
+        conn.close()
+
+
+def sector_indices_up_to_date(
+    endDate: str, databasePath: str = "data/main.sql"
+) -> bool:
+    """
+    Returns True if 'DailyReturns' is up to date to endDate (see returns_up_to_date) and 'SectorIndices' has been
+    updated since, so that the sector indices can be read rather than worked out from every member's returns.
+    """
+    from DatabaseHandling.dailyReturns import returns_up_to_date, select_returns
+
+    if not returns_up_to_date(endDate, databasePath):
+        return False
+    latest = select_returns(
+        ("date",),
+        endDate=endDate,
+        orderBy="date",
+        descending=True,
+        limit=1,
+        databasePath=databasePath,
+    )
+    if not latest:
+        return False
+    return bool(
+        select_sector_indices(
+            startDate=latest[0][0], endDate=endDate, databasePath=databasePath
+        )
+    )
@@ -1,6 +1,23 @@
 import sqlite3
 from datetime import datetime, timedelta
 
+# metrics worked out from two price columns of the same row: metric -> the columns
+DERIVED_METRICS = {
+    "dollar_volume": ("close", "volume"),  # close * volume
+    "day_range": ("high", "low"),  # (high - low) as a percentage of the low
+}
+
+# metrics with one value per ticker over the whole date range, rather than one per ticker per date. They are
+# answered by each ticker's RangeIndex (see DatabaseHandling/rangeIndex.py) without scanning the range
+RANGE_METRICS = [
+    "total_volume",
+    "average_volume",
+    "range_return",  # percentage change of the close from the first to the last day
+    "range_high",  # highest high
+    "range_low",  # lowest low (or close, where no lows are stored)
+    "max_drawdown",  # largest fall of the close from a peak to a later trough, in %
+]
+
 
 class SortItems:
     """
@@ -13,28 +30,22 @@ class SortItems:
         startDate: str,
         sortMetric: str = "close",
         endDate: str = str(datetime.today().date() - timedelta(days=1)),
+        databasePath: str = "data/main.sql",
     ):
         self._startDate = startDate
         self._sortMetric = sortMetric.lower()
         self._endDate = endDate
         self._today = str(datetime.today().date())
         self._values = []
+        self._databasePath = databasePath
 
         self.__check_date_validity()
         # self.__check_sort_method()
         self.__check_sort_metric()
 
-        try:
-            self.conn = sqlite3.connect("data/main.sql")
-            self.cursor = self.conn.cursor()
-        except:
-            raise ConnectionError("Unable to open database at the specified path")
-
-        self.__select_values(self.__select_dates())
-
-        self.conn.commit()
-        self.cursor.close()
-        self.conn.close()
+        self._valuesLoaded = (
+            False  # values are only loaded when a full sort is requested, see top_n
+        )
 
     @property
     def sortMetric(self):
@@ -77,6 +88,7 @@ class SortItems:
         FileName = f"{self._today}-{self._sortMetric}.txt"
 
         folderPath = os.path.join(os.getcwd(), FolderName)
+        os.makedirs(folderPath, exist_ok=True)
 
         filePath = os.path.join(folderPath, FileName)
 
@@ -97,7 +109,21 @@ class SortItems:
                 file.write("\n")
 
     def __check_sort_metric(self):
-        sortMetrics = ["high", "close", "open", "volume", "weighted_volume"]
+        sortMetrics = (
+            [
+                "high",
+                "close",
+                "open",
+                "volume",
+                "weighted_volume",
+                "change",
+                "percentage_change",
+                "log_return",
+                "gap",
+            ]
+            + list(DERIVED_METRICS)
+            + RANGE_METRICS
+        )
         if self._sortMetric not in sortMetrics:
             raise ValueError("Invalid sort metric")
 
@@ -177,6 +203,201 @@ class SortItems:
             workingDate = workingDate + timedelta(days=1)
         return dates
 
+    def __check_lows_stored(self):
+        """
+        Check that lows are stored in the date range, for the metrics worked out from them.
+
+        Raises:
+            - ValueError: If none of the rows in the range has a low.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        from DatabaseHandling.priceStore import count_prices
+        from DatabaseHandling.storageLayout import ensure_schema
+
+        if "low" not in DERIVED_METRICS.get(self._sortMetric, ()):
+            return
+        # databases made before 'low' was stored lack the column
+        ensure_schema(self._databasePath)
+        if not count_prices(
+            startDate=self._startDate,
+            endDate=self._endDate,
+            where="{low} IS NOT NULL",
+            databasePath=self._databasePath,
+        ):
+            raise ValueError(
+                f"No lows are stored from {self._startDate} to {self._endDate}, so {self._sortMetric} cannot be "
+                "worked out. Fill them in with Fill In Lows on the preferences screen"
+            )
+
+    def __select(self, **kwargs) -> list:
+        """
+        Reads (date, ticker, sort metric) rows with select_prices, or for the daily return metrics (see
+        DatabaseHandling/dailyReturns.py) with select_returns, which reads them from the 'DailyReturns' table rather
+        than looking up each row's previous trading day. If that table is not up to date, they are worked out from
+        the prices with compute_returns instead. The derived metrics are worked out from their columns.
+        """
+        from DatabaseHandling.dailyReturns import (
+            RETURN_COLUMNS,
+            compute_returns,
+            returns_up_to_date,
+            select_returns,
+        )
+        from DatabaseHandling.priceStore import select_prices
+
+        if self._sortMetric in DERIVED_METRICS:
+            first, second = DERIVED_METRICS[self._sortMetric]
+            try:
+                rows = select_prices(
+                    ("date", "ticker", first, second),
+                    startDate=self._startDate,
+                    endDate=self._endDate,
+                    databasePath=self._databasePath,
+                    **kwargs,
+                )
+            except sqlite3.Error:
+                raise ConnectionError("Unable to open database at the specified path")
+            if self._sortMetric == "dollar_volume":
+                values = [
+                    (date, ticker, close * volume)
+                    for date, ticker, close, volume in rows
+                    if close is not None and volume is not None
+                ]
+            else:
+                values = [
+                    (date, ticker, (high - low) * 100 / low)
+                    for date, ticker, high, low in rows
+                    if high is not None and low
+                ]
+            return values
+
+        try:
+            if self._sortMetric not in RETURN_COLUMNS:
+                select = select_prices
+            elif returns_up_to_date(self._endDate, self._databasePath):
+                select = select_returns
+            else:
+                select = compute_returns
+            return select(
+                ("date", "ticker", self._sortMetric),
+                startDate=self._startDate,
+                endDate=self._endDate,
+                databasePath=self._databasePath,
+                **kwargs,
+            )
+        except sqlite3.Error:
+            raise ConnectionError("Unable to open database at the specified path")
+
+    def __select_volume_totals(self) -> dict:
+        """
+        Sums each ticker's volume over the range in one grouped query, through the layout-aware price_query.
+
+        Returns:
+            - dict: ticker -> (total volume, trading days), counting a missing volume as 0 as the RangeIndex does.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        from DatabaseHandling.priceStore import price_query
+
+        try:
+            # uri for the read-only archives
+            conn = sqlite3.connect(self._databasePath, uri=True)
+            try:
+                query, arguments, _ = price_query(
+                    conn,
+                    ("ticker", "volume"),
+                    startDate=self._startDate,
+                    endDate=self._endDate,
+                    databasePath=self._databasePath,
+                )
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"SELECT c0, SUM(COALESCE(c1, 0)), COUNT(1) FROM ({query}) GROUP BY c0",
+                    arguments,
+                )
+                rows = cursor.fetchall()
+                cursor.close()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            raise ConnectionError("Unable to open database at the specified path")
+        return {ticker: (int(total), days) for ticker, total, days in rows}
+
+    def __select_range_values(self) -> list:
+        """
+        Works out a range metric for every company: the volume metrics with one grouped query, and the others with
+        the range indexes of the cached price histories.
+
+        Returns:
+            - list: Dictionaries in the standard format, with the date range as the date, in ticker order.
+              Companies without data in the range are left out.
+        """
+        from DatabaseHandling.priceStore import PriceStore, price_store
+        import os
+
+        store = price_store
+        if os.path.abspath(price_store.databasePath) != os.path.abspath(
+            self._databasePath
+        ):
+            store = PriceStore(self._databasePath)
+
+        try:
+            conn = sqlite3.connect(self._databasePath)
+            cursor = conn.cursor()
+            cursor.execute("SELECT ticker FROM Companies ORDER BY ticker")
+            tickers = [row[0] for row in cursor.fetchall()]
+            conn.close()
+        except sqlite3.Error:
+            raise ConnectionError("Unable to open database at the specified path")
+
+        if self._sortMetric in ("total_volume", "average_volume"):
+            # additive, so one grouped query answers every ticker without loading any histories
+            totals = self.__select_volume_totals()
+            values = []
+            for ticker in tickers:
+                if ticker not in totals:
+                    continue
+                total, days = totals[ticker]
+                value = total if self._sortMetric == "total_volume" else total / days
+                values.append(
+                    {
+                        "date": f"{self._startDate} to {self._endDate}",
+                        "ticker": ticker,
+                        self._sortMetric: value,
+                    }
+                )
+            return values
+
+        values = []
+        for ticker in tickers:
+            index = store.range_index(ticker, self._startDate)
+            start, end = self._startDate, self._endDate
+            if self._sortMetric == "total_volume":
+                value = index.total_volume(start, end)
+            elif self._sortMetric == "average_volume":
+                value = index.average_volume(start, end)
+            elif self._sortMetric == "range_return":
+                value = index.percentage_return(start, end)
+            elif self._sortMetric == "range_high":
+                value = index.highest("high", start, end)
+            elif self._sortMetric == "range_low":
+                value = index.lowest("low", start, end)
+                if value is None:  # rows stored before 'low' was, see docs/ToDo.md
+                    value = index.lowest("close", start, end)
+            else:
+                value = index.max_drawdown(start, end)
+            if value is not None:
+                values.append(
+                    {
+                        "date": f"{start} to {end}",
+                        "ticker": ticker,
+                        self._sortMetric: value,
+                    }
+                )
+        return values
+
     def __select_values(self, dates):
         """Standard format:
         [
@@ -186,52 +407,100 @@ class SortItems:
         ]
         Note: if market closed on a day, instead of a dictionary, a string "data not available for yyyy-mm-dd"
 
+        The whole range is read with one query on the date index, rather than one query per date, through
+        select_prices so that it works whichever storage layout the database is in.
         """
+        result = self.__select(orderBy="date")
+
+        datesWithData = set()
+        for date, ticker, value in result:
+            datesWithData.add(date)
+            self._values.append(
+                {
+                    "date": date,
+                    "ticker": ticker,
+                    self._sortMetric: value,
+                }
+            )
 
         for date in dates:
-            # this is done like this because I was not able to set variable select parameters
+            if date not in datesWithData:
+                print(f"Data not available for {date}")
 
-            # perhaps possible if I use an f string query first??
+    def __ensure_values(self):
+        if not self._valuesLoaded:
+            self.__check_lows_stored()
+            if self._sortMetric in RANGE_METRICS:
+                self._values = self.__select_range_values()
+            else:
+                self.__select_values(self.__select_dates())
+            self._valuesLoaded = True
 
-            if self._sortMetric == "open":
-                self.cursor.execute(
-                    "SELECT open, ticker FROM StockPrices WHERE date = ?", (date,)
-                )
+    def top_n(self, n: int = 10, saveToFile: bool = True) -> list:
+        """
+        Find the n largest values of the sort metric in the date range, without loading and sorting every value.
 
-            elif self._sortMetric == "close":
-                self.cursor.execute(
-                    "SELECT close, ticker FROM StockPrices WHERE date = ?", (date,)
-                )
+        Parameters:
+            - n (int): The number of results to return.
+            - saveToFile (bool): If True, the results are written to the results folder like a full sort.
 
-            elif self._sortMetric == "high":
-                self.cursor.execute(
-                    "SELECT high, ticker FROM StockPrices WHERE date = ?", (date,)
-                )
+        Returns:
+            - list: Up to n dictionaries in the standard format, in ascending order (the same order as the end
+              of a full sort, so result[-10:] of a sort and top_n(10) are interchangeable).
 
-            elif self._sortMetric == "volume":
-                self.cursor.execute(
-                    "SELECT volume, ticker FROM StockPrices WHERE date = ?", (date,)
-                )
+        Note:
+            - For the leaderboard metrics (see DatabaseHandling/leaderboards.py) the per-day leaderboards are
+              merged, so no price rows are read at all.
+            - Otherwise SQLite keeps only the n best rows while scanning the date range, so this stays fast when
+              the full universe is stored and a full sort would have millions of values.
+            - For the range metrics there is one value per company, and the n largest are picked with heapq.
+        """
+        return self.__best_n(n, False, saveToFile)
 
-            elif self._sortMetric == "weighted_volume":
-                self.cursor.execute(
-                    "SELECT weighted_volume, ticker FROM StockPrices WHERE date = ?",
-                    (date,),
-                )
+    def bottom_n(self, n: int = 10, saveToFile: bool = True) -> list:
+        """
+        Find the n smallest values of the sort metric in the date range (e.g. the biggest losers), like top_n.
 
-            result = self.cursor.fetchall()
-            count = 0
-            if result == []:
-                print(f"Data not available for {date}")
-            while count < len(result):
-                self._values.append(
-                    {
-                        "date": date,
-                        "ticker": result[count][1],
-                        self._sortMetric: result[count][0],
-                    }
+        Returns:
+            - list: Up to n dictionaries in the standard format, in ascending order (the same order as the start
+              of a full sort).
+        """
+        return self.__best_n(n, True, saveToFile)
+
+    def __best_n(self, n: int, smallest: bool, saveToFile: bool) -> list:
+        import heapq
+        from DatabaseHandling.leaderboards import top_from_leaderboards
+
+        pick = heapq.nsmallest if smallest else heapq.nlargest
+        self.__check_lows_stored()
+        if self._sortMetric in RANGE_METRICS:
+            self.__ensure_values()
+            values = pick(n, self._values, key=lambda item: item[self._sortMetric])
+        else:
+            result = top_from_leaderboards(
+                self._sortMetric,
+                self._startDate,
+                self._endDate,
+                n,
+                smallest,
+                self._databasePath,
+            )
+            if result is None and self._sortMetric in DERIVED_METRICS:
+                result = pick(n, self.__select(), key=lambda row: row[2])
+            elif result is None:
+                result = self.__select(
+                    orderBy=self._sortMetric, descending=not smallest, limit=n
                 )
-                count += 1
+            values = [
+                {"date": date, "ticker": ticker, self._sortMetric: value}
+                for date, ticker, value in result
+            ]
+
+        if not smallest:
+            values.reverse()  # best first, so the largest ends up last
+        if saveToFile:
+            self.__write_results_to_file(values)
+        return values
 
     @property
     def sortMetric(self):
@@ -240,7 +509,11 @@ class SortItems:
     def bubble_sort(self):
         # checker = sorted(self.values, key=lambda x: x[self._sortMetric])
 
+        self.__ensure_values()
         values = self._values[:]  # copy of self.values
+        if not values:  # nothing stored in the range
+            self.__write_results_to_file(values)
+            return values
 
         swapMade = True
         while swapMade:
@@ -325,6 +598,10 @@ class SortItems:
                         newList.append(toBeSorted[index + 2])
                 return newList
 
+        self.__ensure_values()
+        if not self._values:  # nothing stored in the range
+            self.__write_results_to_file([])
+            return []
         values = [[x] for x in self._values]
         while len(values[0]) != len(self._values):
             values = controller(self._sortMetric, values)
@@ -0,0 +1,349 @@
+import sqlite3
+from functools import lru_cache
+
+# The storage layouts 'StockPrices' can be in:
+#   rowid     - the original table, with a surrogate 'priceid' key. Rows are stored in insertion order, which is
+#               date-major, so one ticker's history is spread over roughly one page per stored date.
+#   clustered - a WITHOUT ROWID table keyed on (ticker, date). Rows are stored in key order, so one ticker's
+#               history sits on a handful of neighbouring pages. Same columns (minus 'priceid'), so every
+#               existing query works unchanged.
+#   compact   - the clustered layout with every value stored as an integer: prices in ten-thousandths of a
+#               dollar, dates as days since 1970-01-01 and tickers as ids into a 'Tickers' table. The rows live in
+#               'PriceBars', and 'StockPrices' becomes a view that decodes them (with a trigger so that inserts
+#               still work), so ad hoc queries keep working. Reads that need to be fast should go through
+#               DatabaseHandling.priceStore.select_prices, which filters and sorts on the encoded columns.
+
+PRICE_SCALE = (
+    10000  # prices are stored in ten-thousandths of a dollar in the compact layout
+)
+PRICE_COLUMNS = ("open", "close", "high", "low", "weighted_volume")
+
+# column name -> (expression that decodes it, expression to filter and sort on) for the compact layout
+COMPACT_SOURCE = "PriceBars JOIN Tickers ON Tickers.tickerid = PriceBars.tickerid"
+COMPACT_COLUMNS = {
+    "ticker": ("Tickers.ticker", "Tickers.ticker"),
+    "date": ("date(PriceBars.day * 86400, 'unixepoch')", "PriceBars.day"),
+    "volume": ("PriceBars.volume", "PriceBars.volume"),
+}
+for column in PRICE_COLUMNS:
+    COMPACT_COLUMNS[column] = (
+        f"PriceBars.{column} / {PRICE_SCALE}.0",
+        f"PriceBars.{column}",
+    )
+
+
+def encode_date(date: str) -> int:
+    """Converts a yyyy-mm-dd date to the day number stored by the compact layout."""
+    from datetime import date as Date
+
+    return (Date.fromisoformat(date) - Date(1970, 1, 1)).days
+
+
+@lru_cache(maxsize=None)  # only one entry per stored date, and every ticker shares them
+def decode_date(day: int) -> str:
+    """Converts a day number stored by the compact layout back to a yyyy-mm-dd date."""
+    from datetime import date as Date, timedelta
+
+    return str(Date(1970, 1, 1) + timedelta(days=day))
+
+
+def layout_expressions(layout: str) -> tuple:
+    """
+    Describes how to read the rows of a storage layout.
+
+    Parameters:
+        - layout (str): 'rowid', 'clustered' or 'compact', as returned by detect_layout.
+
+    Returns:
+        - tuple: (source, selectExpression, rawExpression, encode), where source is what to select FROM,
+          selectExpression and rawExpression map a column name to the SQL to select it by and to filter and sort it
+          on, and encode converts a yyyy-mm-dd date to the form the raw date expression compares against.
+
+    Note:
+        - In the compact layout the date is selected as its day number, which the caller decodes with decode_date:
+          that is faster than SQLite's date().
+    """
+    if layout == "compact":
+        return (
+            COMPACT_SOURCE,
+            lambda column: COMPACT_COLUMNS[column][1 if column == "date" else 0],
+            lambda column: COMPACT_COLUMNS[column][1],
+            encode_date,
+        )
+    # the rowid and clustered layouts store the values as they are
+    return ("StockPrices", lambda column: column, lambda column: column, str)
+
+
+def detect_layout(conn: sqlite3.Connection) -> str:
+    """
+    Works out which storage layout 'StockPrices' is in.
+
+    Parameters:
+        - conn (sqlite3.Connection): An open connection to the database.
+
+    Returns:
+        - str: 'rowid', 'clustered' or 'compact'.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT type, sql FROM sqlite_master WHERE name = 'StockPrices'")
+    objectType, tableSql = cursor.fetchone()
+    cursor.close()
+    if objectType == "view":
+        return "compact"
+    if "WITHOUT ROWID" in tableSql.upper():
+        return "clustered"
+    return "rowid"
+
+
+def ensure_schema(databasePath: str = "data/main.sql"):
+    """
+    Brings an existing database up to the current schema. Safe to run on every start.
+
+    Parameters:
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        None
+
+    Raises:
+        sqlite3.Error: If there is an error while connecting to or altering the database.
+
+    Note:
+        - Adds the 'low' column to 'StockPrices' (NULL for rows stored before it existed).
+        - Adds the indexes that keep per-ticker range reads (graphs, search) and per-date reads (sort, status
+          checks) from scanning the whole table, which matters once the full universe is stored. The clustered
+          layout is already ordered by (ticker, date), so only the date index is added to it.
+    """
+    conn = sqlite3.connect(databasePath)
+    try:
+        layout = detect_layout(conn)
+        if layout == "compact":  # created with every column and index already
+            return
+
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA table_info(StockPrices)")
+        columns = [row[1] for row in cursor.fetchall()]
+        if "low" not in columns:
+            cursor.execute("ALTER TABLE StockPrices ADD COLUMN low REAL")
+
+        if layout == "rowid":
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_StockPrices_ticker_date ON StockPrices (ticker, date)"
+            )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_StockPrices_date ON StockPrices (date)"
+        )
+        conn.commit()
+        cursor.close()
+
+    finally:
+        conn.close()
+
+
+def migrate_to_clustered(databasePath: str = "data/main.sql"):
+    """
+    Rebuilds 'StockPrices' as a WITHOUT ROWID table clustered on (ticker, date).
+
+    Parameters:
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        None
+
+    Raises:
+        sqlite3.Error: If there is an error while connecting to or altering the database. The rebuild is done in
+        one transaction, so the original table is left untouched if it fails.
+
+    Note:
+        - Duplicate (ticker, date) rows, which the rowid layout allowed, are collapsed to the most recently
+          inserted one.
+        - The database is VACUUMed afterwards to return the space of the old table, so make sure nothing else
+          has it open. Back up data/main.sql first: the migration cannot be undone other than by restoring it.
+
+    Example:
+        ```
+        >>> migrate_to_clustered("data/main.sql")
+        ```
+    """
+    ensure_schema(databasePath)
+
+    conn = sqlite3.connect(databasePath, isolation_level=None)
+    try:
+        if detect_layout(conn) != "rowid":
+            return
+
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        cursor.execute(
+            """
+            CREATE TABLE StockPricesClustered (
+                ticker TEXT NOT NULL,
+                date DATE NOT NULL,
+                open REAL,
+                close REAL,
+                high REAL,
+                low REAL,
+                volume INTEGER,
+                weighted_volume REAL,
+                PRIMARY KEY (ticker, date),
+                FOREIGN KEY (ticker) REFERENCES Companies (ticker),
+                FOREIGN KEY (date) REFERENCES DateStatuses (date)
+            ) WITHOUT ROWID
+        """
+        )
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO StockPricesClustered
+            SELECT ticker, date, open, close, high, low, volume, weighted_volume
+            FROM StockPrices
+            ORDER BY ticker, date, priceid
+        """
+        )  # inserting in key order fills each page completely
+        cursor.execute("DROP TABLE StockPrices")  # also drops its indexes
+        cursor.execute("ALTER TABLE StockPricesClustered RENAME TO StockPrices")
+        cursor.execute(
+            "CREATE INDEX idx_StockPrices_date ON StockPrices (date)"
+        )  # per-date reads (sort, backfill status checks)
+        cursor.execute("COMMIT")
+
+        cursor.execute("VACUUM")
+        cursor.close()
+
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+    finally:
+        conn.close()
+
+
+def migrate_to_compact(databasePath: str = "data/main.sql"):
+    """
+    Re-encodes 'StockPrices' into the compact integer layout.
+
+    The rows are moved into 'PriceBars', a WITHOUT ROWID table clustered on (tickerid, day), with prices as
+    integer ten-thousandths of a dollar, and tickers moved into a 'Tickers' dimension table. 'StockPrices' is then
+    recreated as a view which decodes the rows, with an INSTEAD OF INSERT trigger that encodes new ones, so the
+    ingest functions and any ad hoc query keep working.
+
+    Parameters:
+        - databasePath (str): The path of the SQLite database, in the rowid or clustered layout.
+
+    Returns:
+        None
+
+    Raises:
+        sqlite3.Error: If there is an error while connecting to or altering the database. The rebuild is done in
+        one transaction, so the original table is left untouched if it fails.
+
+    Note:
+        - Prices are rounded to four decimal places. Nearly every price the API returns already fits: on
+          data/main.sql two highs change, each by less than $0.0001.
+        - As with migrate_to_clustered, back up data/main.sql first and make sure nothing else has it open.
+
+    Example:
+        ```
+        >>> migrate_to_compact("data/main.sql")
+        ```
+    """
+    ensure_schema(databasePath)
+
+    conn = sqlite3.connect(databasePath, isolation_level=None)
+    try:
+        if detect_layout(conn) == "compact":
+            return
+
+        encodedPrices = ", ".join(
+            f"CAST(round({column} * {PRICE_SCALE}) AS INTEGER)"
+            for column in PRICE_COLUMNS
+        )
+        newPrices = ", ".join(
+            f"CAST(round(NEW.{column} * {PRICE_SCALE}) AS INTEGER)"
+            for column in PRICE_COLUMNS
+        )
+        decodedColumns = ", ".join(
+            f"{COMPACT_COLUMNS[column][0]} AS {column}"
+            for column in (
+                "ticker",
+                "date",
+                "open",
+                "close",
+                "high",
+                "low",
+                "volume",
+                "weighted_volume",
+            )  # the column order of the original table
+        )
+
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        cursor.execute(
+            """
+            CREATE TABLE Tickers (
+                tickerid INTEGER PRIMARY KEY,
+                ticker TEXT NOT NULL UNIQUE
+            )
+        """
+        )
+        cursor.execute(
+            f"""
+            CREATE TABLE PriceBars (
+                tickerid INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                volume INTEGER,
+                {", ".join(f"{column} INTEGER" for column in PRICE_COLUMNS)},
+                PRIMARY KEY (tickerid, day),
+                FOREIGN KEY (tickerid) REFERENCES Tickers (tickerid)
+            ) WITHOUT ROWID
+        """
+        )
+        cursor.execute(
+            "INSERT INTO Tickers (ticker) SELECT DISTINCT ticker FROM StockPrices ORDER BY ticker"
+        )
+        cursor.execute(
+            f"""
+            INSERT OR REPLACE INTO PriceBars
+            SELECT Tickers.tickerid, CAST(julianday(StockPrices.date) - 2440587.5 AS INTEGER), volume, {encodedPrices}
+            FROM StockPrices JOIN Tickers ON Tickers.ticker = StockPrices.ticker
+            ORDER BY Tickers.tickerid, StockPrices.date
+        """
+        )
+        cursor.execute("DROP TABLE StockPrices")  # also drops its indexes
+        cursor.execute(
+            "CREATE INDEX idx_PriceBars_day ON PriceBars (day)"
+        )  # per-date reads (sort, backfill status checks)
+
+        cursor.execute(
+            f"CREATE VIEW StockPrices AS SELECT {decodedColumns} FROM {COMPACT_SOURCE}"
+        )
+        # The ticker is added with NOT EXISTS rather than INSERT OR IGNORE: an INSERT OR REPLACE into the view
+        # would override the trigger's conflict clause and give the ticker a new id, orphaning its old rows.
+        cursor.execute(
+            f"""
+            CREATE TRIGGER StockPricesInsert INSTEAD OF INSERT ON StockPrices
+            BEGIN
+                INSERT INTO Tickers (ticker)
+                SELECT NEW.ticker WHERE NOT EXISTS (SELECT 1 FROM Tickers WHERE ticker = NEW.ticker);
+                INSERT OR REPLACE INTO PriceBars (tickerid, day, volume, {", ".join(PRICE_COLUMNS)})
+                VALUES (
+                    (SELECT tickerid FROM Tickers WHERE ticker = NEW.ticker),
+                    CAST(julianday(NEW.date) - 2440587.5 AS INTEGER),
+                    NEW.volume,
+                    {newPrices}
+                );
+            END
+        """
+        )
+        cursor.execute("COMMIT")
+
+        cursor.execute("VACUUM")
+        cursor.close()
+
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+    finally:
+        conn.close()
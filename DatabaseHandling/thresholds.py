@@ -0,0 +1,607 @@
+import json
+import sqlite3
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+# Threshold alerts: rules kept in the 'AlertRules' table, checked against each ingested bar (through the ingest
+# pipeline's 'alerts' hook, see DatabaseHandling/ingestPipeline.py) and against live quotes. A rule fires when its
+# value crosses its threshold, i.e. it was on one side of it on the previous bar and is on (or at) the other side
+# now, and each firing is saved to 'AlertEvents'.
+#
+# Rule kinds (days is in trading days of that ticker):
+#   price         the close (or live price) crosses threshold, a price level
+#   move          the % change of the close over the last days crosses threshold (e.g. 5, or -5 for a fall)
+#   volume_spike  the volume as a multiple of its average over the days before crosses threshold (e.g. 3)
+# direction is 'above' (fires when the value rises to the threshold) or 'below' (when it falls to it).
+#
+# Rules are indexed by ticker, then by the value they watch (kind, days), then by direction, with the thresholds
+# sorted. A new bar is only looked at if its ticker has rules; each value is worked out once however many rules
+# watch it; and the rules crossed between its previous and new value are found with two binary searches, so
+# checking a bar costs O(log n) in its ticker's rules plus the rules that fire.
+#
+# The closes and volumes each ticker's rules need are kept in 'AlertState' (like 'IndicatorState'), so crossings
+# are found incrementally without reading the price history again.
+
+RULE_KINDS = ("price", "move", "volume_spike")
+DIRECTIONS = ("above", "below")
+QUOTE_KINDS = ("price", "move")  # a live quote has no full day's volume to compare
+RULE_COLUMNS = ("id", "ticker", "kind", "days", "threshold", "direction", "created")
+EVENT_COLUMNS = ("rule_id", "ticker", "date", "value", "message")
+
+
+def ensure_alert_tables(conn: sqlite3.Connection):
+    """Creates the 'AlertRules', 'AlertState' and 'AlertEvents' tables if they do not exist."""
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS AlertRules (
+            id INTEGER PRIMARY KEY,
+            ticker TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            days INTEGER NOT NULL DEFAULT 0,
+            threshold REAL NOT NULL,
+            direction TEXT NOT NULL,
+            created DATE,
+            enabled BOOLEAN NOT NULL DEFAULT true
+        )
+    """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS AlertState (
+            ticker TEXT PRIMARY KEY,
+            last_date DATE NOT NULL,
+            state TEXT NOT NULL
+        )
+    """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS AlertEvents (
+            rule_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            ticker TEXT NOT NULL,
+            value REAL,
+            message TEXT,
+            PRIMARY KEY (rule_id, date)
+        )
+    """
+    )  # a rule fires at most once a day, whether from a live quote or the day's bar
+    cursor.execute("CREATE INDEX IF NOT EXISTS AlertEventsDate ON AlertEvents (date)")
+    cursor.close()
+
+
+def add_rule(
+    ticker: str,
+    kind: str,
+    threshold: float,
+    direction: str = "above",
+    days: int = None,
+    databasePath: str = "data/main.sql",
+) -> int:
+    """
+    Adds a threshold alert rule.
+
+    Parameters:
+        - ticker (str): The ticker symbol the rule watches.
+        - kind (str): One of RULE_KINDS.
+        - threshold (float): The price level, % move or volume multiple.
+        - direction (str): 'above' or 'below'.
+        - days (int): The trading days of a 'move', or of the average volume of a 'volume_spike'. Not used for
+          'price'.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - int: The id of the new rule.
+
+    Raises:
+        ValueError: If the kind, direction or days are not valid.
+
+    Example:
+        ```
+        >>> add_rule("AAPL", "move", -5, "below", days=5)  # AAPL falls 5% over a week
+        3
+        ```
+    """
+    from datetime import datetime
+
+    if kind not in RULE_KINDS:
+        raise ValueError(
+            f"Unknown rule kind: {kind}. Use one of {', '.join(RULE_KINDS)}"
+        )
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Unknown direction: {direction}. Use 'above' or 'below'")
+    if kind == "price":
+        days = 0
+    elif days is None or int(days) < 1:
+        raise ValueError(f"A {kind} rule needs a number of days of at least 1")
+
+    from config import DATABASE_BUSY_TIMEOUT
+
+    conn = sqlite3.connect(databasePath, timeout=DATABASE_BUSY_TIMEOUT)
+    try:
+        ensure_alert_tables(conn)
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO AlertRules (ticker, kind, days, threshold, direction, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                ticker.upper(),
+                kind,
+                int(days),
+                float(threshold),
+                direction,
+                str(datetime.now().date()),
+            ),
+        )
+        ruleId = cursor.lastrowid
+        conn.commit()
+        cursor.close()
+        return ruleId
+
+    finally:
+        conn.close()
+
+
+def remove_rule(ruleId: int, databasePath: str = "data/main.sql"):
+    """Deletes a rule and the events it has fired."""
+    from config import DATABASE_BUSY_TIMEOUT
+
+    conn = sqlite3.connect(databasePath, timeout=DATABASE_BUSY_TIMEOUT)
+    try:
+        ensure_alert_tables(conn)
+        conn.execute("DELETE FROM AlertRules WHERE id = ?", (ruleId,))
+        conn.execute("DELETE FROM AlertEvents WHERE rule_id = ?", (ruleId,))
+        # a state no longer kept up to date would be out of date if the ticker was given a rule again
+        conn.execute(
+            "DELETE FROM AlertState WHERE ticker NOT IN (SELECT ticker FROM AlertRules WHERE enabled)"
+        )
+        conn.commit()
+
+    finally:
+        conn.close()
+
+
+def list_rules(databasePath: str = "data/main.sql") -> list:
+    """Returns every enabled rule as a tuple in the order of RULE_COLUMNS, by ticker."""
+    conn = sqlite3.connect(databasePath)
+    try:
+        ensure_alert_tables(conn)
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT {', '.join(RULE_COLUMNS)} FROM AlertRules WHERE enabled ORDER BY ticker, id"
+        )
+        rules = cursor.fetchall()
+        cursor.close()
+        return rules
+
+    finally:
+        conn.close()
+
+
+def recent_events(limit: int = 20, databasePath: str = "data/main.sql") -> list:
+    """Returns the latest events fired as tuples in the order of EVENT_COLUMNS, newest first."""
+    conn = sqlite3.connect(databasePath)
+    try:
+        ensure_alert_tables(conn)
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT {', '.join(EVENT_COLUMNS)} FROM AlertEvents ORDER BY date DESC, rule_id LIMIT ?",
+            (limit,),
+        )
+        events = cursor.fetchall()
+        cursor.close()
+        return events
+
+    finally:
+        conn.close()
+
+
+def describe_rule(rule: tuple) -> str:
+    """A readable description of a rule tuple (in the order of RULE_COLUMNS)."""
+    _, ticker, kind, days, threshold, direction, _ = rule
+    if kind == "price":
+        return f"{ticker} price {direction} {threshold:g}"
+    if kind == "move":
+        return f"{ticker} {days} day move {direction} {threshold:+g}%"
+    return f"{ticker} volume {direction} {threshold:g}x its {days} day average"
+
+
+def _value(kind: str, days: int, closes: list, volumes: list):
+    """Works out the value a rule kind watches from a ticker's latest closes and volumes, or None if unknown."""
+    if kind == "price":
+        return closes[-1] if closes else None
+    if kind == "move":
+        if len(closes) <= days or not closes[-1 - days]:
+            return None
+        return (closes[-1] / closes[-1 - days] - 1) * 100
+    if len(volumes) <= days:
+        return None
+    average = sum(volumes[-1 - days : -1]) / days
+    return volumes[-1] / average if average > 0 else None
+
+
+class TickerState:
+    """
+    The latest closes and volumes of one ticker, as many as its rules look back over.
+
+    Parameters:
+        - size (int): The most days kept, i.e. one more than the longest days of the ticker's rules.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.lastDate = None
+        self.closes = deque(maxlen=size)
+        self.volumes = deque(maxlen=size)
+
+    def add(self, date: str, close: float, volume: float):
+        self.lastDate = date
+        self.closes.append(close)
+        self.volumes.append(volume or 0)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "size": self.size,
+                "closes": list(self.closes),
+                "volumes": list(self.volumes),
+            }
+        )
+
+    @classmethod
+    def from_json(cls, lastDate: str, text: str):
+        data = json.loads(text)
+        state = cls(data["size"])
+        state.closes.extend(data["closes"])
+        state.volumes.extend(data["volumes"])
+        state.lastDate = lastDate
+        return state
+
+
+class AlertEngine:
+    """
+    Checks bars and live quotes against the enabled alert rules.
+
+    Parameters:
+        - databasePath (str): The path of the SQLite database.
+        - rules (list): Optional. Rule tuples (in the order of RULE_COLUMNS) to check instead of those in
+          'AlertRules', e.g. for trying rules out on old data.
+        - persist (bool): If False, nothing is read from or written to 'AlertState' and 'AlertEvents', so the engine
+          starts from the bars it is given.
+
+    Note:
+        - Rules added or removed after the engine is made are picked up by reload().
+
+    Example:
+        ```
+        >>> engine = AlertEngine()
+        >>> engine.check_bars(select_prices(INGEST_COLUMNS, startDate="2024-02-26", endDate="2024-02-26"))
+        [(3, 'AAPL', '2024-02-26', -5.4, 'AAPL moved -5.40% over 5 days (below -5%)')]
+        ```
+    """
+
+    def __init__(
+        self,
+        databasePath: str = "data/main.sql",
+        rules: list = None,
+        persist: bool = True,
+    ):
+        self._databasePath = databasePath
+        self._persist = persist
+        self._rules = {}  # id -> rule tuple
+        # ticker -> (kind, days) -> direction -> (sorted thresholds, rule ids in the same order)
+        self._index = {}
+        self._sizes = {}  # ticker -> days of closes and volumes its rules need
+        self._states = {}  # ticker -> TickerState
+        self._fired = set()  # (rule id, date) already fired by this engine
+        self.reload(rules)
+
+    @property
+    def rules(self) -> dict:
+        return self._rules
+
+    @property
+    def tickers(self) -> set:
+        """The tickers that have rules."""
+        return set(self._index)
+
+    def kinds(self, ticker: str) -> set:
+        """The rule kinds watching a ticker."""
+        return {kind for kind, _ in self._index.get(ticker, {})}
+
+    def distance_to_level(self, ticker: str, price: float) -> float:
+        """
+        How far a price is from the nearest level of the ticker's price rules, as a fraction of the price, e.g. so
+        a ticker about to cross one can be watched more closely. None if it has no price rules.
+        """
+        distance = None
+        for thresholds, _ in self._index.get(ticker, {}).get(("price", 0), {}).values():
+            position = bisect_left(thresholds, price)
+            for level in thresholds[max(0, position - 1) : position + 1]:
+                if price and (
+                    distance is None or abs(level - price) / price < distance
+                ):
+                    distance = abs(level - price) / price
+        return distance
+
+    def reload(self, rules: list = None):
+        """Reads the rules (and, when persisting, their tickers' saved states) again, and rebuilds the index."""
+        if rules is None:
+            rules = list_rules(self._databasePath)
+
+        grouped = {}
+        for rule in rules:
+            ruleId, ticker, kind, days, threshold, direction, _ = rule
+            key = (kind, days if kind != "price" else 0)
+            grouped.setdefault(ticker, {}).setdefault(key, {}).setdefault(
+                direction, []
+            ).append((threshold, ruleId))
+        self._rules = {rule[0]: tuple(rule) for rule in rules}
+
+        self._index = {}
+        self._sizes = {}
+        for ticker, keys in grouped.items():
+            self._index[ticker] = {
+                key: {
+                    direction: tuple(map(list, zip(*sorted(entries))))
+                    for direction, entries in directions.items()
+                }
+                for key, directions in keys.items()
+            }
+            self._sizes[ticker] = max(days for _, days in keys) + 1
+
+        if self._persist and self._index:
+            conn = sqlite3.connect(self._databasePath)
+            try:
+                ensure_alert_tables(conn)
+                cursor = conn.cursor()
+                cursor.execute("SELECT ticker, last_date, state FROM AlertState")
+                for ticker, lastDate, text in cursor.fetchall():
+                    if ticker in self._index and ticker not in self._states:
+                        self._states[ticker] = TickerState.from_json(lastDate, text)
+                cursor.close()
+            finally:
+                conn.close()
+
+    def __prime(self, tickers: list, beforeDate: str):
+        """
+        Reads the closes and volumes before beforeDate that the rules of the given tickers need, for tickers without
+        a state (e.g. with a new rule) or whose state is too short for a new rule.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        from datetime import date, timedelta
+        from DatabaseHandling.priceStore import select_prices
+
+        tickers = [
+            ticker
+            for ticker in tickers
+            if ticker not in self._states
+            or self._states[ticker].size < self._sizes[ticker]
+        ]
+        if not tickers:
+            return
+        longest = max(self._sizes[ticker] for ticker in tickers)
+        startDate = date.fromisoformat(beforeDate) - timedelta(
+            days=longest * 7 // 5 + 14
+        )  # enough calendar days to hold the trading days, allowing for holidays
+        for ticker in tickers:
+            self._states[ticker] = TickerState(self._sizes[ticker])
+        for ticker, rowDate, close, volume in select_prices(
+            ("ticker", "date", "close", "volume"),
+            tickers=tickers,
+            startDate=str(startDate),
+            endDate=str(date.fromisoformat(beforeDate) - timedelta(days=1)),
+            orderBy="date",
+            databasePath=self._databasePath,
+        ):
+            if close is not None:
+                self._states[ticker].add(rowDate, close, volume)
+
+    def __crossed(self, ticker: str, date: str, kinds, before, after) -> list:
+        """
+        Finds the rules of a ticker whose threshold lies between the values before and after a new bar or quote.
+
+        Parameters:
+            - before (callable): (kind, days) -> the value on the previous bar, or None.
+            - after (callable): (kind, days) -> the value now, or None.
+
+        Returns:
+            - list: Event tuples in the order of EVENT_COLUMNS, for rules that have not already fired on the date.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        events = []
+        for (kind, days), directions in self._index[ticker].items():
+            if kind not in kinds:
+                continue
+            old, new = before(kind, days), after(kind, days)
+            if old is None or new is None or old == new:
+                continue
+            if new > old and "above" in directions:
+                thresholds, ruleIds = directions["above"]
+                crossed = ruleIds[
+                    bisect_right(thresholds, old) : bisect_right(thresholds, new)
+                ]  # old < threshold <= new
+            elif new < old and "below" in directions:
+                thresholds, ruleIds = directions["below"]
+                crossed = ruleIds[
+                    bisect_left(thresholds, new) : bisect_left(thresholds, old)
+                ]  # new <= threshold < old
+            else:
+                continue
+            for ruleId in crossed:
+                if (ruleId, date) in self._fired:
+                    continue
+                self._fired.add((ruleId, date))
+                events.append((ruleId, ticker, date, new, self.__message(ruleId, new)))
+        return events
+
+    def __message(self, ruleId: int, value: float) -> str:
+        _, ticker, kind, days, threshold, direction, _ = self._rules[ruleId]
+        if kind == "price":
+            return f"{ticker} went {direction} {threshold:.2f} ({value:.2f})"
+        if kind == "move":
+            return f"{ticker} moved {value:+.2f}% over {days} days ({direction} {threshold:+.2f}%)"
+        return f"{ticker} traded {value:.1f}x its {days} day average volume ({direction} {threshold:.1f}x)"
+
+    def check_bars(self, rows: list) -> list:
+        """
+        Checks new daily bars against the rules, and saves the events and the tickers' states.
+
+        Parameters:
+            - rows (list): Row tuples in the order of DatabaseHandling.ingestPipeline.INGEST_COLUMNS (ticker, date,
+              open, close, high, low, volume, weighted_volume), e.g. the rows of an IngestBatch.
+
+        Returns:
+            - list: Event tuples in the order of EVENT_COLUMNS.
+
+        Note:
+            - Bars on or before the last bar checked for their ticker are skipped, so a date can be checked again.
+            - When persisting, crossings already saved for the rule on the date (e.g. fired by check_quote during the
+              day) are not returned again.
+        """
+        rows = sorted(
+            (row for row in rows if row[0] in self._index and row[3] is not None),
+            key=lambda row: row[1],
+        )
+        if not rows:
+            return []
+        if self._persist:
+            self.__prime(sorted({row[0] for row in rows}), rows[0][1])
+
+        events = []
+        changed = set()
+        for ticker, date, _, close, _, _, volume, _ in rows:
+            state = self._states.get(ticker)
+            if state is None:
+                state = self._states[ticker] = TickerState(self._sizes[ticker])
+            elif state.lastDate is not None and date <= state.lastDate:
+                continue
+            closes, volumes = list(state.closes), list(state.volumes)
+            state.add(date, close, volume)
+            newCloses, newVolumes = list(state.closes), list(state.volumes)
+            events.extend(
+                self.__crossed(
+                    ticker,
+                    date,
+                    RULE_KINDS,
+                    lambda kind, days: _value(kind, days, closes, volumes),
+                    lambda kind, days: _value(kind, days, newCloses, newVolumes),
+                )
+            )
+            changed.add(ticker)
+
+        if self._persist:
+            events = self.__unsaved(events)
+            self.__save(events, changed)
+        return events
+
+    def check_quote(self, ticker: str, date: str, price: float) -> list:
+        """
+        Checks a live price against the price and move rules of its ticker, comparing it with the last stored
+        close. Nothing is added to the ticker's state, as the day's bar is checked once it is ingested.
+
+        Returns:
+            - list: Event tuples in the order of EVENT_COLUMNS, for rules that have not fired yet on the date.
+        """
+        if ticker not in self._index or price is None:
+            return []
+        if self._persist:
+            self.__prime([ticker], date)
+        state = self._states.get(ticker)
+        if state is None or not state.closes:
+            return []
+        closes, volumes = list(state.closes), list(state.volumes)
+        if (
+            state.lastDate == date
+        ):  # the day's bar is stored, so compare with the day before
+            closes, volumes = closes[:-1], volumes[:-1]
+        events = self.__crossed(
+            ticker,
+            date,
+            QUOTE_KINDS,
+            lambda kind, days: _value(kind, days, closes, volumes),
+            lambda kind, days: _value(kind, days, closes + [price], volumes),
+        )
+        if self._persist and events:
+            events = self.__unsaved(events)
+            self.__save(events, ())
+        return events
+
+    def __unsaved(self, events: list) -> list:
+        """
+        Drops events already saved for the same rule and date, e.g. fired by a live quote before the day's bar was
+        ingested, or by another engine, so that they are not returned and passed on again.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        if not events:
+            return events
+        dates = sorted({date for _, _, date, _, _ in events})
+        conn = sqlite3.connect(self._databasePath)
+        try:
+            ensure_alert_tables(conn)
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT rule_id, date FROM AlertEvents WHERE date IN ({', '.join('?' * len(dates))})",
+                dates,
+            )
+            saved = set(cursor.fetchall())
+            cursor.close()
+        finally:
+            conn.close()
+        self._fired.update(saved)
+        return [event for event in events if (event[0], event[2]) not in saved]
+
+    def __save(self, events: list, tickers):
+        """
+        Writes events, and the states of the given tickers, in one transaction.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        from config import DATABASE_BUSY_TIMEOUT
+
+        conn = sqlite3.connect(self._databasePath, timeout=DATABASE_BUSY_TIMEOUT)
+        try:
+            ensure_alert_tables(conn)
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT OR IGNORE INTO AlertEvents (rule_id, ticker, date, value, message) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (ruleId, ticker, date, value, message)
+                    for ruleId, ticker, date, value, message in events
+                ],
+            )
+            cursor.executemany(
+                "INSERT OR REPLACE INTO AlertState (ticker, last_date, state) VALUES (?, ?, ?)",
+                [
+                    (
+                        ticker,
+                        self._states[ticker].lastDate,
+                        self._states[ticker].to_json(),
+                    )
+                    for ticker in tickers
+                ],
+            )
+            conn.commit()
+            cursor.close()
+
+        finally:
+            conn.close()
+
+
+def check_ingested(batch) -> int:
+    """
+    Post-ingest hook checking the rows of a batch of new dates against the alert rules.
+
+    Returns:
+        - int: The number of events fired.
+    """
+    if batch.scope != "dates" or not batch.rows:
+        return 0
+    return len(AlertEngine(batch.databasePath).check_bars(batch.rows))
@@ -0,0 +1,415 @@
+import asyncio
+import heapq
+import sqlite3
+import threading
+import time
+
+# A watchlist of tickers, kept in the 'Watchlist' table, whose live quotes are polled in the background by a
+# QuotePoller and passed to the GUI and the alert engine (DatabaseHandling/thresholds.py) as they arrive.
+#
+# The poller runs on asyncio, in a thread of its own so it does not wait on the Tkinter main loop. Each ticker has
+# its own next due time, kept in a heap, and after each quote it is given a new one:
+#   - while the market is closed (weekends, outside 9:30 to 16:00 New York time, or a date 'DateStatuses' records as
+#     closed) every ticker is polled every QUOTE_CLOSED_INTERVAL seconds
+#   - otherwise the interval starts at the longest of QUOTE_INTERVALS and is shortened the more the ticker has moved
+#     today, halved if it has alert rules, and cut to the shortest when its price is close to a rule's level
+# Every request takes a token from a RequestBudget (a token bucket refilled at QUOTE_REQUESTS_PER_MINUTE) shared by
+# every poller, so the quote site is never called more often than that however many tickers are watched; when the
+# budget runs short, quotes are simply taken later.
+#
+# The quote pages are fetched with call_ticker_current on worker threads (asyncio.to_thread), and the address can be
+# changed, so the poller can be run against a local stand-in server.
+
+NEAR_LEVEL = 0.01  # a price within 1% of an alert level is polled as often as possible
+RETRY_INTERVAL = 60  # seconds before a ticker whose quote failed is tried again
+
+
+def ensure_watchlist_table(conn: sqlite3.Connection):
+    """Creates the 'Watchlist' table if it does not exist."""
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS Watchlist (
+            ticker TEXT PRIMARY KEY,
+            added DATE
+        )
+    """
+    )
+    cursor.close()
+
+
+def load_watchlist(databasePath: str = "data/main.sql") -> list:
+    """Returns the tickers on the watchlist, in alphabetical order."""
+    conn = sqlite3.connect(databasePath)
+    try:
+        ensure_watchlist_table(conn)
+        cursor = conn.cursor()
+        cursor.execute("SELECT ticker FROM Watchlist ORDER BY ticker")
+        tickers = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        return tickers
+
+    finally:
+        conn.close()
+
+
+def add_to_watchlist(ticker: str, databasePath: str = "data/main.sql"):
+    """Adds a ticker to the watchlist, if it is not already on it."""
+    from datetime import datetime
+
+    conn = sqlite3.connect(databasePath)
+    try:
+        ensure_watchlist_table(conn)
+        conn.execute(
+            "INSERT OR IGNORE INTO Watchlist (ticker, added) VALUES (?, ?)",
+            (ticker.upper(), str(datetime.now().date())),
+        )
+        conn.commit()
+
+    finally:
+        conn.close()
+
+
+def remove_from_watchlist(ticker: str, databasePath: str = "data/main.sql"):
+    """Takes a ticker off the watchlist."""
+    conn = sqlite3.connect(databasePath)
+    try:
+        ensure_watchlist_table(conn)
+        conn.execute("DELETE FROM Watchlist WHERE ticker = ?", (ticker.upper(),))
+        conn.commit()
+
+    finally:
+        conn.close()
+
+
+def market_is_open(now=None, databasePath: str = "data/main.sql") -> bool:
+    """
+    Returns True if the US stock market is trading at a time (default now): a weekday between 9:30 and 16:00 New
+    York time, on a date that 'DateStatuses' does not record as closed.
+
+    Parameters:
+        - now (datetime.datetime): Optional. A timezone aware time to check instead of now.
+        - databasePath (str): The path of the SQLite database.
+    """
+    from datetime import datetime, time as clockTime, timedelta, timezone
+
+    try:
+        from zoneinfo import ZoneInfo
+
+        newYork = ZoneInfo("America/New_York")
+    except Exception:  # no time zone database, so assume eastern standard time
+        newYork = timezone(timedelta(hours=-5))
+
+    now = (now or datetime.now(timezone.utc)).astimezone(newYork)
+    if now.weekday() >= 5 or not clockTime(9, 30) <= now.time() < clockTime(16):
+        return False
+
+    conn = sqlite3.connect(databasePath)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT market_open FROM DateStatuses WHERE date = ?",
+            (str(now.date()),),
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        # today is only recorded once it has been backfilled
+        return row is None or bool(row[0])
+
+    except sqlite3.Error:
+        return True
+
+    finally:
+        conn.close()
+
+
+class RequestBudget:
+    """
+    A token bucket limiting how often the quote site is called.
+
+    Parameters:
+        - requestsPerMinute (float): The rate the bucket is refilled at.
+        - burst (int): The most tokens held, i.e. requests that can be made at once after a quiet spell.
+
+    Note:
+        - acquire() can be awaited from any event loop and thread, so one budget can be shared by several pollers.
+    """
+
+    def __init__(self, requestsPerMinute: float, burst: int = 5):
+        self.requestsPerMinute = requestsPerMinute
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __take(self) -> float:
+        """Takes a token if there is one, returning 0, or returns the seconds until there will be one."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._burst,
+                self._tokens + (now - self._updated) * self.requestsPerMinute / 60,
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) * 60 / self.requestsPerMinute
+
+    async def acquire(self):
+        """Waits until a request can be made within the budget."""
+        wait = self.__take()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.__take()
+
+
+_budgets = {}  # requests per minute -> the shared RequestBudget
+
+
+def shared_budget(requestsPerMinute: float = None) -> RequestBudget:
+    """Returns the RequestBudget shared by every poller (by default at config.QUOTE_REQUESTS_PER_MINUTE)."""
+    if requestsPerMinute is None:
+        from config import QUOTE_REQUESTS_PER_MINUTE
+
+        requestsPerMinute = QUOTE_REQUESTS_PER_MINUTE
+    return _budgets.setdefault(requestsPerMinute, RequestBudget(requestsPerMinute))
+
+
+class QuotePoller:
+    """
+    Polls the live quotes of a watchlist in the background, on adaptive intervals within a request budget.
+
+    Parameters:
+        - tickers (iterable): Optional. The tickers to watch. Defaults to the stored watchlist.
+        - databasePath (str): The path of the SQLite database.
+        - quoteUrl (str): Optional. The quote page address passed to call_ticker_current.
+        - budget (RequestBudget): Optional. Defaults to the shared budget.
+        - intervals (tuple): Optional. The (shortest, longest) seconds between quotes of a ticker while the market
+          is open. Defaults to config.QUOTE_INTERVALS.
+        - closedInterval (float): Optional. The seconds between quotes while the market is closed. Defaults to
+          config.QUOTE_CLOSED_INTERVAL.
+        - marketOpen (callable): Optional. Called with no arguments to tell whether the market is open. Defaults to
+          market_is_open on the database.
+        - checkAlerts (bool): Check each quote against the alert rules, passing any events fired to subscribers.
+
+    Note:
+        - Subscribers are called as callback(ticker, quote, events) on the poller's thread, where quote is the
+          dictionary returned by call_ticker_current (with its 'date' added) and events are those of
+          AlertEngine.check_quote. Tkinter widgets must not be touched from them directly; pass the values to the
+          GUI thread (e.g. through a queue.Queue polled with after()).
+
+    Example:
+        ```
+        >>> poller = QuotePoller(["AAPL", "MSFT"])
+        >>> poller.subscribe(lambda ticker, quote, events: print(ticker, quote["currentPrice"], events))
+        >>> poller.start_in_background()
+        AAPL 189.3 []
+        ```
+    """
+
+    def __init__(
+        self,
+        tickers=None,
+        databasePath: str = "data/main.sql",
+        quoteUrl: str = None,
+        budget: RequestBudget = None,
+        intervals: tuple = None,
+        closedInterval: float = None,
+        marketOpen=None,
+        checkAlerts: bool = True,
+    ):
+        from config import QUOTE_CLOSED_INTERVAL, QUOTE_INTERVALS
+
+        self._databasePath = databasePath
+        self._quoteUrl = quoteUrl
+        self._budget = budget or shared_budget()
+        self._intervals = intervals or QUOTE_INTERVALS
+        self._closedInterval = closedInterval or QUOTE_CLOSED_INTERVAL
+        self._marketOpen = marketOpen or (
+            lambda: market_is_open(databasePath=databasePath)
+        )
+        self._checkAlerts = checkAlerts
+        self._tickers = set(
+            load_watchlist(databasePath) if tickers is None else tickers
+        )
+        self._due = [
+            (0.0, ticker) for ticker in sorted(self._tickers)
+        ]  # (monotonic time, ticker) heap
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._engine = None
+        self._engineLock = threading.Lock()
+        self._reloadRules = False
+        self._running = False
+        self._thread = None
+        self.quotes = {}  # ticker -> latest quote
+        self.errors = {}  # ticker -> the error of its latest failed quote
+        self.requestCount = 0
+
+    @property
+    def tickers(self) -> list:
+        with self._lock:
+            return sorted(self._tickers)
+
+    def subscribe(self, callback):
+        """Calls callback(ticker, quote, events) with every new quote."""
+        self._subscribers.append(callback)
+
+    def add(self, ticker: str):
+        """Starts watching a ticker, quoting it as soon as the budget allows."""
+        with self._lock:
+            if ticker not in self._tickers:
+                self._tickers.add(ticker)
+                heapq.heappush(self._due, (0.0, ticker))
+
+    def remove(self, ticker: str):
+        """Stops watching a ticker."""
+        with self._lock:
+            self._tickers.discard(ticker)
+        self.quotes.pop(ticker, None)
+
+    def reload_rules(self):
+        """Picks up alert rules added or removed since the poller started, before the next quote is checked."""
+        self._reloadRules = True
+
+    def interval(self, ticker: str, quote: dict = None) -> float:
+        """
+        The seconds until a ticker is next quoted, given its latest quote.
+
+        Returns:
+            - float: QUOTE_CLOSED_INTERVAL while the market is closed, otherwise between the QUOTE_INTERVALS.
+        """
+        if not self._marketOpen():
+            return self._closedInterval
+        shortest, longest = self._intervals
+        if not quote:
+            return longest
+
+        interval = longest
+        try:
+            move = abs(
+                float(str(quote.get("currentPercentageChange", "0")).strip("%+"))
+            )
+        except ValueError:
+            move = 0.0
+        interval /= (
+            1 + move
+        )  # e.g. a ticker 2% up on the day is quoted three times as often
+        if self._engine is not None and self._engine.kinds(ticker):
+            interval /= 2  # alert rules can fire
+            distance = self._engine.distance_to_level(ticker, quote.get("currentPrice"))
+            if distance is not None and distance < NEAR_LEVEL:
+                interval = shortest
+        return min(longest, max(shortest, interval))
+
+    def __fetch(self, ticker: str) -> list:
+        from DatabaseHandling.search import call_ticker_current
+
+        if self._quoteUrl is None:
+            return call_ticker_current(ticker)
+        return call_ticker_current(ticker, self._quoteUrl)
+
+    def __check(self, ticker: str, quote: dict) -> list:
+        """Checks a quote against the alert rules, reading them the first time and after reload_rules()."""
+        from DatabaseHandling.thresholds import AlertEngine
+
+        with self._engineLock:  # quotes are checked on several worker threads
+            if self._engine is None or self._reloadRules:
+                self._reloadRules = False
+                self._engine = AlertEngine(self._databasePath)
+            return self._engine.check_quote(
+                ticker, quote["date"], quote.get("currentPrice")
+            )
+
+    async def poll(self, ticker: str) -> dict:
+        """
+        Quotes one ticker within the budget, checks it against the alert rules and passes it to the subscribers.
+
+        Returns:
+            - dict: The quote, or None if it could not be fetched.
+        """
+        await self._budget.acquire()
+        self.requestCount += 1
+        try:
+            date, quote = await asyncio.to_thread(self.__fetch, ticker)
+        except (
+            Exception
+        ) as error:  # a non-200 response, a page without a quote, or no connection
+            self.errors[ticker] = error
+            return None
+        quote["date"] = date
+        self.errors.pop(ticker, None)
+
+        events = []
+        if self._checkAlerts:
+            try:
+                events = await asyncio.to_thread(self.__check, ticker, quote)
+            except sqlite3.Error as error:
+                self.errors[ticker] = error
+
+        with self._lock:
+            if ticker not in self._tickers:  # removed while it was being quoted
+                return quote
+        self.quotes[ticker] = quote
+        for callback in self._subscribers:
+            callback(ticker, quote, events)
+        return quote
+
+    async def __poll_and_reschedule(self, ticker: str):
+        quote = await self.poll(ticker)
+        interval = RETRY_INTERVAL if quote is None else self.interval(ticker, quote)
+        with self._lock:
+            if ticker in self._tickers:
+                heapq.heappush(self._due, (time.monotonic() + interval, ticker))
+
+    async def run(self, duration: float = None):
+        """
+        Quotes every watched ticker as it falls due, until stop() is called (or for duration seconds).
+
+        Note:
+            - Quotes are fetched concurrently, so one slow response does not hold up the others; the budget
+              decides how many go out at once.
+        """
+        self._running = True
+        started = time.monotonic()
+        tasks = set()
+        scheduled = (
+            set()
+        )  # tickers with a quote under way, so they are not quoted twice at once
+        while self._running and (
+            duration is None or time.monotonic() - started < duration
+        ):
+            with self._lock:
+                ready = []
+                while self._due and self._due[0][0] <= time.monotonic():
+                    _, ticker = heapq.heappop(self._due)
+                    if ticker in self._tickers and ticker not in scheduled:
+                        ready.append(ticker)
+                wait = self._due[0][0] - time.monotonic() if self._due else 1.0
+            for ticker in ready:
+                scheduled.add(ticker)
+                task = asyncio.create_task(self.__poll_and_reschedule(ticker))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(
+                    lambda _, ticker=ticker: scheduled.discard(ticker)
+                )
+            await asyncio.sleep(
+                min(max(wait, 0.01), 1.0)
+            )  # wakes at least every second for new tickers
+        for task in list(tasks):
+            task.cancel()
+        self._running = False
+
+    def start_in_background(self) -> threading.Thread:
+        """Runs the poller on its own event loop in a daemon thread, and returns the thread."""
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self.run()), daemon=True, name="quote-poller"
+        )
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Stops the poller within a second."""
+        self._running = False
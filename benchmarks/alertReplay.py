@@ -0,0 +1,132 @@
+"""
+Regression and throughput benchmark for the alert engine (DatabaseHandling/thresholds.py), run through a replay.
+
+Makes random rules (price levels, n day moves and volume spikes) for every ticker in a source database, without
+storing them, and replays the stored prices through them with DatabaseHandling/replay.py, the same way the ingest
+hook checks each new date. The events fired are then compared with a brute force check of every rule against every
+bar, and the number of bars a second the replay managed is reported. With the shipped database (~100 tickers over
+~2.5 years) the replay should take a few seconds at most.
+
+Run from the project root:
+    python -m benchmarks.alertReplay
+    python -m benchmarks.alertReplay --rules 50 --start 2023-01-01 --source data/benchmark.sql
+"""
+
+import random
+import time
+
+
+def random_rules(databasePath: str, rulesPerTicker: int, seed: int) -> list:
+    """
+    Makes rule tuples (in the order of thresholds.RULE_COLUMNS) around each ticker's last close and volume.
+
+    Returns:
+        - list: The rules, with ids counting up from 1.
+    """
+    from DatabaseHandling.priceStore import select_prices
+    from DatabaseHandling.thresholds import DIRECTIONS
+
+    lastCloses = {}
+    for ticker, close in select_prices(
+        ("ticker", "close"), orderBy="date", databasePath=databasePath
+    ):
+        if close is not None:
+            lastCloses[ticker] = close
+
+    generator = random.Random(seed)
+    rules = []
+    for ticker, close in sorted(lastCloses.items()):
+        for _ in range(rulesPerTicker):
+            kind = generator.choice(("price", "move", "volume_spike"))
+            direction = generator.choice(DIRECTIONS)
+            if kind == "price":
+                days, threshold = 0, close * generator.uniform(0.5, 1.5)
+            elif kind == "move":
+                days = generator.choice((1, 5, 20))
+                threshold = generator.uniform(2, 10) * (
+                    1 if direction == "above" else -1
+                )
+            else:
+                days = generator.choice((5, 20))
+                threshold = generator.uniform(0.5, 3)
+            rules.append(
+                (len(rules) + 1, ticker, kind, days, threshold, direction, None)
+            )
+    return rules
+
+
+def brute_force(databasePath: str, rules: list, startDate: str = None) -> set:
+    """
+    Checks every rule against every bar of its ticker, from the whole history of the ticker each time.
+
+    Returns:
+        - set: (rule id, ticker, date) of every rule that crossed its threshold on or after startDate.
+    """
+    from DatabaseHandling.priceStore import select_prices
+    from DatabaseHandling.thresholds import _value
+
+    histories = {}  # ticker -> (dates, closes, volumes)
+    for ticker, rowDate, close, volume in select_prices(
+        ("ticker", "date", "close", "volume"),
+        orderBy="date",
+        databasePath=databasePath,
+    ):
+        if close is None:
+            continue
+        dates, closes, volumes = histories.setdefault(ticker, ([], [], []))
+        dates.append(rowDate)
+        closes.append(close)
+        volumes.append(volume or 0)
+
+    fired = set()
+    for ruleId, ticker, kind, days, threshold, direction, _ in rules:
+        dates, closes, volumes = histories.get(ticker, ([], [], []))
+        for i in range(1, len(dates)):
+            if startDate is not None and dates[i] < startDate:
+                continue
+            first = max(0, i - 1 - days)
+            old = _value(kind, days, closes[first:i], volumes[first:i])
+            new = _value(kind, days, closes[first : i + 1], volumes[first : i + 1])
+            if old is None or new is None:
+                continue
+            if (direction == "above" and old < threshold <= new) or (
+                direction == "below" and new <= threshold < old
+            ):
+                fired.add((ruleId, ticker, dates[i]))
+    return fired
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from DatabaseHandling.replay import Replay
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--source", default="data/main.sql")
+    parser.add_argument("--rules", type=int, default=20, help="rules per ticker")
+    parser.add_argument("--start", default=None, help="the first date replayed")
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+
+    rules = random_rules(arguments.source, arguments.rules, arguments.seed)
+    print(f"{len(rules)} random rules")
+
+    report = Replay(arguments.start, rules=rules, databasePath=arguments.source).run()
+    print(
+        f"Replayed {report['bars']} bars over {report['dates']} dates in {report['seconds']:.2f}s "
+        f"({report['barsPerSecond']:,.0f} bars/s), {len(report['events'])} events"
+    )
+
+    started = time.perf_counter()
+    expected = brute_force(arguments.source, rules, arguments.start)
+    print(f"Brute force check took {time.perf_counter() - started:.2f}s")
+
+    replayed = {event[:3] for event in report["events"]}
+    if replayed == expected:
+        print("The events match the brute force check")
+    else:
+        print(
+            f"MISMATCH: {len(replayed - expected)} events not expected, {len(expected - replayed)} missing, "
+            f"e.g. {sorted(replayed ^ expected)[:5]}"
+        )
+        raise SystemExit(1)
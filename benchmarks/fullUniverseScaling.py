@@ -0,0 +1,252 @@
+"""
+Synthetic scaling benchmark for the full universe mode (config.FULL_UNIVERSE).
+
+Builds a database with the same schema as data/main.sql and fills it with random bars for N tickers over D trading
+days, ingesting one date at a time through insert_data_into_stockprices exactly as backfill does. The defaults,
+10,000 tickers over 2,520 trading days, are ~25M rows: roughly 10 years of the whole US market. It then times the
+reads behind each screen of the GUI.
+
+Run from the project root (the full size run takes a while and needs a few GB of disk):
+    python -m benchmarks.fullUniverseScaling
+    python -m benchmarks.fullUniverseScaling --tickers 1000 --days 500 --path data/benchmark-small.sql
+"""
+
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+
+def create_database(path: str):
+    """Creates an empty database at path with the tables of data/main.sql, then brings it up to the current schema."""
+    from DatabaseHandling.storageLayout import ensure_schema
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute(
+        "CREATE TABLE Companies (ticker TEXT PRIMARY KEY, name TEXT, sector TEXT, description TEXT, incorporation_year INTEGER)"
+    )
+    cursor.execute(
+        "CREATE TABLE DateStatuses (date DATE PRIMARY KEY, complete_data BOOLEAN, market_open BOOLEAN)"
+    )
+    cursor.execute(
+        """
+        CREATE TABLE StockPrices (
+            priceid INTEGER PRIMARY KEY,
+            ticker TEXT,
+            date DATE,
+            open REAL,
+            close REAL,
+            high REAL,
+            volume INTEGER,
+            weighted_volume REAL,
+            FOREIGN KEY (ticker) REFERENCES Companies (ticker),
+            FOREIGN KEY (date) REFERENCES DateStatuses (date)
+        )
+        """
+    )
+    conn.commit()
+    conn.close()
+
+    ensure_schema(path)
+
+
+def trading_days(count: int, lastDay: date = None) -> list:
+    """Returns the count weekdays up to and including lastDay (default yesterday) as yyyy-mm-dd strings, oldest first."""
+    days = []
+    day = lastDay or date.today() - timedelta(days=1)
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(str(day))
+        day -= timedelta(days=1)
+    return list(reversed(days))
+
+
+def ingest(path: str, tickerCount: int, dayCount: int, seed: int = 0) -> list:
+    """
+    Fills the database with a random walk per ticker, one grouped-endpoint-shaped date at a time.
+
+    Returns:
+        - list: The tickers and the dates that were written, as (tickers, dates).
+    """
+    from DatabaseHandling.autoBackfill import (
+        insert_data_into_stockprices,
+        update_date_statuses,
+    )
+
+    rng = random.Random(seed)
+    tickers = [f"T{index:05d}" for index in range(tickerCount)]
+    dates = trading_days(dayCount)
+    prices = [rng.uniform(5, 500) for _ in tickers]
+
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO Companies (ticker, name, sector) VALUES (?, ?, ?)",
+        [
+            (ticker, f"Company {ticker}", f"Sector {index % 11}")
+            for index, ticker in enumerate(tickers)
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO DateStatuses (date, complete_data, market_open) VALUES (?, ?, ?)",
+        [(day, False, True) for day in dates],
+    )
+    conn.commit()
+    conn.close()
+
+    started = time.perf_counter()
+    for dayNumber, day in enumerate(dates):
+        data = [day]
+        for index, ticker in enumerate(tickers):
+            openPrice = prices[index]
+            close = max(0.01, openPrice * (1 + rng.gauss(0, 0.02)))
+            prices[index] = close
+            data.append(
+                {
+                    "T": ticker,
+                    "o": round(openPrice, 4),
+                    "c": round(close, 4),
+                    "h": round(max(openPrice, close) * 1.01, 4),
+                    "l": round(min(openPrice, close) * 0.99, 4),
+                    "v": rng.randint(1000, 50_000_000),
+                    "vw": round((openPrice + close) / 2, 4),
+                }
+            )
+        insert_data_into_stockprices(data, path)
+        update_date_statuses(day, path)
+
+        if (dayNumber + 1) % 250 == 0:
+            elapsed = time.perf_counter() - started
+            rows = (dayNumber + 1) * tickerCount
+            print(
+                f"  {rows:,} rows ingested in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)"
+            )
+
+    elapsed = time.perf_counter() - started
+    rows = dayCount * tickerCount
+    print(f"Ingested {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+    return tickers, dates
+
+
+def timed(label: str, function, repeats: int = 5):
+    """Runs function repeats times and prints the mean and worst wall time."""
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - started)
+    print(
+        f"{label:<55} mean {sum(durations) / repeats * 1000:9.2f} ms   worst {max(durations) * 1000:9.2f} ms"
+    )
+    return result
+
+
+def time_queries(path: str, tickers: list, dates: list, seed: int = 1):
+    """Times the reads behind the graph, search, sort and status checks, and the GUI company pickers."""
+    from DatabaseHandling.priceStore import PriceStore
+    from DatabaseHandling.sort import SortItems
+
+    rng = random.Random(seed)
+    lastYear = dates[-252:]
+    lastMonth = dates[-21:]
+
+    def graph_three_tickers_one_year():
+        # a new store each time, so every read goes to the database
+        store = PriceStore(path)
+        return store.get_frame(rng.sample(tickers, 3), lastYear[0], lastYear[-1])
+
+    def graph_one_ticker_full_history():
+        store = PriceStore(path)
+        return store.get_frame([rng.choice(tickers)], dates[0], dates[-1])
+
+    def search_ticker_on_date():
+        conn = sqlite3.connect(path)
+        result = conn.execute(
+            "SELECT close, open, high, volume, weighted_volume FROM StockPrices WHERE ticker = ? AND date = ?",
+            (rng.choice(tickers), rng.choice(dates)),
+        ).fetchall()
+        conn.close()
+        return result
+
+    def status_count_for_date():
+        conn = sqlite3.connect(path)
+        result = conn.execute(
+            "SELECT COUNT(*) FROM StockPrices WHERE date = ?", (rng.choice(dates),)
+        ).fetchone()
+        conn.close()
+        return result
+
+    def sort_top_10(rangeDates):
+        sorter = SortItems(rangeDates[0], "close", rangeDates[-1], path)
+        return sorter.top_n(10, saveToFile=False)
+
+    def load_picker_options():
+        conn = sqlite3.connect(path)
+        result = [
+            row[0]
+            for row in conn.execute("SELECT ticker FROM Companies ORDER BY ticker")
+        ]
+        conn.close()
+        return result
+
+    options = load_picker_options()
+
+    def filter_picker_options():
+        typed = rng.choice(tickers)[:3]
+        return [option for option in options if option.startswith(typed)][:100]
+
+    timed(
+        "Graph: 3 tickers over 1 year (cold price store)", graph_three_tickers_one_year
+    )
+    timed("Graph: 1 ticker over the full history (cold)", graph_one_ticker_full_history)
+    timed("Search: one ticker on one date", search_ticker_on_date)
+    timed("Backfill status: row count for one date", status_count_for_date)
+    timed("Sort: top 10 closes over the last month", lambda: sort_top_10(lastMonth))
+    timed("Sort: top 10 closes over the last year", lambda: sort_top_10(lastYear), 3)
+    timed("Picker: load every ticker from Companies", load_picker_options)
+    timed("Picker: filter options on a typed prefix", filter_picker_options)
+
+
+def report_size(path: str):
+    conn = sqlite3.connect(path)
+    pageCount = conn.execute("PRAGMA page_count").fetchone()[0]
+    pageSize = conn.execute("PRAGMA page_size").fetchone()[0]
+    rows = conn.execute("SELECT COUNT(*) FROM StockPrices").fetchone()[0]
+    conn.close()
+    print(
+        f"{rows:,} rows, {pageCount:,} pages of {pageSize} bytes, {os.path.getsize(path) / 1024 ** 2:,.1f} MiB on disk"
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tickers", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=2_520)
+    parser.add_argument("--path", default="data/benchmark.sql")
+    parser.add_argument(
+        "--reuse",
+        action="store_true",
+        help="time the queries on an existing benchmark database instead of rebuilding it",
+    )
+    arguments = parser.parse_args()
+
+    if arguments.reuse:
+        conn = sqlite3.connect(arguments.path)
+        tickers = [row[0] for row in conn.execute("SELECT ticker FROM Companies")]
+        dates = [
+            row[0]
+            for row in conn.execute("SELECT date FROM DateStatuses ORDER BY date")
+        ]
+        conn.close()
+    else:
+        create_database(arguments.path)
+        tickers, dates = ingest(arguments.path, arguments.tickers, arguments.days)
+
+    report_size(arguments.path)
+    time_queries(arguments.path, tickers, dates)
@@ -0,0 +1,172 @@
+"""
+Compares the storage layouts of the StockPrices table (see DatabaseHandling/storageLayout.py).
+
+Copies a source database once per layout, migrates each copy, and reports its file size and page count, along with
+the time of the reads each screen relies on: a ticker's history over a range (graphs), one ticker on one date
+(search) and every ticker on one date (sort, backfill status checks). Every read goes through select_prices, the
+same data access function the application uses, which opens a new connection each time, so the number of pages a
+read has to touch shows up in its time.
+
+Run from the project root:
+    python -m benchmarks.storageLayouts
+    python -m benchmarks.storageLayouts --source data/benchmark.sql   # the synthetic full universe database
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+HISTORY_COLUMNS = ("date", "open", "close", "high", "low", "volume", "weighted_volume")
+SEARCH_COLUMNS = ("close", "open", "high", "volume", "weighted_volume")
+
+
+def prepare_layouts(source: str, workDirectory: str) -> dict:
+    """
+    Creates one migrated copy of source per layout.
+
+    Returns:
+        - dict: layout name -> path of its database.
+    """
+    from DatabaseHandling.storageLayout import (
+        ensure_schema,
+        migrate_to_clustered,
+        migrate_to_compact,
+    )
+
+    paths = {}
+
+    shipped = os.path.join(workDirectory, "rowid-no-indexes.sql")
+    shutil.copyfile(source, shipped)
+    ensure_schema(shipped)  # for the 'low' column
+    conn = sqlite3.connect(shipped)
+    conn.execute("DROP INDEX IF EXISTS idx_StockPrices_ticker_date")
+    conn.execute("DROP INDEX IF EXISTS idx_StockPrices_date")
+    conn.commit()
+    conn.execute("VACUUM")  # so that the sizes compare like for like
+    conn.close()
+    paths["rowid, no indexes (as shipped)"] = shipped
+
+    indexed = os.path.join(workDirectory, "rowid-indexed.sql")
+    shutil.copyfile(shipped, indexed)
+    ensure_schema(indexed)
+    paths["rowid + indexes (ensure_schema)"] = indexed
+
+    clustered = os.path.join(workDirectory, "clustered.sql")
+    shutil.copyfile(shipped, clustered)
+    started = time.perf_counter()
+    migrate_to_clustered(clustered)
+    print(f"migrate_to_clustered took {time.perf_counter() - started:.1f}s")
+    paths["clustered (ticker, date)"] = clustered
+
+    compact = os.path.join(workDirectory, "compact.sql")
+    shutil.copyfile(shipped, compact)
+    started = time.perf_counter()
+    migrate_to_compact(compact)
+    print(f"migrate_to_compact took {time.perf_counter() - started:.1f}s")
+    paths["compact (integer encoded)"] = compact
+
+    return paths
+
+
+def describe(path: str) -> str:
+    conn = sqlite3.connect(path)
+    pageCount = conn.execute("PRAGMA page_count").fetchone()[0]
+    conn.close()
+    return f"{os.path.getsize(path) / 1024 ** 2:9.1f} MiB {pageCount:>10,} pages"
+
+
+def time_read(path: str, argumentSets: list) -> float:
+    """Returns the mean time in ms of calling select_prices once per set of keyword arguments."""
+    from DatabaseHandling.priceStore import select_prices
+
+    started = time.perf_counter()
+    for arguments in argumentSets:
+        select_prices(databasePath=path, **arguments)
+    return (time.perf_counter() - started) / len(argumentSets) * 1000
+
+
+def compare(paths: dict, repeats: int = 50, seed: int = 0):
+    firstPath = next(iter(paths.values()))
+    conn = sqlite3.connect(firstPath)
+    tickers = [
+        row[0] for row in conn.execute("SELECT DISTINCT ticker FROM StockPrices")
+    ]
+    dates = [
+        row[0]
+        for row in conn.execute("SELECT DISTINCT date FROM StockPrices ORDER BY date")
+    ]
+    conn.close()
+
+    rng = random.Random(seed)
+    yearArguments = []
+    for _ in range(repeats):
+        start = rng.randrange(max(1, len(dates) - 252))
+        yearArguments.append(
+            {
+                "columns": HISTORY_COLUMNS,
+                "tickers": [rng.choice(tickers)],
+                "startDate": dates[start],
+                "endDate": dates[min(start + 251, len(dates) - 1)],
+                "orderBy": "date",
+            }
+        )
+    historyArguments = [
+        {
+            "columns": HISTORY_COLUMNS,
+            "tickers": [rng.choice(tickers)],
+            "orderBy": "date",
+        }
+        for _ in range(repeats)
+    ]
+    pointArguments = []
+    dateArguments = []
+    for _ in range(repeats):
+        date = rng.choice(dates)
+        pointArguments.append(
+            {
+                "columns": SEARCH_COLUMNS,
+                "tickers": [rng.choice(tickers)],
+                "startDate": date,
+                "endDate": date,
+            }
+        )
+        date = rng.choice(dates)
+        dateArguments.append(
+            {"columns": ("ticker", "close"), "startDate": date, "endDate": date}
+        )
+
+    print(
+        f"\n{'layout':<34}{'size':>14}{'pages':>17}{'1y range':>12}{'history':>12}{'point':>10}{'date':>10}   (ms)"
+    )
+    for name, path in paths.items():
+        print(
+            f"{name:<34}{describe(path)}"
+            f"{time_read(path, yearArguments):12.2f}"
+            f"{time_read(path, historyArguments):12.2f}"
+            f"{time_read(path, pointArguments):10.2f}"
+            f"{time_read(path, dateArguments):10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--source", default="data/main.sql")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument(
+        "--workdir",
+        default=None,
+        help="where the migrated copies are written (default: a temporary directory, removed afterwards)",
+    )
+    arguments = parser.parse_args()
+
+    workDirectory = arguments.workdir or tempfile.mkdtemp(prefix="layouts-")
+    try:
+        compare(prepare_layouts(arguments.source, workDirectory), arguments.repeats)
+    finally:
+        if arguments.workdir is None:
+            shutil.rmtree(workDirectory)
@@ -1 +1,61 @@
-# this will be for installing dependencies etc.
\ No newline at end of file
+# this will be for installing dependencies etc.
+
+# When True, every US ticker returned by the grouped daily endpoint is stored (~10k per day), instead of only the
+# companies in company_dictionary. Tickers that are not already in the Companies table are added with their ticker
+# as their name. This is opt-in as it makes the database roughly 100x larger.
+FULL_UNIVERSE = False
+
+# When set to a number of years, backfill moves every older year of prices out of data/main.sql into a read-only
+# archive file per year in data/archive (see DatabaseHandling/archive.py), keeping the live database small. The
+# archived years can still be graphed, searched and sorted. None keeps everything in data/main.sql.
+ARCHIVE_AFTER_YEARS = None
+COMPRESS_ARCHIVES = False  # gzip the archives; they are decompressed into the temporary folder when read
+
+# The technical indicators kept up to date in the TechnicalIndicators table after each backfill (see
+# DatabaseHandling/indicators.py), as indicator -> windows in trading days. The screener reads these instead of
+# working them out. Changing this works out every ticker's indicators again on the next update.
+INDICATOR_WINDOWS = {
+    "sma": (20, 50, 200),
+    "ema": (12, 26),
+    "rsi": (14,),
+    "stddev": (20,),
+    "volatility": (20,),
+    "avg_volume": (20,),
+    "atr": (14,),
+}
+
+# The live quotes of the watchlist (see DatabaseHandling/watchlist.py) are polled in the background, at most
+# QUOTE_REQUESTS_PER_MINUTE times a minute in total. While the market is open each ticker is quoted every
+# QUOTE_INTERVALS seconds (shortest, longest): more often the more it has moved and the closer it is to an alert
+# rule. While the market is closed every ticker is quoted every QUOTE_CLOSED_INTERVAL seconds.
+QUOTE_REQUESTS_PER_MINUTE = 30
+QUOTE_INTERVALS = (15, 300)
+QUOTE_CLOSED_INTERVAL = 1800
+
+# The forward horizons, in trading days, that a backtest (see DatabaseHandling/backtest.py) reports the returns
+# after a rule fired over.
+BACKTEST_HORIZONS = (1, 5, 20)
+
+# Long range graphs are drawn at a level of detail that fits the screen (see graphing/downsample.py): each line is
+# thinned to at most GRAPH_POINT_BUDGET points, and bars are grouped into weeks or months once a ticker would have
+# more than GRAPH_BAR_BUDGET of them, or GRAPH_CANDLE_BUDGET candles (each is wider than a bar, with its wicks).
+# Figures with more than WEBGL_POINTS points in total are drawn with WebGL.
+GRAPH_POINT_BUDGET = 1500
+GRAPH_BAR_BUDGET = 300
+GRAPH_CANDLE_BUDGET = 150
+WEBGL_POINTS = 1000
+
+# The most memory, in megabytes, used by the cache of graph datasets and figures (see graphing/cache.py), so that
+# generating the same graph again is instant. The least recently used graphs are dropped first.
+GRAPH_CACHE_MEGABYTES = 64
+
+# Correlations between tickers (see graphing/universe.py) are only worked out over at least CORRELATION_MIN_DAYS
+# days both have a return on, and CORRELATION_BLOCK_SIZE tickers' correlations with every other ticker are worked
+# out at a time, which bounds the memory used when the full universe is stored.
+CORRELATION_MIN_DAYS = 20
+CORRELATION_BLOCK_SIZE = 1000
+
+# How long, in seconds, a connection that writes to the database waits for another writer to finish before giving
+# up with "database is locked". The post-ingest hooks (see DatabaseHandling/ingestPipeline.py) write on worker threads
+# while the next date is being inserted, so each write can have to wait for the others.
+DATABASE_BUSY_TIMEOUT = 60
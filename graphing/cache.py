@@ -0,0 +1,317 @@
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+# A least recently used cache of what the graph screen builds, so generating the same graph again (or the same
+# companies over a slightly longer range) does not start from scratch:
+#   - datasets: the DataFrame of rows for (tickers, startDate, endDate, columns), as read from the price store
+#   - figures: the plotly figures built for (tickers, startDate, endDate, graph type, layout)
+#   - candles: a ticker's bars grouped into weekly or monthly candles, for (ticker, startDate, endDate, period)
+#   - universe: matrices over every ticker, e.g. the daily returns and correlations, for (startDate, endDate, kind)
+#
+# When a dataset is asked for over a range that overlaps a cached one for the same tickers, only the dates either
+# side of the cached range are read, and added to the rows already cached.
+#
+# Entries are dropped, least recently used first, once their estimated size is over the memory cap
+# (GRAPH_CACHE_MEGABYTES in config.py). The 'graph_cache' post-ingest hook (see DatabaseHandling/ingestPipeline.py)
+# drops the entries of the ingested tickers whose range includes an ingested date, so a graph never shows a range
+# with a date missing.
+
+# rough bytes per point of a cached figure: the date string and value of each point, and plotly's validation copies
+FIGURE_BYTES_PER_POINT = 150
+FIGURE_OVERHEAD_BYTES = 20_000
+CANDLE_COLUMNS = ("date", "open", "high", "low", "close", "volume", "ticker")
+
+
+def _next_day(day: str) -> str:
+    return str(date.fromisoformat(day) + timedelta(days=1))
+
+
+def _previous_day(day: str) -> str:
+    return str(date.fromisoformat(day) - timedelta(days=1))
+
+
+def _figure_size(figures: list) -> int:
+    """An estimate of the memory used by some figures, from the number of points they hold."""
+    points = sum(
+        len(trace.x) if trace.x is not None else 0
+        for fig in figures
+        for trace in fig.data
+    )
+    return points * FIGURE_BYTES_PER_POINT + FIGURE_OVERHEAD_BYTES * len(figures)
+
+
+class GraphCache:
+    """
+    Least recently used cache of graph datasets and figures, with a memory cap.
+
+    Parameters:
+        - maxBytes (int): Optional. The most memory the cached entries may use, as estimated. Defaults to
+          GRAPH_CACHE_MEGABYTES in config.py.
+
+    Note:
+        - Shared between the GUI and the post-ingest hook's worker thread, hence guarded by a lock.
+        - Keys start with (tickers, startDate, endDate), so invalidate() can find the entries a new date affects.
+
+    Example:
+        ```
+        >>> data = graph_cache.frame(("AAPL", "MSFT"), "2023-01-03", "2023-06-30")
+        >>> graph_cache.frame(("AAPL", "MSFT"), "2023-01-03", "2023-12-29")  # only reads July to December
+        ```
+    """
+
+    def __init__(self, maxBytes: int = None):
+        if maxBytes is None:
+            from config import GRAPH_CACHE_MEGABYTES
+
+            maxBytes = GRAPH_CACHE_MEGABYTES * 1024 * 1024
+        self._maxBytes = maxBytes
+        # key -> (value, estimated bytes), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self) -> int:
+        """The estimated bytes used by the cached entries."""
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __get(self, key):
+        """Returns a cached value, marking it as recently used, or None. Call with the lock held."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def __put(self, key, value, size: int):
+        """Caches a value, then drops the least recently used entries until under the cap. Call with the lock held."""
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        if size > self._maxBytes:  # would push out everything else
+            return
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self._maxBytes:
+            _, (_, droppedSize) = self._entries.popitem(last=False)
+            self._bytes -= droppedSize
+
+    def frame(
+        self,
+        tickers,
+        startDate: str,
+        endDate: str,
+        columns: tuple = ("date", "close", "ticker"),
+    ):
+        """
+        Retrieve the stored rows for several tickers between two dates, as PriceStore.get_frame does.
+
+        Parameters:
+            - tickers (iterable): The ticker symbols to include.
+            - startDate (str): The first date of the range (yyyy-mm-dd).
+            - endDate (str): The last date of the range (yyyy-mm-dd).
+            - columns (tuple): The columns to include, which must include "date" and "ticker".
+
+        Returns:
+            - pandas.DataFrame: One row per (ticker, date), grouped by ticker in the order given, then sorted by date.
+              It is shared with the cache, so copy it before changing it.
+
+        Dependencies:
+            - The 'pandas' library for handling data in DataFrame format.
+        """
+        import pandas as pd
+        from DatabaseHandling.priceStore import price_store
+
+        tickers, columns = tuple(tickers), tuple(columns)
+        key = ("frame", tickers, startDate, endDate, columns)
+        with self._lock:
+            data = self.__get(key)
+            if data is not None:
+                self.hits += 1
+                return data
+            self.misses += 1
+            overlapping = [
+                (cachedKey[2], cachedKey[3], entry[0])
+                for cachedKey, entry in self._entries.items()
+                if cachedKey[0] == "frame"
+                and cachedKey[1] == tickers
+                and cachedKey[4] == columns
+                and cachedKey[2] <= endDate
+                and cachedKey[3] >= startDate
+            ]
+
+        if overlapping:
+            # the cached range covering the most of the one asked for
+            cachedStart, cachedEnd, cached = max(
+                overlapping,
+                key=lambda entry: (
+                    date.fromisoformat(min(entry[1], endDate))
+                    - date.fromisoformat(max(entry[0], startDate))
+                ),
+            )
+            parts = [
+                cached[(cached["date"] >= startDate) & (cached["date"] <= endDate)]
+            ]
+            if startDate < cachedStart:
+                parts.append(
+                    price_store.get_frame(
+                        tickers, startDate, _previous_day(cachedStart), columns
+                    )
+                )
+            if endDate > cachedEnd:
+                parts.append(
+                    price_store.get_frame(
+                        tickers, _next_day(cachedEnd), endDate, columns
+                    )
+                )
+            order = {ticker: position for position, ticker in enumerate(tickers)}
+            data = (
+                pd.concat(parts, ignore_index=True)
+                .assign(tickerOrder=lambda rows: rows["ticker"].map(order))
+                .sort_values(["tickerOrder", "date"], kind="stable")
+                .drop(columns="tickerOrder")
+                .reset_index(drop=True)
+            )
+        else:
+            data = price_store.get_frame(tickers, startDate, endDate, columns)
+
+        with self._lock:
+            self.__put(key, data, int(data.memory_usage(deep=True).sum()))
+        return data
+
+    def figures(self, key: tuple, build) -> list:
+        """
+        Retrieve cached figures, or build and cache them.
+
+        Parameters:
+            - key (tuple): (tickers, startDate, endDate, graph type, layout), where tickers is a tuple and the
+              layout is anything else the figures depend on (e.g. displayOnSameGraph).
+            - build (callable): Called with no arguments to build the list of figures if they are not cached.
+
+        Returns:
+            - list: The figures. They are shared with the cache, so do not change them.
+        """
+        key = ("figures",) + tuple(key)
+        with self._lock:
+            figures = self.__get(key)
+            if figures is not None:
+                self.hits += 1
+                return figures
+            self.misses += 1
+
+        figures = build()
+        with self._lock:
+            self.__put(key, figures, _figure_size(figures))
+        return figures
+
+    def candles(self, ticker: str, startDate: str, endDate: str, period: str):
+        """
+        Retrieve a ticker's bars between two dates grouped into candles of a period, as resample_bars does.
+
+        Parameters:
+            - ticker (str): The ticker symbol.
+            - startDate (str): The first date of the range (yyyy-mm-dd).
+            - endDate (str): The last date of the range (yyyy-mm-dd).
+            - period (str): One of graphing.downsample.BAR_PERIODS.
+
+        Returns:
+            - pandas.DataFrame: One row per candle, with the columns of CANDLE_COLUMNS. It is shared with the cache,
+              so copy it before changing it.
+
+        Note:
+            - Each (ticker, period) is cached on its own, so switching a graph between daily, weekly and monthly
+              candles only groups the days the first time, and the daily rows are read once for every period.
+        """
+        from graphing.downsample import resample_bars
+
+        key = ("candles", (ticker,), startDate, endDate, period)
+        with self._lock:
+            data = self.__get(key)
+            if data is not None:
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        data = resample_bars(
+            self.frame((ticker,), startDate, endDate, CANDLE_COLUMNS), period
+        )
+        with self._lock:
+            self.__put(key, data, int(data.memory_usage(deep=True).sum()))
+        return data
+
+    def universe(self, kind: str, startDate: str, endDate: str, build):
+        """
+        Retrieve a cached matrix over every ticker, such as the daily returns of graphing/universe.py, or build and
+        cache it.
+
+        Parameters:
+            - kind (str): What the matrix is, e.g. "returns" or "correlation".
+            - startDate (str): The first date of the range (yyyy-mm-dd).
+            - endDate (str): The last date of the range (yyyy-mm-dd).
+            - build (callable): Called with no arguments to build the pandas.DataFrame if it is not cached.
+
+        Returns:
+            - pandas.DataFrame: The matrix. It is shared with the cache, so copy it before changing it.
+
+        Note:
+            - The key's tickers are None, so new rows for any ticker in the range drop it.
+        """
+        key = ("universe", None, startDate, endDate, kind)
+        with self._lock:
+            data = self.__get(key)
+            if data is not None:
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        data = build()
+        with self._lock:
+            self.__put(key, data, int(data.memory_usage(deep=True).sum()))
+        return data
+
+    def invalidate(self, tickers=None, dates=None) -> int:
+        """
+        Drops the entries that new rows affect.
+
+        Parameters:
+            - tickers (iterable): Optional. The tickers with new rows. Defaults to every ticker.
+            - dates (iterable): Optional. The new dates. Entries whose range includes one of them are dropped. Defaults
+              to every date, e.g. when whole histories have been added.
+
+        Returns:
+            - int: The number of entries dropped.
+        """
+        tickers = None if tickers is None else set(tickers)
+        dates = None if dates is None else sorted(dates)
+        with self._lock:
+            dropped = []
+            for key in self._entries:
+                _, keyTickers, startDate, endDate = key[:4]
+                # None stands for every ticker (see universe)
+                if (
+                    tickers is not None
+                    and keyTickers is not None
+                    and tickers.isdisjoint(keyTickers)
+                ):
+                    continue
+                if dates is not None and not any(
+                    startDate <= day <= endDate for day in dates
+                ):
+                    continue
+                dropped.append(key)
+            for key in dropped:
+                self._bytes -= self._entries.pop(key)[1]
+            return len(dropped)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+graph_cache = GraphCache()
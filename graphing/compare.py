@@ -0,0 +1,86 @@
+import numpy as np
+
+# Performance comparison of any number of companies over a range, on a scale they share however different their
+# prices are:
+#   - rebased: each company's close as a percentage of its first close in the range, so every line starts at 100
+#   - relative: a rebased line divided by a benchmark's, rebased from the same date, so a line above 100 has done
+#     better than the benchmark since then
+#
+# Both are worked out for every company at once on a matrix of dates x tickers, so comparing 30 companies costs
+# about the same as comparing 3. A company whose history starts after the first date of the range is rebased from
+# its own first date.
+
+
+def close_matrix(frame, tickers=None):
+    """
+    Pivots the rows of a long DataFrame into a matrix of closes.
+
+    Parameters:
+        - frame (pandas.DataFrame): One row per (ticker, date), with date, close and ticker columns.
+        - tickers (iterable): Optional. The order of the columns. Defaults to the order of the frame's tickers.
+
+    Returns:
+        - pandas.DataFrame: A row per date (in order) and a column per ticker, with NaN where a ticker has no close.
+    """
+    if tickers is None:
+        tickers = frame["ticker"].unique()
+    matrix = frame.pivot(index="date", columns="ticker", values="close").sort_index()
+    return matrix.reindex(columns=list(tickers)).astype(float)
+
+
+def rebase(closes, base: float = 100.0):
+    """
+    Rebases every column of a matrix of closes to base at its first close.
+
+    Example:
+        ```
+        >>> rebase(pd.DataFrame({"A": [10, 12, 9], "B": [np.nan, 50, 55]}))
+               A      B
+        0  100.0    NaN
+        1  120.0  100.0
+        2   90.0  110.0
+        ```
+    """
+    if closes.empty:
+        return closes
+    first = closes.bfill().iloc[0]
+    return closes / first.where(first != 0) * base
+
+
+def relative_to(closes, benchmark: str, base: float = 100.0):
+    """
+    Divides every column of a matrix of closes by a benchmark column, both rebased from the column's first close.
+
+    Parameters:
+        - closes (pandas.DataFrame): The dates x tickers closes, including the benchmark.
+        - benchmark (str): The benchmark's column. Dates it has no close on take its latest close before them.
+        - base (float): The value every line starts at.
+
+    Returns:
+        - pandas.DataFrame: The relative performance of every column, with base meaning level with the benchmark.
+
+    Raises:
+        ValueError: If the benchmark is not one of the columns.
+
+    Dependencies:
+        - The 'pandas' library for handling data in DataFrame format.
+    """
+    import pandas as pd
+
+    if benchmark not in closes.columns:
+        raise ValueError(f"The benchmark {benchmark} is not being compared")
+    values = closes.to_numpy()
+    benchmarkValues = closes[benchmark].ffill().bfill().to_numpy()
+    # the row of each column's first close, and the benchmark's close on it
+    known = ~np.isnan(values)
+    firstRows = known.argmax(axis=0)
+    first = values[firstRows, np.arange(values.shape[1])]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative = (
+            values
+            / first
+            * (benchmarkValues[firstRows] / benchmarkValues[:, None])
+            * base
+        )
+    relative[:, ~known.any(axis=0)] = np.nan
+    return pd.DataFrame(relative, index=closes.index, columns=closes.columns)
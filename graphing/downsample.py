@@ -0,0 +1,197 @@
+import numpy as np
+
+# Level of detail for long range graphs. A graph is only a few thousand pixels wide, so drawing every daily row of a
+# multi-year range sends the browser far more points than it can show, and makes it slow to draw and to pan.
+#
+# Lines are thinned with largest triangle three buckets (LTTB): the series is split into as many buckets as the
+# point budget, and from each bucket the point that makes the largest triangle with the point kept from the bucket
+# before and the mean of the bucket after is kept. This keeps the peaks and troughs a reader looks for, where taking
+# every nth row would skip them.
+#
+# The chart drawn inside the app (see gui/chartPanel.py) re-thins the visible window every time it is panned or
+# zoomed, which LTTB's loop over buckets is too slow for with many lines. Instead it keeps the lowest and highest
+# point of each pixel column (min/max decimation), worked out for every column at once, which draws the same line as
+# every point would.
+#
+# Bars are grouped into weeks, or months, once there would be more of them than the bar budget, with the open of
+# the first day, the highest high, the lowest low and the close of the last day of each period (and the volumes
+# summed), drawn at the period's last trading day.
+#
+# The budgets are per trace, so a short range (e.g. zooming in on a few months) is always drawn at full detail.
+
+# periods bars are grouped into, shortest first, as pandas period frequencies
+BAR_PERIODS = ("D", "W-FRI", "M")
+AGGREGATIONS = {
+    "open": "first",
+    "high": "max",
+    "low": "min",
+    "close": "last",
+    "volume": "sum",
+    "weighted_volume": "mean",
+}
+
+
+def lttb(x, y, threshold: int) -> np.ndarray:
+    """
+    Picks the points of a line to keep with largest triangle three buckets.
+
+    Parameters:
+        - x (array like): The x values, in increasing order, as numbers.
+        - y (array like): The y values.
+        - threshold (int): The most points to keep. The first and last points are always kept.
+
+    Returns:
+        - numpy.ndarray: The indices of the points to keep, in order. Every index if there are no more points than
+          threshold.
+
+    Example:
+        ```
+        >>> lttb(np.arange(10), np.array([0, 1, 0, 5, 0, 1, 0, -4, 0, 1]), 5)
+        array([0, 2, 3, 7, 9])
+        ```
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    # the points between the first and last split into threshold - 2 buckets
+    edges = np.floor(np.linspace(1, length - 1, threshold - 1)).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, length - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            nextStart, nextEnd = edges[bucket + 1], edges[bucket + 2]
+        else:
+            nextStart, nextEnd = length - 1, length
+        averageX = x[nextStart:nextEnd].mean()
+        averageY = y[nextStart:nextEnd].mean()
+        # twice the area of the triangle each point in the bucket makes with the last point kept and the next mean
+        areas = np.abs(
+            (x[previous] - averageX) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (averageY - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def minmax(y, buckets: int) -> np.ndarray:
+    """
+    Picks the points of a line to keep with min/max decimation: the lowest and highest of each of buckets equal runs.
+
+    Parameters:
+        - y (array like): The y values, in the order of their x values.
+        - buckets (int): The number of runs, e.g. the width in pixels the line is drawn over.
+
+    Returns:
+        - numpy.ndarray: The indices of the points to keep, in order. The first and last points, and the points after
+          the last full run, are always kept. Every index if there are no more than about 2 * buckets points.
+
+    Example:
+        ```
+        >>> minmax(np.array([0, 3, 1, 2, 5, 4, 9, 7, 8]), 2)
+        array([0, 1, 5, 6, 8])
+        ```
+    """
+    y = np.asarray(y, dtype=float)
+    length = len(y)
+    if buckets < 1 or length <= 2 * buckets + 2:
+        return np.arange(length)
+    size = length // buckets
+    runs = y[: size * buckets].reshape(buckets, size)
+    starts = np.arange(buckets) * size
+    return np.unique(
+        np.concatenate(
+            (
+                [0, length - 1],
+                starts + np.argmin(runs, axis=1),
+                starts + np.argmax(runs, axis=1),
+                np.arange(size * buckets, length),
+            )
+        )
+    )
+
+
+def downsample_lines(
+    frame, threshold: int, x: str = "date", y: str = "close", by: str = "ticker"
+):
+    """
+    Thins every line in a long DataFrame (one row per (line, x)) to at most threshold points each with LTTB.
+
+    Parameters:
+        - frame (pandas.DataFrame): The rows, sorted by x within each line.
+        - threshold (int): The most points kept per line.
+        - x (str): The column of the x values (dates as yyyy-mm-dd strings, or numbers).
+        - y (str): The column of the y values. Rows where it is missing are dropped.
+        - by (str): The column naming each line.
+
+    Returns:
+        - pandas.DataFrame: The rows kept, in the same order.
+
+    Dependencies:
+        - The 'pandas' library for handling data in DataFrame format.
+    """
+    import pandas as pd
+
+    frame = frame.dropna(subset=[y])
+    kept = []
+    for _, rows in frame.groupby(by, sort=False):
+        if len(rows) <= threshold:
+            kept.append(rows)
+            continue
+        xValues = rows[x]
+        if not pd.api.types.is_numeric_dtype(xValues):
+            xValues = pd.to_datetime(xValues).astype("int64")
+        kept.append(rows.iloc[lttb(xValues.to_numpy(), rows[y].to_numpy(), threshold)])
+    if not kept:
+        return frame
+    return pd.concat(kept)
+
+
+def bar_period(tradingDays: int, budget: int) -> str:
+    """The shortest of BAR_PERIODS that fits tradingDays worth of bars into budget bars (per ticker)."""
+    for period, daysPerPeriod in zip(BAR_PERIODS, (1, 5, 21)):
+        if tradingDays / daysPerPeriod <= budget:
+            return period
+    return BAR_PERIODS[-1]
+
+
+def resample_bars(frame, period: str, date: str = "date", by: str = "ticker"):
+    """
+    Groups the daily rows of a long DataFrame into bars of a longer period.
+
+    Parameters:
+        - frame (pandas.DataFrame): One row per (ticker, date), sorted by date within each ticker.
+        - period (str): One of BAR_PERIODS. "D" returns the frame as it is.
+        - date (str): The column of the dates (yyyy-mm-dd).
+        - by (str): The column naming each ticker.
+
+    Returns:
+        - pandas.DataFrame: One row per (ticker, period), dated at the period's last trading day, with the open,
+          high, low, close and volume columns of the frame aggregated as in AGGREGATIONS, and the rest taken from
+          the last day.
+
+    Dependencies:
+        - The 'pandas' library for handling data in DataFrame format.
+    """
+    import pandas as pd
+
+    if period == "D" or frame.empty:
+        return frame
+    periods = pd.to_datetime(frame[date]).dt.to_period(period)
+    aggregations = {
+        column: AGGREGATIONS.get(column, "last")
+        for column in frame.columns
+        if column != by
+    }
+    aggregations[date] = "last"
+    grouped = frame.groupby([frame[by], periods.rename("period")], sort=False).agg(
+        aggregations
+    )
+    return grouped.reset_index(level="period", drop=True).reset_index()[
+        list(frame.columns)
+    ]
@@ -0,0 +1,227 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Headless export of graphs, e.g. for nightly reports over every company, instead of opening a browser tab per
+# figure with fig.show().
+#
+# A graph is exported as standalone HTML, or as a static image (which needs the 'kaleido' package). The HTML files
+# in a directory all load one shared copy of plotly.js (PLOTLY_BUNDLE, written once next to them) rather than each
+# inlining the ~4MB bundle.
+#
+# A batch of jobs, each a (companies, startDate, endDate, graphType) tuple, is rendered across a pool of processes,
+# as building and writing figures is CPU bound and holds the GIL. Each process reads prices through its own price
+# store, and a job that fails is reported with its error without stopping the rest.
+
+GRAPH_TYPES = ("line", "bar", "candlestick")
+IMAGE_FORMATS = ("png", "jpeg", "webp", "svg", "pdf")
+PLOTLY_BUNDLE = "plotly.min.js"
+EXPORT_DIRECTORY = "graphing/GraphExports"
+
+
+def write_plotly_bundle(directory: str) -> str:
+    """Writes plotly.js into directory as PLOTLY_BUNDLE, if it is not already there, and returns its path."""
+    from plotly.offline import get_plotlyjs
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, PLOTLY_BUNDLE)
+    if not os.path.exists(path):
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(get_plotlyjs())
+    return path
+
+
+def export_figures(
+    figures: list, directory: str, name: str, fileFormat: str = "html"
+) -> list:
+    """
+    Writes plotly figures to files, without displaying them.
+
+    Parameters:
+        - figures (list): The figures, e.g. from Generate.line_figures.
+        - directory (str): The folder to write them to. It is made if it does not exist.
+        - name (str): The start of the file names. If there are several figures, the name of each figure's first
+          trace (its ticker) is added.
+        - fileFormat (str): "html", or one of IMAGE_FORMATS.
+
+    Returns:
+        - list: The paths written. Files with the same name are overwritten.
+
+    Raises:
+        ValueError: If the format is unknown.
+        RuntimeError: From plotly, if an image is asked for without 'kaleido' installed.
+    """
+    if fileFormat != "html" and fileFormat not in IMAGE_FORMATS:
+        raise ValueError(
+            f"Unknown export format: {fileFormat}. Use html or one of {', '.join(IMAGE_FORMATS)}"
+        )
+    if fileFormat == "html":
+        write_plotly_bundle(directory)
+    else:
+        os.makedirs(directory, exist_ok=True)
+
+    paths = []
+    for fig in figures:
+        fileName = name
+        if len(figures) > 1 and fig.data:
+            fileName = f"{name}_{fig.data[0].name}"
+        path = os.path.join(directory, f"{fileName}.{fileFormat}")
+        if fileFormat == "html":
+            fig.write_html(path, include_plotlyjs=PLOTLY_BUNDLE)
+        else:
+            fig.write_image(path)
+        paths.append(path)
+    return paths
+
+
+def export_graph(
+    companies,
+    startDate: str,
+    endDate: str,
+    graphType: str = "line",
+    displayOnSameGraph: bool = True,
+    directory: str = EXPORT_DIRECTORY,
+    fileFormat: str = "html",
+) -> list:
+    """
+    Builds a graph of some companies over a date range, as Generate does, and writes it to files.
+
+    Parameters:
+        - companies (iterable): The tickers to graph.
+        - startDate (str): The first date (yyyy-mm-dd).
+        - endDate (str): The last date (yyyy-mm-dd).
+        - graphType (str): One of GRAPH_TYPES.
+        - displayOnSameGraph (bool): If True, every company on the same axes. If False, a panel per company.
+        - directory (str): The folder to write to.
+        - fileFormat (str): "html", or one of IMAGE_FORMATS.
+
+    Returns:
+        - list: The paths written.
+
+    Raises:
+        ValueError: If the graph type, format or dates are not valid, or a candlestick graph's companies have no
+            stored lows (see backfill_missing_lows in DatabaseHandling/autoBackfill.py).
+
+    Example:
+        ```
+        >>> export_graph(["AAPL", "MSFT"], "2023-01-01", "2023-12-29")
+        ['graphing/GraphExports/AAPL-MSFT_line_2023-01-01_2023-12-29.html']
+        ```
+    """
+    from graphing.generate import Generate
+
+    if graphType not in GRAPH_TYPES:
+        raise ValueError(
+            f"Unknown graph type: {graphType}. Use one of {', '.join(GRAPH_TYPES)}"
+        )
+    companies = list(companies)
+    generator = Generate(startDate, endDate, *companies)
+    if graphType == "line":
+        figures = generator.line_figures(displayOnSameGraph)
+    elif graphType == "bar":
+        figures = generator.bar_figures(displayOnSameGraph)
+    else:  # one figure with a panel per company, whatever displayOnSameGraph is
+        figures = generator.candlestick_figures()
+    name = f"{'-'.join(companies)}_{graphType}_{startDate}_{endDate}"
+    return export_figures(figures, directory, name, fileFormat)
+
+
+def _export_job(job: tuple, displayOnSameGraph: bool, directory: str, fileFormat: str):
+    """Runs one job of export_batch in a worker process."""
+    companies, startDate, endDate, graphType = job
+    return export_graph(
+        companies,
+        startDate,
+        endDate,
+        graphType,
+        displayOnSameGraph,
+        directory,
+        fileFormat,
+    )
+
+
+def export_batch(
+    jobs,
+    directory: str = EXPORT_DIRECTORY,
+    fileFormat: str = "html",
+    displayOnSameGraph: bool = True,
+    maxWorkers: int = None,
+) -> list:
+    """
+    Exports many graphs in parallel across a pool of processes.
+
+    Parameters:
+        - jobs (iterable): (companies, startDate, endDate, graphType) tuples, one per graph.
+        - directory (str): The folder to write to.
+        - fileFormat (str): "html", or one of IMAGE_FORMATS.
+        - displayOnSameGraph (bool): As in export_graph, for every job.
+        - maxWorkers (int): Optional. The most processes used. Defaults to the number of CPUs.
+
+    Returns:
+        - list: (job, paths written, exception or None) for every job, in the order given.
+
+    Note:
+        - Run it from the project root, under an `if __name__ == "__main__":` guard, as the worker processes import
+          the calling module and read data/main.sql relative to the working directory.
+
+    Example:
+        ```
+        >>> jobs = [((ticker,), "2023-01-01", "2023-12-29", "line") for ticker in tickers]
+        >>> [job for job, paths, error in export_batch(jobs) if error]
+        []
+        ```
+    """
+    jobs = [
+        (tuple(companies), startDate, endDate, graphType)
+        for companies, startDate, endDate, graphType in jobs
+    ]
+    if fileFormat == "html":
+        # before the workers, so they never race to write it
+        write_plotly_bundle(directory)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=maxWorkers) as executor:
+        futures = [
+            executor.submit(_export_job, job, displayOnSameGraph, directory, fileFormat)
+            for job in jobs
+        ]
+        for job, future in zip(jobs, futures):
+            error = future.exception()
+            results.append((job, [] if error else future.result(), error))
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import sqlite3
+    import time
+    from datetime import date, timedelta
+
+    parser = argparse.ArgumentParser(
+        description="Exports a graph of every company, e.g. for a nightly report."
+    )
+    parser.add_argument("--days", type=int, default=365, help="calendar days graphed")
+    parser.add_argument("--type", default="line", choices=GRAPH_TYPES)
+    parser.add_argument("--format", default="html")
+    parser.add_argument("--directory", default=EXPORT_DIRECTORY)
+    parser.add_argument("--workers", type=int, default=None)
+    arguments = parser.parse_args()
+
+    conn = sqlite3.connect("data/main.sql")
+    tickers = [row[0] for row in conn.execute("SELECT ticker FROM Companies")]
+    endDate = conn.execute("SELECT MAX(date) FROM StockPrices").fetchone()[0]
+    conn.close()
+    startDate = str(date.fromisoformat(endDate) - timedelta(days=arguments.days))
+
+    started = time.perf_counter()
+    results = export_batch(
+        [((ticker,), startDate, endDate, arguments.type) for ticker in tickers],
+        arguments.directory,
+        arguments.format,
+        maxWorkers=arguments.workers,
+    )
+    for job, paths, error in results:
+        if error is not None:
+            print(f"{job[0][0]}: {error}")
+    print(
+        f"Exported {sum(len(paths) for _, paths, _ in results)} graphs in {time.perf_counter() - started:.1f}s"
+    )
@@ -1,11 +1,17 @@
 import sqlite3
 
+_companyNames = {}  # ticker -> name, as names do not change once a company is stored
+
+CANDLE_STYLES = ("candlestick", "ohlc")
+_PERIOD_LABELS = {"D": "", "W-FRI": "weekly ", "M": "monthly "}
+
 
 class Generate:
     def __init__(self, startDate: str, endDate: str, *companies):
         self._startDate = startDate
         self._endDate = endDate
-        self._companies = companies
+        # a company selected more than once is only graphed once
+        self._companies = tuple(dict.fromkeys(companies))
         self._data = None
 
         self.__check_dates()
@@ -61,7 +67,7 @@ class Generate:
 
     def __get_data(self):
         """
-        Retrieve stock price data from a SQLite database for specified companies and date range.
+        Retrieve stock price data for specified companies and date range from the price store.
 
         Parameters:
             None
@@ -70,40 +76,28 @@ class Generate:
             None
 
         Dependencies:
-            - The 'pandas' library for handling data in DataFrame format.
-            - The 'sqlite3' module for accessing and querying the database.
+            - The 'graph_cache' from graphing.cache, which keeps the rows of recent graphs and reads them through the
+              'price_store', which caches each company's history in memory.
 
         Note:
             - This method is intended for internal use within a class and does not provide a direct external interface.
         """
-        import pandas as pd
-
-        try:
-            conn = sqlite3.connect("data/main.sql")
-
-            query = f"""
-                SELECT date, close, ticker
-                FROM StockPrices
-                WHERE date >= '{self._startDate}' AND date <= '{self._endDate}'
-                AND ticker IN ({','.join([f"'{c}'" for c in self._companies])})
-            """
+        from graphing.cache import graph_cache
 
-            # Execute the query and fetch the results into a DataFrame
-            self._data = pd.read_sql_query(query, conn)
-
-        except sqlite3.Error as error:
-            print("Error: {}".format(error))
-
-        finally:
-            conn.close()
+        self._data = graph_cache.frame(
+            self._companies, self._startDate, self._endDate, ("date", "close", "ticker")
+        )
 
     def __get_company_name_from_ticker(self, ticker):
         """Helper function to get the company name of tickers, so that they can be displayed on the title of the graph"""
+        if ticker in _companyNames:
+            return _companyNames[ticker]
         try:
             conn = sqlite3.connect("data/main.sql")
             cursor = conn.cursor()
             cursor.execute("SELECT name FROM Companies where ticker = ?", (ticker,))
             result = cursor.fetchall()
+            _companyNames[ticker] = result[0][0]
             return result[0][0]
 
         except sqlite3.Error as error:
@@ -116,69 +110,410 @@ class Generate:
             if conn:
                 conn.close()
 
-    def generate_line_graph(self, displayOnSameGraph=True):
+    def __line_data(self):
         """
-        Generate and display a line graph of stock prices for specified companies over a given date range.
+        Thin each company's closes to the point budget for drawing as lines.
+
+        Returns:
+            - pandas.DataFrame: The rows to draw.
+
+        Dependencies:
+            - graphing.downsample for largest triangle three buckets downsampling.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        from config import GRAPH_POINT_BUDGET
+        from graphing.downsample import downsample_lines
+
+        return downsample_lines(self._data, GRAPH_POINT_BUDGET)
+
+    def __bar_data(self):
+        """
+        Group each company's closes into weekly or monthly bars if there are more days than the bar budget.
+
+        Returns:
+            - tuple: (pandas.DataFrame of the bars to draw, "weekly " or "monthly " for the title, or "" for daily bars)
+
+        Dependencies:
+            - graphing.downsample for resampling daily rows into longer periods.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        from config import GRAPH_BAR_BUDGET
+        from graphing.downsample import bar_period, resample_bars
+
+        tradingDays = (
+            int(self._data.groupby("ticker").size().max()) if len(self._data) else 0
+        )
+        period = bar_period(tradingDays, GRAPH_BAR_BUDGET)
+        return resample_bars(self._data, period), _PERIOD_LABELS[period]
+
+    def zoom(self, startDate: str, endDate: str):
+        """
+        Re-request a window of the graph, which is drawn at full detail if it is short enough to fit the budgets.
 
         Parameters:
-            - displayOnSameGraph (bool): If True, display all companies on the same graph. If False, display each company on a separate graph.
+            - startDate (str): The first date of the window (yyyy-mm-dd).
+            - endDate (str): The last date of the window (yyyy-mm-dd).
 
         Returns:
-            None
+            - Generate: A new instance for the same companies over the window. The rows come from the price store's
+              cache, so no database read is needed for companies already graphed.
+
+        Raises:
+            - ValueError: If the dates are not valid (see __check_dates).
+
+        Example:
+            ```
+            >>> instance.zoom("2023-03-01", "2023-06-01").generate_line_graph()
+            ```
+        """
+        return Generate(startDate, endDate, *self._companies)
+
+    def __panel_figure(self, data, graphType: str, title: str):
+        """
+        Build one figure with a panel per company, stacked with a shared date axis.
+
+        Parameters:
+            - data (pandas.DataFrame): The rows to draw, with date, close and ticker columns.
+            - graphType (str): "line" or "bar".
+            - title (str): The title of the figure. Each panel is titled with its company's name.
+
+        Returns:
+            - plotly.graph_objects.Figure: The figure.
 
         Dependencies:
-            - The 'plotly.express' library for creating interactive visualizations.
+            - The 'plotly' library's subplots and graph objects.
 
         Note:
-            - This method is intended for external use and provides a direct interface to generate line graphs.
+            - The rows are grouped by ticker once, rather than filtered once per company, and every panel goes into
+              the same figure, so there is one render however many companies there are.
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+
+        groups = list(data.groupby("ticker", sort=False))
+        panels = max(len(groups), 1)
+        fig = make_subplots(
+            rows=panels,
+            cols=1,
+            shared_xaxes=True,
+            vertical_spacing=min(0.06, 0.3 / panels),
+            subplot_titles=[
+                self.__get_company_name_from_ticker(ticker).replace(".", "")
+                for ticker, _ in groups
+            ],
+        )
+        for row, (ticker, rows) in enumerate(groups, start=1):
+            if graphType == "bar":
+                trace = go.Bar(x=rows["date"], y=rows["close"], name=ticker)
+            elif _render_mode(rows) == "webgl":
+                trace = go.Scattergl(
+                    x=rows["date"], y=rows["close"], name=ticker, mode="lines"
+                )
+            else:
+                trace = go.Scatter(
+                    x=rows["date"], y=rows["close"], name=ticker, mode="lines"
+                )
+            fig.add_trace(trace, row=row, col=1)
+            fig.update_yaxes(title_text="Price in USD", row=row, col=1)
+        fig.update_xaxes(title_text="Date", row=panels, col=1)
+        fig.update_layout(title=title, height=max(450, 220 * panels), showlegend=False)
+        return fig
+
+    def line_figures(self, displayOnSameGraph=True) -> list:
+        """
+        Build line graphs of stock prices for specified companies over a given date range, without displaying them.
+
+        Parameters:
+            - displayOnSameGraph (bool): If True, every company on the same axes. If False, a panel per company in
+              one figure, sharing the date axis.
+
+        Returns:
+            - list: The plotly figures.
+
+        Dependencies:
+            - The 'graph_cache' from graphing.cache, so figures already built for the same companies, dates and layout
+              are reused. They are shared, so copy them (go.Figure(fig)) before changing them.
 
         Example:
             ```
-            >>> instance.generate_line_graph()
+            >>> instance.line_figures()[0].write_html("prices.html")
             ```
         """
+        from graphing.cache import graph_cache
+
+        return graph_cache.figures(
+            (
+                self._companies,
+                self._startDate,
+                self._endDate,
+                "line",
+                displayOnSameGraph,
+            ),
+            lambda: self.__build_line_figures(displayOnSameGraph),
+        )
+
+    def __build_line_figures(self, displayOnSameGraph: bool) -> list:
+        """
+        Build the figures of line_figures.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
         import plotly.express as px
 
-        companies = self._data["ticker"].unique()
-        companiesFullNames = [
-            self.__get_company_name_from_ticker(x).replace(".", "") for x in companies
-        ]
+        data = self.__line_data()
 
+        figures = []
         if displayOnSameGraph:
+            companiesFullNames = [
+                self.__get_company_name_from_ticker(x).replace(".", "")
+                for x in data["ticker"].unique()
+            ]
             fig = px.line(
-                self._data,
+                data,
                 x="date",
                 y="close",
                 color="ticker",
+                render_mode=_render_mode(data),
                 title=f"{', '.join(companiesFullNames)}'s prices from {self._startDate} to {self._endDate}",
             )
             fig.update_xaxes(title_text="Date")
             fig.update_yaxes(title_text="Price in USD")
-            fig.show()
+            figures.append(fig)
+
+        else:  # one panel per company, in a single figure
+            figures.append(
+                self.__panel_figure(
+                    data,
+                    "line",
+                    f"Prices from {self._startDate} to {self._endDate}",
+                )
+            )
+        return figures
+
+    def bar_figures(self, displayOnSameGraph=True) -> list:
+        """
+        Build bar graphs of stock prices for specified companies over a given date range, without displaying them.
+
+        Parameters:
+            - displayOnSameGraph (bool): If True, every company on the same axes. If False, a panel per company in
+              one figure, sharing the date axis.
+
+        Returns:
+            - list: The plotly figures.
+
+        Dependencies:
+            - The 'graph_cache' from graphing.cache, so figures already built for the same companies, dates and layout
+              are reused. They are shared, so copy them (go.Figure(fig)) before changing them.
+        """
+        from graphing.cache import graph_cache
+
+        return graph_cache.figures(
+            (
+                self._companies,
+                self._startDate,
+                self._endDate,
+                "bar",
+                displayOnSameGraph,
+            ),
+            lambda: self.__build_bar_figures(displayOnSameGraph),
+        )
+
+    def __build_bar_figures(self, displayOnSameGraph: bool) -> list:
+        """
+        Build the figures of bar_figures.
 
-        else:  # if not display on same graph
-            for company in companies:
-                filteredData = self._data[
-                    self._data["ticker"] == company
-                ]  # filter dataframe to only get for specific company
-
-                fig = px.line(
-                    filteredData,
-                    x="date",
-                    y="close",
-                    color="ticker",
-                    title=f"{self.__get_company_name_from_ticker(company).replace('.', '')}'s prices from {self._startDate} to {self._endDate}",
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        import plotly.express as px
+
+        data, period = self.__bar_data()
+
+        figures = []
+        if displayOnSameGraph:
+            companiesFullNames = [
+                self.__get_company_name_from_ticker(x).replace(".", "")
+                for x in data["ticker"].unique()
+            ]
+            fig = px.bar(
+                data,
+                x="date",
+                y="close",
+                color="ticker",
+                title=f"{', '.join(companiesFullNames)}'s {period}prices from {self._startDate} to {self._endDate}",
+            )
+            fig.update_xaxes(title_text="Date")
+            fig.update_yaxes(title_text="Price in USD")
+            figures.append(fig)
+
+        else:  # one panel per company, in a single figure
+            figures.append(
+                self.__panel_figure(
+                    data,
+                    "bar",
+                    f"{(period + 'prices').capitalize()} from {self._startDate} to {self._endDate}",
                 )
-                fig.update_xaxes(title_text="Date")
-                fig.update_yaxes(title_text="Price in USD")
-                fig.show()
+            )
+        return figures
+
+    def comparison_figures(self, benchmark: str = None) -> list:
+        """
+        Build a graph comparing the performance of any number of companies over a given date range, without
+        displaying it.
+
+        Parameters:
+            - benchmark (str): Optional. A ticker to compare every company against. If given, each line is the
+              company's performance relative to the benchmark's since the company's first date in the range. If
+              not, each line is the company's close rebased to 100 on that date.
+
+        Returns:
+            - list: The plotly figures.
+
+        Raises:
+            - ValueError: If the benchmark has no prices in the range.
+
+        Dependencies:
+            - graphing.compare for rebasing every company at once.
+            - The 'graph_cache' from graphing.cache, so figures already built for the same companies, dates and
+              benchmark are reused.
+
+        Example:
+            ```
+            >>> Generate("2023-01-03", "2023-12-29", *sector_members()["Technology"]).comparison_figures("AAPL")
+            ```
+        """
+        from graphing.cache import graph_cache
+
+        return graph_cache.figures(
+            (
+                self._companies,
+                self._startDate,
+                self._endDate,
+                "comparison",
+                benchmark,
+            ),
+            lambda: self.__build_comparison_figures(benchmark),
+        )
+
+    def __build_comparison_figures(self, benchmark: str) -> list:
+        """
+        Build the figures of comparison_figures.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        import plotly.express as px
+        from config import GRAPH_POINT_BUDGET
+        from graphing.cache import graph_cache
+        from graphing.compare import close_matrix, rebase, relative_to
+        from graphing.downsample import downsample_lines
+
+        tickers = self._companies
+        data = self._data
+        if benchmark is not None and benchmark not in tickers:
+            tickers += (benchmark,)
+            data = graph_cache.frame(
+                tickers, self._startDate, self._endDate, ("date", "close", "ticker")
+            )
+        closes = close_matrix(data, tickers)
+
+        if benchmark is None:
+            values = rebase(closes)
+            title = f"Performance of {len(self._companies)} companies from {self._startDate} to {self._endDate}, rebased to 100"
+        else:
+            if closes[benchmark].isna().all():
+                raise ValueError(
+                    f"{benchmark} has no prices from {self._startDate} to {self._endDate}"
+                )
+            values = relative_to(closes, benchmark)[list(self._companies)]
+            title = f"Performance of {len(self._companies)} companies relative to {benchmark} from {self._startDate} to {self._endDate}"
+
+        lines = (
+            values.rename_axis(columns="ticker")
+            .stack()
+            .rename("performance")
+            .reset_index()
+            .sort_values(["ticker", "date"], kind="stable")
+        )
+        lines = downsample_lines(lines, GRAPH_POINT_BUDGET, y="performance")
+        fig = px.line(
+            lines,
+            x="date",
+            y="performance",
+            color="ticker",
+            category_orders={"ticker": list(self._companies)},
+            render_mode=_render_mode(lines),
+            title=title,
+        )
+        fig.add_hline(y=100, line_dash="dot", line_color="grey")
+        fig.update_xaxes(title_text="Date")
+        fig.update_yaxes(
+            title_text="Rebased to 100"
+            if benchmark is None
+            else f"Relative to {benchmark}"
+        )
+        return [fig]
+
+    def generate_comparison_graph(self, benchmark: str = None):
+        """
+        Generate and display a graph comparing the performance of any number of companies over a given date range.
+
+        Parameters:
+            - benchmark (str): Optional. A ticker to compare every company against (see comparison_figures).
+
+        Returns:
+            None
+
+        Dependencies:
+            - The 'plotly.express' library for creating interactive visualizations.
+
+        Note:
+            - This method is intended for external use and provides a direct interface to generate comparison graphs.
+
+        Example:
+            ```
+            >>> instance.generate_comparison_graph("MSFT")
+            ```
+        """
+        for fig in self.comparison_figures(benchmark):
+            fig.show()
+
+    def generate_line_graph(self, displayOnSameGraph=True):
+        """
+        Generate and display a line graph of stock prices for specified companies over a given date range.
+
+        Parameters:
+            - displayOnSameGraph (bool): If True, display all companies on the same graph. If False, display each company on its own panel of one figure.
+
+        Returns:
+            None
+
+        Dependencies:
+            - The 'plotly.express' library for creating interactive visualizations.
+
+        Note:
+            - This method is intended for external use and provides a direct interface to generate line graphs.
+
+        Example:
+            ```
+            >>> instance.generate_line_graph()
+            ```
+        """
+        for fig in self.line_figures(displayOnSameGraph):
+            fig.show()
 
     def generate_bar_graph(self, displayOnSameGraph=True):
         """
         Generate and display a bar graph of stock prices for specified companies over a given date range.
 
         Parameters:
-            - displayOnSameGraph (bool): If True, display all companies on the same graph. If False, display each company on a separate graph.
+            - displayOnSameGraph (bool): If True, display all companies on the same graph. If False, display each company on its own panel of one figure.
 
         Returns:
             None
@@ -194,72 +529,245 @@ class Generate:
             >>> instance.generate_bar_graph()
             ```
         """
-        import plotly.express as px
+        for fig in self.bar_figures(displayOnSameGraph):
+            fig.show()
 
-        companies = self._data["ticker"].unique()
-        companiesFullNames = [
-            self.__get_company_name_from_ticker(x).replace(".", "") for x in companies
-        ]
+    def candle_period(self) -> str:
+        """
+        The period candles are grouped into by default: the shortest that keeps each company within the candle budget.
 
-        if displayOnSameGraph:
-            fig = px.bar(
-                self._data,
-                x="date",
-                y="close",
-                color="ticker",
-                title=f"{', '.join(companiesFullNames)}'s prices from {self._startDate} to {self._endDate}",
+        Returns:
+            - str: One of graphing.downsample.BAR_PERIODS ("D", "W-FRI" or "M").
+        """
+        from config import GRAPH_CANDLE_BUDGET
+        from graphing.downsample import bar_period
+
+        tradingDays = (
+            int(self._data.groupby("ticker").size().max()) if len(self._data) else 0
+        )
+        return bar_period(tradingDays, GRAPH_CANDLE_BUDGET)
+
+    def candlestick_figures(
+        self, period: str = None, style: str = "candlestick", indicators=()
+    ) -> list:
+        """
+        Build candlestick or OHLC graphs, with volume, for specified companies over a given date range, without
+        displaying them.
+
+        Parameters:
+            - period (str): Optional. One of graphing.downsample.BAR_PERIODS: "D" for daily, "W-FRI" for weekly or
+              "M" for monthly candles. Defaults to candle_period().
+            - style (str): One of CANDLE_STYLES.
+            - indicators (iterable): Optional. Moving averages to overlay, named as in the 'TechnicalIndicators'
+              table: sma_n or ema_n. They are worked out over the candles' closes, so on weekly candles sma_10 is
+              the mean of the last 10 weekly closes.
+
+        Returns:
+            - list: One plotly figure, with a price panel and a volume panel below it per company.
+
+        Raises:
+            - ValueError: If the period, style or an indicator is not known, or a company has no stored lows at all
+              (see backfill_missing_lows in DatabaseHandling/autoBackfill.py).
+
+        Dependencies:
+            - The 'graph_cache' from graphing.cache, which caches each company's candles per period, so switching
+              between periods only groups the daily rows the first time, and the figures themselves.
+
+        Note:
+            - A candle whose low is missing (a row stored before the low was) is drawn with its low at the lower of
+              its open and close.
+
+        Example:
+            ```
+            >>> instance.candlestick_figures("W-FRI", indicators=("sma_10",))[0].write_html("candles.html")
+            ```
+        """
+        from graphing.cache import graph_cache
+        from graphing.downsample import BAR_PERIODS
+
+        if period is None:
+            period = self.candle_period()
+        if period not in BAR_PERIODS:
+            raise ValueError(
+                f"Unknown period: {period}. Use one of {', '.join(BAR_PERIODS)}"
+            )
+        if style not in CANDLE_STYLES:
+            raise ValueError(
+                f"Unknown candle style: {style}. Use one of {', '.join(CANDLE_STYLES)}"
+            )
+        indicators = tuple(indicators)
+        for name in indicators:
+            _moving_average_window(name)
+
+        return graph_cache.figures(
+            (
+                self._companies,
+                self._startDate,
+                self._endDate,
+                "candlestick",
+                (period, style, indicators),
+            ),
+            lambda: self.__build_candlestick_figures(period, style, indicators),
+        )
+
+    def __build_candlestick_figures(
+        self, period: str, style: str, indicators: tuple
+    ) -> list:
+        """
+        Build the figures of candlestick_figures.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        import pandas as pd
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+        from graphing.cache import graph_cache
+
+        candles = {
+            ticker: graph_cache.candles(ticker, self._startDate, self._endDate, period)
+            for ticker in self._companies
+        }
+        candles = {ticker: rows for ticker, rows in candles.items() if len(rows)}
+        noLows = [
+            ticker for ticker, rows in candles.items() if rows["low"].isna().all()
+        ]
+        if noLows:
+            raise ValueError(
+                f"No lows are stored for {', '.join(noLows)}. Fill them in with Fill In Lows on the preferences screen"
             )
-            fig.update_xaxes(title_text="Date")
-            fig.update_yaxes(title_text="Price in USD")
-            fig.show()
 
-        else:  # if not display on same graph
-            for company in companies:
-                filteredData = self._data[
-                    self._data["ticker"] == company
-                ]  # filter dataframe to only get for specific company
-
-                fig = px.bar(
-                    filteredData,
-                    x="date",
-                    y="close",
-                    color="ticker",
-                    title=f"{self.__get_company_name_from_ticker(company).replace('.', '')}'s prices from {self._startDate} to {self._endDate}",
+        panels = max(len(candles), 1)
+        fig = make_subplots(
+            rows=2 * panels,
+            cols=1,
+            shared_xaxes=True,
+            vertical_spacing=min(0.03, 0.15 / panels),
+            row_heights=[3, 1] * panels,
+            subplot_titles=[
+                title
+                for ticker in candles
+                for title in (
+                    self.__get_company_name_from_ticker(ticker).replace(".", ""),
+                    "",
+                )
+            ],
+        )
+        Trace = go.Candlestick if style == "candlestick" else go.Ohlc
+        for panel, (ticker, rows) in enumerate(candles.items()):
+            row = 2 * panel + 1
+            low = rows["low"].fillna(rows[["open", "close"]].min(axis=1))
+            fig.add_trace(
+                Trace(
+                    x=rows["date"],
+                    open=rows["open"],
+                    high=rows["high"],
+                    low=low,
+                    close=rows["close"],
+                    name=ticker,
+                ),
+                row=row,
+                col=1,
+            )
+            for name in indicators:
+                window = _moving_average_window(name)
+                if name.startswith("sma"):
+                    values = rows["close"].rolling(window).mean()
+                else:
+                    values = rows["close"].ewm(span=window, adjust=False).mean()
+                fig.add_trace(
+                    go.Scatter(
+                        x=rows["date"],
+                        y=values,
+                        name=f"{ticker} {name}",
+                        mode="lines",
+                        line={"width": 1},
+                    ),
+                    row=row,
+                    col=1,
                 )
-                fig.update_xaxes(title_text="Date")
-                fig.update_yaxes(title_text="Price in USD")
-                fig.show()
+            fig.add_trace(
+                go.Bar(
+                    x=rows["date"],
+                    y=rows["volume"],
+                    name=f"{ticker} volume",
+                    marker_color=[
+                        "#26a69a" if rise else "#ef5350"
+                        for rise in rows["close"] >= rows["open"]
+                    ],
+                ),
+                row=row + 1,
+                col=1,
+            )
+            fig.update_yaxes(title_text="Price in USD", row=row, col=1)
+            fig.update_yaxes(title_text="Volume", row=row + 1, col=1)
+
+        fig.update_xaxes(rangeslider_visible=False)
+        if period == "D" and candles:
+            # leave out the weekends and holidays, rather than drawing a gap for every day with no candle
+            traded = set(pd.concat([rows["date"] for rows in candles.values()]))
+            closed = [
+                str(day.date())
+                for day in pd.date_range(self._startDate, self._endDate)
+                if str(day.date()) not in traded
+            ]
+            fig.update_xaxes(rangebreaks=[{"values": closed}])
+        fig.update_xaxes(title_text="Date", row=2 * panels, col=1)
+        shape = "candles" if style == "candlestick" else "OHLC bars"
+        fig.update_layout(
+            title=f"{(_PERIOD_LABELS[period] or 'daily ').capitalize()}{shape} from {self._startDate} to {self._endDate}",
+            height=max(500, 400 * panels),
+            showlegend=bool(indicators),
+        )
+        return [fig]
+
+    def generate_candlestick_graph(
+        self, period: str = None, style: str = "candlestick", indicators=()
+    ):
+        """
+        Generate and display a candlestick or OHLC graph, with volume, for specified companies over a given date range.
 
-    def generate_candlestick_graph(self, displayOnSameGraph=True):
-        """not possible unfortunately due to previous ommital of 'low' from data."""
-        pass
+        Parameters:
+            - period (str): Optional. "D", "W-FRI" or "M" for daily, weekly or monthly candles. Defaults to the
+              shortest that fits the candle budget.
+            - style (str): "candlestick" or "ohlc".
+            - indicators (iterable): Optional. sma_n or ema_n moving averages to overlay.
 
-    # import pandas as pd
-    # import plotly.graph_objects as go
-    # import plotly.express as px
+        Returns:
+            None
+
+        Raises:
+            - ValueError: See candlestick_figures.
 
-    # try:
-    #     conn = sqlite3.connect("data/main.sql")
+        Dependencies:
+            - The 'plotly' library for creating interactive visualizations.
+
+        Note:
+            - This method is intended for external use and provides a direct interface to generate candlestick graphs.
+            - Each company always has its own panel, as overlapping candles cannot be told apart.
+
+        Example:
+            ```
+            >>> instance.generate_candlestick_graph(indicators=("sma_20", "ema_50"))
+            ```
+        """
+        for fig in self.candlestick_figures(period, style, indicators):
+            fig.show()
 
-    #     query = f"""
-    #         SELECT date, high, open, close, ticker
-    #         FROM StockPrices
-    #         WHERE date >= '{startDate}' AND date <= '{endDate}'
-    #         AND ticker IN ({','.join([f"'{c}'" for c in companies])})
-    #     """
 
-    #     # Execute the query and fetch the results into a DataFrame
-    #     data = pd.read_sql_query(query, conn)
+def _moving_average_window(name: str) -> int:
+    """The window of an sma_n or ema_n indicator name, or a ValueError if it is neither."""
+    kind, _, window = name.partition("_")
+    if kind not in ("sma", "ema") or not window.isdigit() or int(window) < 1:
+        raise ValueError(f"Unknown indicator: {name}. Use sma_n or ema_n")
+    return int(window)
 
-    # except sqlite3.Error as error:
-    #     print("Error: {}".format(error))
 
-    # finally:
-    #     conn.close()
+def _render_mode(data) -> str:
+    """The plotly render_mode for a line figure of the given rows: WebGL once there are more than WEBGL_POINTS."""
+    from config import WEBGL_POINTS
 
-    # fig = go.Figure(data=[go.Candlestick(x=data['date'], open=data['open'], high=data['high'], low=['low'], close=data['close'])])
-    # fig.update_layout(title=f"{', '.join(companies)}'s price from {startDate} to {endDate}", xaxis_title='Date', yaxis_title='Price in USD')
-    # fig.show()
+    return "webgl" if len(data) > WEBGL_POINTS else "svg"
 
 
 if __name__ == "main":
@@ -0,0 +1,125 @@
+import numpy as np
+
+# Finds the companies whose price moved most like a given company's over a window, e.g. "which companies moved
+# most like NVDA this quarter".
+#
+# Each ticker's closes over the window are z-normalised (less their mean, over their standard deviation), so paths
+# are compared by their shape rather than their price or how far they moved. The normalised paths of every ticker
+# are kept as one matrix of days x tickers, built once per window and cached (see graphing/cache.py), so a query is a
+# single product of the matrix with the query's path rather than a loop over tickers:
+#   - correlation: the mean of the products of two z-normalised paths is their Pearson correlation
+#   - distance: the z-normalised Euclidean distance, sqrt(2 * days * (1 - correlation)), as used for comparing the
+#     shapes of time series
+# As the distance only depends on the correlation, both order the neighbours the same way; they differ only in the
+# score reported. The k nearest are picked with a partial sort (numpy's argpartition).
+#
+# A ticker with no close on some days of the window (e.g. one that started trading during it) is filled in from its
+# closes either side if it is missing at most MAX_MISSING of the days, and left out otherwise.
+
+METRICS = ("correlation", "distance")
+MAX_MISSING = 0.1
+
+
+def path_matrix(startDate: str, endDate: str, databasePath: str = "data/main.sql"):
+    """
+    Builds the z-normalised close paths of every ticker over a window.
+
+    Parameters:
+        - startDate (str): The first date of the window (yyyy-mm-dd).
+        - endDate (str): The last date of the window (yyyy-mm-dd).
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - pandas.DataFrame: A row per date and a column per ticker. Each column has mean 0 and standard deviation 1.
+          Tickers missing more than MAX_MISSING of the days, or whose close did not move, are left out.
+
+    Dependencies:
+        - The 'pandas' library for handling data in DataFrame format.
+        - The 'graph_cache' from graphing.cache, which keeps the matrix of each window.
+    """
+    from DatabaseHandling.priceStore import price_store
+    from graphing.cache import graph_cache
+
+    def build():
+        from DatabaseHandling.backtest import load_matrix
+
+        matrices = load_matrix(("close",), None, startDate, endDate, databasePath)
+        closes = matrices["close"]
+        closes = closes.loc[:, closes.isna().mean() <= MAX_MISSING].ffill().bfill()
+        deviations = closes.std(ddof=0)
+        closes = closes.loc[:, deviations > 0]
+        return (closes - closes.mean()) / deviations[closes.columns]
+
+    if databasePath != price_store.databasePath:
+        return build()
+    return graph_cache.universe("paths", startDate, endDate, build)
+
+
+def find_similar(
+    ticker: str,
+    startDate: str,
+    endDate: str,
+    k: int = 5,
+    metric: str = "correlation",
+    databasePath: str = "data/main.sql",
+) -> list:
+    """
+    Finds the tickers whose close moved most like a ticker's over a window.
+
+    Parameters:
+        - ticker (str): The ticker to compare the others with.
+        - startDate (str): The first date of the window (yyyy-mm-dd).
+        - endDate (str): The last date of the window (yyyy-mm-dd).
+        - k (int): The number of tickers to return.
+        - metric (str): One of METRICS, which the results are scored by. Both give the same order.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - list: Up to k dicts, most similar first, each with:
+            - "ticker" (str): The ticker.
+            - "correlation" (float): The correlation of its path with the ticker's, from -1 to 1.
+            - "distance" (float): The z-normalised Euclidean distance between the paths.
+            - "score" (float): The correlation or the distance, as chosen by metric.
+
+    Raises:
+        ValueError: If the metric is not known, or the ticker has no path over the window (too few closes, or
+            ones that did not move).
+
+    Example:
+        ```
+        >>> [match["ticker"] for match in find_similar("NVDA", "2023-10-02", "2023-12-29")]
+        ['CDNS', 'AMAT', 'META', 'KLAC', 'CPRT']
+        ```
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}. Use one of {', '.join(METRICS)}")
+    paths = path_matrix(startDate, endDate, databasePath)
+    if ticker not in paths.columns:
+        raise ValueError(
+            f"{ticker} does not have enough prices from {startDate} to {endDate} to compare"
+        )
+
+    values = paths.to_numpy()
+    days = values.shape[0]
+    position = paths.columns.get_loc(ticker)
+    correlations = np.clip(values.T @ values[:, position] / days, -1, 1)
+    correlations[position] = -np.inf  # not similar to itself
+    k = min(k, len(correlations) - 1)
+    if k < 1:
+        return []
+    nearest = np.argpartition(-correlations, k - 1)[:k]
+    nearest = nearest[np.argsort(-correlations[nearest], kind="stable")]
+
+    matches = []
+    for index in nearest:
+        correlation = float(correlations[index])
+        distance = float(np.sqrt(2 * days * (1 - correlation)))
+        matches.append(
+            {
+                "ticker": paths.columns[index],
+                "correlation": correlation,
+                "distance": distance,
+                "score": correlation if metric == "correlation" else distance,
+            }
+        )
+    return matches
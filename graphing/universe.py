@@ -0,0 +1,482 @@
+import numpy as np
+
+# Views of every stored ticker at once, over a chosen range:
+#   - a returns heatmap: each ticker's daily returns, dates across and tickers down
+#   - a sector heatmap: each sector's performance in each week, month or quarter, compounding its daily returns
+#   - sector indices: each sector's daily returns compounded over the range, as lines that start from 100
+#   - a correlation matrix: how closely each pair of tickers' daily returns moved together
+#
+# They all start from one matrix of daily returns, dates x tickers, read in one query from the 'DailyReturns'
+# table (see DatabaseHandling/dailyReturns.py), or worked out from the closes if it is not up to date. It is kept in
+# the graph cache per range (see graphing/cache.py), as are the correlations, so switching between the views, or
+# back to a range already viewed, does not read or work them out again. A sector's daily return is its members' mean
+# (or dollar volume weighted mean) return, read from the sector indices stored after each ingest (see
+# DatabaseHandling/sectorIndices.py) when they are up to date, so the sector views need not read every member.
+#
+# The correlations are exact pairwise Pearson correlations over the days both tickers have a return on, as
+# pandas' DataFrame.corr() gives, but worked out with a handful of matrix products (the counts, sums and sums of
+# squares over the shared days) rather than a loop over pairs. They are worked out CORRELATION_BLOCK_SIZE tickers
+# against every ticker at a time, so with the full universe (~10k tickers) the products never need more than a block
+# of memory beyond the result, and a caller that only needs part of the result can use correlation_blocks directly.
+
+SECTOR_PERIODS = {"W-FRI": "week", "M": "month", "Q": "quarter"}
+
+
+def returns_matrix(startDate: str, endDate: str, databasePath: str = "data/main.sql"):
+    """
+    Reads the daily returns of every ticker between two dates into a matrix.
+
+    Parameters:
+        - startDate (str): The first date (yyyy-mm-dd).
+        - endDate (str): The last date (yyyy-mm-dd).
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - pandas.DataFrame: A row per date (in order) and a column per ticker (in alphabetical order) of percentage
+          changes since the ticker's previous trading day, with NaN where a ticker has no return.
+
+    Dependencies:
+        - The 'pandas' library for handling data in DataFrame format.
+        - The 'graph_cache' from graphing.cache, which keeps the matrix of each range viewed.
+    """
+    return _cached(
+        "returns",
+        startDate,
+        endDate,
+        databasePath,
+        lambda: _read_returns(startDate, endDate, databasePath),
+    )
+
+
+def _cached(kind: str, startDate: str, endDate: str, databasePath: str, build):
+    from DatabaseHandling.priceStore import price_store
+    from graphing.cache import graph_cache
+
+    # the graph cache only holds matrices of the price store's database
+    if databasePath != price_store.databasePath:
+        return build()
+    return graph_cache.universe(kind, startDate, endDate, build)
+
+
+def _read_returns(startDate: str, endDate: str, databasePath: str):
+    import pandas as pd
+    from DatabaseHandling.backtest import load_matrix
+    from DatabaseHandling.dailyReturns import returns_up_to_date, select_returns
+
+    if returns_up_to_date(endDate, databasePath):
+        rows = select_returns(
+            ("date", "ticker", "percentage_change"),
+            startDate=startDate,
+            endDate=endDate,
+            databasePath=databasePath,
+        )
+        if rows:
+            frame = pd.DataFrame(rows, columns=["date", "ticker", "percentage_change"])
+            return (
+                frame.pivot(index="date", columns="ticker", values="percentage_change")
+                .sort_index()
+                .sort_index(axis=1)
+                .astype(float)
+            )
+
+    # as in 'DailyReturns', from each ticker's previous trading day, which may be before startDate
+    from datetime import date, timedelta
+
+    lookback = str(date.fromisoformat(startDate) - timedelta(days=31))
+    closes = load_matrix(("close",), None, lookback, endDate, databasePath)["close"]
+    previous = closes.ffill().shift(1)
+    returns = (closes / previous.where(previous != 0) - 1) * 100
+    return returns.where(closes.notna()).loc[startDate:].sort_index(axis=1)
+
+
+def correlation_blocks(returns, blockSize: int = None, minDays: int = None):
+    """
+    Works out the correlations of a matrix of returns a block of tickers at a time.
+
+    Parameters:
+        - returns (pandas.DataFrame): The dates x tickers returns, with NaN where a ticker has none.
+        - blockSize (int): Optional. The tickers in each block. Defaults to CORRELATION_BLOCK_SIZE in config.py.
+        - minDays (int): Optional. Pairs with fewer shared days than this are NaN. Defaults to CORRELATION_MIN_DAYS.
+
+    Yields:
+        - tuple: (start, numpy.ndarray) where the array is the correlations of every ticker (rows) with the
+          tickers from column start of returns to start + blockSize (columns).
+    """
+    from config import CORRELATION_BLOCK_SIZE, CORRELATION_MIN_DAYS
+
+    blockSize = blockSize or CORRELATION_BLOCK_SIZE
+    minDays = CORRELATION_MIN_DAYS if minDays is None else minDays
+
+    known = returns.notna().to_numpy(dtype=float)
+    values = np.nan_to_num(returns.to_numpy(dtype=float))
+    squares = values**2
+    for start in range(0, values.shape[1], blockSize):
+        block = slice(start, start + blockSize)
+        # over the days both tickers of each pair have a return on
+        days = known.T @ known[:, block]
+        sumX = values.T @ known[:, block]
+        sumY = known.T @ values[:, block]
+        sumXX = squares.T @ known[:, block]
+        sumYY = known.T @ squares[:, block]
+        sumXY = values.T @ values[:, block]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            covariance = sumXY - sumX * sumY / days
+            variance = (sumXX - sumX**2 / days) * (sumYY - sumY**2 / days)
+            correlation = covariance / np.sqrt(variance)
+        correlation[(days < max(minDays, 2)) | ~(variance > 0)] = np.nan
+        yield start, np.clip(correlation, -1, 1)
+
+
+def correlation_matrix(
+    startDate: str, endDate: str, tickers=None, databasePath: str = "data/main.sql"
+):
+    """
+    Works out the correlations between the daily returns of every pair of tickers over a range.
+
+    Parameters:
+        - startDate (str): The first date (yyyy-mm-dd).
+        - endDate (str): The last date (yyyy-mm-dd).
+        - tickers (iterable): Optional. Only these tickers, in this order. Defaults to every ticker.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - pandas.DataFrame: tickers x tickers correlations between -1 and 1, NaN where a pair shares fewer than
+          CORRELATION_MIN_DAYS days.
+
+    Dependencies:
+        - The 'pandas' library for handling data in DataFrame format.
+
+    Example:
+        ```
+        >>> correlation_matrix("2023-01-03", "2023-12-29").loc["GOOG", "GOOGL"]
+        0.9949
+        ```
+    """
+
+    def build():
+        import pandas as pd
+
+        returns = returns_matrix(startDate, endDate, databasePath)
+        result = np.empty((returns.shape[1], returns.shape[1]))
+        for start, block in correlation_blocks(returns):
+            result[:, start : start + block.shape[1]] = block
+        return pd.DataFrame(result, index=returns.columns, columns=returns.columns)
+
+    correlations = _cached("correlation", startDate, endDate, databasePath, build)
+    if tickers is None:
+        return correlations
+    tickers = list(dict.fromkeys(tickers))
+    return correlations.reindex(index=tickers, columns=tickers)
+
+
+def sector_daily_returns(
+    startDate: str,
+    endDate: str,
+    weighting: str = "equal",
+    databasePath: str = "data/main.sql",
+):
+    """
+    Reads each sector's daily returns between two dates into a matrix.
+
+    Parameters:
+        - startDate (str): The first date (yyyy-mm-dd).
+        - endDate (str): The last date (yyyy-mm-dd).
+        - weighting (str): One of SECTOR_WEIGHTINGS from DatabaseHandling.sectorIndices: the mean of the members'
+          returns ("equal"), or their mean weighted by each member's dollar volume that day ("volume").
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - pandas.DataFrame: A row per date (in order) and a column per sector (in alphabetical order) of percentage
+          returns, with NaN where a sector has no member with a return.
+
+    Raises:
+        ValueError: If the weighting is not known.
+
+    Note:
+        - Read from the stored sector indices when they are up to date (see DatabaseHandling/sectorIndices.py), and
+          worked out from the returns matrix the same way otherwise.
+    """
+    from DatabaseHandling.sectorIndices import SECTOR_WEIGHTINGS
+
+    if weighting not in SECTOR_WEIGHTINGS:
+        raise ValueError(
+            f"Unknown weighting: {weighting}. Use one of {', '.join(SECTOR_WEIGHTINGS)}"
+        )
+    return _cached(
+        f"sectors {weighting}",
+        startDate,
+        endDate,
+        databasePath,
+        lambda: _read_sector_returns(startDate, endDate, weighting, databasePath),
+    )
+
+
+def _read_sector_returns(
+    startDate: str, endDate: str, weighting: str, databasePath: str
+):
+    import pandas as pd
+    from DatabaseHandling.backtest import load_matrix
+    from DatabaseHandling.companies import sector_members
+    from DatabaseHandling.sectorIndices import (
+        sector_indices_up_to_date,
+        select_sector_indices,
+    )
+
+    if sector_indices_up_to_date(endDate, databasePath):
+        rows = select_sector_indices(None, startDate, endDate, weighting, databasePath)
+        if rows:
+            frame = pd.DataFrame(rows, columns=["date", "sector", "value", "return"])
+            return (
+                frame.pivot(index="date", columns="sector", values="return")
+                .sort_index()
+                .astype(float)
+            )
+
+    returns = returns_matrix(startDate, endDate, databasePath)
+    sectorOf = returns.columns.map(
+        {
+            ticker: sector
+            for sector, members in sector_members(databasePath).items()
+            for ticker in members
+        }
+    )
+    if weighting == "equal":
+        bySector = returns.T.groupby(sectorOf).mean().T
+    else:
+        prices = load_matrix(
+            ("close", "volume"), None, startDate, endDate, databasePath
+        )
+        weights = (prices["close"] * prices["volume"]).reindex_like(returns)
+        weights = weights.fillna(0).where(returns.notna())
+        weightSums = weights.T.groupby(sectorOf).sum().T
+        # a day with no volumes for a sector falls back to the equal weighting
+        bySector = (
+            ((returns * weights).T.groupby(sectorOf).sum(min_count=1).T)
+            / weightSums.where(weightSums > 0)
+        ).fillna(returns.T.groupby(sectorOf).mean().T)
+    bySector.columns.name = "sector"
+    return bySector.sort_index(axis=1)
+
+
+def sector_returns(
+    startDate: str,
+    endDate: str,
+    period: str = "M",
+    weighting: str = "equal",
+    databasePath: str = "data/main.sql",
+):
+    """
+    Works out each sector's return in each period of a range, by compounding its daily returns.
+
+    Parameters:
+        - startDate (str): The first date (yyyy-mm-dd).
+        - endDate (str): The last date (yyyy-mm-dd).
+        - period (str): One of SECTOR_PERIODS, as a pandas period frequency.
+        - weighting (str): How the members' returns are combined each day (see sector_daily_returns).
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - pandas.DataFrame: A row per sector and a column per period (e.g. "2023-06"), of percentage returns, NaN
+          where a sector has no return in a period.
+
+    Raises:
+        ValueError: If the period or the weighting is not known.
+    """
+    import pandas as pd
+
+    if period not in SECTOR_PERIODS:
+        raise ValueError(
+            f"Unknown period: {period}. Use one of {', '.join(SECTOR_PERIODS)}"
+        )
+    daily = sector_daily_returns(startDate, endDate, weighting, databasePath)
+    periods = pd.to_datetime(daily.index).to_period(period)
+    # summing log returns compounds them; min_count keeps a period with no returns NaN rather than 0
+    logReturns = np.log1p(daily / 100).groupby(periods).sum(min_count=1)
+    bySector = (np.expm1(logReturns) * 100).T
+    bySector.index.name = "sector"
+    bySector.columns = bySector.columns.astype(str).rename("period")
+    return bySector
+
+
+def sector_performance(
+    startDate: str,
+    endDate: str,
+    weighting: str = "equal",
+    databasePath: str = "data/main.sql",
+) -> list:
+    """
+    Ranks the sectors by their return over a range.
+
+    Parameters:
+        - startDate (str): The first date (yyyy-mm-dd).
+        - endDate (str): The last date (yyyy-mm-dd).
+        - weighting (str): How the members' returns are combined each day (see sector_daily_returns).
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - list: (sector, percentage return) tuples, best first. Sectors with no returns in the range are left out.
+
+    Example:
+        ```
+        >>> sector_performance("2023-01-03", "2023-12-29")[:2]
+        [('Technology', 61.35), ('Apparel', 59.59)]
+        ```
+    """
+    daily = sector_daily_returns(startDate, endDate, weighting, databasePath)
+    totals = np.expm1(np.log1p(daily / 100).sum(min_count=1)) * 100
+    totals = totals.dropna().sort_values(ascending=False, kind="stable")
+    return [(sector, float(total)) for sector, total in totals.items()]
+
+
+def returns_heatmap_figure(
+    startDate: str, endDate: str, tickers=None, databasePath: str = "data/main.sql"
+):
+    """
+    Builds a heatmap of daily returns, with a row per ticker and a column per date.
+
+    Parameters:
+        - startDate (str): The first date (yyyy-mm-dd).
+        - endDate (str): The last date (yyyy-mm-dd).
+        - tickers (iterable): Optional. Only these tickers. Defaults to every ticker.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - plotly.graph_objects.Figure: The heatmap. The colour scale is centred on 0, and runs to the 99th
+          percentile of the size of the returns, so a few outliers do not wash out the rest.
+    """
+    import plotly.express as px
+
+    returns = returns_matrix(startDate, endDate, databasePath)
+    if tickers is not None:
+        returns = returns.reindex(columns=list(dict.fromkeys(tickers)))
+    values = returns.T
+    limit = np.nanpercentile(np.abs(values.to_numpy()), 99) if values.size else 1
+    fig = px.imshow(
+        values,
+        color_continuous_scale="RdYlGn",
+        color_continuous_midpoint=0,
+        zmin=-limit,
+        zmax=limit,
+        aspect="auto",
+        labels={"x": "Date", "y": "Ticker", "color": "Daily return (%)"},
+        title=f"Daily returns from {startDate} to {endDate}",
+    )
+    fig.update_layout(height=max(500, 12 * values.shape[0]))
+    return fig
+
+
+def sector_heatmap_figure(
+    startDate: str,
+    endDate: str,
+    period: str = "M",
+    databasePath: str = "data/main.sql",
+):
+    """
+    Builds a heatmap of sector returns, with a row per sector and a column per period (see sector_returns).
+
+    Returns:
+        - plotly.graph_objects.Figure: The heatmap, with each cell's return written on it.
+    """
+    import plotly.express as px
+
+    bySector = sector_returns(startDate, endDate, period, databasePath=databasePath)
+    limit = np.nanmax(np.abs(bySector.to_numpy())) if bySector.size else 1
+    fig = px.imshow(
+        bySector,
+        color_continuous_scale="RdYlGn",
+        color_continuous_midpoint=0,
+        zmin=-limit,
+        zmax=limit,
+        aspect="auto",
+        text_auto=".1f",
+        labels={
+            "x": SECTOR_PERIODS[period].capitalize(),
+            "y": "Sector",
+            "color": "Return (%)",
+        },
+        title=f"Sector returns per {SECTOR_PERIODS[period]} from {startDate} to {endDate}",
+    )
+    fig.update_layout(height=max(500, 30 * bySector.shape[0]))
+    return fig
+
+
+def sector_index_figure(
+    startDate: str,
+    endDate: str,
+    weighting: str = "equal",
+    sectors=None,
+    databasePath: str = "data/main.sql",
+):
+    """
+    Builds a line graph of sector indices over a range, each starting from 100.
+
+    Parameters:
+        - startDate (str): The first date (yyyy-mm-dd).
+        - endDate (str): The last date (yyyy-mm-dd).
+        - weighting (str): How the members' returns are combined each day (see sector_daily_returns).
+        - sectors (iterable): Optional. Only these sectors. Defaults to every sector.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - plotly.graph_objects.Figure: A line per sector of 100 compounded by its daily returns, so a line's value
+          at a date is what 100 put in the sector the day before startDate would be worth.
+    """
+    import plotly.express as px
+
+    daily = sector_daily_returns(startDate, endDate, weighting, databasePath)
+    if sectors is not None:
+        daily = daily.reindex(columns=list(dict.fromkeys(sectors)))
+    indices = (1 + daily.fillna(0) / 100).cumprod() * 100
+    indices = indices.where(daily.notna().cummax())  # from each sector's first return
+    fig = px.line(
+        indices,
+        labels={"date": "Date", "value": "Index (start = 100)", "sector": "Sector"},
+        title=f"{weighting.capitalize()} weighted sector indices from {startDate} to {endDate}",
+    )
+    fig.add_hline(y=100, line_dash="dot", line_color="grey")
+    return fig
+
+
+def correlation_figure(
+    startDate: str, endDate: str, tickers=None, databasePath: str = "data/main.sql"
+):
+    """
+    Builds a heatmap of the correlations between tickers' daily returns over a range.
+
+    Parameters:
+        - startDate (str): The first date (yyyy-mm-dd).
+        - endDate (str): The last date (yyyy-mm-dd).
+        - tickers (iterable): Optional. Only these tickers, in this order. Defaults to every ticker, grouped by
+          sector so that sectors that move together show up as blocks.
+        - databasePath (str): The path of the SQLite database.
+
+    Returns:
+        - plotly.graph_objects.Figure: The heatmap.
+    """
+    import plotly.express as px
+    from DatabaseHandling.companies import sector_members
+
+    if tickers is None:
+        correlations = correlation_matrix(startDate, endDate, None, databasePath)
+        bySector = [
+            ticker
+            for members in sector_members(databasePath).values()
+            for ticker in members
+        ]
+        order = [ticker for ticker in bySector if ticker in correlations.index]
+        ordered = set(order)
+        order += [ticker for ticker in correlations.index if ticker not in ordered]
+        correlations = correlations.reindex(index=order, columns=order)
+    else:
+        correlations = correlation_matrix(startDate, endDate, tickers, databasePath)
+    fig = px.imshow(
+        correlations,
+        color_continuous_scale="RdBu_r",
+        zmin=-1,
+        zmax=1,
+        labels={"color": "Correlation"},
+        title=f"Correlations of daily returns from {startDate} to {endDate}",
+    )
+    size = max(600, 12 * correlations.shape[0])
+    fig.update_layout(height=size, width=size + 150)
+    return fig
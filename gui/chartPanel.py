@@ -0,0 +1,290 @@
+import tkinter as tk
+
+# A line chart drawn inside the app with matplotlib, rather than opened in a browser tab with plotly, so it is
+# ready as soon as the rows are read, and stays next to the rest of the graph screen.
+#
+# The full series of every ticker shown are kept as numpy arrays. What is drawn is only the visible window of each,
+# sliced out with a binary search and thinned to about two points per pixel column (see minmax in
+# graphing/downsample.py), so a chart of many tickers over the whole history pans and zooms as quickly as one over a
+# few months. The window is re-sliced once per redraw, however many times the limits changed since the last one.
+#
+# The lines (and the ticker labels at their right ends) are animated artists: a full redraw draws everything else,
+# which is kept as a background image, then the lines on top. When only the lines change (a live price, or tickers
+# swapped within the same limits) the background is pasted back and just the lines are drawn over it (blitting),
+# rather than drawing the axes, ticks and grid again.
+
+
+class LineChart:
+    """
+    The prices of some tickers as lines on one set of axes, drawn on any matplotlib canvas.
+
+    Parameters:
+        - figure (matplotlib.figure.Figure): The figure to draw on.
+        - canvas (FigureCanvasBase): The figure's canvas, e.g. a FigureCanvasTkAgg.
+
+    Dependencies:
+        - The 'matplotlib' library for drawing the chart.
+        - The 'graph_cache' from graphing.cache for the rows.
+
+    Example:
+        ```
+        >>> chart = LineChart(figure, canvas)
+        >>> chart.show(("AAPL", "MSFT"), "2022-01-03", "2024-02-26")
+        >>> chart.update_price("AAPL", "2024-02-26", 183.5)  # blitted, if within the limits
+        ```
+    """
+
+    def __init__(self, figure, canvas):
+        self._figure = figure
+        self._canvas = canvas
+        self._axes = figure.add_subplot()
+        self._axes.set_xlabel("Date")
+        self._axes.set_ylabel("Price in USD")
+        self._axes.grid(alpha=0.3)
+        self._axes.xaxis_date()
+        self._series = {}  # ticker -> (dates as matplotlib date numbers, closes)
+        self._lines = {}  # ticker -> (Line2D, Text label)
+        self._startDate = None
+        self._endDate = None
+        self._background = None
+        self._resliceNeeded = False
+        self.redraws = 0
+        self.blits = 0
+
+        canvas.mpl_connect("draw_event", self.__on_draw)
+        self._axes.callbacks.connect("xlim_changed", self.__on_limits_changed)
+
+    @property
+    def tickers(self) -> tuple:
+        return tuple(self._series)
+
+    def show(self, tickers, startDate: str, endDate: str):
+        """
+        Shows the closes of some tickers between two dates, keeping the lines of tickers already shown.
+
+        Parameters:
+            - tickers (iterable): The tickers to show, replacing the ones shown.
+            - startDate (str): The first date (yyyy-mm-dd).
+            - endDate (str): The last date. Live prices (update_price) up to it are drawn too.
+
+        Note:
+            - If the limits the new lines need are the ones already shown, only the lines are drawn again.
+        """
+        import numpy as np
+        from matplotlib.dates import datestr2num
+        from graphing.cache import graph_cache
+
+        tickers = tuple(dict.fromkeys(tickers))
+        data = graph_cache.frame(
+            tickers, startDate, endDate, ("date", "close", "ticker")
+        )
+        data = data.dropna(subset=["close"])
+        self._series = {
+            ticker: (
+                datestr2num(rows["date"].to_numpy()),
+                rows["close"].to_numpy(dtype=float),
+            )
+            for ticker, rows in data.groupby("ticker", sort=False)
+        }
+        self._startDate, self._endDate = startDate, endDate
+
+        for ticker in list(self._lines):
+            if ticker not in self._series:
+                line, label = self._lines.pop(ticker)
+                line.remove()
+                label.remove()
+        for ticker in self._series:
+            if ticker not in self._lines:
+                (line,) = self._axes.plot([], [], animated=True, linewidth=1.2)
+                label = self._axes.text(
+                    0,
+                    0,
+                    ticker,
+                    animated=True,
+                    in_layout=False,
+                    horizontalalignment="right",
+                    verticalalignment="bottom",
+                    fontsize=8,
+                    color=line.get_color(),
+                )
+                self._lines[ticker] = (line, label)
+
+        if self._series:
+            closes = np.concatenate([closes for _, closes in self._series.values()])
+            margin = (closes.max() - closes.min()) * 0.05 or 1
+            limits = (
+                (datestr2num(startDate), datestr2num(endDate)),
+                (closes.min() - margin, closes.max() + margin),
+            )
+        else:
+            limits = (self._axes.get_xlim(), self._axes.get_ylim())
+        self.__set_limits(*limits)
+
+    def update_price(self, ticker: str, date: str, price: float) -> bool:
+        """
+        Draws a new price of a shown ticker: the latest close is replaced if it is of the same date, or the line is
+        extended if it is of a later one.
+
+        Parameters:
+            - ticker (str): The ticker symbol.
+            - date (str): The date of the price (yyyy-mm-dd).
+            - price (float): The price.
+
+        Returns:
+            - bool: True if the price was drawn. Prices of other tickers, of dates before the latest close or after
+              the end date, and missing prices are left out.
+        """
+        import numpy as np
+        from matplotlib.dates import datestr2num
+
+        if ticker not in self._series or price is None or date > self._endDate:
+            return False
+        dates, closes = self._series[ticker]
+        day = datestr2num(date)
+        if len(dates) and day < dates[-1]:
+            return False
+        if len(dates) and day == dates[-1]:
+            closes = closes.copy()
+            closes[-1] = price
+        else:
+            dates, closes = np.append(dates, day), np.append(closes, price)
+        self._series[ticker] = (dates, closes)
+
+        bottom, top = self._axes.get_ylim()
+        if bottom <= price <= top:
+            self.__reslice()
+            self.__blit()
+        else:
+            margin = (top - bottom) * 0.05
+            self.__set_limits(
+                self._axes.get_xlim(),
+                (min(bottom, price - margin), max(top, price + margin)),
+            )
+        return True
+
+    def __set_limits(self, xlim: tuple, ylim: tuple):
+        """
+        Sets the limits, then draws everything again if they changed, or blits the lines if not.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        if (
+            self._background is not None
+            and tuple(self._axes.get_xlim()) == tuple(xlim)
+            and tuple(self._axes.get_ylim()) == tuple(ylim)
+        ):
+            self.__reslice()
+            self.__blit()
+            return
+        self._axes.set_xlim(*xlim)
+        self._axes.set_ylim(*ylim)
+        self._resliceNeeded = True
+        self._canvas.draw_idle()
+
+    def __on_limits_changed(self, axes):
+        # e.g. while panning with the toolbar; the lines are re-sliced when it next draws, rather than every move
+        self._resliceNeeded = True
+
+    def __on_draw(self, event):
+        """
+        After a full redraw, keep it as the background, then draw the lines over it.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        self.redraws += 1
+        self._background = self._canvas.copy_from_bbox(self._figure.bbox)
+        if self._resliceNeeded:
+            self.__reslice()
+        self.__draw_lines()
+
+    def __reslice(self):
+        """
+        Sets each line to the points of its series in the visible dates, thinned to the width of the axes.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        import numpy as np
+        from graphing.downsample import minmax
+
+        self._resliceNeeded = False
+        left, right = self._axes.get_xlim()
+        columns = max(int(self._axes.bbox.width), 1)
+        for ticker, (line, label) in self._lines.items():
+            dates, closes = self._series[ticker]
+            # one point either side, so the line runs off the edges rather than stopping short of them
+            first = max(int(np.searchsorted(dates, left)) - 1, 0)
+            last = min(int(np.searchsorted(dates, right, side="right")) + 1, len(dates))
+            dates, closes = dates[first:last], closes[first:last]
+            kept = minmax(closes, columns)
+            line.set_data(dates[kept], closes[kept])
+            label.set_visible(len(dates) > 0)
+            if len(dates):
+                end = min(
+                    len(dates) - 1, int(np.searchsorted(dates, right, side="right")) - 1
+                )
+                label.set_position((dates[max(end, 0)], closes[max(end, 0)]))
+
+    def __draw_lines(self):
+        for line, label in self._lines.values():
+            self._axes.draw_artist(line)
+            self._axes.draw_artist(label)
+
+    def __blit(self):
+        """
+        Pastes the background back and draws just the lines over it.
+
+        Note:
+            - This method is intended for internal use within a class and does not provide a direct external interface.
+        """
+        if self._background is None:
+            self._canvas.draw_idle()
+            return
+        self.blits += 1
+        self._canvas.restore_region(self._background)
+        self.__draw_lines()
+        self._canvas.blit(self._figure.bbox)
+        self._canvas.flush_events()
+
+
+class ChartPanel(tk.Frame):
+    """
+    A LineChart on a Tk canvas, with matplotlib's toolbar for panning and zooming, and a button to close it.
+
+    Parameters:
+        - parent (tk.Widget): The widget to place the panel in.
+        - onClose (callable): Optional. Called with no arguments when the close button is pressed, after the panel
+          has been hidden.
+    """
+
+    def __init__(self, parent, onClose=None, **kwargs):
+        from matplotlib.backends.backend_tkagg import (
+            FigureCanvasTkAgg,
+            NavigationToolbar2Tk,
+        )
+        from matplotlib.figure import Figure
+
+        tk.Frame.__init__(self, parent, **kwargs)
+        self._onClose = onClose
+
+        figure = Figure(figsize=(8, 6), dpi=100, layout="constrained")
+        self.canvas = FigureCanvasTkAgg(figure, master=self)
+        self.chart = LineChart(figure, self.canvas)
+
+        bar = tk.Frame(self)
+        bar.pack(side="bottom", fill="x")
+        toolbar = NavigationToolbar2Tk(self.canvas, bar, pack_toolbar=False)
+        toolbar.pack(side="left")
+        tk.Button(bar, text="Close Chart", command=self.close).pack(side="right")
+        self.canvas.get_tk_widget().pack(side="top", fill="both", expand=True)
+
+    def show(self, tickers, startDate: str, endDate: str):
+        """Shows the closes of some tickers between two dates (see LineChart.show)."""
+        self.chart.show(tickers, startDate, endDate)
+
+    def close(self):
+        self.place_forget()
+        if self._onClose:
+            self._onClose()
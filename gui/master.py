@@ -1,5 +1,6 @@
 import tkinter as tk
 import tkinter.messagebox as mb
+import tkinter.ttk as ttk
 
 TITLE_FONT = ("Arial", 35, "bold")
 BUTTON_FONT = ("Arial", 20)
@@ -25,12 +26,39 @@ class tkinterApp(tk.Tk):
 
         self.frames = {}
 
+        # live quotes of the watchlist, polled on a background thread and passed to this thread through a queue
+        import queue
+        from DatabaseHandling.watchlist import QuotePoller
+
+        self.quote_queue = queue.Queue()
+        self.poller = QuotePoller()
+        self.poller.subscribe(
+            lambda ticker, quote, events: self.quote_queue.put((ticker, quote, events))
+        )
+
         for F in (StartPage, SortScreen, GraphsScreen, SearchScreen, ThresholdsScreen):
             frame = F(container, self)
             self.frames[F] = frame
             frame.grid(row=0, column=0, sticky="nsew")
 
         self.show_frame(StartPage)
+        self.poller.start_in_background()
+        self.poll_quotes()
+
+    def poll_quotes(self):
+        """Show quotes (and any alerts they fired) sent from the poller thread. Tkinter widgets may only be updated from this thread."""
+        import queue
+
+        try:
+            while True:
+                ticker, quote, events = self.quote_queue.get_nowait()
+                self.frames[StartPage].show_quote(ticker, quote, events)
+                self.frames[GraphsScreen].show_quote(ticker, quote)
+                if events:
+                    self.frames[ThresholdsScreen].refresh_alerts()
+        except queue.Empty:
+            pass
+        self.after(500, self.poll_quotes)
 
     def show_frame(self, cont):
         frame = self.frames[cont]
@@ -38,8 +66,53 @@ class tkinterApp(tk.Tk):
 
 
 class StartPage(tk.Frame):
+    def show_watchlist(self):
+        """List the watched tickers with their latest quotes, and the latest alert each has fired."""
+        self.watchlist_listbox.delete(0, tk.END)
+        for ticker in self.controller.poller.tickers:
+            quote = self.controller.poller.quotes.get(ticker)
+            if quote:
+                line = f"{ticker}   {quote['currentPrice']}   {quote['currentPercentageChange']}"
+            else:
+                line = f"{ticker}   waiting for a quote"
+            if ticker in self.latest_alerts:
+                line += f"   ({self.latest_alerts[ticker]})"
+            self.watchlist_listbox.insert(tk.END, line)
+
+    def show_quote(self, ticker, quote, events):
+        if events:
+            self.latest_alerts[ticker] = events[-1][4]
+        self.show_watchlist()
+
+    def get_user_data_and_watch(self, ticker_entry):
+        from DatabaseHandling.watchlist import add_to_watchlist
+
+        ticker = ticker_entry.get().strip().upper()
+        if not ticker:
+            mb.showwarning("Data warning", "Please enter a ticker to watch")
+            return
+        add_to_watchlist(ticker)
+        self.controller.poller.add(ticker)
+        ticker_entry.delete(0, tk.END)
+        self.show_watchlist()
+
+    def remove_selected_from_watchlist(self):
+        from DatabaseHandling.watchlist import remove_from_watchlist
+
+        selected = self.watchlist_listbox.curselection()
+        if not selected:
+            mb.showwarning("Data warning", "Please select a ticker to stop watching")
+            return
+        ticker = self.controller.poller.tickers[selected[0]]
+        remove_from_watchlist(ticker)
+        self.controller.poller.remove(ticker)
+        self.latest_alerts.pop(ticker, None)
+        self.show_watchlist()
+
     def __init__(self, parent, controller):
         tk.Frame.__init__(self, parent, bg=BACKGROUND_COLOR)
+        self.controller = controller
+        self.latest_alerts = {}  # ticker -> message of the latest alert its quotes fired
 
         label = tk.Label(
             self,
@@ -99,6 +172,39 @@ class StartPage(tk.Frame):
         )
         button4.place(relx=0.75, rely=0.45, anchor="center")
 
+        # Watchlist
+        watchlist_label = tk.Label(
+            self, text="Watchlist", font=BUTTON_FONT, bg=BACKGROUND_COLOR
+        )
+        watchlist_label.place(relx=0.5, rely=0.6, anchor="center")
+
+        watch_entry = tk.Entry(self, font=TEXT_BOX_FONT, width=8)
+        watch_entry.place(relx=0.35, rely=0.66, anchor="center")
+
+        watch_button = tk.Button(
+            self,
+            text="WATCH",
+            command=lambda: self.get_user_data_and_watch(watch_entry),
+            highlightbackground=BACKGROUND_COLOR,
+            font=BUTTON_FONT,
+            width=6,
+        )
+        watch_button.place(relx=0.5, rely=0.66, anchor="center")
+
+        unwatch_button = tk.Button(
+            self,
+            text="REMOVE",
+            command=self.remove_selected_from_watchlist,
+            highlightbackground=BACKGROUND_COLOR,
+            font=BUTTON_FONT,
+            width=8,
+        )
+        unwatch_button.place(relx=0.66, rely=0.66, anchor="center")
+
+        self.watchlist_listbox = tk.Listbox(self, font=TEXT_BOX_FONT, width=60, height=9)
+        self.watchlist_listbox.place(relx=0.5, rely=0.84, anchor="center")
+        self.show_watchlist()
+
 
 class BackButton(tk.Button):
     def __init__(self, parent, controller):
@@ -113,8 +219,114 @@ class BackButton(tk.Button):
         self.place(relx=0.95, rely=0.05, anchor="center")
 
 
+class TickerPicker(ttk.Combobox):
+    """
+    A company dropdown that can also be typed into. Typing narrows the list to the tickers starting with what
+    has been typed, so the picker stays usable when the full universe (~10k tickers) is stored, where an
+    OptionMenu with a menu entry per ticker is slow to build and impractical to scroll through.
+    """
+
+    MAX_SHOWN = 100  # most options put in the dropdown list at once
+
+    def __init__(self, parent, variable, options):
+        super().__init__(parent, textvariable=variable, font=TEXT_BOX_FONT, width=12)
+        self.set_options(options)
+        self.bind("<KeyRelease>", self.filter_options)
+
+    def set_options(self, options):
+        self._options = options
+        self["values"] = options[: self.MAX_SHOWN]
+
+    def filter_options(self, event=None):
+        typed = self.get().upper()
+        matches = [option for option in self._options if option.startswith(typed)]
+        self["values"] = matches[: self.MAX_SHOWN]
+
+
+class ComparisonPicker(tk.Toplevel):
+    """
+    A window for picking any number of companies to compare, one by one or a whole sector at a time, and an
+    optional benchmark. The graph is generated over the dates entered on the graph screen.
+    """
+
+    def __init__(self, parent, start_date, end_date):
+        from DatabaseHandling.companies import sector_members
+
+        super().__init__(parent, bg=BACKGROUND_COLOR)
+        self.title("Compare Companies")
+        self.geometry("420x640")
+        self.start_date = start_date
+        self.end_date = end_date
+        self.sectors = sector_members()
+        self.tickers = parent.get_all_company_names()
+
+        tk.Label(self, text="Add a sector:", font=TEXT_BOX_FONT, bg=BACKGROUND_COLOR).pack(pady=(10, 0))
+        self.selected_sector = tk.StringVar(self)
+        sector_dropdown = ttk.Combobox(
+            self, textvariable=self.selected_sector, values=list(self.sectors), font=TEXT_BOX_FONT, state="readonly"
+        )
+        sector_dropdown.bind("<<ComboboxSelected>>", self.select_sector)
+        sector_dropdown.pack()
+
+        tk.Label(self, text="Companies:", font=TEXT_BOX_FONT, bg=BACKGROUND_COLOR).pack(pady=(10, 0))
+        list_frame = tk.Frame(self)
+        list_frame.pack(fill="both", expand=True, padx=20)
+        scrollbar = tk.Scrollbar(list_frame)
+        scrollbar.pack(side="right", fill="y")
+        self.companies_listbox = tk.Listbox(
+            list_frame, selectmode=tk.MULTIPLE, font=TEXT_BOX_FONT, yscrollcommand=scrollbar.set, exportselection=False
+        )
+        self.companies_listbox.pack(side="left", fill="both", expand=True)
+        scrollbar.config(command=self.companies_listbox.yview)
+        for ticker in self.tickers:
+            self.companies_listbox.insert(tk.END, ticker)
+
+        tk.Button(self, text="Clear Selection", command=lambda: self.companies_listbox.selection_clear(0, tk.END)).pack(pady=5)
+
+        tk.Label(self, text="Benchmark (optional):", font=TEXT_BOX_FONT, bg=BACKGROUND_COLOR).pack()
+        self.selected_benchmark = tk.StringVar(self, value="None")
+        TickerPicker(self, self.selected_benchmark, ["None"] + self.tickers).pack()
+
+        tk.Button(
+            self,
+            text="COMPARE",
+            command=self.generate,
+            highlightbackground=BACKGROUND_COLOR,
+            font=BUTTON_FONT,
+            width=12,
+        ).pack(pady=15)
+
+    def select_sector(self, event=None):
+        """Add every company of the chosen sector to the selection."""
+        members = set(self.sectors.get(self.selected_sector.get(), ()))
+        for index, ticker in enumerate(self.tickers):
+            if ticker in members:
+                self.companies_listbox.selection_set(index)
+
+    def generate(self):
+        from graphing.generate import Generate
+
+        companies = [self.tickers[index] for index in self.companies_listbox.curselection()]
+        benchmark = self.selected_benchmark.get().strip().upper()
+        benchmark = None if benchmark in ("", "NONE") else benchmark
+        start_date = self.start_date.get()
+        end_date = self.end_date.get()
+
+        if not (start_date and end_date):
+            mb.showwarning("Date Warning", "Please enter both start and end dates on the graph screen.", parent=self)
+            return
+        if not companies:
+            mb.showwarning("Invalid data", "1 or more companies must be selected", parent=self)
+            return
+        try:
+            generator = Generate(start_date, end_date, *companies)
+            generator.generate_comparison_graph(benchmark)
+        except Exception as e:
+            mb.showwarning("Invalid Data", e, parent=self)
+
+
 class SortScreen(tk.Frame):
-    def show_top_10_results(self, top_10_data: list, sort_by):
+    def show_top_10_results(self, top_10_data: list, sort_by, title="Top 10 Results"):
         # Create or update a label to display the top 10 results
 
         if self.result_label:
@@ -128,7 +340,7 @@ class SortScreen(tk.Frame):
 
         self.result_label = tk.Label(
             self,
-            text="Top 10 Results:\n\n\n" + "\n\n".join(top_10_data_reformatted),
+            text=f"{title}:\n\n\n" + "\n\n".join(top_10_data_reformatted),
             font=TEXT_BOX_FONT,
             fg=WHITE,
             bg=STANDARD_BLUE,
@@ -158,6 +370,40 @@ class SortScreen(tk.Frame):
 
         save_dir_label.place(relx=0.8, rely=0.7, anchor="center")
 
+    def show_sector_results(self, start_date_entry, end_date_entry, weighting):
+        # Rank the sectors by their index's return over the dates entered (see graphing/universe.py)
+        from graphing.universe import sector_performance
+
+        start_date = start_date_entry.get()
+        end_date = end_date_entry.get()
+        if not (start_date and end_date):
+            mb.showwarning("Data Warning", "Please enter both start and end dates.")
+            return
+        try:
+            ranking = sector_performance(start_date, end_date, weighting.get())
+        except Exception as e:
+            mb.showwarning("Invalid Data", e)
+            return
+        if not ranking:
+            mb.showwarning("Invalid Data", "There are no returns between these dates.")
+            return
+
+        if self.result_label:
+            self.result_label.destroy()
+        lines = [f"{sector}: {change:+.2f}%" for sector, change in ranking]
+        self.result_label = tk.Label(
+            self,
+            text=f"Sectors ({weighting.get()} weighted):\n\n" + "\n".join(lines),
+            font=TEXT_BOX_FONT,
+            fg=WHITE,
+            bg=STANDARD_BLUE,
+            padx=10,
+            pady=10,
+            borderwidth=3,
+            relief="solid",
+        )
+        self.result_label.place(relx=0.8, rely=0.4, anchor="center")
+
     def get_user_data_and_sort(
         self, start_date_entry, end_date_entry, selected_sort, sort_method
     ):
@@ -181,6 +427,14 @@ class SortScreen(tk.Frame):
                     result = sorter.bubble_sort()
                 elif sort_algorithm == "merge":
                     result = sorter.merge_sort()
+                elif sort_algorithm == "top":
+                    result = sorter.top_n(10)
+                elif sort_algorithm == "bottom":
+                    result = sorter.bottom_n(10)
+                    self.show_top_10_results(
+                        result, sorter.sortMetric, "Bottom 10 Results"
+                    )
+                    return
 
                 self.show_top_10_results(result[-10:], sorter.sortMetric)
 
@@ -233,14 +487,32 @@ class SortScreen(tk.Frame):
         sort_label.place(relx=0.23, rely=0.33, anchor="center")
 
         # Options for the dropdown
-        sort_options = ["high", "close", "open", "volume", "weighted_volume"]
+        sort_options = [
+            "high",
+            "close",
+            "open",
+            "volume",
+            "weighted_volume",
+            "dollar_volume",
+            "day_range",
+            "percentage_change",
+            "change",
+            "gap",
+            "log_return",
+            "total_volume",
+            "average_volume",
+            "range_return",
+            "range_high",
+            "range_low",
+            "max_drawdown",
+        ]
         selected_sort = tk.StringVar(self)
         selected_sort.set(sort_options[0])  # Default value
 
         # Creating the dropdown
         sort_dropdown = tk.OptionMenu(self, selected_sort, *sort_options)
         sort_dropdown.config(
-            font=TEXT_BOX_FONT, width=12, highlightbackground=BACKGROUND_COLOR
+            font=TEXT_BOX_FONT, width=16, highlightbackground=BACKGROUND_COLOR
         )
         sort_dropdown.place(relx=0.43, rely=0.33, anchor="center")
 
@@ -274,6 +546,31 @@ class SortScreen(tk.Frame):
         )
         merge_radio.place(relx=0.4, rely=0.46, anchor="center")
 
+        top_radio = tk.Radiobutton(
+            self,
+            text="Top 10 only",
+            variable=sort_method,
+            value="top",
+            font=TEXT_BOX_FONT,
+            bg=BACKGROUND_COLOR,
+        )
+        top_radio.place(relx=0.4, rely=0.49, anchor="center")
+
+        bottom_radio = tk.Radiobutton(
+            self,
+            text="Bottom 10 only",
+            variable=sort_method,
+            value="bottom",
+            font=TEXT_BOX_FONT,
+            bg=BACKGROUND_COLOR,
+        )
+        bottom_radio.place(relx=0.4, rely=0.52, anchor="center")
+
+        from config import FULL_UNIVERSE
+
+        if FULL_UNIVERSE:  # a full sort of every ticker over a range is far too slow
+            sort_method.set("top")
+
         # Button to get user data
         get_data_button = tk.Button(
             self,
@@ -286,7 +583,29 @@ class SortScreen(tk.Frame):
             width=10,
             height=2,
         )
-        get_data_button.place(relx=0.42, rely=0.6, anchor="center")
+        get_data_button.place(relx=0.42, rely=0.62, anchor="center")
+
+        # Sector ranking, from the stored sector indices
+        sector_weighting = tk.StringVar(self)
+        sector_weighting.set("equal")
+        weighting_dropdown = tk.OptionMenu(self, sector_weighting, "equal", "volume")
+        weighting_dropdown.config(
+            font=TEXT_BOX_FONT, width=8, highlightbackground=BACKGROUND_COLOR
+        )
+        weighting_dropdown.place(relx=0.3, rely=0.75, anchor="center")
+
+        sectors_button = tk.Button(
+            self,
+            text="SECTORS",
+            command=lambda: self.show_sector_results(
+                start_date_entry, end_date_entry, sector_weighting
+            ),
+            highlightbackground=BACKGROUND_COLOR,
+            font=COMMAND_BUTTON_FONT,
+            width=10,
+            height=2,
+        )
+        sectors_button.place(relx=0.42, rely=0.75, anchor="center")
 
 
 class GraphsScreen(tk.Frame):
@@ -299,6 +618,7 @@ class GraphsScreen(tk.Frame):
         start_date_entry,
         graph_type,
         using_single_axes,
+        draw_in_app,
     ):
         from graphing.generate import Generate
 
@@ -310,6 +630,7 @@ class GraphsScreen(tk.Frame):
         start_date = start_date_entry.get()
         graph_type = graph_type.get()
         using_single_axes = using_single_axes.get()
+        draw_in_app = draw_in_app.get()
 
         if not (start_date and end_date):
             warning = "Please enter both start and end dates."
@@ -317,6 +638,9 @@ class GraphsScreen(tk.Frame):
         elif graph_type == "":
             warning = "Please select a graph type"
             mb.showwarning("Graph Type Warning", warning)
+        elif draw_in_app and graph_type != "line":
+            warning = "Only line graphs can be drawn in the app"
+            mb.showwarning("Graph Type Warning", warning)
         else:
             try:
                 companies = [company1, company2, company3]
@@ -329,10 +653,15 @@ class GraphsScreen(tk.Frame):
                 # elif len(companies) == 1:
                 #     companies = companies[0]
                 generator = Generate(start_date, end_date, *companies)
-                if graph_type == "line":
+                if draw_in_app:
+                    self.show_chart(companies, start_date, end_date)
+                elif graph_type == "line":
                     generator.generate_line_graph(using_single_axes)
                 elif graph_type == "bar":
                     generator.generate_bar_graph(using_single_axes)
+                elif graph_type == "candlestick":
+                    # candles always get a panel per company, so the single axes option does not apply
+                    generator.generate_candlestick_graph()
 
             except Exception as e:
                 mb.showwarning("Invalid Data", e)
@@ -346,7 +675,7 @@ class GraphsScreen(tk.Frame):
         try:
             conn = sqlite3.connect("data/main.sql")
             cursor = conn.cursor()
-            cursor.execute("SELECT ticker FROM Companies")
+            cursor.execute("SELECT ticker FROM Companies ORDER BY ticker")
             result = cursor.fetchall()
             return [x[0] for x in result]
 
@@ -360,6 +689,75 @@ class GraphsScreen(tk.Frame):
             if conn:
                 conn.close()
 
+    def show_chart(self, companies, start_date, end_date):
+        """Draw the companies' prices in the chart panel, made the first time it is needed as importing matplotlib takes a moment."""
+        if self.chart_panel is None:
+            from gui.chartPanel import ChartPanel
+
+            self.chart_panel = ChartPanel(self, bg=BACKGROUND_COLOR)
+        self.chart_panel.place(relx=0.5, rely=0.55, relwidth=0.96, relheight=0.82, anchor="center")
+        self.chart_panel.show(companies, start_date, end_date)
+
+    def show_universe_view(self, view, start_date_entry, end_date_entry):
+        """Show a heatmap, correlation matrix or sector indices of every company over the dates entered (see graphing/universe.py)."""
+        from graphing import universe
+
+        start_date = start_date_entry.get()
+        end_date = end_date_entry.get()
+        if not (start_date and end_date):
+            mb.showwarning("Date Warning", "Please enter both start and end dates.")
+            return
+        try:
+            if view == "returns":
+                fig = universe.returns_heatmap_figure(start_date, end_date)
+            elif view == "sectors":
+                fig = universe.sector_heatmap_figure(start_date, end_date)
+            elif view in ("equal", "volume"):
+                fig = universe.sector_index_figure(start_date, end_date, view)
+            else:
+                fig = universe.correlation_figure(start_date, end_date)
+            fig.show()
+        except Exception as e:
+            mb.showwarning("Invalid Data", e)
+
+    def find_similar(self, selected_company, start_date_entry, end_date_entry):
+        """Find the companies whose price moved most like Company 1's over the dates entered, and compare them on a graph."""
+        from graphing.generate import Generate
+        from graphing.similarity import find_similar
+
+        ticker = selected_company.get()
+        start_date = start_date_entry.get()
+        end_date = end_date_entry.get()
+        if ticker == "None":
+            mb.showwarning("Invalid data", "Select a company in Company 1 to find similar companies to.")
+            return
+        if not (start_date and end_date):
+            mb.showwarning("Date Warning", "Please enter both start and end dates.")
+            return
+        try:
+            Generate(start_date, end_date, ticker)  # checks the dates
+            matches = find_similar(ticker, start_date, end_date)
+            if not matches:
+                mb.showinfo("Find Similar", "There are no other companies to compare with.")
+                return
+            lines = [f"{match['ticker']}: correlation {match['correlation']:.2f}" for match in matches]
+            mb.showinfo(f"Most like {ticker}", "\n".join(lines))
+            generator = Generate(start_date, end_date, ticker, *[match["ticker"] for match in matches])
+            generator.generate_comparison_graph()
+        except Exception as e:
+            mb.showwarning("Invalid Data", e)
+
+    def show_quote(self, ticker, quote):
+        """Draw a live quote on the chart panel, if its company is being shown."""
+        if self.chart_panel is not None and self.chart_panel.winfo_ismapped():
+            self.chart_panel.chart.update_price(ticker, quote["date"], quote.get("currentPrice"))
+
+    def refresh_company_options(self):
+        """Rebuild the company dropdowns from the Companies table, e.g. after a company has been added."""
+        company_options = ["None"] + self.get_all_company_names()
+        for dropdown, selected_company in self.company_dropdowns:
+            dropdown.set_options(company_options)
+
     def __init__(self, parent, controller):
         tk.Frame.__init__(self, parent, bg=BACKGROUND_COLOR)
         label = tk.Label(
@@ -404,10 +802,7 @@ class GraphsScreen(tk.Frame):
         selected_company1.set(company_options[0])  # Default value
 
         # Creating the dropdown
-        company1_dropdown = tk.OptionMenu(self, selected_company1, *company_options)
-        company1_dropdown.config(
-            font=TEXT_BOX_FONT, width=12, highlightbackground=BACKGROUND_COLOR
-        )
+        company1_dropdown = TickerPicker(self, selected_company1, company_options)
         company1_dropdown.place(relx=0.51, rely=0.2, anchor="center")
 
         # Dropdown Box for Company 2
@@ -420,10 +815,7 @@ class GraphsScreen(tk.Frame):
         selected_company2.set(company_options[1])  # Default value
 
         # Creating the dropdown
-        company2_dropdown = tk.OptionMenu(self, selected_company2, *company_options)
-        company2_dropdown.config(
-            font=TEXT_BOX_FONT, width=12, highlightbackground=BACKGROUND_COLOR
-        )
+        company2_dropdown = TickerPicker(self, selected_company2, company_options)
         company2_dropdown.place(relx=0.51, rely=0.3, anchor="center")
 
         # Dropdown Box for Company 3
@@ -436,12 +828,16 @@ class GraphsScreen(tk.Frame):
         selected_company3.set(company_options[2])  # Default value
 
         # Creating the dropdown
-        company3_dropdown = tk.OptionMenu(self, selected_company3, *company_options)
-        company3_dropdown.config(
-            font=TEXT_BOX_FONT, width=12, highlightbackground=BACKGROUND_COLOR
-        )
+        company3_dropdown = TickerPicker(self, selected_company3, company_options)
         company3_dropdown.place(relx=0.51, rely=0.4, anchor="center")
 
+        # kept so that the options can be refreshed when a company is added
+        self.company_dropdowns = [
+            (company1_dropdown, selected_company1),
+            (company2_dropdown, selected_company2),
+            (company3_dropdown, selected_company3),
+        ]
+
         graph_type = tk.StringVar()
 
         graph_type_label = tk.Label(
@@ -470,6 +866,16 @@ class GraphsScreen(tk.Frame):
         )
         bar_radio.place(relx=0.51, rely=0.73, anchor="center")
 
+        candlestick_radio = tk.Radiobutton(
+            self,
+            text="Candlestick",
+            variable=graph_type,
+            value="candlestick",
+            font=TEXT_BOX_FONT,
+            bg=BACKGROUND_COLOR,
+        )
+        candlestick_radio.place(relx=0.51, rely=0.76, anchor="center")
+
         use_single_axes = tk.BooleanVar()
         use_single_axes_checkbox = tk.Checkbutton(
             self,
@@ -478,7 +884,58 @@ class GraphsScreen(tk.Frame):
             font=TEXT_BOX_FONT,
             bg=BACKGROUND_COLOR,
         )
-        use_single_axes_checkbox.place(relx=0.5, rely=0.8, anchor="center")
+        use_single_axes_checkbox.place(relx=0.5, rely=0.81, anchor="center")
+
+        draw_in_app = tk.BooleanVar()
+        draw_in_app_checkbox = tk.Checkbutton(
+            self,
+            text="Draw In App",
+            variable=draw_in_app,
+            font=TEXT_BOX_FONT,
+            bg=BACKGROUND_COLOR,
+        )
+        draw_in_app_checkbox.place(relx=0.5, rely=0.85, anchor="center")
+
+        # made the first time a graph is drawn in the app
+        self.chart_panel = None
+
+        compare_button = tk.Button(
+            self,
+            text="Compare Many",
+            command=lambda: ComparisonPicker(self, start_date_entry, end_date_entry),
+            highlightbackground=BACKGROUND_COLOR,
+            font=TEXT_BOX_FONT,
+        )
+        compare_button.place(relx=0.83, rely=0.3, anchor="center")
+
+        # views of every company at once, over the dates entered
+        for rely, (text, view) in zip(
+            (0.37, 0.44, 0.51, 0.58, 0.65),
+            (
+                ("Returns Heatmap", "returns"),
+                ("Sector Heatmap", "sectors"),
+                ("Correlations", "correlation"),
+                ("Sector Indices", "equal"),
+                ("Volume Weighted", "volume"),
+            ),
+        ):
+            view_button = tk.Button(
+                self,
+                text=text,
+                command=lambda view=view: self.show_universe_view(view, start_date_entry, end_date_entry),
+                highlightbackground=BACKGROUND_COLOR,
+                font=TEXT_BOX_FONT,
+            )
+            view_button.place(relx=0.83, rely=rely, anchor="center")
+
+        find_similar_button = tk.Button(
+            self,
+            text="Find Similar",
+            command=lambda: self.find_similar(selected_company1, start_date_entry, end_date_entry),
+            highlightbackground=BACKGROUND_COLOR,
+            font=TEXT_BOX_FONT,
+        )
+        find_similar_button.place(relx=0.83, rely=0.2, anchor="center")
 
         get_input_button = tk.Button(
             self,
@@ -491,6 +948,7 @@ class GraphsScreen(tk.Frame):
                 start_date_entry,
                 graph_type,
                 use_single_axes,
+                draw_in_app,
             ),
             highlightbackground=BACKGROUND_COLOR,
             font=COMMAND_BUTTON_FONT,
@@ -508,7 +966,7 @@ class SearchScreen(tk.Frame):
         if self.result_label:
             self.result_label.destroy()
 
-        if len(data) == 6:
+        if "currentPrice" in data:
             data = [ # live data has one more metric at the moment(percentage change)
                 f"current high: {data['high']}",
                 f"current low: {data['low']}\n",
@@ -538,8 +996,12 @@ class SearchScreen(tk.Frame):
                 f"close price: {data['close']}",
                 f"open price: {data['open']}",
                 f"volume traded: {data['volume']}",
-                f"weighted volume: {data['weighted_volume']}\n",
-
+                f"weighted volume: {data['weighted_volume']}",
+                (
+                    f"change since previous close: {data['change']:+.2f} ({data['percentage_change']:+.2f}%)\n"
+                    if data["change"] is not None
+                    else "change since previous close: not available\n"
+                ),
             ]
             data = [str(x) + '\n' for x in data]
             self.result_label = tk.Label(
@@ -577,6 +1039,51 @@ class SearchScreen(tk.Frame):
         except Exception as e:
             mb.showwarning("Data error", e)
 
+    def show_metric_search_results(self, results: dict, expression: str):
+        if self.result_label:
+            self.result_label.destroy()
+
+        if results:
+            text = f"{len(results)} companies matched {expression}:\n\n" + ", ".join(
+                results
+            )
+        else:
+            text = f"No companies matched {expression}"
+        self.result_label = tk.Label(
+            self,
+            text=text,
+            font=TEXT_BOX_FONT,
+            fg=WHITE,
+            bg=STANDARD_BLUE,
+            wraplength=600,
+            padx=10,
+            pady=10,
+            borderwidth=3,
+            relief="solid",
+        )
+        self.result_label.place(relx=0.5, rely=0.75, anchor="center")
+
+    def get_user_data_and_search_metrics(self, metrics_entry, date_entry):
+        from DatabaseHandling.search import search_by_metrics
+
+        expression = metrics_entry.get()
+        date = date_entry.get()
+
+        if not date:
+            message = "Please enter a date"
+            mb.showwarning("Date warning", message)
+            return
+        if not expression:
+            message = "Please enter the metrics to search by, e.g. close > sma_50"
+            mb.showwarning("Data warning", message)
+            return
+
+        try:
+            results = search_by_metrics(expression, date)
+            self.show_metric_search_results(results, expression)
+        except Exception as e:
+            mb.showwarning("Data error", e)
+
     def __init__(self, parent, controller):
         tk.Frame.__init__(self, parent, bg=BACKGROUND_COLOR)
         label = tk.Label(
@@ -612,6 +1119,15 @@ class SearchScreen(tk.Frame):
         date_entry = tk.Entry(self, font=TEXT_BOX_FONT, width=12)
         date_entry.place(relx=0.44, rely=0.285)
 
+        # Metrics Entry
+        metrics = tk.Label(
+            self, text="Metrics:", font=BUTTON_FONT, bg=BACKGROUND_COLOR
+        )
+        metrics.place(relx=0.235, rely=0.4, anchor="center")
+        metrics_entry = tk.Entry(self, font=TEXT_BOX_FONT, width=40)
+        metrics_entry.insert(0, "close > sma_50 AND rsi_14 < 70")
+        metrics_entry.place(relx=0.44, rely=0.385)
+
         get_input_button = tk.Button(
             self,
             text="SEARCH",
@@ -621,11 +1137,164 @@ class SearchScreen(tk.Frame):
             width=15,
             height=2,
         )
-        get_input_button.place(relx=0.5, rely=0.45, anchor="center")
+        get_input_button.place(relx=0.38, rely=0.5, anchor="center")
+
+        search_metrics_button = tk.Button(
+            self,
+            text="SEARCH BY METRICS",
+            command=lambda: self.get_user_data_and_search_metrics(
+                metrics_entry, date_entry
+            ),
+            highlightbackground=BACKGROUND_COLOR,
+            font=COMMAND_BUTTON_FONT,
+            width=15,
+            height=2,
+        )
+        search_metrics_button.place(relx=0.62, rely=0.5, anchor="center")
 
 
 class ThresholdsScreen(tk.Frame):
+    def poll_add_company_progress(self):
+        """Show progress messages sent from the add company or fill in lows thread. Tkinter widgets may only be updated from this thread."""
+        import queue
+
+        try:
+            while True:
+                message, finished = self.progress_queue.get_nowait()
+                self.progress_label.config(text=message)
+                if finished:
+                    self.add_company_button.config(state="normal")
+                    self.fill_lows_button.config(state="normal")
+                    self.controller.frames[GraphsScreen].refresh_company_options()
+                    return
+        except queue.Empty:
+            pass
+        self.after(200, self.poll_add_company_progress)
+
+    def get_user_data_and_add_company(
+        self, ticker_entry, name_entry, sector_entry, year_entry
+    ):
+        from DatabaseHandling.addCompany import add_company_in_background
+
+        ticker = ticker_entry.get().strip().upper()
+        name = name_entry.get().strip()
+        sector = sector_entry.get().strip() or None
+        year = year_entry.get().strip()
+
+        if not (ticker and name):
+            mb.showwarning("Data warning", "Please enter both a ticker and a name")
+            return
+        if year and not year.isdigit():
+            mb.showwarning("Data warning", "Incorporation year must be a number")
+            return
+
+        def progress(message, fraction):
+            self.progress_queue.put((f"{message} ({int(fraction * 100)}%)", False))
+
+        def done(inserted, error):
+            if error:
+                self.progress_queue.put((f"Could not add {ticker}: {error}", True))
+            else:
+                self.progress_queue.put(
+                    (f"{ticker} added with {inserted} days of data", True)
+                )
+
+        self.add_company_button.config(state="disabled")
+        self.fill_lows_button.config(state="disabled")
+        add_company_in_background(
+            ticker,
+            name,
+            sector,
+            None,
+            int(year) if year else None,
+            progressCallback=progress,
+            doneCallback=done,
+        )
+        self.poll_add_company_progress()
+
+    def fill_in_lows(self):
+        """Fill in the lows of rows stored before they were, which candlestick graphs and day_range need, on a background thread."""
+        from DatabaseHandling.autoBackfill import backfill_missing_lows_in_background
+
+        if not mb.askyesno(
+            "Fill In Lows",
+            "This fetches every company's history again to fill in the missing lows, one call every 12 seconds "
+            "(around 20 minutes for the default companies). Continue?",
+        ):
+            return
+
+        def progress(message, fraction):
+            self.progress_queue.put((f"{message} ({int(fraction * 100)}%)", False))
+
+        def done(filled, error):
+            if error:
+                self.progress_queue.put((f"Could not fill in the lows: {error}", True))
+            else:
+                self.progress_queue.put((f"Filled in {filled} lows", True))
+
+        self.add_company_button.config(state="disabled")
+        self.fill_lows_button.config(state="disabled")
+        self.progress_label.config(text="Finding the rows with no low")
+        backfill_missing_lows_in_background(progressCallback=progress, doneCallback=done)
+        self.poll_add_company_progress()
+
+    def refresh_alerts(self):
+        """Show the stored alert rules and the latest events fired."""
+        from DatabaseHandling.thresholds import describe_rule, list_rules, recent_events
+
+        self.rules = list_rules()
+        self.rules_listbox.delete(0, tk.END)
+        for rule in self.rules:
+            self.rules_listbox.insert(tk.END, describe_rule(rule))
+
+        self.events_listbox.delete(0, tk.END)
+        for _, _, date, _, message in recent_events(50):
+            self.events_listbox.insert(tk.END, f"{date}: {message}")
+
+    def get_user_data_and_add_rule(
+        self, ticker_entry, kind, direction, threshold_entry, days_entry
+    ):
+        from DatabaseHandling.thresholds import add_rule
+
+        ticker = ticker_entry.get().strip().upper()
+        threshold = threshold_entry.get().strip()
+        days = days_entry.get().strip()
+
+        if not (ticker and threshold):
+            mb.showwarning("Data warning", "Please enter both a ticker and a threshold")
+            return
+        try:
+            threshold = float(threshold)
+        except ValueError:
+            mb.showwarning("Data warning", "The threshold must be a number")
+            return
+        if days and not days.isdigit():
+            mb.showwarning("Data warning", "Days must be a whole number")
+            return
+
+        try:
+            add_rule(ticker, kind.get(), threshold, direction.get(), int(days) if days else None)
+        except ValueError as e:
+            mb.showwarning("Data warning", e)
+            return
+        self.controller.poller.reload_rules()
+        self.refresh_alerts()
+
+    def remove_selected_rule(self):
+        from DatabaseHandling.thresholds import remove_rule
+
+        selected = self.rules_listbox.curselection()
+        if not selected:
+            mb.showwarning("Data warning", "Please select a rule to remove")
+            return
+        remove_rule(self.rules[selected[0]][0])
+        self.controller.poller.reload_rules()
+        self.refresh_alerts()
+
     def __init__(self, parent, controller):
+        import queue
+        from DatabaseHandling.thresholds import DIRECTIONS, RULE_KINDS
+
         tk.Frame.__init__(self, parent, bg=BACKGROUND_COLOR)
         label = tk.Label(
             self,
@@ -641,3 +1310,137 @@ class ThresholdsScreen(tk.Frame):
         label.place(relx=0.5, rely=0.05, anchor="center")
 
         backButton = BackButton(self, controller)
+
+        self.controller = controller
+        self.progress_queue = queue.Queue()  # messages from the add company and fill in lows threads
+
+        # Add Company
+        add_company_label = tk.Label(
+            self, text="Add a Company", font=BUTTON_FONT, bg=BACKGROUND_COLOR
+        )
+        add_company_label.place(relx=0.5, rely=0.14, anchor="center")
+
+        ticker_label = tk.Label(
+            self, text="Ticker:", font=TEXT_BOX_FONT, bg=BACKGROUND_COLOR
+        )
+        ticker_label.place(relx=0.2, rely=0.2, anchor="center")
+        ticker_entry = tk.Entry(self, font=TEXT_BOX_FONT, width=8)
+        ticker_entry.place(relx=0.33, rely=0.2, anchor="center")
+
+        name_label = tk.Label(self, text="Name:", font=TEXT_BOX_FONT, bg=BACKGROUND_COLOR)
+        name_label.place(relx=0.5, rely=0.2, anchor="center")
+        name_entry = tk.Entry(self, font=TEXT_BOX_FONT, width=18)
+        name_entry.place(relx=0.68, rely=0.2, anchor="center")
+
+        sector_label = tk.Label(
+            self, text="Sector:", font=TEXT_BOX_FONT, bg=BACKGROUND_COLOR
+        )
+        sector_label.place(relx=0.2, rely=0.25, anchor="center")
+        sector_entry = tk.Entry(self, font=TEXT_BOX_FONT, width=12)
+        sector_entry.place(relx=0.36, rely=0.25, anchor="center")
+
+        year_label = tk.Label(
+            self, text="Incorporated:", font=TEXT_BOX_FONT, bg=BACKGROUND_COLOR
+        )
+        year_label.place(relx=0.56, rely=0.25, anchor="center")
+        year_entry = tk.Entry(self, font=TEXT_BOX_FONT, width=6)
+        year_entry.place(relx=0.7, rely=0.25, anchor="center")
+
+        self.add_company_button = tk.Button(
+            self,
+            text="ADD",
+            command=lambda: self.get_user_data_and_add_company(
+                ticker_entry, name_entry, sector_entry, year_entry
+            ),
+            highlightbackground=BACKGROUND_COLOR,
+            font=BUTTON_FONT,
+            width=6,
+        )
+        self.add_company_button.place(relx=0.85, rely=0.25, anchor="center")
+
+        # lows of rows stored before they were, for candlestick graphs
+        self.fill_lows_button = tk.Button(
+            self,
+            text="Fill In Lows",
+            command=self.fill_in_lows,
+            highlightbackground=BACKGROUND_COLOR,
+            font=TEXT_BOX_FONT,
+        )
+        self.fill_lows_button.place(relx=0.85, rely=0.14, anchor="center")
+
+        self.progress_label = tk.Label(
+            self, text="", font=ITALIC_SAVE_DIR_FONT, bg=BACKGROUND_COLOR
+        )
+        self.progress_label.place(relx=0.5, rely=0.3, anchor="center")
+
+        # Threshold Alerts
+        alerts_label = tk.Label(
+            self, text="Threshold Alerts", font=BUTTON_FONT, bg=BACKGROUND_COLOR
+        )
+        alerts_label.place(relx=0.5, rely=0.38, anchor="center")
+
+        rule_ticker_label = tk.Label(
+            self, text="Ticker:", font=TEXT_BOX_FONT, bg=BACKGROUND_COLOR
+        )
+        rule_ticker_label.place(relx=0.1, rely=0.44, anchor="center")
+        rule_ticker_entry = tk.Entry(self, font=TEXT_BOX_FONT, width=8)
+        rule_ticker_entry.place(relx=0.21, rely=0.44, anchor="center")
+
+        selected_kind = tk.StringVar(value=RULE_KINDS[0])
+        kind_dropdown = tk.OptionMenu(self, selected_kind, *RULE_KINDS)
+        kind_dropdown.config(width=11)
+        kind_dropdown.place(relx=0.38, rely=0.44, anchor="center")
+
+        selected_direction = tk.StringVar(value=DIRECTIONS[0])
+        direction_dropdown = tk.OptionMenu(self, selected_direction, *DIRECTIONS)
+        direction_dropdown.config(width=5)
+        direction_dropdown.place(relx=0.53, rely=0.44, anchor="center")
+
+        threshold_entry = tk.Entry(self, font=TEXT_BOX_FONT, width=7)
+        threshold_entry.place(relx=0.65, rely=0.44, anchor="center")
+
+        days_label = tk.Label(self, text="Days:", font=TEXT_BOX_FONT, bg=BACKGROUND_COLOR)
+        days_label.place(relx=0.74, rely=0.44, anchor="center")
+        days_entry = tk.Entry(self, font=TEXT_BOX_FONT, width=4)
+        days_entry.place(relx=0.8, rely=0.44, anchor="center")
+
+        add_rule_button = tk.Button(
+            self,
+            text="ADD",
+            command=lambda: self.get_user_data_and_add_rule(
+                rule_ticker_entry,
+                selected_kind,
+                selected_direction,
+                threshold_entry,
+                days_entry,
+            ),
+            highlightbackground=BACKGROUND_COLOR,
+            font=BUTTON_FONT,
+            width=6,
+        )
+        add_rule_button.place(relx=0.9, rely=0.44, anchor="center")
+
+        rules_label = tk.Label(self, text="Rules", font=TEXT_BOX_FONT, bg=BACKGROUND_COLOR)
+        rules_label.place(relx=0.27, rely=0.5, anchor="center")
+        self.rules_listbox = tk.Listbox(self, font=TEXT_BOX_FONT, width=34, height=14)
+        self.rules_listbox.place(relx=0.27, rely=0.7, anchor="center")
+
+        remove_rule_button = tk.Button(
+            self,
+            text="REMOVE",
+            command=self.remove_selected_rule,
+            highlightbackground=BACKGROUND_COLOR,
+            font=BUTTON_FONT,
+            width=8,
+        )
+        remove_rule_button.place(relx=0.27, rely=0.91, anchor="center")
+
+        events_label = tk.Label(
+            self, text="Latest Alerts", font=TEXT_BOX_FONT, bg=BACKGROUND_COLOR
+        )
+        events_label.place(relx=0.72, rely=0.5, anchor="center")
+        self.events_listbox = tk.Listbox(self, font=TEXT_BOX_FONT, width=40, height=14)
+        self.events_listbox.place(relx=0.72, rely=0.7, anchor="center")
+
+        self.rules = []
+        self.refresh_alerts()